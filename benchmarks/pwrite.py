@@ -0,0 +1,118 @@
+# Copyright (c) Microsoft Corporation
+#
+# All rights reserved.
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+"""Benchmark concurrent chunk writes of downloaded data
+
+Compares the legacy per-chunk open, seek and write path against
+blobxfer.models.filehandle.FileWriterPool for each durability policy.
+
+Usage: python benchmarks/pwrite.py [--threads N] [--size BYTES]
+    [--chunk-size BYTES] [--path DIR]
+"""
+
+# stdlib imports
+import argparse
+import os
+import queue
+import tempfile
+import threading
+import time
+# non-stdlib imports
+# local imports
+import blobxfer.models.filehandle
+
+
+def _legacy_write(path, offset, data):
+    # type: (str, int, bytes) -> None
+    """Legacy write path
+    :param str path: path
+    :param int offset: offset
+    :param bytes data: data
+    """
+    with open(path, 'r+b') as fd:
+        fd.seek(offset, 0)
+        fd.write(data)
+
+
+def run(name, path, write, finalize, num_threads, size, chunk_size):
+    # type: (str, str, function, function, int, int, int) -> None
+    """Run a benchmark
+    :param str name: name
+    :param str path: path
+    :param function write: write function
+    :param function finalize: finalize function
+    :param int num_threads: number of writer threads
+    :param int size: file size
+    :param int chunk_size: chunk size
+    """
+    with open(path, 'wb') as fd:
+        fd.truncate(size)
+    data = os.urandom(chunk_size)
+    q = queue.Queue()
+    for offset in range(0, size, chunk_size):
+        q.put(offset)
+
+    def _worker():
+        while True:
+            try:
+                offset = q.get(block=False)
+            except queue.Empty:
+                break
+            write(path, offset, data[:min((chunk_size, size - offset))])
+
+    threads = [threading.Thread(target=_worker) for _ in range(num_threads)]
+    start = time.perf_counter()
+    for thr in threads:
+        thr.start()
+    for thr in threads:
+        thr.join()
+    finalize(path)
+    elapsed = time.perf_counter() - start
+    print('{0:>16}: {1:8.3f} sec {2:10.1f} MiB/s'.format(
+        name, elapsed, size / 1048576 / elapsed))
+    os.unlink(path)
+
+
+def main():
+    # type: (None) -> None
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--size', type=int, default=268435456)
+    parser.add_argument('--chunk-size', type=int, default=65536)
+    parser.add_argument('--path', default=None)
+    args = parser.parse_args()
+    fd, path = tempfile.mkstemp(dir=args.path)
+    os.close(fd)
+    run('legacy', path, _legacy_write, lambda x: None, args.threads,
+        args.size, args.chunk_size)
+    for durability in blobxfer.models.filehandle.WriteDurability:
+        pool = blobxfer.models.filehandle.FileWriterPool(
+            durability=durability)
+        run('pool/{}'.format(durability), path, pool.pwrite, pool.finalize,
+            args.threads, args.size, args.chunk_size)
+
+
+if __name__ == '__main__':
+    main()
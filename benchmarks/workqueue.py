@@ -0,0 +1,130 @@
+# Copyright (c) Microsoft Corporation
+#
+# All rights reserved.
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+"""Benchmark idle CPU usage and dispatch latency of the worker queues
+
+Compares the legacy non-blocking polling loop used by the transfer
+worker threads against blobxfer.models.workqueue.WorkQueue.
+
+Usage: python benchmarks/workqueue.py [--threads N] [--idle SEC]
+"""
+
+# stdlib imports
+import argparse
+import queue
+import statistics
+import threading
+import time
+# non-stdlib imports
+# local imports
+import blobxfer.models.workqueue
+
+
+def _polling_worker(q, stop, latencies):
+    # type: (queue.Queue, threading.Event, list) -> None
+    """Legacy polling worker
+    :param queue.Queue q: queue
+    :param threading.Event stop: stop event
+    :param list latencies: latencies
+    """
+    while not stop.is_set():
+        try:
+            ts = q.get(block=False, timeout=0.1)
+        except queue.Empty:
+            continue
+        latencies.append(time.perf_counter() - ts)
+
+
+def _blocking_worker(q, stop, latencies):
+    # type: (blobxfer.models.workqueue.WorkQueue, threading.Event,
+    #        list) -> None
+    """Blocking worker
+    :param blobxfer.models.workqueue.WorkQueue q: queue
+    :param threading.Event stop: stop event
+    :param list latencies: latencies
+    """
+    while not stop.is_set():
+        try:
+            ts = q.get()
+        except queue.Empty:
+            continue
+        latencies.append(time.perf_counter() - ts)
+
+
+def run(name, q, target, num_threads, idle_time, num_items):
+    # type: (str, queue.Queue, function, int, float, int) -> None
+    """Run a benchmark
+    :param str name: name
+    :param queue.Queue q: queue
+    :param function target: worker function
+    :param int num_threads: number of worker threads
+    :param float idle_time: idle time in seconds
+    :param int num_items: number of items to dispatch
+    """
+    stop = threading.Event()
+    latencies = []
+    threads = [
+        threading.Thread(target=target, args=(q, stop, latencies))
+        for _ in range(num_threads)
+    ]
+    for thr in threads:
+        thr.start()
+    # measure idle cpu
+    cpu_start = time.process_time()
+    time.sleep(idle_time)
+    idle_cpu = (time.process_time() - cpu_start) / idle_time
+    # measure dispatch latency
+    for _ in range(num_items):
+        q.put(time.perf_counter())
+        time.sleep(0.001)
+    while len(latencies) < num_items:
+        time.sleep(0.01)
+    stop.set()
+    if isinstance(q, blobxfer.models.workqueue.WorkQueue):
+        q.terminate()
+    for thr in threads:
+        thr.join()
+    latencies = sorted(x * 1e6 for x in latencies)
+    print(('{0:>8}: idle cpu {1:7.1%} dispatch latency median {2:9.1f} us '
+           'p99 {3:9.1f} us').format(
+               name, idle_cpu, statistics.median(latencies),
+               latencies[int(len(latencies) * 0.99) - 1]))
+
+
+def main():
+    # type: (None) -> None
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--idle', type=float, default=2.0)
+    parser.add_argument('--items', type=int, default=1000)
+    args = parser.parse_args()
+    run('polling', queue.Queue(), _polling_worker, args.threads, args.idle,
+        args.items)
+    run('blocking', blobxfer.models.workqueue.WorkQueue(), _blocking_worker,
+        args.threads, args.idle, args.items)
+
+
+if __name__ == '__main__':
+    main()
@@ -58,6 +58,7 @@ class StorageEntity(object):
         self._name = None
         self._mode = None
         self._lmt = None
+        self._etag = None
         self._size = None
         self._snapshot = None
         self._md5 = None
@@ -136,6 +137,16 @@ class StorageEntity(object):
         """
         return self._lmt
 
+    @property
+    def etag(self):
+        # type: (StorageEntity) -> str
+        """Entity ETag
+        :param StorageEntity self: this
+        :rtype: str
+        :return: ETag of entity
+        """
+        return self._etag
+
     @property
     def size(self):
         # type: (StorageEntity) -> int
@@ -363,6 +374,7 @@ class StorageEntity(object):
         self._name = blob.name
         self._snapshot = blob.snapshot
         self._lmt = blob.properties.last_modified
+        self._etag = blob.properties.etag
         self._size = blob.properties.content_length
         self._md5 = blob.properties.content_settings.content_md5
         self._cache_control = blob.properties.content_settings.cache_control
@@ -406,6 +418,7 @@ class StorageEntity(object):
             self._name = file.name
         self._snapshot = snapshot
         self._lmt = file.properties.last_modified
+        self._etag = file.properties.etag
         self._size = file.properties.content_length
         self._md5 = file.properties.content_settings.content_md5
         self._cache_control = file.properties.content_settings.cache_control
@@ -451,6 +464,20 @@ class StorageEntity(object):
                 self._client = sa.block_blob_client
                 self._mode = StorageModes.Block
 
+    def update_from_response(self, props, md5):
+        # type: (StorageEntity,
+        #        azure.storage.blob.models.ResourceProperties, str) -> None
+        """Update remote properties from the response of a request which
+        modified the entity
+        :param StorageEntity self: this
+        :param azure.storage.blob.models.ResourceProperties props:
+            properties in response
+        :param str md5: content md5 of entity
+        """
+        self._lmt = props.last_modified
+        self._etag = props.etag
+        self._md5 = md5
+
     def populate_from_arbitrary_url(self, remote_path, size):
         # type: (StorageEntity, str, int) -> None
         """Populate properties from an arbitrary url
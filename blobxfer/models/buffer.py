@@ -0,0 +1,191 @@
+# Copyright (c) Microsoft Corporation
+#
+# All rights reserved.
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+# stdlib imports
+import collections
+import threading
+# non-stdlib imports
+# local imports
+
+# global defines
+_SIZE_CLASS_BYTES = 65536
+_DEFAULT_MAX_RETAINED_BYTES = 268435456
+
+
+def zero_pad(data, length):
+    # type: (object, int) -> object
+    """Zero pad data to a length. Pooled buffers are padded in place if
+    the underlying buffer has sufficient capacity, otherwise a padded copy
+    is returned.
+    :param object data: bytes or memoryview of a pooled buffer
+    :param int length: padded length
+    :rtype: object
+    :return: padded data
+    """
+    datalen = len(data)
+    if datalen >= length:
+        return data
+    if (isinstance(data, memoryview) and
+            isinstance(data.obj, bytearray) and
+            len(data.obj) >= length):
+        view = memoryview(data.obj)[:length]
+        view[datalen:] = bytes(length - datalen)
+        return view
+    return bytes(data).ljust(length, b'\0')
+
+
+def to_bytes(data):
+    # type: (object) -> bytes
+    """Convert data to bytes for request bodies
+    :param object data: bytes or memoryview
+    :rtype: bytes
+    :return: data as bytes
+    """
+    if isinstance(data, memoryview):
+        return data.tobytes()
+    return data
+
+
+class BufferPool(object):
+    """Size-classed pool of reusable bytearray buffers"""
+    def __init__(self, max_retained_bytes=_DEFAULT_MAX_RETAINED_BYTES):
+        # type: (BufferPool, int) -> None
+        """Ctor for BufferPool
+        :param BufferPool self: this
+        :param int max_retained_bytes: maximum bytes of free buffers to
+            retain for reuse
+        """
+        if max_retained_bytes < 0:
+            max_retained_bytes = 0
+        self._lock = threading.Lock()
+        self._free = collections.defaultdict(list)
+        self._free_ids = set()
+        self._max_retained_bytes = max_retained_bytes
+        self._retained_bytes = 0
+        self._allocations = 0
+        self._reuses = 0
+
+    @property
+    def retained_bytes(self):
+        # type: (BufferPool) -> int
+        """Bytes of free buffers retained for reuse
+        :param BufferPool self: this
+        :rtype: int
+        :return: retained bytes
+        """
+        with self._lock:
+            return self._retained_bytes
+
+    @property
+    def allocations(self):
+        # type: (BufferPool) -> int
+        """Number of buffers allocated
+        :param BufferPool self: this
+        :rtype: int
+        :return: number of allocations
+        """
+        with self._lock:
+            return self._allocations
+
+    @property
+    def reuses(self):
+        # type: (BufferPool) -> int
+        """Number of buffers reused from the pool
+        :param BufferPool self: this
+        :rtype: int
+        :return: number of reuses
+        """
+        with self._lock:
+            return self._reuses
+
+    @staticmethod
+    def size_class(nbytes):
+        # type: (int) -> int
+        """Compute size class for a number of bytes
+        :param int nbytes: number of bytes
+        :rtype: int
+        :return: size class in bytes
+        """
+        if nbytes <= 0:
+            return _SIZE_CLASS_BYTES
+        return (
+            (nbytes + _SIZE_CLASS_BYTES - 1) // _SIZE_CLASS_BYTES
+        ) * _SIZE_CLASS_BYTES
+
+    def acquire(self, nbytes):
+        # type: (BufferPool, int) -> memoryview
+        """Acquire a buffer with a capacity of at least nbytes
+        :param BufferPool self: this
+        :param int nbytes: number of bytes
+        :rtype: memoryview
+        :return: view of length nbytes at the start of a pooled buffer
+        """
+        size = BufferPool.size_class(nbytes)
+        buf = None
+        with self._lock:
+            free = self._free.get(size)
+            if free:
+                buf = free.pop()
+                self._free_ids.discard(id(buf))
+                self._retained_bytes -= size
+                self._reuses += 1
+            else:
+                self._allocations += 1
+        if buf is None:
+            buf = bytearray(size)
+        return memoryview(buf)[:nbytes]
+
+    def release(self, data):
+        # type: (BufferPool, object) -> None
+        """Return a buffer to the pool. Data which does not originate from
+        a pool is ignored.
+        :param BufferPool self: this
+        :param object data: memoryview of a pooled buffer
+        """
+        if not isinstance(data, memoryview):
+            return
+        buf = data.obj
+        if not isinstance(buf, bytearray):
+            return
+        size = len(buf)
+        if size == 0 or size % _SIZE_CLASS_BYTES != 0:
+            return
+        with self._lock:
+            if id(buf) in self._free_ids:
+                return
+            if self._retained_bytes + size > self._max_retained_bytes:
+                return
+            self._free[size].append(buf)
+            self._free_ids.add(id(buf))
+            self._retained_bytes += size
+
+    def clear(self):
+        # type: (BufferPool) -> None
+        """Drop all retained buffers
+        :param BufferPool self: this
+        """
+        with self._lock:
+            self._free.clear()
+            self._free_ids.clear()
+            self._retained_bytes = 0
@@ -25,6 +25,7 @@
 # stdlib imports
 import base64
 import collections
+import enum
 import hashlib
 import hmac
 import json
@@ -37,6 +38,21 @@ import blobxfer.util
 
 # encryption constants
 AES256_BLOCKSIZE_BYTES = 16
+AES256_GCM_NONCE_LENGTH_BYTES = 12
+AES256_GCM_TAG_LENGTH_BYTES = 16
+AES256_GCM_REGION_OVERHEAD_BYTES = (
+    AES256_GCM_NONCE_LENGTH_BYTES + AES256_GCM_TAG_LENGTH_BYTES
+)
+
+
+# enums
+class EncryptionMode(enum.Enum):
+    FullBlob = 'fullblob'
+    ChunkedBlob = 'chunkedblob'
+
+    def __str__(self):
+        return self.value
+
 
 # named tuples
 EncryptionBlobxferExtensions = collections.namedtuple(
@@ -64,6 +80,13 @@ EncryptionWrappedContentKey = collections.namedtuple(
         'key_id',
     ]
 )
+EncryptedRegionInfo = collections.namedtuple(
+    'EncryptedRegionInfo', [
+        'data_length',
+        'nonce_length',
+        'tag_length',
+    ]
+)
 EncryptionMetadataAuthentication = collections.namedtuple(
     'EncryptionMetadataAuthentication', [
         'algorithm',
@@ -80,6 +103,9 @@ class EncryptionMetadata(object):
     _ENCRYPTION_MODE = 'FullBlob'
     _ENCRYPTION_PROTOCOL_VERSION = '1.0'
     _ENCRYPTION_ALGORITHM = 'AES_CBC_256'
+    _CHUNKED_ENCRYPTION_MODE = 'ChunkedBlob'
+    _CHUNKED_ENCRYPTION_PROTOCOL_VERSION = '2.0'
+    _CHUNKED_ENCRYPTION_ALGORITHM = 'AES_GCM_256'
     _ENCRYPTED_KEY_SCHEME = 'RSA-OAEP'
     _AUTH_ALGORITHM = 'HMAC-SHA256'
     _AUTH_ENCODING_TYPE = 'UTF-8'
@@ -102,6 +128,10 @@ class EncryptionMetadata(object):
     _JSON_KEY_KEY_WRAPPING_METADATA = 'KeyWrappingMetadata'
     _JSON_KEY_BLOBXFER_EXTENSIONS = 'BlobxferExtensions'
     _JSON_KEY_PREENCRYPTED_MD5 = 'PreEncryptedContentMD5'
+    _JSON_KEY_ENCRYPTED_REGION_INFO = 'EncryptedRegionInfo'
+    _JSON_KEY_DATA_LENGTH = 'DataLength'
+    _JSON_KEY_NONCE_LENGTH = 'NonceLength'
+    _JSON_KEY_TAG_LENGTH = 'TagLength'
 
     _JSON_KEY_AUTH_METAAUTH = 'EncryptionMetadataAuthentication'
     _JSON_KEY_AUTH_ENCODING = 'Encoding'
@@ -113,6 +143,7 @@ class EncryptionMetadata(object):
         """
         self.blobxfer_extensions = None
         self.content_encryption_iv = None
+        self.encrypted_region_info = None
         self.encryption_agent = None
         self.encryption_authentication = None
         self.encryption_mode = None
@@ -143,6 +174,42 @@ class EncryptionMetadata(object):
         """
         return self._signkey
 
+    @property
+    def is_chunked(self):
+        # type: (EncryptionMetadata) -> bool
+        """Check if data is encrypted in independently authenticated regions
+        :param EncryptionMetadata self: this
+        :rtype: bool
+        :return: if chunked encryption mode
+        """
+        return (self.encryption_mode ==
+                EncryptionMetadata._CHUNKED_ENCRYPTION_MODE)
+
+    @property
+    def encrypted_region_size(self):
+        # type: (EncryptionMetadata) -> int
+        """Get the plaintext length of each encrypted region
+        :param EncryptionMetadata self: this
+        :rtype: int
+        :return: plaintext region length or None if not chunked
+        """
+        if self.encrypted_region_info is None:
+            return None
+        return self.encrypted_region_info.data_length
+
+    @encrypted_region_size.setter
+    def encrypted_region_size(self, value):
+        # type: (EncryptionMetadata, int) -> None
+        """Set the plaintext length of each encrypted region
+        :param EncryptionMetadata self: this
+        :param int value: plaintext region length
+        """
+        self.encrypted_region_info = EncryptedRegionInfo(
+            data_length=value,
+            nonce_length=AES256_GCM_NONCE_LENGTH_BYTES,
+            tag_length=AES256_GCM_TAG_LENGTH_BYTES,
+        )
+
     @staticmethod
     def encryption_metadata_exists(md):
         # type: (dict) -> bool
@@ -159,26 +226,39 @@ class EncryptionMetadata(object):
             pass
         return False
 
-    def create_new_metadata(self, rsa_public_key):
+    def create_new_metadata(self, rsa_public_key, mode=None):
         # type: (EncryptionMetadata,
-        #        cryptography.hazmat.primitives.asymmetric.rsa.RSAPublicKey)
-        #        -> None
+        #        cryptography.hazmat.primitives.asymmetric.rsa.RSAPublicKey,
+        #        EncryptionMode) -> None
         """Create new metadata entries for encryption (upload)
         :param EncryptionMetadata self: this
         :param cryptography.hazmat.primitives.asymmetric.rsa.RSAPublicKey:
             rsa public key
+        :param EncryptionMode mode: encryption mode
         """
         self._rsa_public_key = rsa_public_key
+        self.wrapped_content_key = None
         self._symkey = os.urandom(
             blobxfer.operations.crypto._AES256_KEYLENGTH_BYTES)
         self._signkey = os.urandom(
             blobxfer.operations.crypto._AES256_KEYLENGTH_BYTES)
-        self.content_encryption_iv = os.urandom(AES256_BLOCKSIZE_BYTES)
-        self.encryption_agent = EncryptionAgent(
-            encryption_algorithm=EncryptionMetadata._ENCRYPTION_ALGORITHM,
-            protocol=EncryptionMetadata._ENCRYPTION_PROTOCOL_VERSION,
-        )
-        self.encryption_mode = EncryptionMetadata._ENCRYPTION_MODE
+        if mode == EncryptionMode.ChunkedBlob:
+            # each region carries its own nonce, the region size is set
+            # once the chunk size of the upload is known
+            self.encryption_agent = EncryptionAgent(
+                encryption_algorithm=EncryptionMetadata.
+                _CHUNKED_ENCRYPTION_ALGORITHM,
+                protocol=EncryptionMetadata.
+                _CHUNKED_ENCRYPTION_PROTOCOL_VERSION,
+            )
+            self.encryption_mode = EncryptionMetadata._CHUNKED_ENCRYPTION_MODE
+        else:
+            self.content_encryption_iv = os.urandom(AES256_BLOCKSIZE_BYTES)
+            self.encryption_agent = EncryptionAgent(
+                encryption_algorithm=EncryptionMetadata._ENCRYPTION_ALGORITHM,
+                protocol=EncryptionMetadata._ENCRYPTION_PROTOCOL_VERSION,
+            )
+            self.encryption_mode = EncryptionMetadata._ENCRYPTION_MODE
 
     def convert_from_json(self, md, entityname, rsaprivatekey):
         # type: (EncryptionMetadata, dict, str,
@@ -202,8 +282,19 @@ class EncryptionMetadata(object):
             )
         except KeyError:
             pass
-        self.content_encryption_iv = base64.b64decode(
-            ed[EncryptionMetadata._JSON_KEY_CONTENT_IV])
+        self.encryption_mode = ed[
+            EncryptionMetadata._JSON_KEY_ENCRYPTION_MODE]
+        if self.encryption_mode == EncryptionMetadata._ENCRYPTION_MODE:
+            algorithm = EncryptionMetadata._ENCRYPTION_ALGORITHM
+            protocol = EncryptionMetadata._ENCRYPTION_PROTOCOL_VERSION
+        elif self.encryption_mode == \
+                EncryptionMetadata._CHUNKED_ENCRYPTION_MODE:
+            algorithm = EncryptionMetadata._CHUNKED_ENCRYPTION_ALGORITHM
+            protocol = EncryptionMetadata._CHUNKED_ENCRYPTION_PROTOCOL_VERSION
+        else:
+            raise RuntimeError(
+                '{}: unknown encryption mode: {}'.format(
+                    entityname, self.encryption_mode))
         self.encryption_agent = EncryptionAgent(
             encryption_algorithm=ed[
                 EncryptionMetadata._JSON_KEY_ENCRYPTION_AGENT][
@@ -212,14 +303,30 @@ class EncryptionMetadata(object):
                 EncryptionMetadata._JSON_KEY_ENCRYPTION_AGENT][
                     EncryptionMetadata._JSON_KEY_PROTOCOL],
         )
-        if (self.encryption_agent.encryption_algorithm !=
-                EncryptionMetadata._ENCRYPTION_ALGORITHM):
+        if self.encryption_agent.encryption_algorithm != algorithm:
             raise RuntimeError('{}: unknown block cipher: {}'.format(
                 entityname, self.encryption_agent.encryption_algorithm))
-        if (self.encryption_agent.protocol !=
-                EncryptionMetadata._ENCRYPTION_PROTOCOL_VERSION):
+        if self.encryption_agent.protocol != protocol:
             raise RuntimeError('{}: unknown encryption protocol: {}'.format(
                 entityname, self.encryption_agent.protocol))
+        if self.is_chunked:
+            eri = ed[EncryptionMetadata._JSON_KEY_ENCRYPTED_REGION_INFO]
+            self.encrypted_region_info = EncryptedRegionInfo(
+                data_length=eri[EncryptionMetadata._JSON_KEY_DATA_LENGTH],
+                nonce_length=eri[EncryptionMetadata._JSON_KEY_NONCE_LENGTH],
+                tag_length=eri[EncryptionMetadata._JSON_KEY_TAG_LENGTH],
+            )
+            if (self.encrypted_region_info.nonce_length !=
+                    AES256_GCM_NONCE_LENGTH_BYTES or
+                    self.encrypted_region_info.tag_length !=
+                    AES256_GCM_TAG_LENGTH_BYTES or
+                    self.encrypted_region_info.data_length <= 0):
+                raise RuntimeError(
+                    '{}: invalid encrypted region info: {}'.format(
+                        entityname, self.encrypted_region_info))
+        else:
+            self.content_encryption_iv = base64.b64decode(
+                ed[EncryptionMetadata._JSON_KEY_CONTENT_IV])
         self.encryption_authentication = EncryptionAuthentication(
             algorithm=ed[
                 EncryptionMetadata._JSON_KEY_INTEGRITY_AUTH][
@@ -233,12 +340,6 @@ class EncryptionMetadata(object):
             raise RuntimeError(
                 '{}: unknown integrity/auth method: {}'.format(
                     entityname, self.encryption_authentication.algorithm))
-        self.encryption_mode = ed[
-            EncryptionMetadata._JSON_KEY_ENCRYPTION_MODE]
-        if self.encryption_mode != EncryptionMetadata._ENCRYPTION_MODE:
-            raise RuntimeError(
-                '{}: unknown encryption mode: {}'.format(
-                    entityname, self.encryption_mode))
         try:
             _eak = ed[EncryptionMetadata._JSON_KEY_WRAPPEDCONTENTKEY][
                 EncryptionMetadata._JSON_KEY_ENCRYPTED_AUTHKEY]
@@ -313,6 +414,28 @@ class EncryptionMetadata(object):
                     '{}: encryption metadata authentication failed'.format(
                         entityname))
 
+    def _wrap_keys(self):
+        # type: (EncryptionMetadata) -> EncryptionWrappedContentKey
+        """Wrap the keys of a new upload with the RSA public key. Keys are
+        wrapped once so the same values are recorded in the resume database
+        and the entity metadata.
+        :param EncryptionMetadata self: this
+        :rtype: EncryptionWrappedContentKey
+        :return: wrapped content key
+        """
+        if self.wrapped_content_key is None:
+            self.wrapped_content_key = EncryptionWrappedContentKey(
+                algorithm=EncryptionMetadata._ENCRYPTED_KEY_SCHEME,
+                encrypted_authentication_key=blobxfer.operations.crypto.
+                rsa_encrypt_key_base64_encoded(
+                    None, self._rsa_public_key, self.signing_key),
+                encrypted_key=blobxfer.operations.crypto.
+                rsa_encrypt_key_base64_encoded(
+                    None, self._rsa_public_key, self.symmetric_key),
+                key_id='private:pem',
+            )
+        return self.wrapped_content_key
+
     def convert_to_json_with_mac(self, md5digest, hmacdigest):
         # type: (EncryptionMetadata, str, str) -> dict
         """Constructs metadata for encryption
@@ -323,30 +446,23 @@ class EncryptionMetadata(object):
         :return: encryption metadata
         """
         # encrypt keys
-        enc_content_key = blobxfer.operations.crypto.\
-            rsa_encrypt_key_base64_encoded(
-                None, self._rsa_public_key, self.symmetric_key)
-        enc_sign_key = blobxfer.operations.crypto.\
-            rsa_encrypt_key_base64_encoded(
-                None, self._rsa_public_key, self.signing_key)
+        wck = self._wrap_keys()
         # generate json
         encjson = {
             EncryptionMetadata._JSON_KEY_ENCRYPTION_MODE:
-            EncryptionMetadata._ENCRYPTION_MODE,
-            EncryptionMetadata._JSON_KEY_CONTENT_IV:
-            blobxfer.util.base64_encode_as_string(self.content_encryption_iv),
+            self.encryption_mode,
             EncryptionMetadata._JSON_KEY_WRAPPEDCONTENTKEY: {
-                EncryptionMetadata._JSON_KEY_KEYID: 'private:pem',
-                EncryptionMetadata._JSON_KEY_ENCRYPTED_KEY: enc_content_key,
-                EncryptionMetadata._JSON_KEY_ENCRYPTED_AUTHKEY: enc_sign_key,
-                EncryptionMetadata._JSON_KEY_ALGORITHM:
-                EncryptionMetadata._ENCRYPTED_KEY_SCHEME,
+                EncryptionMetadata._JSON_KEY_KEYID: wck.key_id,
+                EncryptionMetadata._JSON_KEY_ENCRYPTED_KEY: wck.encrypted_key,
+                EncryptionMetadata._JSON_KEY_ENCRYPTED_AUTHKEY:
+                wck.encrypted_authentication_key,
+                EncryptionMetadata._JSON_KEY_ALGORITHM: wck.algorithm,
             },
             EncryptionMetadata._JSON_KEY_ENCRYPTION_AGENT: {
                 EncryptionMetadata._JSON_KEY_PROTOCOL:
-                EncryptionMetadata._ENCRYPTION_PROTOCOL_VERSION,
+                self.encryption_agent.protocol,
                 EncryptionMetadata._JSON_KEY_ENCRYPTION_ALGORITHM:
-                EncryptionMetadata._ENCRYPTION_ALGORITHM,
+                self.encryption_agent.encryption_algorithm,
             },
             EncryptionMetadata._JSON_KEY_INTEGRITY_AUTH: {
                 EncryptionMetadata._JSON_KEY_ALGORITHM:
@@ -354,6 +470,19 @@ class EncryptionMetadata(object):
             },
             EncryptionMetadata._JSON_KEY_KEY_WRAPPING_METADATA: {},
         }
+        if self.is_chunked:
+            encjson[EncryptionMetadata._JSON_KEY_ENCRYPTED_REGION_INFO] = {
+                EncryptionMetadata._JSON_KEY_DATA_LENGTH:
+                self.encrypted_region_info.data_length,
+                EncryptionMetadata._JSON_KEY_NONCE_LENGTH:
+                self.encrypted_region_info.nonce_length,
+                EncryptionMetadata._JSON_KEY_TAG_LENGTH:
+                self.encrypted_region_info.tag_length,
+            }
+        else:
+            encjson[EncryptionMetadata._JSON_KEY_CONTENT_IV] = \
+                blobxfer.util.base64_encode_as_string(
+                    self.content_encryption_iv)
         if md5digest is not None:
             encjson[EncryptionMetadata._JSON_KEY_BLOBXFER_EXTENSIONS] = {
                 EncryptionMetadata._JSON_KEY_PREENCRYPTED_MD5: md5digest
@@ -385,14 +514,89 @@ class EncryptionMetadata(object):
             authjson, sort_keys=True)
         return encjson
 
-    def initialize_hmac(self):
-        # type: (EncryptionMetadata) -> hmac.HMAC
+    def convert_to_resume_json(self):
+        # type: (EncryptionMetadata) -> str
+        """Serialize the RSA wrapped keys and parameters of a new upload for
+        the resume database so an interrupted upload can be continued with
+        the same keys
+        :param EncryptionMetadata self: this
+        :rtype: str
+        :return: json string
+        """
+        wck = self._wrap_keys()
+        state = {
+            EncryptionMetadata._JSON_KEY_ENCRYPTION_MODE:
+            self.encryption_mode,
+            EncryptionMetadata._JSON_KEY_ENCRYPTED_KEY: wck.encrypted_key,
+            EncryptionMetadata._JSON_KEY_ENCRYPTED_AUTHKEY:
+            wck.encrypted_authentication_key,
+        }
+        if self.is_chunked:
+            state[EncryptionMetadata._JSON_KEY_DATA_LENGTH] = \
+                self.encrypted_region_info.data_length
+        else:
+            state[EncryptionMetadata._JSON_KEY_CONTENT_IV] = \
+                blobxfer.util.base64_encode_as_string(
+                    self.content_encryption_iv)
+        return json.dumps(state, sort_keys=True)
+
+    def convert_from_resume_json(self, resume_json, rsaprivatekey):
+        # type: (EncryptionMetadata, str,
+        #        cryptography.hazmat.primitives.asymmetric.rsa.RSAPrivateKey)
+        #        -> None
+        """Restore the keys and parameters of an upload from the resume
+        database. The encryption mode must match.
+        :param EncryptionMetadata self: this
+        :param str resume_json: json string
+        :param rsaprivatekey: RSA private key
+        :type rsaprivatekey:
+            cryptography.hazmat.primitives.asymmetric.rsa.RSAPrivateKey
+        """
+        state = json.loads(resume_json)
+        mode = state[EncryptionMetadata._JSON_KEY_ENCRYPTION_MODE]
+        if mode != self.encryption_mode:
+            raise ValueError('encryption mode mismatch {} -> {}'.format(
+                mode, self.encryption_mode))
+        if rsaprivatekey is None:
+            raise ValueError(
+                'RSA private key is required to restore encryption keys')
+        enc_content_key = state[EncryptionMetadata._JSON_KEY_ENCRYPTED_KEY]
+        enc_sign_key = state[EncryptionMetadata._JSON_KEY_ENCRYPTED_AUTHKEY]
+        symkey = blobxfer.operations.crypto.rsa_decrypt_base64_encoded_key(
+            rsaprivatekey, enc_content_key)
+        signkey = blobxfer.operations.crypto.rsa_decrypt_base64_encoded_key(
+            rsaprivatekey, enc_sign_key)
+        if self.is_chunked:
+            region_size = state[EncryptionMetadata._JSON_KEY_DATA_LENGTH]
+            if region_size <= 0:
+                raise ValueError(
+                    'invalid encrypted region size {}'.format(region_size))
+            self.encrypted_region_size = region_size
+        else:
+            iv = base64.b64decode(
+                state[EncryptionMetadata._JSON_KEY_CONTENT_IV])
+            if len(iv) != AES256_BLOCKSIZE_BYTES:
+                raise ValueError('invalid content encryption iv')
+            self.content_encryption_iv = iv
+        self._symkey = symkey
+        self._signkey = signkey
+        self.wrapped_content_key = EncryptionWrappedContentKey(
+            algorithm=EncryptionMetadata._ENCRYPTED_KEY_SCHEME,
+            encrypted_authentication_key=enc_sign_key,
+            encrypted_key=enc_content_key,
+            key_id='private:pem',
+        )
+
+    def initialize_hmac(self, state=None):
+        # type: (EncryptionMetadata, bytes) -> hmac.HMAC
         """Initialize an hmac from a signing key if it exists
         :param EncryptionMetadata self: this
+        :param bytes state: exported hmac state to continue from
         :rtype: hmac.HMAC or None
         :return: hmac
         """
         if self._signkey is not None:
-            return hmac.new(self._signkey, digestmod=hashlib.sha256)
+            return blobxfer.util.new_resumable_hmac_sha256_hasher(
+                self._signkey, state=state)
         else:
             return None
@@ -32,6 +32,7 @@ import tempfile
 import threading
 import time
 # non-stdlib imports
+import bitstring
 # local imports
 import blobxfer.models.azure
 import blobxfer.models.crypto
@@ -42,6 +43,8 @@ import blobxfer.util
 logger = logging.getLogger(__name__)
 # global defines
 _AUTO_SELECT_CHUNKSIZE_BYTES = 8388608
+_MAX_ADAPTIVE_CHUNKSIZE_BYTES = 67108864
+_MAX_REORDER_BUFFER_BYTES = 33554432
 # named tuples
 Offsets = collections.namedtuple(
     'Offsets', [
@@ -55,6 +58,7 @@ Offsets = collections.namedtuple(
 )
 UncheckedChunk = collections.namedtuple(
     'UncheckedChunk', [
+        'data',
         'data_len',
         'fd_start',
         'file_path',
@@ -184,13 +188,19 @@ class Descriptor(object):
     """Download Descriptor"""
 
     _AES_BLOCKSIZE = blobxfer.models.crypto.AES256_BLOCKSIZE_BYTES
+    _AES_GCM_REGION_OVERHEAD = \
+        blobxfer.models.crypto.AES256_GCM_REGION_OVERHEAD_BYTES
 
-    def __init__(self, lpath, ase, options, general_options, resume_mgr):
+    def __init__(
+            self, lpath, ase, options, general_options, resume_mgr,
+            writer=None, auto_chunk_size=None, memory_budget=None):
         # type: (Descriptor, pathlib.Path,
         #        blobxfer.models.azure.StorageEntity,
         #        blobxfer.models.options.Download,
         #        blobxfer.models.options.General,
-        #        blobxfer.operations.resume.DownloadResumeManager) -> None
+        #        blobxfer.operations.resume.DownloadResumeManager,
+        #        blobxfer.models.filehandle.FileWriterPool, int,
+        #        blobxfer.models.workqueue.MemoryBudget) -> None
         """Ctor for Descriptor
         :param Descriptor self: this
         :param pathlib.Path lpath: local path
@@ -199,31 +209,50 @@ class Descriptor(object):
         :param blobxfer.models.options.General general_options: general options
         :param blobxfer.operations.resume.DownloadResumeManager resume_mgr:
             download resume manager
+        :param blobxfer.models.filehandle.FileWriterPool writer:
+            file writer pool
+        :param int auto_chunk_size: chunk size to use if auto-selected
+        :param blobxfer.models.workqueue.MemoryBudget memory_budget:
+            memory budget to charge the reorder buffer against
         """
         self._verbose = general_options.verbose
         self._offset = 0
         self._chunk_num = 0
         self._next_integrity_chunk = 0
         self._unchecked_chunks = {}
+        self._buffered_bytes = 0
+        self._memory_budget = memory_budget
         self._allocated = False
         self._finalized = False
+        self._finalize_claimed = False
         self._meta_lock = threading.Lock()
         self._hasher_lock = threading.Lock()
         self._resume_mgr = resume_mgr
+        self._writer = writer
         self._restore_file_properties = options.restore_file_properties
         self._ase = ase
         # set path
         self.final_path = lpath
         self.view = None
         # auto-select chunk size
-        if options.chunk_size_bytes == 0:
-            chunk_size_bytes = _AUTO_SELECT_CHUNKSIZE_BYTES
+        if options.chunk_size_bytes == 0 and auto_chunk_size is not None:
+            chunk_size_bytes = auto_chunk_size
         else:
-            chunk_size_bytes = options.chunk_size_bytes
+            chunk_size_bytes = Descriptor.max_chunk_size(options)
+        # chunks of regions encrypted independently must contain whole
+        # regions
+        if self.is_encrypted_in_regions:
+            stride = self.encrypted_region_stride
+            chunk_size_bytes = max((chunk_size_bytes // stride, 1)) * stride
         self._chunk_size = min((chunk_size_bytes, self._ase.size))
         # calculate the total number of ops required for transfer
         self._total_chunks = self._compute_total_chunks(self._chunk_size)
         self._outstanding_ops = self._total_chunks
+        # chunks written to disk, tracked for resume
+        self._completed_chunks = None
+        if self._resume_mgr:
+            self._completed_chunks = bitstring.BitArray(
+                length=self._total_chunks)
         # initialize integrity checkers
         self.hmac = None
         self.md5 = None
@@ -262,6 +291,45 @@ class Descriptor(object):
             return (self._outstanding_ops == 0 and
                     len(self._unchecked_chunks) == 0)
 
+    def claim_finalization(self):
+        # type: (Descriptor) -> bool
+        """Claim finalization of the descriptor once all operations are
+        completed. Only the first caller may finalize.
+        :param Descriptor self: this
+        :rtype: bool
+        :return: if caller should finalize
+        """
+        with self._meta_lock:
+            if (self._finalize_claimed or self._outstanding_ops != 0 or
+                    len(self._unchecked_chunks) != 0):
+                return False
+            self._finalize_claimed = True
+            return True
+
+    @property
+    def is_encrypted_in_regions(self):
+        # type: (Descriptor) -> bool
+        """Entity is encrypted in independent regions
+        :param Descriptor self: this
+        :rtype: bool
+        :return: if entity is encrypted in regions
+        """
+        return (self._ase.is_encrypted and
+                self._ase.encryption_metadata.is_chunked)
+
+    @property
+    def encrypted_region_stride(self):
+        # type: (Descriptor) -> int
+        """Size of an encrypted region in the remote entity
+        :param Descriptor self: this
+        :rtype: int
+        :return: encrypted region size
+        """
+        return (
+            self._ase.encryption_metadata.encrypted_region_size +
+            Descriptor._AES_GCM_REGION_OVERHEAD
+        )
+
     @property
     def is_resumable(self):
         # type: (Descriptor) -> bool
@@ -270,7 +338,8 @@ class Descriptor(object):
         :rtype: bool
         :return: if resumable
         """
-        return self._resume_mgr is not None and self.hmac is None
+        return self._resume_mgr is not None and (
+            self.hmac is None or blobxfer.util.is_resumable_hasher(self.hmac))
 
     def _compute_total_chunks(self, chunk_size):
         # type: (Descriptor, int) -> int
@@ -301,20 +370,41 @@ class Descriptor(object):
             self.hmac = self._ase.encryption_metadata.initialize_hmac()
         if (self.hmac is None and options.check_file_md5 and
                 blobxfer.util.is_not_empty(self._ase.md5)):
-            self.md5 = blobxfer.util.new_md5_hasher()
+            self.md5 = blobxfer.util.new_resumable_md5_hasher()
+
+    @staticmethod
+    def max_chunk_size(options):
+        # type: (blobxfer.models.options.Download) -> int
+        """Maximum chunk size requested by download options
+        :param blobxfer.models.options.Download options: download options
+        :rtype: int
+        :return: maximum chunk size in bytes
+        """
+        if options.chunk_size_bytes == 0:
+            return _AUTO_SELECT_CHUNKSIZE_BYTES
+        return options.chunk_size_bytes
 
     @staticmethod
-    def compute_allocated_size(size, is_encrypted):
-        # type: (int, bool) -> int
+    def compute_allocated_size(size, is_encrypted, region_size=None):
+        # type: (int, bool, int) -> int
         """Compute allocated size on disk
         :param int size: size (content length)
         :param bool is_ecrypted: if entity is encrypted
+        :param int region_size: plaintext size of encrypted regions
         :rtype: int
         :return: required size on disk
         """
         # compute size
         if size > 0:
-            if is_encrypted:
+            if is_encrypted and region_size is not None:
+                # each region carries a nonce and tag
+                overhead = blobxfer.models.download.Descriptor.\
+                    _AES_GCM_REGION_OVERHEAD
+                regions = int(math.ceil(size / (region_size + overhead)))
+                allocatesize = size - regions * overhead
+                if allocatesize < 0:
+                    raise RuntimeError('allocatesize is negative')
+            elif is_encrypted:
                 # cipher_len_without_iv = (clear_len / aes_bs + 1) * aes_bs
                 allocatesize = (
                     size //
@@ -337,8 +427,12 @@ class Descriptor(object):
         :rtype: tuple
         :return: (local path view, allocation size)
         """
+        if ase.is_encrypted and ase.encryption_metadata.is_chunked:
+            region_size = ase.encryption_metadata.encrypted_region_size
+        else:
+            region_size = None
         slicesize = blobxfer.models.download.Descriptor.compute_allocated_size(
-            ase.size, ase.is_encrypted)
+            ase.size, ase.is_encrypted, region_size=region_size)
         if ase.vectored_io is None:
             view = LocalPathView(
                 fd_start=0,
@@ -414,6 +508,92 @@ class Descriptor(object):
                             fd.write(b'\0')
             self._allocated = True
 
+    def _local_file_stamp(self):
+        # type: (Descriptor) -> tuple
+        """Size and modification time of the local file used to verify
+        that a recorded md5 hasher state is still valid on resume
+        :param Descriptor self: this
+        :rtype: tuple
+        :return: (size, mtime in nanoseconds) or (None, None)
+        """
+        try:
+            st = self.final_path.stat()
+        except OSError:
+            return None, None
+        return st.st_size, st.st_mtime_ns
+
+    def _restore_md5_state(self, rr):
+        # type: (Descriptor, blobxfer.models.resume.Download) -> bool
+        """Restore the md5 hasher from the state in the resume record
+        if the local file is unchanged since the record was last updated
+        :param Descriptor self: this
+        :param blobxfer.models.resume.Download rr: resume record
+        :rtype: bool
+        :return: if md5 hasher state was restored
+        """
+        if (rr.md5_state is None or
+                not blobxfer.util.resumable_hasher_supported()):
+            return False
+        file_size, file_mtime_ns = self._local_file_stamp()
+        if (file_size is None or rr.file_size != file_size or
+                rr.file_mtime_ns != file_mtime_ns):
+            logger.debug(
+                'local file {} changed since md5 state was recorded'.format(
+                    self.final_path))
+            return False
+        try:
+            md5 = blobxfer.util.new_resumable_md5_hasher(rr.md5_state)
+        except ValueError as e:
+            logger.warning('invalid md5 state for {}: {}'.format(
+                self.final_path, e))
+            return False
+        if md5.hexdigest() != rr.md5hexdigest:
+            logger.warning(
+                'md5 state does not match resume md5 for {}'.format(
+                    self.final_path))
+            return False
+        with self._hasher_lock:
+            self.md5 = md5
+        return True
+
+    def _restore_hmac_state(self, rr):
+        # type: (Descriptor, blobxfer.models.resume.Download) -> bool
+        """Restore the hmac hasher from the state in the resume record
+        if the local file is unchanged since the record was last updated
+        :param Descriptor self: this
+        :param blobxfer.models.resume.Download rr: resume record
+        :rtype: bool
+        :return: if hmac hasher state was restored
+        """
+        if (rr.hmac_state is None or
+                not blobxfer.util.is_resumable_hasher(self.hmac)):
+            logger.debug('no hmac state to resume {}'.format(
+                self.final_path))
+            return False
+        if (self.is_encrypted_in_regions and
+                rr.chunk_size % self.encrypted_region_stride != 0):
+            logger.warning(
+                'resume chunk size {} is not region aligned for {}'.format(
+                    rr.chunk_size, self.final_path))
+            return False
+        file_size, file_mtime_ns = self._local_file_stamp()
+        if (file_size is None or rr.file_size != file_size or
+                rr.file_mtime_ns != file_mtime_ns):
+            logger.warning(
+                'local file {} changed since hmac state was recorded'.format(
+                    self.final_path))
+            return False
+        try:
+            hmac = self._ase.encryption_metadata.initialize_hmac(
+                rr.hmac_state)
+        except (RuntimeError, ValueError) as e:
+            logger.warning('invalid hmac state for {}: {}'.format(
+                self.final_path, e))
+            return False
+        with self._hasher_lock:
+            self.hmac = hmac
+        return True
+
     def _resume(self):
         # type: (Descriptor) -> int
         """Resume a download, if possible
@@ -433,8 +613,10 @@ class Descriptor(object):
             logger.warning('resume length mismatch {} -> {}'.format(
                 rr.length, self._ase.size))
             return None
-        # calculate current chunk and offset
-        if rr.next_integrity_chunk == 0:
+        # calculate current chunk and offset, chunks completed out of
+        # order are resumable even if the first chunk is not completed
+        if (rr.next_integrity_chunk == 0 and
+                (not rr.completed_chunks or self._ase.is_encrypted)):
             logger.debug('nothing to resume for {}'.format(self.final_path))
             return None
         curr_chunk = rr.next_integrity_chunk
@@ -451,24 +633,24 @@ class Descriptor(object):
                 self._outstanding_ops = 0
                 self._finalized = True
             return self._ase.size
-        # encrypted files are not resumable due to hmac requirement
-        if self._ase.is_encrypted:
-            logger.debug('cannot resume encrypted entity {}'.format(
-                self._ase.path))
-            return None
         self._allocate_disk_space()
         # check if final path exists
         if not self.final_path.exists():  # noqa
             logger.warning('download path {} does not exist'.format(
                 self.final_path))
             return None
-        if self.hmac is not None:
-            raise RuntimeError(
-                'unexpected hmac object for entity {}'.format(self._ase.path))
+        # encrypted entities continue from the recorded hmac state
+        if self._ase.is_encrypted and not self._restore_hmac_state(rr):
+            return None
         # re-hash from 0 to offset if needed
         _fd_offset = 0
         _end_offset = min((curr_chunk * rr.chunk_size, rr.length))
-        if self.md5 is not None and curr_chunk > 0:
+        if (self.md5 is not None and curr_chunk > 0 and
+                self._restore_md5_state(rr)):
+            logger.debug(
+                'restored md5 state for {} at offset {}'.format(
+                    self.final_path, _end_offset))
+        elif self.md5 is not None and curr_chunk > 0:
             _blocksize = blobxfer.util.MEGABYTE << 2
             logger.debug(
                 'integrity checking existing file {} offset {} -> {}'.format(
@@ -493,7 +675,7 @@ class Descriptor(object):
                     'MD5 mismatch resume={} computed={} for {}'.format(
                         rr.md5hexdigest, hexdigest, self.final_path))
                 # reset hasher
-                self.md5 = blobxfer.util.new_md5_hasher()
+                self.md5 = blobxfer.util.new_resumable_md5_hasher()
                 return None
         # set values from resume
         with self._meta_lock:
@@ -505,14 +687,61 @@ class Descriptor(object):
             self._outstanding_ops = (
                 self._total_chunks - self._next_integrity_chunk
             )
+            self._completed_chunks = bitstring.BitArray(
+                length=self._total_chunks)
+            self._completed_chunks.set(True, range(0, curr_chunk))
+            resume_bytes = _end_offset
+            # chunks completed out of order are not retained in encrypted
+            # form for the hmac and must be downloaded again
+            if not self._ase.is_encrypted:
+                resume_bytes += self._resume_completed_chunks(rr, curr_chunk)
             logger.debug(
                 ('resuming file {} from byte={} chunk={} chunk_size={} '
                  'total_chunks={} next_integrity_chunk={} '
-                 'outstanding_ops={}').format(
+                 'outstanding_ops={} chunks_completed_out_of_order={}').format(
                      self.final_path, self._offset, self._chunk_num,
                      self._chunk_size, self._total_chunks,
-                     self._next_integrity_chunk, self._outstanding_ops))
-        return _end_offset
+                     self._next_integrity_chunk, self._outstanding_ops,
+                     len(self._unchecked_chunks)))
+        # integrity check chunks following the verified range which were
+        # completed prior to resume
+        self.perform_chunked_integrity_check()
+        return resume_bytes
+
+    def _resume_completed_chunks(self, rr, curr_chunk):
+        # type: (Descriptor, blobxfer.models.resume.Download, int) -> int
+        """Restore chunks completed out of order after the next integrity
+        chunk. These chunks are not downloaded again and are only read back
+        from disk when integrity checked. Must be called with the meta lock
+        held.
+        :param Descriptor self: this
+        :param blobxfer.models.resume.Download rr: resume record
+        :param int curr_chunk: next integrity chunk
+        :rtype: int
+        :return: number of bytes completed
+        """
+        if rr.completed_chunks is None or self._total_chunks == 0:
+            return 0
+        completed = bitstring.BitArray(length=self._total_chunks)
+        completed.int = rr.completed_chunks
+        total = 0
+        for chunk_num in completed.findall('0b1', start=curr_chunk):
+            chunk_start = chunk_num * self._chunk_size
+            chunk_len = min(
+                (self._chunk_size, self._ase.size - chunk_start))
+            self._completed_chunks.set(True, chunk_num)
+            self._unchecked_chunks[chunk_num] = {
+                'ucc': UncheckedChunk(
+                    data=None,
+                    data_len=chunk_len,
+                    fd_start=self.view.fd_start + chunk_start,
+                    file_path=self.final_path,
+                    temp=False,
+                ),
+                'decrypted': True,
+            }
+            total += chunk_len
+        return total
 
     def cleanup_all_temporary_files(self):
         # type: (Descriptor) -> None
@@ -545,6 +774,12 @@ class Descriptor(object):
         if resume_bytes is None and not self._allocated:
             self._allocate_disk_space()
         with self._meta_lock:
+            # skip chunks completed prior to resume
+            while (self._offset < self._ase.size and
+                   self._completed_chunks is not None and
+                   self._completed_chunks[self._chunk_num]):
+                self._offset += self._chunk_size
+                self._chunk_num += 1
             if self._offset >= self._ase.size:
                 return None, resume_bytes
             if self._offset + self._chunk_size > self._ase.size:
@@ -559,7 +794,13 @@ class Descriptor(object):
             chunk_num = self._chunk_num
             fd_start = self._offset
             range_start = self._offset
-            if self._ase.is_encrypted:
+            if self.is_encrypted_in_regions:
+                # chunks start on a region boundary
+                fd_start = (
+                    self._offset // self.encrypted_region_stride *
+                    self._ase.encryption_metadata.encrypted_region_size
+                )
+            elif self._ase.is_encrypted:
                 # ensure start is AES block size aligned
                 range_start = range_start - \
                     (range_start % self._AES_BLOCKSIZE) - \
@@ -569,7 +810,9 @@ class Descriptor(object):
             range_end = self._offset + num_bytes
             self._offset += chunk
             self._chunk_num += 1
-            if self._ase.is_encrypted and self._offset >= self._ase.size:
+            if (self._ase.is_encrypted and
+                    not self.is_encrypted_in_regions and
+                    self._offset >= self._ase.size):
                 unpad = True
             else:
                 unpad = False
@@ -591,49 +834,116 @@ class Descriptor(object):
         with self._hasher_lock:
             self.hmac.update(iv)
 
+    def _reserve_reorder_buffer(self, chunk_num, length):
+        # type: (Descriptor, int, int) -> bool
+        """Reserve space in the reorder buffer to retain chunk data in
+        memory for integrity checking. The next chunk to be checked is
+        always retained as it is hashed immediately. Retained data is
+        charged against the memory budget if limited, otherwise the
+        buffer is bounded per descriptor. Must be called with the meta
+        lock held.
+        :param Descriptor self: this
+        :param int chunk_num: chunk number
+        :param int length: data length
+        :rtype: bool
+        :return: if chunk data should be retained in memory
+        """
+        if self.hmac is None and self.md5 is None:
+            return False
+        force = chunk_num == self._next_integrity_chunk
+        if self._memory_budget is not None and self._memory_budget.limited:
+            if not self._memory_budget.try_acquire(length, force=force):
+                return False
+        elif (not force and
+                self._buffered_bytes + length > _MAX_REORDER_BUFFER_BYTES):
+            return False
+        self._buffered_bytes += length
+        return True
+
+    def _release_reorder_buffer(self, length):
+        # type: (Descriptor, int) -> None
+        """Release space in the reorder buffer
+        :param Descriptor self: this
+        :param int length: data length
+        """
+        with self._meta_lock:
+            self._buffered_bytes -= length
+        if self._memory_budget is not None and self._memory_budget.limited:
+            self._memory_budget.release(length)
+
     def write_unchecked_data(self, offsets, data):
         # type: (Descriptor, Offsets, bytes) -> None
-        """Write unchecked data to disk
+        """Write unchecked data to disk. Data is retained in memory for
+        integrity checking if the reorder buffer has space, otherwise it
+        is read back from disk when checked.
         :param Descriptor self: this
         :param Offsets offsets: download offsets
         :param bytes data: data
         """
         self.write_data(offsets, data)
-        unchecked = UncheckedChunk(
-            data_len=len(data),
-            fd_start=self.view.fd_start + offsets.fd_start,
-            file_path=self.final_path,
-            temp=False,
-        )
         with self._meta_lock:
+            retain = self._reserve_reorder_buffer(
+                offsets.chunk_num, len(data))
+            unchecked = UncheckedChunk(
+                data=data if retain else None,
+                data_len=len(data),
+                fd_start=self.view.fd_start + offsets.fd_start,
+                file_path=self.final_path,
+                temp=False,
+            )
             self._unchecked_chunks[offsets.chunk_num] = {
                 'ucc': unchecked,
                 'decrypted': True,
             }
+            # record chunk as completed so it is not downloaded again on
+            # resume even if integrity checking has not reached it
+            if self.is_resumable:
+                self._completed_chunks.set(True, offsets.chunk_num)
+                if (self.md5 is not None and
+                        blobxfer.util.resumable_hasher_supported()):
+                    file_size, file_mtime_ns = self._local_file_stamp()
+                else:
+                    file_size = file_mtime_ns = None
+                self._resume_mgr.add_or_update_record(
+                    self.final_path, self._ase, self._chunk_size,
+                    self._next_integrity_chunk, False, None,
+                    completed_chunks=self._completed_chunks.int,
+                    file_size=file_size, file_mtime_ns=file_mtime_ns,
+                )
 
-    def write_unchecked_hmac_data(self, offsets, data):
-        # type: (Descriptor, Offsets, bytes) -> None
-        """Write unchecked encrypted data to disk
+    def write_unchecked_hmac_data(self, offsets, data, persist=True):
+        # type: (Descriptor, Offsets, bytes, bool) -> str
+        """Write unchecked encrypted data to disk. Data is retained in
+        memory for integrity checking if the reorder buffer has space.
         :param Descriptor self: this
         :param Offsets offsets: download offsets
         :param bytes data: hmac/encrypted data
+        :param bool persist: always write data to a temporary file
+        :rtype: str
+        :return: temporary file path or None if not persisted
         """
+        with self._meta_lock:
+            retain = self._reserve_reorder_buffer(
+                offsets.chunk_num, len(data))
         fname = None
-        with tempfile.NamedTemporaryFile(mode='wb', delete=False) as fd:
-            fname = fd.name
-            fd.write(data)
+        if persist or not retain:
+            with tempfile.NamedTemporaryFile(
+                    mode='wb', delete=False) as fd:
+                fname = fd.name
+                fd.write(data)
         unchecked = UncheckedChunk(
+            data=data if retain else None,
             data_len=len(data),
             fd_start=0,
-            file_path=pathlib.Path(fname),
-            temp=True,
+            file_path=pathlib.Path(fname) if fname is not None else None,
+            temp=fname is not None,
         )
         with self._meta_lock:
             self._unchecked_chunks[offsets.chunk_num] = {
                 'ucc': unchecked,
                 'decrypted': False,
             }
-        return str(unchecked.file_path)
+        return fname
 
     def mark_unchecked_chunk_decrypted(self, chunk_num):
         # type: (Descriptor, int) -> None
@@ -643,6 +953,16 @@ class Descriptor(object):
         """
         with self._meta_lock:
             self._unchecked_chunks[chunk_num]['decrypted'] = True
+            # decrypted data has been written, record the file stamp so
+            # the hmac state remains valid on resume
+            if self.is_resumable and self.hmac is not None:
+                file_size, file_mtime_ns = self._local_file_stamp()
+                self._resume_mgr.add_or_update_record(
+                    self.final_path, self._ase, self._chunk_size,
+                    self._next_integrity_chunk, False, None,
+                    completed_chunks=self._completed_chunks.int,
+                    file_size=file_size, file_mtime_ns=file_mtime_ns,
+                )
 
     def perform_chunked_integrity_check(self):
         # type: (Descriptor) -> None
@@ -663,24 +983,43 @@ class Descriptor(object):
                     break
             # hash data and set next integrity chunk
             md5hexdigest = None
+            md5state = None
+            hmacstate = None
             if hasher is not None:
-                with ucc.file_path.open('rb') as fd:
-                    if not ucc.temp:
-                        fd.seek(ucc.fd_start, 0)
-                    chunk = fd.read(ucc.data_len)
+                if ucc.data is not None:
+                    chunk = ucc.data
+                else:
+                    with ucc.file_path.open('rb') as fd:
+                        if not ucc.temp:
+                            fd.seek(ucc.fd_start, 0)
+                        chunk = fd.read(ucc.data_len)
                 if ucc.temp:
                     ucc.file_path.unlink()
                 with self._hasher_lock:
                     hasher.update(chunk)
                     if hasher == self.md5:
                         md5hexdigest = hasher.hexdigest()
+                        md5state = blobxfer.util.export_hasher_state(
+                            hasher)
+                    else:
+                        hmacstate = blobxfer.util.export_hasher_state(
+                            hasher)
+                if ucc.data is not None:
+                    self._release_reorder_buffer(ucc.data_len)
             with self._meta_lock:
                 # update integrity counter and resume db
                 self._next_integrity_chunk += 1
                 if self.is_resumable:
+                    if md5state is not None or hmacstate is not None:
+                        file_size, file_mtime_ns = self._local_file_stamp()
+                    else:
+                        file_size = file_mtime_ns = None
                     self._resume_mgr.add_or_update_record(
                         self.final_path, self._ase, self._chunk_size,
                         self._next_integrity_chunk, False, md5hexdigest,
+                        completed_chunks=self._completed_chunks.int,
+                        md5_state=md5state, file_size=file_size,
+                        file_mtime_ns=file_mtime_ns, hmac_state=hmacstate,
                     )
                 # decrement outstanding op counter
                 self._outstanding_ops -= 1
@@ -708,9 +1047,12 @@ class Descriptor(object):
         if len(data) > 0:
             # offset from internal view
             pos = self.view.fd_start + offsets.fd_start
-            with self.final_path.open('r+b') as fd:
-                fd.seek(pos, 0)
-                fd.write(data)
+            if self._writer is not None:
+                self._writer.pwrite(self.final_path, pos, data)
+            else:
+                with self.final_path.open('r+b') as fd:
+                    fd.seek(pos, 0)
+                    fd.write(data)
 
     def finalize_integrity(self):
         # type: (Descriptor) -> None
@@ -797,6 +1139,10 @@ class Descriptor(object):
         """Finalize file for download
         :param Descriptor self: this
         """
+        # sync and release pooled file descriptor
+        if self._writer is not None:
+            self._writer.finalize(
+                self.final_path, sync=not self._integrity_failed)
         # delete bad file if integrity failed
         if self._integrity_failed:
             self.final_path.unlink()
@@ -0,0 +1,493 @@
+# Copyright (c) Microsoft Corporation
+#
+# All rights reserved.
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+# stdlib imports
+import collections
+import contextlib
+import enum
+import logging
+import os
+import threading
+# non-stdlib imports
+# local imports
+
+# create logger
+logger = logging.getLogger(__name__)
+# global defines
+_DEFAULT_MAX_HANDLES = 256
+_HAS_PREAD = hasattr(os, 'pread')
+_HAS_PREADV = hasattr(os, 'preadv')
+_HAS_FADVISE = hasattr(os, 'posix_fadvise')
+_FADV_SEQUENTIAL = getattr(os, 'POSIX_FADV_SEQUENTIAL', None)
+_FADV_WILLNEED = getattr(os, 'POSIX_FADV_WILLNEED', None)
+_HAS_PWRITE = hasattr(os, 'pwrite')
+_HAS_PWRITEV = hasattr(os, 'pwritev')
+_DEFAULT_SYNC_INTERVAL_BYTES = 67108864
+try:
+    _IOV_MAX = os.sysconf('SC_IOV_MAX')
+except (AttributeError, OSError, ValueError):  # noqa
+    _IOV_MAX = -1
+if _IOV_MAX <= 0:  # noqa
+    _IOV_MAX = 1024
+
+
+class WriteDurability(enum.Enum):
+    NoSync = 'none'
+    Finalize = 'finalize'
+    Periodic = 'periodic'
+
+    def __str__(self):
+        return self.value
+
+
+class _FileHandle(object):
+    """Cached file handle"""
+    __slots__ = ['fd', 'refcount', 'evicted']
+
+    def __init__(self, fd):
+        # type: (_FileHandle, int) -> None
+        """Ctor for _FileHandle
+        :param _FileHandle self: this
+        :param int fd: file descriptor
+        """
+        self.fd = fd
+        self.refcount = 0
+        self.evicted = False
+
+
+class _WriteRequest(object):
+    """Pending positional write"""
+    __slots__ = ['offset', 'data', 'done', 'exc']
+
+    def __init__(self, offset, data):
+        # type: (_WriteRequest, int, bytes) -> None
+        """Ctor for _WriteRequest
+        :param _WriteRequest self: this
+        :param int offset: offset
+        :param bytes data: data
+        """
+        self.offset = offset
+        self.data = data
+        self.done = False
+        self.exc = None
+
+
+class _WriteHandle(_FileHandle):
+    """Cached file handle with pending write batch"""
+    __slots__ = ['cond', 'pending', 'writing', 'unsynced']
+
+    def __init__(self, fd):
+        # type: (_WriteHandle, int) -> None
+        """Ctor for _WriteHandle
+        :param _WriteHandle self: this
+        :param int fd: file descriptor
+        """
+        super().__init__(fd)
+        self.cond = threading.Condition()
+        self.pending = []
+        self.writing = False
+        self.unsynced = 0
+
+
+def _datasync(fd):
+    # type: (int) -> None
+    """Flush file data to stable storage
+    :param int fd: file descriptor
+    """
+    if hasattr(os, 'fdatasync'):
+        os.fdatasync(fd)
+    else:
+        os.fsync(fd)
+
+
+def _pwrite_all(fd, buffers, offset):
+    # type: (int, list, int) -> None
+    """Write buffers contiguously at an offset, retrying partial writes
+    :param int fd: file descriptor
+    :param list buffers: list of bytes-like objects
+    :param int offset: offset
+    """
+    i = 0
+    while i < len(buffers):
+        if _HAS_PWRITEV and len(buffers) - i > 1:
+            written = os.pwritev(fd, buffers[i:i + _IOV_MAX], offset)
+        else:
+            written = os.pwrite(fd, buffers[i], offset)
+        offset += written
+        # skip fully written buffers and trim a partially written one
+        while i < len(buffers) and written >= len(buffers[i]):
+            written -= len(buffers[i])
+            i += 1
+        if written > 0:
+            buffers[i] = memoryview(buffers[i])[written:]
+
+
+def pwrite(path, offset, data):
+    # type: (pathlib.Path, int, bytes) -> None
+    """Write data at an offset of an existing file without caching
+    the file descriptor
+    :param pathlib.Path path: path
+    :param int offset: offset to write to
+    :param bytes data: data
+    """
+    if len(data) == 0:
+        return
+    path = str(path)
+    if not _HAS_PWRITE:
+        with open(path, 'r+b') as fd:
+            fd.seek(offset, 0)
+            fd.write(data)
+        return
+    fd = os.open(path, os.O_WRONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        _pwrite_all(fd, [data], offset)
+    finally:
+        os.close(fd)
+
+
+class FileHandleCache(object):
+    """LRU-bounded cache of file descriptors for positional I/O"""
+    def __init__(self, max_handles=_DEFAULT_MAX_HANDLES):
+        # type: (FileHandleCache, int) -> None
+        """Ctor for FileHandleCache
+        :param FileHandleCache self: this
+        :param int max_handles: maximum number of idle handles to keep open
+        """
+        if max_handles < 1:
+            raise ValueError(
+                'max handles is invalid: {}'.format(max_handles))
+        self._lock = threading.Lock()
+        self._handles = collections.OrderedDict()
+        self._handle_type = _FileHandle
+        self._max_handles = max_handles
+
+    @property
+    def num_open(self):
+        # type: (FileHandleCache) -> int
+        """Number of cached handles
+        :param FileHandleCache self: this
+        :rtype: int
+        :return: number of cached handles
+        """
+        with self._lock:
+            return len(self._handles)
+
+    @staticmethod
+    def _advise(fd, offset, length, advice):
+        # type: (int, int, int, int) -> None
+        """Issue posix_fadvise hint, if supported
+        :param int fd: file descriptor
+        :param int offset: offset
+        :param int length: length
+        :param int advice: advice
+        """
+        if not _HAS_FADVISE or length <= 0:
+            return
+        try:
+            os.posix_fadvise(fd, offset, length, advice)
+        except OSError as e:
+            logger.debug('posix_fadvise failed: {}'.format(e))
+
+    def _evict(self):
+        # type: (FileHandleCache) -> None
+        """Evict least recently used handles over the limit. Must be called
+        with the lock held.
+        :param FileHandleCache self: this
+        """
+        while len(self._handles) > self._max_handles:
+            _, handle = self._handles.popitem(last=False)
+            handle.evicted = True
+            if handle.refcount == 0:
+                os.close(handle.fd)
+
+    def _open(self, path, view):
+        # type: (FileHandleCache, str, object) -> int
+        """Open a file descriptor for reading
+        :param FileHandleCache self: this
+        :param str path: path
+        :param object view: local path view with fd_start and fd_end
+        :rtype: int
+        :return: file descriptor
+        """
+        fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        if view is not None:
+            FileHandleCache._advise(
+                fd, view.fd_start, view.fd_end - view.fd_start,
+                _FADV_SEQUENTIAL)
+        return fd
+
+    @contextlib.contextmanager
+    def _acquire(self, path, view):
+        # type: (FileHandleCache, str, object) -> _FileHandle
+        """Acquire a cached file handle for a path
+        :param FileHandleCache self: this
+        :param str path: path
+        :param object view: local path view with fd_start and fd_end
+        :rtype: _FileHandle
+        :return: file handle
+        """
+        with self._lock:
+            handle = self._handles.get(path)
+            if handle is not None:
+                self._handles.move_to_end(path)
+                handle.refcount += 1
+        if handle is None:
+            fd = self._open(path, view)
+            with self._lock:
+                handle = self._handles.get(path)
+                if handle is None:
+                    handle = self._handle_type(fd)
+                    self._handles[path] = handle
+                    fd = None
+                handle.refcount += 1
+                self._evict()
+            # another thread opened the same path concurrently
+            if fd is not None:
+                os.close(fd)
+        try:
+            yield handle
+        finally:
+            with self._lock:
+                handle.refcount -= 1
+                if handle.evicted and handle.refcount == 0:
+                    os.close(handle.fd)
+
+    def pread(self, path, offset, length, view=None):
+        # type: (FileHandleCache, pathlib.Path, int, int, object) -> bytes
+        """Read data at an offset without modifying a file position.
+        If view is specified, the view range is hinted as sequential on
+        open and the range following the read is hinted as needed soon.
+        :param FileHandleCache self: this
+        :param pathlib.Path path: path
+        :param int offset: offset to read from
+        :param int length: number of bytes to read
+        :param object view: local path view with fd_start and fd_end
+        :rtype: bytes
+        :return: data read
+        """
+        path = str(path)
+        if not _HAS_PREAD:
+            with open(path, 'rb') as fd:
+                fd.seek(offset, 0)
+                return fd.read(length)
+        with self._acquire(path, view) as handle:
+            fd = handle.fd
+            data = os.pread(fd, length, offset)
+            # handle short reads that are not at end of file
+            while 0 < len(data) < length:
+                buf = os.pread(fd, length - len(data), offset + len(data))
+                if len(buf) == 0:
+                    break
+                data += buf
+            if view is not None:
+                start = offset + length
+                FileHandleCache._advise(
+                    fd, start, min((length, view.fd_end - start)),
+                    _FADV_WILLNEED)
+        return data
+
+    def preadinto(self, path, offset, buf, view=None):
+        # type: (FileHandleCache, pathlib.Path, int, memoryview,
+        #        object) -> int
+        """Read data at an offset into a buffer without modifying a file
+        position. If view is specified, hints are applied as in pread.
+        :param FileHandleCache self: this
+        :param pathlib.Path path: path
+        :param int offset: offset to read from
+        :param memoryview buf: buffer to read into
+        :param object view: local path view with fd_start and fd_end
+        :rtype: int
+        :return: number of bytes read
+        """
+        path = str(path)
+        length = len(buf)
+        if not _HAS_PREADV:
+            with open(path, 'rb') as fd:
+                fd.seek(offset, 0)
+                return fd.readinto(buf)
+        nread = 0
+        with self._acquire(path, view) as handle:
+            fd = handle.fd
+            # handle short reads that are not at end of file
+            while nread < length:
+                n = os.preadv(fd, [buf[nread:]], offset + nread)
+                if n == 0:
+                    break
+                nread += n
+            if view is not None:
+                start = offset + length
+                FileHandleCache._advise(
+                    fd, start, min((length, view.fd_end - start)),
+                    _FADV_WILLNEED)
+        return nread
+
+    def close(self, path):
+        # type: (FileHandleCache, pathlib.Path) -> None
+        """Close the cached handle for a path. Handles that are in use
+        are closed upon release.
+        :param FileHandleCache self: this
+        :param pathlib.Path path: path
+        """
+        with self._lock:
+            handle = self._handles.pop(str(path), None)
+            if handle is None:
+                return
+            handle.evicted = True
+            if handle.refcount == 0:
+                os.close(handle.fd)
+
+    def close_all(self):
+        # type: (FileHandleCache) -> None
+        """Close all cached handles
+        :param FileHandleCache self: this
+        """
+        with self._lock:
+            while len(self._handles) > 0:
+                _, handle = self._handles.popitem(last=False)
+                handle.evicted = True
+                if handle.refcount == 0:
+                    os.close(handle.fd)
+
+
+class FileWriterPool(FileHandleCache):
+    """LRU-bounded pool of file descriptors for concurrent positional
+    writes. Concurrent writes to the same file are batched and adjacent
+    regions are coalesced into vectored writes."""
+    def __init__(
+            self, durability=WriteDurability.NoSync,
+            max_handles=_DEFAULT_MAX_HANDLES,
+            sync_interval_bytes=_DEFAULT_SYNC_INTERVAL_BYTES):
+        # type: (FileWriterPool, WriteDurability, int, int) -> None
+        """Ctor for FileWriterPool
+        :param FileWriterPool self: this
+        :param WriteDurability durability: durability policy
+        :param int max_handles: maximum number of idle handles to keep open
+        :param int sync_interval_bytes: bytes written between data syncs
+            for periodic durability
+        """
+        super().__init__(max_handles=max_handles)
+        if sync_interval_bytes < 1:
+            raise ValueError(
+                'sync interval is invalid: {}'.format(sync_interval_bytes))
+        self._handle_type = _WriteHandle
+        self._durability = durability
+        self._sync_interval_bytes = sync_interval_bytes
+
+    def _open(self, path, view):
+        # type: (FileWriterPool, str, object) -> int
+        """Open a file descriptor for writing to an existing file
+        :param FileWriterPool self: this
+        :param str path: path
+        :param object view: unused
+        :rtype: int
+        :return: file descriptor
+        """
+        return os.open(path, os.O_WRONLY | getattr(os, 'O_BINARY', 0))
+
+    def _write_batch(self, handle, batch):
+        # type: (FileWriterPool, _WriteHandle, list) -> None
+        """Write a batch of requests, coalescing adjacent regions. Errors
+        are recorded on the requests of the affected region.
+        :param FileWriterPool self: this
+        :param _WriteHandle handle: write handle
+        :param list batch: list of write requests
+        """
+        batch.sort(key=lambda x: x.offset)
+        i = 0
+        while i < len(batch):
+            j = i + 1
+            end = batch[i].offset + len(batch[i].data)
+            while j < len(batch) and batch[j].offset == end:
+                end += len(batch[j].data)
+                j += 1
+            try:
+                _pwrite_all(
+                    handle.fd, [req.data for req in batch[i:j]],
+                    batch[i].offset)
+            except Exception as e:
+                for req in batch[i:j]:
+                    req.exc = e
+            i = j
+
+    def pwrite(self, path, offset, data):
+        # type: (FileWriterPool, pathlib.Path, int, bytes) -> None
+        """Write data at an offset of an existing file. Returns once the
+        data has been written to the file.
+        :param FileWriterPool self: this
+        :param pathlib.Path path: path
+        :param int offset: offset to write to
+        :param bytes data: data
+        """
+        if len(data) == 0:
+            return
+        if not _HAS_PWRITE:
+            pwrite(path, offset, data)
+            return
+        req = _WriteRequest(offset, data)
+        with self._acquire(str(path), None) as handle:
+            with handle.cond:
+                handle.pending.append(req)
+                # wait for the current writer to either pick up this
+                # request or finish so this thread can lead the next batch
+                handle.cond.wait_for(lambda: req.done or not handle.writing)
+                if req.done:
+                    batch = None
+                else:
+                    batch = handle.pending
+                    handle.pending = []
+                    handle.writing = True
+            if batch is not None:
+                sync = False
+                try:
+                    self._write_batch(handle, batch)
+                    if self._durability == WriteDurability.Periodic:
+                        handle.unsynced += sum(len(x.data) for x in batch)
+                        if handle.unsynced >= self._sync_interval_bytes:
+                            handle.unsynced = 0
+                            sync = True
+                    if sync:
+                        _datasync(handle.fd)
+                finally:
+                    with handle.cond:
+                        for x in batch:
+                            x.done = True
+                        handle.writing = False
+                        handle.cond.notify_all()
+        if req.exc is not None:
+            raise req.exc
+
+    def finalize(self, path, sync=True):
+        # type: (FileWriterPool, pathlib.Path, bool) -> None
+        """Finalize writes to a path, syncing data to stable storage as
+        required by the durability policy, and close the handle
+        :param FileWriterPool self: this
+        :param pathlib.Path path: path
+        :param bool sync: sync data if required by durability policy
+        """
+        path = str(path)
+        if (sync and _HAS_PWRITE and
+                self._durability != WriteDurability.NoSync):
+            with self._acquire(path, None) as handle:
+                _datasync(handle.fd)
+        self.close(path)
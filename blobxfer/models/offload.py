@@ -23,13 +23,225 @@
 # DEALINGS IN THE SOFTWARE.
 
 # stdlib imports
+import collections
 import logging
 import multiprocessing
+try:
+    import multiprocessing.shared_memory
+    _SHARED_MEMORY_SUPPORTED = True
+except ImportError:  # noqa
+    # shared memory is only available on python 3.8+
+    _SHARED_MEMORY_SUPPORTED = False
+import os
 import threading
 import queue
+# non-stdlib imports
+# local imports
+import blobxfer.util
 
 # create logger
 logger = logging.getLogger(__name__)
+# global defines
+_SHM_DEVICE = '/dev/shm'
+# encapsulate a slot of a shared memory ring
+SharedMemorySlot = collections.namedtuple(
+    'SharedMemorySlot', [
+        'length',
+        'name',
+        'offset',
+        'slot',
+    ]
+)
+
+
+class SharedMemoryRing(object):
+    """Fixed-size slots in a shared memory segment which are handed
+    between the main process and offload processes. Only slot handles
+    are pickled through the offload queues, the slot contents never
+    touch the disk. Slots are owned and released by the main process."""
+    def __init__(self, slot_size, num_slots):
+        # type: (SharedMemoryRing, int, int) -> None
+        """Ctor for SharedMemoryRing
+        :param SharedMemoryRing self: this
+        :param int slot_size: size of each slot in bytes
+        :param int num_slots: number of slots
+        """
+        if slot_size is None or slot_size < 1:
+            raise ValueError('invalid slot_size: {}'.format(slot_size))
+        if num_slots is None or num_slots < 1:
+            raise ValueError('invalid num_slots: {}'.format(num_slots))
+        self._slot_size = slot_size
+        self._num_slots = num_slots
+        self._shm = multiprocessing.shared_memory.SharedMemory(
+            create=True, size=slot_size * num_slots)
+        self._lock = threading.Lock()
+        self._free = collections.deque(range(num_slots))
+
+    @property
+    def name(self):
+        # type: (SharedMemoryRing) -> str
+        """Name of the shared memory segment
+        :param SharedMemoryRing self: this
+        :rtype: str
+        :return: shared memory segment name
+        """
+        return self._shm.name
+
+    @property
+    def slot_size(self):
+        # type: (SharedMemoryRing) -> int
+        """Size of each slot
+        :param SharedMemoryRing self: this
+        :rtype: int
+        :return: slot size in bytes
+        """
+        return self._slot_size
+
+    @property
+    def free_slots(self):
+        # type: (SharedMemoryRing) -> int
+        """Number of free slots
+        :param SharedMemoryRing self: this
+        :rtype: int
+        :return: number of free slots
+        """
+        with self._lock:
+            return len(self._free)
+
+    @staticmethod
+    def create(slot_size, num_slots):
+        # type: (int, int) -> SharedMemoryRing
+        """Create a shared memory ring if the platform can back it
+        :param int slot_size: size of each slot in bytes
+        :param int num_slots: number of slots
+        :rtype: SharedMemoryRing
+        :return: shared memory ring or None if not available
+        """
+        if not _SHARED_MEMORY_SUPPORTED:
+            logger.debug(
+                'shared memory is not supported on this python version, '
+                'using temporary files')
+            return None
+        size = slot_size * num_slots
+        # shared memory on linux is backed by a tmpfs which may be
+        # much smaller than memory (e.g., in containers) and touching
+        # pages beyond its capacity raises SIGBUS instead of an error
+        if blobxfer.util.on_linux() and os.path.isdir(_SHM_DEVICE):
+            try:
+                stat = os.statvfs(_SHM_DEVICE)
+                avail = stat.f_bavail * stat.f_frsize
+            except OSError:
+                avail = 0
+            if avail < size:
+                logger.warning(
+                    'insufficient space in {} ({} bytes) for a shared memory '
+                    'ring of {} bytes, using temporary files'.format(
+                        _SHM_DEVICE, avail, size))
+                return None
+        try:
+            ring = SharedMemoryRing(slot_size, num_slots)
+        except OSError as e:
+            logger.warning(
+                'cannot create shared memory ring, using temporary '
+                'files: {}'.format(e))
+            return None
+        logger.debug(
+            'created shared memory ring {} with {} slots of {} bytes'.format(
+                ring.name, num_slots, slot_size))
+        return ring
+
+    def allocate(self, length):
+        # type: (SharedMemoryRing, int) -> SharedMemorySlot
+        """Allocate a slot
+        :param SharedMemoryRing self: this
+        :param int length: number of bytes to hold in slot
+        :rtype: SharedMemorySlot
+        :return: slot or None if length does not fit or no slot is free
+        """
+        if length > self._slot_size:
+            return None
+        with self._lock:
+            if len(self._free) == 0:
+                return None
+            slot = self._free.popleft()
+        return SharedMemorySlot(
+            length=length,
+            name=self._shm.name,
+            offset=slot * self._slot_size,
+            slot=slot,
+        )
+
+    def put(self, data):
+        # type: (SharedMemoryRing, bytes) -> SharedMemorySlot
+        """Copy data into a newly allocated slot
+        :param SharedMemoryRing self: this
+        :param bytes data: data
+        :rtype: SharedMemorySlot
+        :return: slot or None if data does not fit or no slot is free
+        """
+        slot = self.allocate(len(data))
+        if slot is not None:
+            self._shm.buf[slot.offset:slot.offset + slot.length] = data
+        return slot
+
+    def get(self, slot):
+        # type: (SharedMemoryRing, SharedMemorySlot) -> bytes
+        """Copy data out of a slot and release it
+        :param SharedMemoryRing self: this
+        :param SharedMemorySlot slot: slot
+        :rtype: bytes
+        :return: data
+        """
+        data = bytes(self._shm.buf[slot.offset:slot.offset + slot.length])
+        self.release(slot)
+        return data
+
+    def release(self, slot):
+        # type: (SharedMemoryRing, SharedMemorySlot) -> None
+        """Release a slot
+        :param SharedMemoryRing self: this
+        :param SharedMemorySlot slot: slot
+        """
+        with self._lock:
+            self._free.append(slot.slot)
+
+    def close(self):
+        # type: (SharedMemoryRing) -> None
+        """Close and remove the shared memory segment
+        :param SharedMemoryRing self: this
+        """
+        self._shm.close()
+        try:
+            self._shm.unlink()
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def attach(slot, attached):
+        # type: (SharedMemorySlot, dict) -> memoryview
+        """Get a view of a slot from an offload process
+        :param SharedMemorySlot slot: slot
+        :param dict attached: shared memory segments attached by name
+        :rtype: memoryview
+        :return: view of slot
+        """
+        if slot.name not in attached:
+            attached[slot.name] = multiprocessing.shared_memory.SharedMemory(
+                name=slot.name)
+        return attached[slot.name].buf[slot.offset:slot.offset + slot.length]
+
+    @staticmethod
+    def detach(attached):
+        # type: (dict) -> None
+        """Detach shared memory segments from an offload process
+        :param dict attached: shared memory segments attached by name
+        """
+        for shm in attached.values():
+            try:
+                shm.close()
+            except BufferError:
+                pass
+        attached.clear()
 
 
 class _MultiprocessOffload(object):
@@ -24,6 +24,7 @@
 
 # stdlib imports
 import collections
+import enum
 import logging
 import multiprocessing
 import pathlib
@@ -39,6 +40,24 @@ if sys.version_info >= (3, 5):  # noqa
     _DEFAULT_REQUESTS_TIMEOUT = (10, 200)
 else:  # noqa
     _DEFAULT_REQUESTS_TIMEOUT = (10, 31)
+_MAX_AUTO_TRANSFER_THREADS = 96
+
+
+class ChunkSizeMode(enum.Enum):
+    Static = 'static'
+    Adaptive = 'adaptive'
+
+    def __str__(self):
+        return self.value
+
+
+class ConcurrencyMode(enum.Enum):
+    Static = 'static'
+    Auto = 'auto'
+
+    def __str__(self):
+        return self.value
+
 
 # named tuples
 HttpProxy = collections.namedtuple(
@@ -75,13 +94,19 @@ Upload = collections.namedtuple(
     'Upload', [
         'access_tier',
         'chunk_size_bytes',
+        'chunk_size_mode',
+        'delete_during_transfer',
         'delete_extraneous_destination',
         'delete_only',
+        'delta',
+        'encryption_mode',
         'mode',
         'one_shot_bytes',
         'overwrite',
         'recursive',
+        'remote_index',
         'rename',
+        'rsa_private_key',
         'rsa_public_key',
         'stdin_as_page_blob_size',
         'store_file_properties',
@@ -93,8 +118,10 @@ Download = collections.namedtuple(
     'Download', [
         'check_file_md5',
         'chunk_size_bytes',
+        'chunk_size_mode',
         'delete_extraneous_destination',
         'delete_only',
+        'durability',
         'max_single_object_concurrency',
         'mode',
         'overwrite',
@@ -108,14 +135,19 @@ Download = collections.namedtuple(
 SyncCopy = collections.namedtuple(
     'SyncCopy', [
         'access_tier',
+        'async_copy',
+        'delete_during_transfer',
         'delete_extraneous_destination',
         'delete_only',
+        'delta',
         'dest_mode',
         'mode',
         'overwrite',
         'recursive',
+        'remote_index',
         'rename',
         'server_side_copy',
+        'stream_relay',
         'strip_components',
     ]
 )
@@ -176,11 +208,59 @@ class Timeout(object):
         return self._max_retries
 
 
+class SyncState(object):
+    """Sync State Options"""
+    def __init__(self, state_file, revalidate_interval, revalidate_sample):
+        """Ctor for Sync State options
+        :param SyncState self: this
+        :param str state_file: sync state file
+        :param float revalidate_interval: remote revalidation interval
+        :param float revalidate_sample: remote revalidation sample fraction
+        """
+        self._state_file = pathlib.Path(state_file)
+        if revalidate_interval is None or revalidate_interval < 0:
+            self._revalidate_interval = 0
+        else:
+            self._revalidate_interval = revalidate_interval
+        if revalidate_sample is None:
+            revalidate_sample = 0
+        if revalidate_sample < 0 or revalidate_sample > 1:
+            raise ValueError(
+                'sync state revalidate sample must be in the range [0, 1]')
+        self._revalidate_sample = revalidate_sample
+
+    @property
+    def state_file(self):
+        """Sync state file
+        :rtype: pathlib.Path
+        :return: sync state file
+        """
+        return self._state_file
+
+    @property
+    def revalidate_interval(self):
+        """Minimum interval in seconds between remote revalidations of an
+        unchanged entity, 0 if disabled
+        :rtype: float
+        :return: revalidate interval
+        """
+        return self._revalidate_interval
+
+    @property
+    def revalidate_sample(self):
+        """Fraction of unchanged entities to revalidate with the remote
+        :rtype: float
+        :return: revalidate sample
+        """
+        return self._revalidate_sample
+
+
 class Concurrency(object):
     """Concurrency Options"""
     def __init__(
             self, crypto_processes, md5_processes, disk_threads,
-            transfer_threads, action=None):
+            transfer_threads, action=None, max_memory_bytes=None,
+            scan_threads=None, mode=None):
         """Ctor for Concurrency Options
         :param Concurrency self: this
         :param int crypto_processes: number of crypto procs
@@ -188,11 +268,22 @@ class Concurrency(object):
         :param int disk_threads: number of disk threads
         :param int transfer_threads: number of transfer threads
         :param int action: action hint (1=Download, 2=Upload, 3=SyncCopy)
+        :param int max_memory_bytes: maximum in-flight data bytes
+        :param int scan_threads: number of local directory scan threads
+        :param ConcurrencyMode mode: concurrency mode
         """
+        self.mode = mode
+        if self.mode is None:
+            self.mode = ConcurrencyMode.Static
         self.crypto_processes = crypto_processes
         self.md5_processes = md5_processes
         self.disk_threads = disk_threads
         self.transfer_threads = transfer_threads
+        self.max_memory_bytes = max_memory_bytes
+        self.scan_threads = scan_threads
+        # zero or unset max memory disables the in-flight byte budget
+        if self.max_memory_bytes is None or self.max_memory_bytes < 0:
+            self.max_memory_bytes = 0
         # allow crypto processes to be zero (which will inline crypto
         # routines with main process)
         if self.crypto_processes is None or self.crypto_processes < 1:
@@ -201,6 +292,11 @@ class Concurrency(object):
             self.md5_processes = multiprocessing.cpu_count() >> 1
         if self.md5_processes < 1:
             self.md5_processes = 1
+        if self.scan_threads is None or self.scan_threads < 1:
+            self.scan_threads = multiprocessing.cpu_count()
+            # cap maximum number of scan threads from cpu count to 16
+            if self.scan_threads > 16:
+                self.scan_threads = 16
         auto_disk = False
         if self.disk_threads is None or self.disk_threads < 1:
             self.disk_threads = multiprocessing.cpu_count() << 1
@@ -217,6 +313,7 @@ class Concurrency(object):
             self.md5_processes = 0
             self.crypto_processes = 0
             self.disk_threads = 0
+            self.scan_threads = 0
         if self.transfer_threads is None or self.transfer_threads < 1:
             if auto_disk:
                 # for download action, cap network threads to lower value
@@ -231,8 +328,15 @@ class Concurrency(object):
             else:
                 self.transfer_threads = multiprocessing.cpu_count() << 2
             # cap maximum number of threads from cpu count to 96
-            if self.transfer_threads > 96:
-                self.transfer_threads = 96
+            if self.transfer_threads > _MAX_AUTO_TRANSFER_THREADS:
+                self.transfer_threads = _MAX_AUTO_TRANSFER_THREADS
+        # in auto mode, the transfer thread count is the starting point
+        # for the adaptive controller which may grow up to the maximum
+        if self.mode == ConcurrencyMode.Auto:
+            self.max_transfer_threads = max(
+                (self.transfer_threads, _MAX_AUTO_TRANSFER_THREADS))
+        else:
+            self.max_transfer_threads = self.transfer_threads
 
 
 class General(object):
@@ -240,7 +344,7 @@ class General(object):
     def __init__(
             self, concurrency, log_file=None, progress_bar=True,
             resume_file=None, timeout=None, verbose=False, quiet=False,
-            dry_run=False, proxy=None):
+            dry_run=False, proxy=None, sync_state=None):
         """Ctor for General Options
         :param General self: this
         :param Concurrency concurrency: concurrency options
@@ -252,6 +356,7 @@ class General(object):
         :param bool quiet: quiet
         :param bool dry_run: dry run
         :param HttpProxy proxy: proxy
+        :param SyncState sync_state: sync state options
         """
         if concurrency is None:
             raise ValueError('concurrency option is unspecified')
@@ -267,3 +372,4 @@ class General(object):
         self.quiet = quiet
         self.dry_run = dry_run
         self.proxy = proxy
+        self.sync_state = sync_state
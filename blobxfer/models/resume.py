@@ -31,8 +31,10 @@ class Download(object):
     """Download resume object"""
     def __init__(
             self, final_path, length, chunk_size, next_integrity_chunk,
-            completed, md5):
-        # type: (Download, str, int, int, int, bool, str) -> None
+            completed, md5, completed_chunks=None, md5_state=None,
+            file_size=None, file_mtime_ns=None, hmac_state=None):
+        # type: (Download, str, int, int, int, bool, str, int, bytes, int,
+        #        int, bytes) -> None
         """Ctor for Download
         :param Download self: this
         :param str final_path: final path
@@ -41,6 +43,11 @@ class Download(object):
         :param int next_integrity_chunk: next integrity chunk
         :param bool completed: completed
         :param str md5: md5 hex digest
+        :param int completed_chunks: completed chunks
+        :param bytes md5_state: md5 hasher state
+        :param int file_size: local file size
+        :param int file_mtime_ns: local file modification time
+        :param bytes hmac_state: hmac hasher state
         """
         self._final_path = final_path
         self._length = length
@@ -48,6 +55,11 @@ class Download(object):
         self._next_integrity_chunk = next_integrity_chunk
         self._completed = completed
         self._md5hexdigest = md5 if md5 is not None else None
+        self._completed_chunks = completed_chunks
+        self._md5_state = md5_state
+        self._file_size = file_size
+        self._file_mtime_ns = file_mtime_ns
+        self._hmac_state = hmac_state
 
     @property
     def final_path(self):
@@ -98,6 +110,25 @@ class Download(object):
         """
         self._next_integrity_chunk = value
 
+    @property
+    def completed_chunks(self):
+        # type: (Download) -> int
+        """Get Completed chunks
+        :param Download self: this
+        :rtype: int
+        :return: completed chunks or None if not tracked
+        """
+        return self._completed_chunks
+
+    @completed_chunks.setter
+    def completed_chunks(self, value):
+        # type: (Download, int) -> None
+        """Set Completed chunks
+        :param Download self: this
+        :param int value: completed chunks
+        """
+        self._completed_chunks = value
+
     @property
     def completed(self):
         # type: (Download) -> bool
@@ -138,6 +169,87 @@ class Download(object):
             return
         self._md5hexdigest = value
 
+    @property
+    def md5_state(self):
+        # type: (Download) -> bytes
+        """Get md5 hasher state
+        :param Download self: this
+        :rtype: bytes
+        :return: md5 hasher state matching the md5 hex digest
+        """
+        return self._md5_state
+
+    @md5_state.setter
+    def md5_state(self, value):
+        # type: (Download, bytes) -> None
+        """Set md5 hasher state value if value is not None
+        :param Download self: this
+        :param bytes value: md5 hasher state
+        """
+        if value is None:
+            return
+        self._md5_state = value
+
+    @property
+    def file_size(self):
+        # type: (Download) -> int
+        """Get local file size when the md5 hasher state was recorded
+        :param Download self: this
+        :rtype: int
+        :return: local file size
+        """
+        return self._file_size
+
+    @file_size.setter
+    def file_size(self, value):
+        # type: (Download, int) -> None
+        """Set local file size
+        :param Download self: this
+        :param int value: local file size
+        """
+        self._file_size = value
+
+    @property
+    def file_mtime_ns(self):
+        # type: (Download) -> int
+        """Get local file modification time when the md5 hasher state
+        was recorded
+        :param Download self: this
+        :rtype: int
+        :return: local file modification time in nanoseconds
+        """
+        return self._file_mtime_ns
+
+    @file_mtime_ns.setter
+    def file_mtime_ns(self, value):
+        # type: (Download, int) -> None
+        """Set local file modification time
+        :param Download self: this
+        :param int value: local file modification time in nanoseconds
+        """
+        self._file_mtime_ns = value
+
+    @property
+    def hmac_state(self):
+        # type: (Download) -> bytes
+        """Get hmac hasher state
+        :param Download self: this
+        :rtype: bytes
+        :return: hmac hasher state
+        """
+        return self._hmac_state
+
+    @hmac_state.setter
+    def hmac_state(self, value):
+        # type: (Download, bytes) -> None
+        """Set hmac hasher state value if value is not None
+        :param Download self: this
+        :param bytes value: hmac hasher state
+        """
+        if value is None:
+            return
+        self._hmac_state = value
+
     def __repr__(self):
         # type: (Download) -> str
         """Return representation
@@ -156,8 +268,11 @@ class Upload(object):
     """Upload resume object"""
     def __init__(
             self, local_path, length, chunk_size, total_chunks,
-            completed_chunks, completed, md5):
-        # type: (Upload, str, int, int, int, int, bool, str) -> None
+            completed_chunks, completed, md5, md5_state=None, file_size=None,
+            file_mtime_ns=None, encryption_keys=None, encryption_iv=None,
+            hmac_state=None):
+        # type: (Upload, str, int, int, int, int, bool, str, bytes, int,
+        #        int, str, bytes, bytes) -> None
         """Ctor for Upload
         :param Upload self: this
         :param str local_path: local path
@@ -167,6 +282,12 @@ class Upload(object):
         :param int completed_chunks: completed chunks
         :param bool completed: completed
         :param str md5: md5 hex digest
+        :param bytes md5_state: md5 hasher state
+        :param int file_size: local file size
+        :param int file_mtime_ns: local file modification time
+        :param str encryption_keys: serialized encryption keys
+        :param bytes encryption_iv: chaining iv for the next chunk
+        :param bytes hmac_state: hmac hasher state
         """
         self._local_path = local_path
         self._length = length
@@ -175,6 +296,12 @@ class Upload(object):
         self._completed_chunks = completed_chunks
         self._completed = completed
         self._md5hexdigest = md5 if md5 is not None else None
+        self._md5_state = md5_state
+        self._file_size = file_size
+        self._file_mtime_ns = file_mtime_ns
+        self._encryption_keys = encryption_keys
+        self._encryption_iv = encryption_iv
+        self._hmac_state = hmac_state
 
     @property
     def local_path(self):
@@ -275,6 +402,127 @@ class Upload(object):
             return
         self._md5hexdigest = value
 
+    @property
+    def md5_state(self):
+        # type: (Upload) -> bytes
+        """Get md5 hasher state
+        :param Upload self: this
+        :rtype: bytes
+        :return: md5 hasher state matching the md5 hex digest
+        """
+        return self._md5_state
+
+    @md5_state.setter
+    def md5_state(self, value):
+        # type: (Upload, bytes) -> None
+        """Set md5 hasher state value if value is not None
+        :param Upload self: this
+        :param bytes value: md5 hasher state
+        """
+        if value is None:
+            return
+        self._md5_state = value
+
+    @property
+    def file_size(self):
+        # type: (Upload) -> int
+        """Get local file size when the md5 hasher state was recorded
+        :param Upload self: this
+        :rtype: int
+        :return: local file size
+        """
+        return self._file_size
+
+    @file_size.setter
+    def file_size(self, value):
+        # type: (Upload, int) -> None
+        """Set local file size
+        :param Upload self: this
+        :param int value: local file size
+        """
+        self._file_size = value
+
+    @property
+    def file_mtime_ns(self):
+        # type: (Upload) -> int
+        """Get local file modification time when the md5 hasher state
+        was recorded
+        :param Upload self: this
+        :rtype: int
+        :return: local file modification time in nanoseconds
+        """
+        return self._file_mtime_ns
+
+    @file_mtime_ns.setter
+    def file_mtime_ns(self, value):
+        # type: (Upload, int) -> None
+        """Set local file modification time
+        :param Upload self: this
+        :param int value: local file modification time in nanoseconds
+        """
+        self._file_mtime_ns = value
+
+    @property
+    def hmac_state(self):
+        # type: (Upload) -> bytes
+        """Get hmac hasher state
+        :param Upload self: this
+        :rtype: bytes
+        :return: hmac hasher state
+        """
+        return self._hmac_state
+
+    @hmac_state.setter
+    def hmac_state(self, value):
+        # type: (Upload, bytes) -> None
+        """Set hmac hasher state value if value is not None
+        :param Upload self: this
+        :param bytes value: hmac hasher state
+        """
+        if value is None:
+            return
+        self._hmac_state = value
+
+    @property
+    def encryption_keys(self):
+        # type: (Upload) -> str
+        """Get encryption keys and parameters
+        :param Upload self: this
+        :rtype: str
+        :return: serialized encryption keys or None
+        """
+        return self._encryption_keys
+
+    @encryption_keys.setter
+    def encryption_keys(self, value):
+        # type: (Upload, str) -> None
+        """Set encryption keys and parameters
+        :param Upload self: this
+        :param str value: serialized encryption keys
+        """
+        self._encryption_keys = value
+
+    @property
+    def encryption_iv(self):
+        # type: (Upload) -> bytes
+        """Get chaining IV for the next chunk
+        :param Upload self: this
+        :rtype: bytes
+        :return: iv
+        """
+        return self._encryption_iv
+
+    @encryption_iv.setter
+    def encryption_iv(self, value):
+        # type: (Upload, bytes) -> None
+        """Set chaining IV value if value is not None
+        :param Upload self: this
+        :param bytes value: iv
+        """
+        if value is None:
+            return
+        self._encryption_iv = value
+
     def __repr__(self):
         # type: (Upload) -> str
         """Return representation
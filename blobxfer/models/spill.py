@@ -0,0 +1,192 @@
+# Copyright (c) Microsoft Corporation
+#
+# All rights reserved.
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+# stdlib imports
+import logging
+import pathlib
+import pickle
+import shutil
+import sqlite3
+import tempfile
+# non-stdlib imports
+# local imports
+
+# create logger
+logger = logging.getLogger(__name__)
+# global defines
+DEFAULT_SPILL_THRESHOLD = 1048576
+_SPILL_BATCH_SIZE = 5000
+
+
+class SpillableStore(object):
+    """Key value store held in memory until a threshold is reached and
+    then spilled to a temporary on-disk database. Instances are not thread
+    safe and must be guarded by the owner."""
+    def __init__(self, name, spill_threshold=DEFAULT_SPILL_THRESHOLD):
+        # type: (SpillableStore, str, int) -> None
+        """Ctor for SpillableStore
+        :param SpillableStore self: this
+        :param str name: store name used for the on-disk database
+        :param int spill_threshold: number of entries held in memory
+            before the store is spilled to disk
+        """
+        if spill_threshold < 1:
+            raise ValueError('spill_threshold must be positive')
+        self._name = name
+        self._spill_threshold = spill_threshold
+        self._entries = {}
+        self._pending = []
+        self._spill_dir = None
+        self._db = None
+
+    @property
+    def spilled(self):
+        # type: (SpillableStore) -> bool
+        """Check if store has spilled to disk
+        :param SpillableStore self: this
+        :rtype: bool
+        :return: if store is on disk
+        """
+        return self._db is not None
+
+    @property
+    def dbpath(self):
+        # type: (SpillableStore) -> pathlib.Path
+        """Path of the on-disk database
+        :param SpillableStore self: this
+        :rtype: pathlib.Path
+        :return: database path or None if not spilled
+        """
+        if self._spill_dir is None:
+            return None
+        return pathlib.Path(self._spill_dir) / '{}.db'.format(self._name)
+
+    def _spill(self):
+        # type: (SpillableStore) -> None
+        """Move in-memory entries to an on-disk database
+        :param SpillableStore self: this
+        """
+        self._spill_dir = tempfile.mkdtemp(
+            prefix='blobxfer-{}-'.format(self._name))
+        dbpath = self.dbpath
+        logger.debug('spilling {} of {} entries to {}'.format(
+            self._name, len(self._entries), dbpath))
+        self._db = sqlite3.connect(str(dbpath), check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=OFF')
+        self._db.execute('PRAGMA synchronous=OFF')
+        self._db.execute(
+            'CREATE TABLE entries (key TEXT PRIMARY KEY, value BLOB)')
+        self._pending.extend(self._entries.items())
+        self._entries.clear()
+        self._flush()
+
+    def _flush(self):
+        # type: (SpillableStore) -> None
+        """Flush pending entries to the on-disk database
+        :param SpillableStore self: this
+        """
+        if len(self._pending) == 0:
+            return
+        self._db.executemany(
+            'INSERT OR REPLACE INTO entries VALUES (?, ?)',
+            ((key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+             for key, value in self._pending))
+        self._db.commit()
+        self._pending.clear()
+
+    def put(self, key, value=None):
+        # type: (SpillableStore, str, object) -> None
+        """Add or replace an entry
+        :param SpillableStore self: this
+        :param str key: key
+        :param object value: value
+        """
+        if self._db is not None:
+            self._pending.append((key, value))
+            if len(self._pending) >= _SPILL_BATCH_SIZE:
+                self._flush()
+            return
+        self._entries[key] = value
+        if len(self._entries) > self._spill_threshold:
+            self._spill()
+
+    def get(self, key, default=None):
+        # type: (SpillableStore, str, object) -> object
+        """Get the value of an entry
+        :param SpillableStore self: this
+        :param str key: key
+        :param object default: default if entry does not exist
+        :rtype: object
+        :return: value or default
+        """
+        if self._db is None:
+            return self._entries.get(key, default)
+        self._flush()
+        row = self._db.execute(
+            'SELECT value FROM entries WHERE key = ?', (key, )).fetchone()
+        if row is None:
+            return default
+        return pickle.loads(row[0])
+
+    def __contains__(self, key):
+        # type: (SpillableStore, str) -> bool
+        """Check if an entry exists
+        :param SpillableStore self: this
+        :param str key: key
+        :rtype: bool
+        :return: if entry exists
+        """
+        if self._db is None:
+            return key in self._entries
+        self._flush()
+        row = self._db.execute(
+            'SELECT 1 FROM entries WHERE key = ?', (key, )).fetchone()
+        return row is not None
+
+    def __len__(self):
+        # type: (SpillableStore) -> int
+        """Number of entries
+        :param SpillableStore self: this
+        :rtype: int
+        :return: number of entries
+        """
+        if self._db is None:
+            return len(self._entries)
+        self._flush()
+        return self._db.execute(
+            'SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def close(self):
+        # type: (SpillableStore) -> None
+        """Clear the store and remove any on-disk database
+        :param SpillableStore self: this
+        """
+        self._entries.clear()
+        self._pending.clear()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+        if self._spill_dir is not None:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self._spill_dir = None
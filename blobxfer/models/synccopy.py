@@ -89,11 +89,14 @@ class Specification(object):
 
 class Descriptor(object):
     """Synccopy Descriptor"""
-    def __init__(self, src_ase, dst_ase, block_list, options, resume_mgr):
+    def __init__(
+            self, src_ase, dst_ase, block_list, options, resume_mgr,
+            page_ranges=None, src_block_digests=None, dst_blocks=None):
         # type: (Descriptior, blobxfer.models.azure.StorageEntity,
         #        blobxfer.models.azure.StorageEntity, list,
         #        blobxfer.models.options.SyncCopy,
-        #        blobxfer.operations.resume.SyncCopyResumeManager) -> None
+        #        blobxfer.operations.resume.SyncCopyResumeManager,
+        #        list, list, list) -> None
         """Ctor for Descriptor
         :param Descriptor self: this
         :param blobxfer.models.azure.StorageEntity src_ase:
@@ -104,16 +107,24 @@ class Descriptor(object):
         :param blobxfer.models.options.SyncCopy options: synccopy options
         :param blobxfer.operations.resume.SyncCopyResumeManager resume_mgr:
             synccopy resume manager
+        :param list page_ranges: populated page ranges of a page blob
+            source, only these ranges are transferred if specified
+        :param list src_block_digests: hex digests encoded in the block ids
+            of the source block list
+        :param list dst_blocks: (hex digest, size) of committed blocks of
+            the destination block blob for delta copies
         """
         self._offset = 0
         self._chunk_num = 0
         self._finalized = False
+        self._finalize_claimed = False
         self._meta_lock = threading.Lock()
         self._resume_mgr = resume_mgr
         self._src_ase = src_ase
         self._dst_ase = dst_ase
         self._src_block_list = block_list
         self._chunk_size = self._compute_chunk_size()
+        self._src_page_chunks = self._compute_page_chunks(page_ranges)
         self._server_side_copy = options.server_side_copy
         if (self._dst_ase.mode != blobxfer.models.azure.StorageModes.Block and
                 self._server_side_copy):
@@ -125,6 +136,12 @@ class Descriptor(object):
         self._outstanding_ops = self._total_chunks
         if blobxfer.util.is_not_empty(self._dst_ase.replica_targets):
             self._outstanding_ops *= len(self._dst_ase.replica_targets) + 1
+        self._initialize_delta(options, src_block_digests, dst_blocks)
+        if self._resume_mgr and self.is_delta:
+            logger.debug(
+                'ignoring resume option for delta copy of {}'.format(
+                    self._src_ase.path))
+            self._resume_mgr = None
         if self._resume_mgr:
             self._completed_chunks = bitstring.BitArray(
                 length=self._total_chunks)
@@ -161,6 +178,66 @@ class Descriptor(object):
         with self._meta_lock:
             return self._outstanding_ops == 0
 
+    def claim_finalization(self):
+        # type: (Descriptor) -> bool
+        """Claim finalization of the descriptor once all operations are
+        completed. Only the first caller may finalize.
+        :param Descriptor self: this
+        :rtype: bool
+        :return: if caller should finalize
+        """
+        with self._meta_lock:
+            if self._finalize_claimed or self._outstanding_ops != 0:
+                return False
+            self._finalize_claimed = True
+            return True
+
+    @property
+    def sparse_bytes(self):
+        # type: (Descriptor) -> int
+        """Bytes of cleared pages of the source which are not transferred
+        :param Descriptor self: this
+        :rtype: int
+        :return: number of bytes not transferred
+        """
+        if self._src_page_chunks is None:
+            return 0
+        return self._src_ase.size - self._page_chunk_bytes(
+            len(self._src_page_chunks))
+
+    @property
+    def is_delta(self):
+        # type: (Descriptor) -> bool
+        """Copy only sends blocks changed from the destination block blob
+        :param Descriptor self: this
+        :rtype: bool
+        :return: if delta copy
+        """
+        return self._block_digests is not None
+
+    @property
+    def delta_block_digests(self):
+        # type: (Descriptor) -> list
+        """Hex digests of all blocks in order
+        :param Descriptor self: this
+        :rtype: list
+        :return: block digests
+        """
+        return self._block_digests
+
+    @property
+    def delta_unchanged(self):
+        # type: (Descriptor) -> tuple
+        """Number of blocks and bytes unchanged from the destination
+        :param Descriptor self: this
+        :rtype: tuple
+        :return: (unchanged blocks, unchanged bytes)
+        """
+        return (
+            len(self._unchanged_blocks),
+            sum(self._src_block_list[x].size for x in self._unchanged_blocks),
+        )
+
     @property
     def is_resumable(self):
         # type: (Descriptor) -> bool
@@ -285,6 +362,29 @@ class Descriptor(object):
         return (self.remote_is_block_blob and
                 self.dst_entity.access_tier is not None)
 
+    def delta_block_digest(self, chunk_num):
+        # type: (Descriptor, int) -> str
+        """Get the digest of a block of a delta copy
+        :param Descriptor self: this
+        :param int chunk_num: chunk num
+        :rtype: str
+        :return: hex digest or None if not a delta copy
+        """
+        if self._block_digests is None:
+            return None
+        return self._block_digests[chunk_num]
+
+    def is_delta_block_unchanged(self, chunk_num):
+        # type: (Descriptor, int) -> bool
+        """Check if a block of a delta copy is already committed to the
+        destination
+        :param Descriptor self: this
+        :param int chunk_num: chunk num
+        :rtype: bool
+        :return: if block is unchanged
+        """
+        return chunk_num in self._unchanged_blocks
+
     def complete_offset_upload(self, chunk_num):
         # type: (Descriptor, int) -> None
         """Complete the upload for the offset
@@ -316,6 +416,41 @@ class Descriptor(object):
                     self._completed_chunks.int, completed,
                 )
 
+    def _initialize_delta(self, options, src_block_digests, dst_blocks):
+        # type: (Descriptor, blobxfer.models.options.SyncCopy, list,
+        #        list) -> None
+        """Initialize delta copy state. Block ids carrying a content digest
+        are kept in the destination so source blocks at the same offset
+        with the same digest and size as a committed destination block
+        need not be copied
+        :param Descriptor self: this
+        :param blobxfer.models.options.SyncCopy options: synccopy options
+        :param list src_block_digests: hex digests of source blocks
+        :param list dst_blocks: (hex digest, size) of destination blocks
+        """
+        self._block_digests = None
+        self._unchanged_blocks = set()
+        if (not options.delta or not self.remote_is_block_blob or
+                self._chunk_size != -1 or
+                blobxfer.util.is_not_empty(self._dst_ase.replica_targets) or
+                blobxfer.util.is_none_or_empty(src_block_digests) or
+                any(x is None for x in src_block_digests)):
+            return
+        self._block_digests = src_block_digests
+        if blobxfer.util.is_none_or_empty(dst_blocks):
+            return
+        src_offset = 0
+        dst_offset = 0
+        for i, block in enumerate(self._src_block_list):
+            if i >= len(dst_blocks):
+                break
+            digest, size = dst_blocks[i]
+            if (src_offset == dst_offset and size == block.size and
+                    digest == src_block_digests[i]):
+                self._unchanged_blocks.add(i)
+            src_offset += block.size
+            dst_offset += size
+
     def _compute_chunk_size(self):
         # type: (Descriptor) -> int
         """Compute chunk size given block list
@@ -338,6 +473,47 @@ class Descriptor(object):
             else:
                 return _MAX_NONBLOCK_BLOB_CHUNKSIZE_BYTES
 
+    def _compute_page_chunks(self, page_ranges):
+        # type: (Descriptor, list) -> list
+        """Compute chunks covering only the populated page ranges. Adjacent
+        ranges are coalesced and split at the chunk size.
+        :param Descriptor self: this
+        :param list page_ranges: populated page ranges
+        :rtype: list
+        :return: list of (range start, num bytes) or None
+        """
+        if page_ranges is None:
+            return None
+        spans = []
+        for pr in sorted(page_ranges, key=lambda x: x.start):
+            end = min((pr.end + 1, self._src_ase.size))
+            if pr.start >= end:
+                continue
+            if len(spans) > 0 and pr.start <= spans[-1][1]:
+                spans[-1][1] = max((spans[-1][1], end))
+            else:
+                spans.append([pr.start, end])
+        chunks = []
+        for start, end in spans:
+            while start < end:
+                num_bytes = min((self._chunk_size, end - start))
+                chunks.append((start, num_bytes))
+                start += num_bytes
+        if len(chunks) == 0:
+            # an empty chunk is required to create the destination
+            chunks.append((0, 0))
+        return chunks
+
+    def _page_chunk_bytes(self, num_chunks):
+        # type: (Descriptor, int) -> int
+        """Number of bytes in the leading populated page chunks
+        :param Descriptor self: this
+        :param int num_chunks: number of chunks
+        :rtype: int
+        :return: number of bytes
+        """
+        return sum(x[1] for x in self._src_page_chunks[:num_chunks])
+
     def _compute_total_chunks(self, chunk_size):
         # type: (Descriptor, int) -> int
         """Compute total number of chunks for entity
@@ -346,6 +522,8 @@ class Descriptor(object):
         :rtype: int
         :return: num chunks
         """
+        if self._src_page_chunks is not None:
+            return len(self._src_page_chunks)
         try:
             if self._src_block_list is not None:
                 blen = len(self._src_block_list)
@@ -377,6 +555,13 @@ class Descriptor(object):
             logger.warning('resume length mismatch {} -> {}'.format(
                 rr.length, self._src_ase.size))
             return None
+        # ensure populated page ranges are the same
+        if (self._src_page_chunks is not None and
+                (rr.total_chunks != self._total_chunks or
+                 rr.chunk_size != self._chunk_size)):
+            logger.warning('resume page range mismatch for {}'.format(
+                self._src_ase.path))
+            return None
         # compute replica factor
         if blobxfer.util.is_not_empty(self._dst_ase.replica_targets):
             replica_factor = 1 + len(self._dst_ase.replica_targets)
@@ -394,6 +579,11 @@ class Descriptor(object):
                 self._total_chunks = rr.total_chunks
                 self._completed_chunks.int = rr.completed_chunks
                 self._outstanding_ops = 0
+                if self._src_page_chunks is not None:
+                    return (
+                        self._page_chunk_bytes(rr.total_chunks) *
+                        replica_factor
+                    )
                 return self._src_ase.size * replica_factor
         # re-hash from 0 to offset if needed
         _cc = bitstring.BitArray(length=rr.total_chunks)
@@ -418,6 +608,8 @@ class Descriptor(object):
                      self._src_ase.path, self._offset, self._chunk_num,
                      self._chunk_size, self._total_chunks,
                      self._outstanding_ops))
+            if self._src_page_chunks is not None:
+                return self._page_chunk_bytes(curr_chunk) * replica_factor
             return rr.offset * replica_factor
 
     def next_offsets(self):
@@ -431,7 +623,11 @@ class Descriptor(object):
         with self._meta_lock:
             if self._chunk_num >= self._total_chunks:
                 return None, resume_bytes
-            if self._chunk_size == -1 and self._src_block_list is not None:
+            range_start = self._offset
+            if self._src_page_chunks is not None:
+                range_start, num_bytes = self._src_page_chunks[
+                    self._chunk_num]
+            elif self._chunk_size == -1 and self._src_block_list is not None:
                 num_bytes = self._src_block_list[self._chunk_num].size
             else:
                 if self._offset + self._chunk_size > self._src_ase.size:
@@ -439,9 +635,8 @@ class Descriptor(object):
                 else:
                     num_bytes = self._chunk_size
             chunk_num = self._chunk_num
-            range_start = self._offset
-            range_end = self._offset + num_bytes - 1
-            self._offset += num_bytes
+            range_end = range_start + num_bytes - 1
+            self._offset = range_start + num_bytes
             self._chunk_num += 1
             return Offsets(
                 chunk_num=chunk_num,
@@ -25,6 +25,7 @@
 # stdlib imports
 import collections
 import enum
+import fnmatch
 import json
 import logging
 import math
@@ -86,15 +87,18 @@ class VectoredIoDistributionMode(enum.Enum):
 class LocalPath(object):
     """Local Path"""
 
-    def __init__(self, parent_path, relative_path, use_stdin=False, view=None):
+    def __init__(
+            self, parent_path, relative_path, use_stdin=False, view=None,
+            stat=None):
         # type: (LocalPath, pathlib.Path, pathlib.Path, bool,
-        #        LocalPathView) -> None
+        #        LocalPathView, os.stat_result) -> None
         """Ctor for LocalPath
         :param LocalPath self: this
         :param pathlib.Path parent_path: parent path
         :param pathlib.Path relative_path: relative path
         :param bool use_stdin: use stdin
         :param LocalPathView view: local path view
+        :param os.stat_result stat: stat result of the file, if known
         """
         self.parent_path = parent_path
         self.relative_path = relative_path
@@ -108,6 +112,8 @@ class LocalPath(object):
             self._stat.st_mode = 0
             self._stat.st_uid = 0
             self._stat.st_gid = 0
+        elif stat is not None:
+            self._stat = stat
         else:
             self._stat = self.absolute_path.stat()
         if view is None:
@@ -153,6 +159,16 @@ class LocalPath(object):
         """
         return self._stat.st_size
 
+    @property
+    def stat(self):
+        # type: (LocalPath) -> os.stat_result
+        """Stat result of file
+        :param LocalPath self: this
+        :rtype: os.stat_result
+        :return: stat result of file
+        """
+        return self._stat
+
     @property
     def lmt(self):
         # type: (LocalPath) -> int
@@ -222,11 +238,36 @@ class LocalSourcePath(blobxfer.models._BaseSourcePaths):
             return True
         return False
 
-    def files(self, dry_run):
-        # type: (LocalSourcePaths, bool) -> LocalPath
+    def _exclusion_prune(self, root, entry, dry_run):
+        # type: (LocalSourcePath, str, os.DirEntry, bool) -> bool
+        """Check if all files under a directory are excluded by filters.
+        Only exclude patterns ending with a wildcard can exclude every
+        descendant of a directory.
+        :param LocalSourcePath self: this
+        :param str root: root path prefix of entry
+        :param os.DirEntry entry: directory entry
+        :param bool dry_run: dry run
+        :rtype: bool
+        :return: if directory should not be descended into
+        """
+        if self._exclude is None:
+            return False
+        _rdir = entry.path[len(root):] + os.sep
+        for x in self._exclude:
+            if x.endswith('*') and fnmatch.fnmatch(_rdir, x):
+                if dry_run:
+                    logger.info(
+                        '[DRY RUN] skipping directory due to filters: '
+                        '{}'.format(_rdir))
+                return True
+        return False
+
+    def files(self, dry_run, scan_threads=1):
+        # type: (LocalSourcePaths, bool, int) -> LocalPath
         """Generator for files in paths
         :param LocalSourcePath self: this
         :param bool dry_run: dry run
+        :param int scan_threads: number of directory scanning threads
         :rtype: LocalPath
         :return: LocalPath
         """
@@ -256,8 +297,13 @@ class LocalSourcePath(blobxfer.models._BaseSourcePaths):
                         '[DRY RUN] skipping due to filters: {}'.format(tmp))
             else:
                 del tmp
-                for entry in blobxfer.util.scantree(_ppath):
-                    _rpath = pathlib.Path(entry.path).relative_to(_ppath)
+                _root = os.path.join(_ppath, '')
+                for entry in blobxfer.util.scantree(
+                        _ppath,
+                        prune=lambda x: self._exclusion_prune(
+                            _root, x, dry_run),
+                        num_threads=scan_threads):
+                    _rpath = pathlib.Path(entry.path[len(_root):])
                     if not self._inclusion_check(_rpath):
                         if dry_run:
                             logger.info(
@@ -268,6 +314,7 @@ class LocalSourcePath(blobxfer.models._BaseSourcePaths):
                         parent_path=_expath,
                         relative_path=_rpath,
                         use_stdin=False,
+                        stat=entry.stat(),
                     )
 
 
@@ -330,13 +377,20 @@ class Descriptor(object):
     """Upload Descriptor"""
 
     _AES_BLOCKSIZE = blobxfer.models.crypto.AES256_BLOCKSIZE_BYTES
+    _AES_GCM_REGION_OVERHEAD = \
+        blobxfer.models.crypto.AES256_GCM_REGION_OVERHEAD_BYTES
 
-    def __init__(self, lpath, ase, uid, options, general_options, resume_mgr):
+    def __init__(
+            self, lpath, ase, uid, options, general_options, resume_mgr,
+            fd_cache=None, buffer_pool=None, auto_chunk_size=None,
+            remote_blocks=None):
         # type: (Descriptior, LocalPath,
         #        blobxfer.models.azure.StorageEntity, str,
         #        blobxfer.models.options.Upload,
         #        blobxfer.models.options.General,
-        #        blobxfer.operations.resume.UploadResumeManager) -> None
+        #        blobxfer.operations.resume.UploadResumeManager,
+        #        blobxfer.models.filehandle.FileHandleCache,
+        #        blobxfer.models.buffer.BufferPool, int, list) -> None
         """Ctor for Descriptor
         :param Descriptor self: this
         :param LocalPath lpath: local path
@@ -346,14 +400,23 @@ class Descriptor(object):
         :param blobxfer.models.options.General general_options: general options
         :param blobxfer.operations.resume.UploadResumeManager resume_mgr:
             upload resume manager
+        :param blobxfer.models.filehandle.FileHandleCache fd_cache:
+            file handle cache
+        :param blobxfer.models.buffer.BufferPool buffer_pool: buffer pool
+        :param int auto_chunk_size: chunk size to start from if auto-selected
+        :param list remote_blocks: (hex digest, size) of committed blocks of
+            the remote block blob for delta uploads
         """
         self.local_path = lpath
         self.unique_id = uid
+        self._fd_cache = fd_cache
+        self._buffer_pool = buffer_pool
         self._verbose = general_options.verbose
         self._offset = 0
         self._chunk_num = 0
         self._next_integrity_chunk = 0
         self._finalized = False
+        self._finalize_claimed = False
         self._needs_resize = False
         self._meta_lock = threading.Lock()
         self._hasher_lock = threading.Lock()
@@ -363,21 +426,47 @@ class Descriptor(object):
         else:
             self._resume_mgr = resume_mgr
         self._ase = ase
+        self._rsa_private_key = options.rsa_private_key
         self._store_file_attr = options.store_file_properties.attributes
         self.current_iv = None
+        self._region_tags = {}
+        self._region_tags_hashed = 0
         self._initialize_encryption(options)
         # calculate the total number of ops required for transfer
         self._compute_remote_size(options)
-        self._adjust_chunk_size(options)
+        self._adjust_chunk_size(options, auto_chunk_size)
+        self._initialize_encrypted_regions()
+        self._initialize_delta(options, remote_blocks)
         self._total_chunks = self._compute_total_chunks(self._chunk_size)
         self._outstanding_ops = self._total_chunks
         if blobxfer.util.is_not_empty(self._ase.replica_targets):
             self._outstanding_ops *= len(self._ase.replica_targets) + 1
+        if self._resume_mgr and self.is_delta:
+            logger.debug(
+                'ignoring resume option for delta upload of {}'.format(
+                    self.local_path.absolute_path))
+            self._resume_mgr = None
+        # keys of encrypted uploads are recorded wrapped with the RSA
+        # public key and can only be unwrapped with the private key
+        if (self._resume_mgr and self._ase.is_encrypted and
+                self._rsa_private_key is None):
+            logger.debug(
+                'ignoring resume option for encrypted upload of {} without '
+                'an RSA private key'.format(self.local_path.absolute_path))
+            self._resume_mgr = None
         if self._resume_mgr:
             self._completed_chunks = bitstring.BitArray(
                 length=self._total_chunks)
             self._md5_cache = {}
+            self._md5_state_cache = {}
+            self._encryption_state_cache = {}
             self._replica_counters = {}
+        # keys of encrypted uploads are recorded to allow resume
+        if self._resume_mgr and self._ase.is_encrypted:
+            self._resume_encryption_keys = \
+                self._ase.encryption_metadata.convert_to_resume_json()
+        else:
+            self._resume_encryption_keys = None
         # initialize integrity checkers
         self.hmac = None
         self.md5 = None
@@ -414,6 +503,20 @@ class Descriptor(object):
         with self._meta_lock:
             return self._outstanding_ops == 0
 
+    def claim_finalization(self):
+        # type: (Descriptor) -> bool
+        """Claim finalization of the descriptor once all operations are
+        completed. Only the first caller may finalize.
+        :param Descriptor self: this
+        :rtype: bool
+        :return: if caller should finalize
+        """
+        with self._meta_lock:
+            if self._finalize_claimed or self._outstanding_ops != 0:
+                return False
+            self._finalize_claimed = True
+            return True
+
     @property
     def last_block_num(self):
         # type: (Descriptor) -> bool
@@ -426,6 +529,41 @@ class Descriptor(object):
         with self._meta_lock:
             return self._chunk_num - 1
 
+    @property
+    def is_delta(self):
+        # type: (Descriptor) -> bool
+        """Upload only sends blocks changed from the remote block blob
+        :param Descriptor self: this
+        :rtype: bool
+        :return: if delta upload
+        """
+        return self._block_digests is not None
+
+    @property
+    def delta_block_digests(self):
+        # type: (Descriptor) -> list
+        """Hex digests of all blocks in order, should only be called for
+        finalize operation
+        :param Descriptor self: this
+        :rtype: list
+        :return: block digests
+        """
+        with self._meta_lock:
+            return [
+                self._block_digests[x] for x in range(0, self._chunk_num)
+            ]
+
+    @property
+    def delta_unchanged(self):
+        # type: (Descriptor) -> tuple
+        """Number of blocks and bytes unchanged from the remote
+        :param Descriptor self: this
+        :rtype: tuple
+        :return: (unchanged blocks, unchanged bytes)
+        """
+        with self._meta_lock:
+            return (len(self._unchanged_blocks), self._unchanged_bytes)
+
     @property
     def is_resumable(self):
         # type: (Descriptor) -> bool
@@ -434,8 +572,10 @@ class Descriptor(object):
         :rtype: bool
         :return: if resumable
         """
-        return (self._resume_mgr is not None and self.hmac is None and
-                not self.remote_is_append_blob)
+        return (self._resume_mgr is not None and
+                not self.remote_is_append_blob and
+                (self.hmac is None or
+                 blobxfer.util.is_resumable_hasher(self.hmac)))
 
     @property
     def remote_is_file(self):
@@ -487,6 +627,17 @@ class Descriptor(object):
         """
         return self.remote_is_block_blob and self._total_chunks == 1
 
+    @property
+    def is_encrypted_in_regions(self):
+        # type: (Descriptor) -> bool
+        """Each chunk is encrypted as an independent region
+        :param Descriptor self: this
+        :rtype: bool
+        :return: if chunks are encrypted independently
+        """
+        return (self._ase.is_encrypted and
+                self._ase.encryption_metadata.is_chunked)
+
     @property
     def requires_put_block_list(self):
         # type: (Descriptor) -> bool
@@ -540,6 +691,53 @@ class Descriptor(object):
         with self._meta_lock:
             return (self._needs_resize, self._offset)
 
+    def compute_delta_block(self, offsets, data):
+        # type: (Descriptor, Offsets, bytes) -> bool
+        """Compute the digest of a block for a delta upload and check it
+        against the committed block at the same position
+        :param Descriptor self: this
+        :param Offsets offsets: upload offsets
+        :param bytes data: block data
+        :rtype: bool
+        :return: if block is unchanged and need not be uploaded
+        """
+        hasher = blobxfer.util.new_md5_hasher()
+        hasher.update(data)
+        digest = hasher.hexdigest()
+        with self._meta_lock:
+            self._block_digests[offsets.chunk_num] = digest
+            if self._remote_block_digests.get(offsets.chunk_num) != digest:
+                return False
+            self._unchanged_blocks.add(offsets.chunk_num)
+            self._unchanged_bytes += offsets.num_bytes
+            return True
+
+    def delta_block_digest(self, chunk_num):
+        # type: (Descriptor, int) -> str
+        """Get the digest of a block of a delta upload
+        :param Descriptor self: this
+        :param int chunk_num: chunk num
+        :rtype: str
+        :return: hex digest or None if not a delta upload
+        """
+        if self._block_digests is None:
+            return None
+        with self._meta_lock:
+            return self._block_digests[chunk_num]
+
+    def is_delta_block_unchanged(self, chunk_num):
+        # type: (Descriptor, int) -> bool
+        """Check if a block of a delta upload is unchanged
+        :param Descriptor self: this
+        :param int chunk_num: chunk num
+        :rtype: bool
+        :return: if block is unchanged
+        """
+        if self._block_digests is None:
+            return False
+        with self._meta_lock:
+            return chunk_num in self._unchanged_blocks
+
     def complete_offset_upload(self, chunk_num):
         # type: (Descriptor, int) -> None
         """Complete the upload for the offset
@@ -565,29 +763,54 @@ class Descriptor(object):
                         self._replica_counters.pop(chunk_num)
                 self._completed_chunks.set(True, chunk_num)
                 completed = self._outstanding_ops == 0
-                if not completed and self.must_compute_md5:
+                # hasher states are recorded for the last chunk of the
+                # consecutive run of completed chunks
+                if completed:
+                    last_consecutive = self._total_chunks - 1
+                else:
                     last_consecutive = (
                         self._completed_chunks.find('0b0')[0] - 1
                     )
-                    md5digest = self._md5_cache[last_consecutive]
+                if self.must_compute_md5:
+                    md5digest = self._md5_cache.get(last_consecutive)
+                    md5state = self._md5_state_cache.get(last_consecutive)
                 else:
                     md5digest = None
+                    md5state = None
+                hmacstate, enciv = self._encryption_state_cache.get(
+                    last_consecutive, (None, None))
+                file_size, file_mtime_ns = self._local_file_stamp()
                 self._resume_mgr.add_or_update_record(
                     self.local_path.absolute_path, self._ase, self._chunk_size,
                     self._total_chunks, self._completed_chunks.int, completed,
-                    md5digest,
+                    md5digest, md5_state=md5state, file_size=file_size,
+                    file_mtime_ns=file_mtime_ns,
+                    encryption_keys=self._resume_encryption_keys,
+                    encryption_iv=enciv, hmac_state=hmacstate,
                 )
-                # prune md5 cache
-                if self.must_compute_md5:
+                # prune hasher state caches
+                for cache in (self._md5_cache, self._md5_state_cache,
+                              self._encryption_state_cache):
                     if completed:
-                        self._md5_cache.clear()
-                    elif (len(self._md5_cache) >
-                          _MD5_CACHE_RESUME_ENTRIES_GC_THRESHOLD):
-                        mkeys = sorted(list(self._md5_cache.keys()))
-                        for key in mkeys:
+                        cache.clear()
+                    elif len(cache) > _MD5_CACHE_RESUME_ENTRIES_GC_THRESHOLD:
+                        for key in sorted(list(cache.keys())):
                             if key >= last_consecutive:
                                 break
-                            self._md5_cache.pop(key)
+                            cache.pop(key)
+
+    def _local_file_stamp(self):
+        # type: (Descriptor) -> tuple
+        """Size and modification time of the local file used to verify
+        that a recorded md5 hasher state is still valid on resume
+        :param Descriptor self: this
+        :rtype: tuple
+        :return: (size, mtime in nanoseconds)
+        """
+        return (
+            self.local_path.total_size,
+            getattr(self.local_path.stat, 'st_mtime_ns', None),
+        )
 
     def hmac_data(self, data):
         # type: (Descriptor, bytes) -> None
@@ -598,6 +821,53 @@ class Descriptor(object):
         with self._hasher_lock:
             self.hmac.update(data)
 
+    def add_region_tag(self, chunk_num, encdata):
+        # type: (Descriptor, int, bytes) -> None
+        """Retain the authentication tag of an encrypted region for the
+        MAC over all tags
+        :param Descriptor self: this
+        :param int chunk_num: chunk num of region
+        :param bytes encdata: encrypted region
+        """
+        with self._hasher_lock:
+            self._region_tags[chunk_num] = bytes(
+                encdata[-blobxfer.models.crypto.AES256_GCM_TAG_LENGTH_BYTES:])
+            if self.hmac is None:
+                return
+            # mac tags in order as they become contiguous
+            while self._region_tags_hashed in self._region_tags:
+                self.hmac.update(
+                    self._region_tags.pop(self._region_tags_hashed))
+                self._checkpoint_encryption_state(self._region_tags_hashed)
+                self._region_tags_hashed += 1
+
+    def _checkpoint_encryption_state(self, chunk_num):
+        # type: (Descriptor, int) -> None
+        """Retain the hmac state and chaining iv following a chunk for
+        resume. Hasher lock must be held by the caller.
+        :param Descriptor self: this
+        :param int chunk_num: chunk num
+        """
+        if not self.is_resumable:
+            return
+        state = blobxfer.util.export_hasher_state(self.hmac)
+        if state is not None:
+            self._encryption_state_cache[chunk_num] = (state, self.current_iv)
+
+    def complete_encrypted_chunk(self, chunk_num, encdata):
+        # type: (Descriptor, int, bytes) -> None
+        """Send an encrypted chunk through the hmac and chain the iv for
+        the next chunk
+        :param Descriptor self: this
+        :param int chunk_num: chunk num
+        :param bytes encdata: encrypted data
+        """
+        with self._hasher_lock:
+            self.hmac.update(encdata)
+            self.current_iv = \
+                encdata[-blobxfer.models.crypto.AES256_BLOCKSIZE_BYTES:]
+            self._checkpoint_encryption_state(chunk_num)
+
     def _initialize_encryption(self, options):
         # type: (Descriptor, blobxfer.models.options.Upload) -> None
         """Download is resume capable
@@ -608,7 +878,8 @@ class Descriptor(object):
                 (self._ase.mode == blobxfer.models.azure.StorageModes.Block or
                  self._ase.mode == blobxfer.models.azure.StorageModes.File)):
             em = blobxfer.models.crypto.EncryptionMetadata()
-            em.create_new_metadata(options.rsa_public_key)
+            em.create_new_metadata(
+                options.rsa_public_key, mode=options.encryption_mode)
             self.current_iv = em.content_encryption_iv
             self._ase.encryption_metadata = em
 
@@ -629,7 +900,8 @@ class Descriptor(object):
             else:
                 allocatesize = options.stdin_as_page_blob_size
         elif size > 0:
-            if self._ase.is_encrypted:
+            if (self._ase.is_encrypted and
+                    not self._ase.encryption_metadata.is_chunked):
                 # cipher_len_without_iv = (clear_len / aes_bs + 1) * aes_bs
                 allocatesize = (size // self._AES_BLOCKSIZE + 1) * \
                     self._AES_BLOCKSIZE
@@ -645,22 +917,27 @@ class Descriptor(object):
             logger.debug('remote size for {} is {} bytes'.format(
                 self._ase.path, self._ase.size))
 
-    def _adjust_chunk_size(self, options):
-        # type: (Descriptor, blobxfer.models.options.Upload) -> None
+    def _adjust_chunk_size(self, options, auto_chunk_size=None):
+        # type: (Descriptor, blobxfer.models.options.Upload, int) -> None
         """Adjust chunk size for entity mode
         :param Descriptor self: this
         :param blobxfer.models.options.Upload options: upload options
+        :param int auto_chunk_size: chunk size to start from if auto-selected
         """
         chunk_size = options.chunk_size_bytes
         # auto-select chunk size
         if chunk_size == 0:
             if self._ase.mode != blobxfer.models.azure.StorageModes.Block:
                 chunk_size = _MAX_NONBLOCK_BLOB_CHUNKSIZE_BYTES
+                if auto_chunk_size is not None:
+                    chunk_size = min((auto_chunk_size, chunk_size))
             else:
                 if self._ase.size == 0:
                     chunk_size = _MAX_NONBLOCK_BLOB_CHUNKSIZE_BYTES
                 else:
-                    chunk_size = _DEFAULT_AUTO_CHUNKSIZE_BYTES
+                    chunk_size = (
+                        auto_chunk_size or _DEFAULT_AUTO_CHUNKSIZE_BYTES
+                    )
                     while chunk_size < _MAX_BLOCK_BLOB_CHUNKSIZE_BYTES:
                         chunks = int(math.ceil(self._ase.size / chunk_size))
                         if chunks <= _MAX_NUM_CHUNKS:
@@ -721,6 +998,85 @@ class Descriptor(object):
                          'from {}').format(
                              self._chunk_size, self.local_path.absolute_path))
 
+    def _initialize_delta(self, options, remote_blocks):
+        # type: (Descriptor, blobxfer.models.options.Upload, list) -> None
+        """Initialize delta upload state, aligning the chunk size to the
+        block size of the remote so unchanged blocks line up
+        :param Descriptor self: this
+        :param blobxfer.models.options.Upload options: upload options
+        :param list remote_blocks: (hex digest, size) of committed blocks
+        """
+        self._block_digests = None
+        self._remote_block_digests = None
+        self._unchanged_blocks = set()
+        self._unchanged_bytes = 0
+        if (not options.delta or not self.remote_is_block_blob or
+                self._ase.is_encrypted or self.local_path.use_stdin or
+                blobxfer.util.is_not_empty(self._ase.replica_targets) or
+                self._chunk_size >= self._ase.size):
+            return
+        self._block_digests = {}
+        self._remote_block_digests = {}
+        if blobxfer.util.is_none_or_empty(remote_blocks):
+            return
+        digest, block_size = remote_blocks[0]
+        if (digest is not None and block_size != self._chunk_size and
+                0 < block_size < self._ase.size and
+                block_size <= _MAX_BLOCK_BLOB_CHUNKSIZE_BYTES and
+                math.ceil(self._ase.size / block_size) <= _MAX_NUM_CHUNKS):
+            if self._verbose:
+                logger.debug(
+                    ('adjusting chunk size to {} for delta upload to match '
+                     'remote blocks from {}').format(
+                         block_size, self.local_path.absolute_path))
+            self._chunk_size = block_size
+        # only blocks at the same offset as the local chunk can be reused
+        offset = 0
+        for i, (digest, block_size) in enumerate(remote_blocks):
+            if digest is not None and offset == i * self._chunk_size:
+                self._remote_block_digests[i] = digest
+            offset += block_size
+
+    def _initialize_encrypted_regions(self):
+        # type: (Descriptor) -> None
+        """Set the encrypted region size from the chunk size and expand
+        the chunk and remote sizes for the per-region overhead
+        :param Descriptor self: this
+        """
+        if not self.is_encrypted_in_regions:
+            return
+        if self._ase.mode == blobxfer.models.azure.StorageModes.Block:
+            # one-shot uploads larger than a block must remain one region
+            if (self._chunk_size > _MAX_BLOCK_BLOB_CHUNKSIZE_BYTES and
+                    self.local_path.size +
+                    Descriptor._AES_GCM_REGION_OVERHEAD <=
+                    _MAX_BLOCK_BLOB_ONESHOT_BYTES):
+                max_chunk_size = _MAX_BLOCK_BLOB_ONESHOT_BYTES
+            else:
+                max_chunk_size = _MAX_BLOCK_BLOB_CHUNKSIZE_BYTES
+        else:
+            max_chunk_size = _MAX_NONBLOCK_BLOB_CHUNKSIZE_BYTES
+        region_size = min(
+            (self._chunk_size,
+             max_chunk_size - Descriptor._AES_GCM_REGION_OVERHEAD))
+        regions = int(math.ceil(self.local_path.size / region_size))
+        self._ase.encryption_metadata.encrypted_region_size = region_size
+        self._chunk_size = region_size + Descriptor._AES_GCM_REGION_OVERHEAD
+        allocatesize = (
+            self.local_path.size +
+            regions * Descriptor._AES_GCM_REGION_OVERHEAD
+        )
+        self._ase.size = allocatesize
+        if blobxfer.util.is_not_empty(self._ase.replica_targets):
+            for rt in self._ase.replica_targets:
+                rt.size = allocatesize
+        if self._verbose:
+            logger.debug(
+                ('encrypted region size of {} for {}, remote size is '
+                 '{} bytes').format(
+                     region_size, self.local_path.absolute_path,
+                     allocatesize))
+
     def _compute_total_chunks(self, chunk_size):
         # type: (Descriptor, int) -> int
         """Compute total number of chunks for entity
@@ -778,7 +1134,96 @@ class Descriptor(object):
         # both hmac and md5 can be enabled
         if (options.store_file_properties.md5 and
                 not self.remote_is_append_blob):
-            self.md5 = blobxfer.util.new_md5_hasher()
+            self.md5 = blobxfer.util.new_resumable_md5_hasher()
+
+    def _restore_md5_state(self, rr):
+        # type: (Descriptor, blobxfer.models.resume.Upload) -> bool
+        """Restore the md5 hasher from the state in the resume record
+        if the local file is unchanged since the state was recorded
+        :param Descriptor self: this
+        :param blobxfer.models.resume.Upload rr: resume record
+        :rtype: bool
+        :return: if md5 hasher state was restored
+        """
+        if (rr.md5_state is None or
+                not blobxfer.util.resumable_hasher_supported()):
+            return False
+        file_size, file_mtime_ns = self._local_file_stamp()
+        if (file_mtime_ns is None or rr.file_size != file_size or
+                rr.file_mtime_ns != file_mtime_ns):
+            logger.debug(
+                'local file {} changed since md5 state was recorded'.format(
+                    self.local_path.absolute_path))
+            return False
+        try:
+            md5 = blobxfer.util.new_resumable_md5_hasher(rr.md5_state)
+        except ValueError as e:
+            logger.warning('invalid md5 state for {}: {}'.format(
+                self._ase.path, e))
+            return False
+        if md5.hexdigest() != rr.md5hexdigest:
+            logger.warning(
+                'md5 state does not match resume md5 for {}'.format(
+                    self._ase.path))
+            return False
+        with self._hasher_lock:
+            self.md5 = md5
+        return True
+
+    def _restore_encryption_state(self, rr, curr_chunk):
+        # type: (Descriptor, blobxfer.models.resume.Upload, int) -> bool
+        """Restore the encryption keys, hmac state and chaining iv from
+        the resume record
+        :param Descriptor self: this
+        :param blobxfer.models.resume.Upload rr: resume record
+        :param int curr_chunk: chunks already uploaded in order
+        :rtype: bool
+        :return: if encryption state was restored
+        """
+        em = self._ase.encryption_metadata
+        if rr.encryption_keys is None or (
+                curr_chunk > 0 and rr.hmac_state is None):
+            logger.debug('no encryption state to resume {}'.format(
+                self._ase.path))
+            return False
+        file_size, file_mtime_ns = self._local_file_stamp()
+        if (curr_chunk > 0 and (
+                file_mtime_ns is None or rr.file_size != file_size or
+                rr.file_mtime_ns != file_mtime_ns)):
+            logger.warning(
+                'local file {} changed since encryption state was '
+                'recorded'.format(self.local_path.absolute_path))
+            return False
+        if (not em.is_chunked and curr_chunk > 0 and
+                curr_chunk < rr.total_chunks and (
+                    rr.encryption_iv is None or
+                    len(rr.encryption_iv) != self._AES_BLOCKSIZE)):
+            logger.warning('invalid chaining iv to resume {}'.format(
+                self._ase.path))
+            return False
+        try:
+            em.convert_from_resume_json(
+                rr.encryption_keys, self._rsa_private_key)
+            if (em.is_chunked and rr.chunk_size !=
+                    em.encrypted_region_size +
+                    Descriptor._AES_GCM_REGION_OVERHEAD):
+                raise ValueError('region size mismatch')
+            hmac = em.initialize_hmac(
+                rr.hmac_state if curr_chunk > 0 else None)
+        except (RuntimeError, ValueError) as e:
+            logger.warning('cannot restore encryption state for {}: {}'.format(
+                self._ase.path, e))
+            return False
+        with self._hasher_lock:
+            self.hmac = hmac
+            if em.is_chunked or curr_chunk == 0:
+                self.current_iv = em.content_encryption_iv
+            else:
+                self.current_iv = rr.encryption_iv
+            self._region_tags.clear()
+            self._region_tags_hashed = curr_chunk
+        self._resume_encryption_keys = rr.encryption_keys
+        return True
 
     def _resume(self):
         # type: (Descriptor) -> int
@@ -806,6 +1251,14 @@ class Descriptor(object):
             replica_factor = 1
         # set offsets if completed
         if rr.completed:
+            # encrypted uploads are finalized with the recorded state
+            if self._ase.is_encrypted and not (
+                    self._restore_encryption_state(rr, rr.total_chunks) and
+                    (self.md5 is None or self._restore_md5_state(rr))):
+                logger.warning(
+                    'cannot finalize completed encrypted upload {}'.format(
+                        self._ase.path))
+                return None
             with self._meta_lock:
                 logger.debug('{} upload already completed'.format(
                     self._ase.path))
@@ -813,12 +1266,16 @@ class Descriptor(object):
                 self._chunk_num = rr.total_chunks
                 self._chunk_size = rr.chunk_size
                 self._total_chunks = rr.total_chunks
+                # the chunk size recorded may differ from the one selected
+                self._completed_chunks = bitstring.BitArray(
+                    length=rr.total_chunks)
                 self._completed_chunks.int = rr.completed_chunks
                 self._outstanding_ops = 0
                 return self._ase.size * replica_factor
-        # encrypted files are not resumable due to hmac requirement
-        if self._ase.is_encrypted:
-            logger.debug('cannot resume encrypted entity {}'.format(
+        # encrypted uploads require the recorded keys and hmac state
+        if self._ase.is_encrypted and (
+                rr.encryption_keys is None or self.hmac is None):
+            logger.debug('no encryption state to resume {}'.format(
                 self._ase.path))
             return None
         # check if path exists
@@ -833,20 +1290,33 @@ class Descriptor(object):
         del _cc
         _fd_offset = 0
         _end_offset = min((curr_chunk * rr.chunk_size, rr.length))
-        if self.md5 is not None and curr_chunk > 0:
+        if self.is_encrypted_in_regions:
+            # md5 is over the local file excluding region overhead
+            _md5_end_offset = min((
+                curr_chunk * (
+                    rr.chunk_size - Descriptor._AES_GCM_REGION_OVERHEAD),
+                self.local_path.size))
+        else:
+            _md5_end_offset = _end_offset
+        if (self.md5 is not None and curr_chunk > 0 and
+                self._restore_md5_state(rr)):
+            logger.debug(
+                'restored md5 state for {} at offset {}'.format(
+                    self._ase.path, _md5_end_offset))
+        elif self.md5 is not None and curr_chunk > 0:
             _blocksize = blobxfer.util.MEGABYTE << 2
             logger.debug(
                 'integrity checking existing file {} offset {} -> {}'.format(
                     self._ase.path,
                     self.local_path.view.fd_start,
-                    self.local_path.view.fd_start + _end_offset)
+                    self.local_path.view.fd_start + _md5_end_offset)
             )
             with self._hasher_lock:
                 with self.local_path.absolute_path.open('rb') as filedesc:
                     filedesc.seek(self.local_path.view.fd_start, 0)
-                    while _fd_offset < _end_offset:
-                        if (_fd_offset + _blocksize) > _end_offset:
-                            _blocksize = _end_offset - _fd_offset
+                    while _fd_offset < _md5_end_offset:
+                        if (_fd_offset + _blocksize) > _md5_end_offset:
+                            _blocksize = _md5_end_offset - _fd_offset
                         _buf = filedesc.read(_blocksize)
                         self.md5.update(_buf)
                         _fd_offset += _blocksize
@@ -858,8 +1328,13 @@ class Descriptor(object):
                     'MD5 mismatch resume={} computed={} for {}'.format(
                         rr.md5hexdigest, hexdigest, self._ase.path))
                 # reset hasher
-                self.md5 = blobxfer.util.new_md5_hasher()
+                self.md5 = blobxfer.util.new_resumable_md5_hasher()
                 return None
+        if (self._ase.is_encrypted and
+                not self._restore_encryption_state(rr, curr_chunk)):
+            if self.md5 is not None:
+                self.md5 = blobxfer.util.new_resumable_md5_hasher()
+            return None
         # set values from resume
         with self._meta_lock:
             self._offset = _end_offset
@@ -899,7 +1374,9 @@ class Descriptor(object):
             range_end = self._offset + num_bytes - 1
             self._offset += num_bytes
             self._chunk_num += 1
-            if self._ase.is_encrypted and self._offset >= self._ase.size:
+            if (self._ase.is_encrypted and
+                    not self._ase.encryption_metadata.is_chunked and
+                    self._offset >= self._ase.size):
                 pad = True
             else:
                 pad = False
@@ -911,9 +1388,95 @@ class Descriptor(object):
                 pad=pad,
             ), resume_bytes
 
+    def _use_buffer_pool(self, offsets):
+        # type: (Descriptor, Offsets) -> bool
+        """Check if data for offsets should be read into a pooled buffer.
+        Pooled buffers are only used where the data is transformed before
+        upload as request bodies must be converted to bytes.
+        :param Descriptor self: this
+        :param Offsets offsets: offsets
+        :rtype: bool
+        :return: if buffer pool should be used
+        """
+        if self._buffer_pool is None or self._fd_cache is None:
+            return False
+        if self._ase.is_encrypted:
+            return True
+        return (
+            self._ase.mode == blobxfer.models.azure.StorageModes.Page and
+            blobxfer.util.page_align_content_length(
+                offsets.num_bytes) != offsets.num_bytes
+        )
+
+    @staticmethod
+    def max_encrypted_region_chunk_size(options):
+        # type: (blobxfer.models.options.Upload) -> int
+        """Maximum chunk size of regions encrypted independently for the
+        chunk size requested by upload options
+        :param blobxfer.models.options.Upload options: upload options
+        :rtype: int
+        :return: maximum chunk size in bytes including region overhead
+        """
+        if options.chunk_size_bytes is None or options.chunk_size_bytes < 1:
+            chunk_size = _DEFAULT_AUTO_CHUNKSIZE_BYTES
+        else:
+            chunk_size = min(
+                (options.chunk_size_bytes,
+                 _MAX_BLOCK_BLOB_CHUNKSIZE_BYTES -
+                 Descriptor._AES_GCM_REGION_OVERHEAD))
+        return chunk_size + Descriptor._AES_GCM_REGION_OVERHEAD
+
+    def compute_read_range(self, offsets):
+        # type: (Descriptor, Offsets) -> Tuple[int, int]
+        """Compute the local file range to read for the offsets. Offsets
+        of chunks encrypted in regions refer to the remote entity, which
+        is larger than the local file by the per-region overhead.
+        :param Descriptor self: this
+        :param Offsets offsets: offsets
+        :rtype: tuple
+        :return: (file offset to read from, number of bytes)
+        """
+        if self.is_encrypted_in_regions:
+            start = (
+                offsets.chunk_num *
+                self._ase.encryption_metadata.encrypted_region_size
+            )
+            num_bytes = offsets.num_bytes - Descriptor._AES_GCM_REGION_OVERHEAD
+        else:
+            start = offsets.range_start
+            num_bytes = offsets.num_bytes
+        return self.local_path.view.fd_start + start, num_bytes
+
+    def _read_data_into_buffer(self, start, num_bytes):
+        # type: (Descriptor, int, int) -> memoryview
+        """Read data from file into a pooled buffer with capacity for
+        encryption padding or page alignment
+        :param Descriptor self: this
+        :param int start: file offset to read from
+        :param int num_bytes: number of bytes to read
+        :rtype: memoryview
+        :return: view of data read
+        """
+        if self.is_encrypted_in_regions:
+            capacity = num_bytes
+        elif self._ase.is_encrypted:
+            capacity = num_bytes + Descriptor._AES_BLOCKSIZE
+        else:
+            capacity = blobxfer.util.page_align_content_length(num_bytes)
+        buf = self._buffer_pool.acquire(capacity)
+        try:
+            nread = self._fd_cache.preadinto(
+                self.local_path.absolute_path, start,
+                buf[:num_bytes], view=self.local_path.view)
+        except Exception:
+            self._buffer_pool.release(buf)
+            raise
+        return buf[:nread]
+
     def read_data(self, offsets):
         # type: (Descriptor, Offsets) -> Tuple[bytes, Offsets]
-        """Read data from file
+        """Read data from file. Data is returned as a memoryview of a
+        pooled buffer if a buffer pool is used for the offsets.
         :param Descriptor self: this
         :param Offsets offsets: offsets
         :rtype: tuple
@@ -924,12 +1487,19 @@ class Descriptor(object):
             if offsets.num_bytes == 0:
                 return None, None
             # compute start from view
-            start = self.local_path.view.fd_start + offsets.range_start
+            start, num_bytes = self.compute_read_range(offsets)
             # encrypted offsets will read past the end of the file due
             # to padding, but will be accounted for after encryption+padding
-            with self.local_path.absolute_path.open('rb') as fd:
-                fd.seek(start, 0)
-                data = fd.read(offsets.num_bytes)
+            if self._use_buffer_pool(offsets):
+                data = self._read_data_into_buffer(start, num_bytes)
+            elif self._fd_cache is not None:
+                data = self._fd_cache.pread(
+                    self.local_path.absolute_path, start, num_bytes,
+                    view=self.local_path.view)
+            else:
+                with self.local_path.absolute_path.open('rb') as fd:
+                    fd.seek(start, 0)
+                    data = fd.read(num_bytes)
         else:
             data = blobxfer.STDIN.read(self._chunk_size)
             if not data:
@@ -960,6 +1530,9 @@ class Descriptor(object):
                 self.md5.update(data)
                 if self.is_resumable:
                     self._md5_cache[self._chunk_num - 1] = self.md5.hexdigest()
+                    md5state = blobxfer.util.export_hasher_state(self.md5)
+                    if md5state is not None:
+                        self._md5_state_cache[self._chunk_num - 1] = md5state
         return data, newoffset
 
     def generate_metadata(self):
@@ -986,7 +1559,15 @@ class Descriptor(object):
                     self.md5.digest())
             else:
                 md5digest = None
-            if self.hmac is not None:
+            if self.hmac is not None and self.is_encrypted_in_regions:
+                # mac over the region tags in order
+                with self._hasher_lock:
+                    hmac = self.hmac.copy()
+                    for chunk_num in sorted(self._region_tags.keys()):
+                        hmac.update(self._region_tags[chunk_num])
+                hmacdigest = blobxfer.util.base64_encode_as_string(
+                    hmac.digest())
+            elif self.hmac is not None:
                 hmacdigest = blobxfer.util.base64_encode_as_string(
                     self.hmac.digest())
             else:
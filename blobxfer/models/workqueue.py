@@ -0,0 +1,366 @@
+# Copyright (c) Microsoft Corporation
+#
+# All rights reserved.
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+# stdlib imports
+import collections
+import queue
+import threading
+# non-stdlib imports
+# local imports
+
+
+class WorkQueue(queue.Queue):
+    """Work queue with blocking retrieval and a termination signal"""
+    def __init__(self, maxsize=0):
+        # type: (WorkQueue, int) -> None
+        """Ctor for WorkQueue
+        :param WorkQueue self: this
+        :param int maxsize: maximum queue size
+        """
+        super(WorkQueue, self).__init__(maxsize=maxsize)
+        self._terminated = False
+
+    @property
+    def terminated(self):
+        # type: (WorkQueue) -> bool
+        """Check if terminated
+        :param WorkQueue self: this
+        :rtype: bool
+        :return: if terminated
+        """
+        with self.mutex:
+            return self._terminated
+
+    def get(self, block=True, timeout=None):
+        # type: (WorkQueue, bool, float) -> object
+        """Get an item from the queue. If blocking, waits until an item
+        is available or the queue is terminated.
+        :param WorkQueue self: this
+        :param bool block: block until an item is available
+        :param float timeout: timeout for blocking
+        :rtype: object
+        :return: item
+        """
+        with self.not_empty:
+            if block:
+                self.not_empty.wait_for(
+                    lambda: self._qsize() > 0 or self._terminated, timeout)
+            if self._qsize() == 0:
+                raise queue.Empty()
+            item = self._get()
+            self.not_full.notify()
+            return item
+
+    def terminate(self):
+        # type: (WorkQueue) -> None
+        """Terminate the queue and wake all blocked consumers
+        :param WorkQueue self: this
+        """
+        with self.mutex:
+            self._terminated = True
+            self.not_empty.notify_all()
+
+
+class Backpressure(object):
+    """Condition-driven backpressure for state guarded by a lock"""
+    def __init__(self, lock):
+        # type: (Backpressure, threading.Lock) -> None
+        """Ctor for Backpressure
+        :param Backpressure self: this
+        :param threading.Lock lock: lock guarding the monitored state
+        """
+        self._cv = threading.Condition(lock)
+        self._terminated = False
+
+    @property
+    def terminated(self):
+        # type: (Backpressure) -> bool
+        """Check if terminated
+        :param Backpressure self: this
+        :rtype: bool
+        :return: if terminated
+        """
+        return self._terminated
+
+    def notify(self):
+        # type: (Backpressure) -> None
+        """Notify waiters that monitored state has changed. The guarding
+        lock must be held by the caller.
+        :param Backpressure self: this
+        """
+        self._cv.notify_all()
+
+    def wait(self, predicate):
+        # type: (Backpressure, function) -> bool
+        """Wait until predicate is satisfied or terminated. The predicate
+        is evaluated with the guarding lock held.
+        :param Backpressure self: this
+        :param function predicate: predicate to satisfy
+        :rtype: bool
+        :return: True if predicate was satisfied, False if terminated
+        """
+        with self._cv:
+            self._cv.wait_for(lambda: self._terminated or predicate())
+            return not self._terminated
+
+    def terminate(self):
+        # type: (Backpressure) -> None
+        """Terminate and wake all waiters
+        :param Backpressure self: this
+        """
+        with self._cv:
+            self._terminated = True
+            self._cv.notify_all()
+
+
+class MemoryBudget(object):
+    """Byte budget for in-flight data shared by worker threads"""
+    def __init__(self, max_bytes):
+        # type: (MemoryBudget, int) -> None
+        """Ctor for MemoryBudget
+        :param MemoryBudget self: this
+        :param int max_bytes: maximum in-flight bytes, 0 for unlimited
+        """
+        if not isinstance(max_bytes, int) or max_bytes < 0:
+            max_bytes = 0
+        self._cv = threading.Condition()
+        self._max_bytes = max_bytes
+        self._in_use = 0
+        self._peak = 0
+        self._terminated = False
+
+    @property
+    def limited(self):
+        # type: (MemoryBudget) -> bool
+        """Check if budget is limited
+        :param MemoryBudget self: this
+        :rtype: bool
+        :return: if budget is limited
+        """
+        return self._max_bytes > 0
+
+    @property
+    def max_bytes(self):
+        # type: (MemoryBudget) -> int
+        """Maximum in-flight bytes
+        :param MemoryBudget self: this
+        :rtype: int
+        :return: maximum in-flight bytes, 0 for unlimited
+        """
+        return self._max_bytes
+
+    @property
+    def in_use(self):
+        # type: (MemoryBudget) -> int
+        """Bytes currently in-flight
+        :param MemoryBudget self: this
+        :rtype: int
+        :return: bytes in-flight
+        """
+        with self._cv:
+            return self._in_use
+
+    @property
+    def peak(self):
+        # type: (MemoryBudget) -> int
+        """Peak bytes in-flight
+        :param MemoryBudget self: this
+        :rtype: int
+        :return: peak bytes in-flight
+        """
+        with self._cv:
+            return self._peak
+
+    def acquire(self, nbytes):
+        # type: (MemoryBudget, int) -> bool
+        """Acquire bytes from the budget, waiting until enough bytes are
+        available or terminated. A request larger than the budget is
+        granted once nothing else is in-flight.
+        :param MemoryBudget self: this
+        :param int nbytes: number of bytes
+        :rtype: bool
+        :return: True if acquired, False if terminated
+        """
+        with self._cv:
+            if self._max_bytes > 0:
+                self._cv.wait_for(
+                    lambda: self._terminated or self._in_use == 0 or
+                    self._in_use + nbytes <= self._max_bytes)
+            if self._terminated:
+                return False
+            self._in_use += nbytes
+            if self._in_use > self._peak:
+                self._peak = self._in_use
+            return True
+
+    def try_acquire(self, nbytes, force=False):
+        # type: (MemoryBudget, int, bool) -> bool
+        """Acquire bytes from the budget without waiting
+        :param MemoryBudget self: this
+        :param int nbytes: number of bytes
+        :param bool force: acquire even if the budget is exceeded
+        :rtype: bool
+        :return: True if acquired
+        """
+        with self._cv:
+            if self._terminated:
+                return False
+            if (not force and self._max_bytes > 0 and self._in_use > 0 and
+                    self._in_use + nbytes > self._max_bytes):
+                return False
+            self._in_use += nbytes
+            if self._in_use > self._peak:
+                self._peak = self._in_use
+            return True
+
+    def release(self, nbytes):
+        # type: (MemoryBudget, int) -> None
+        """Release bytes back to the budget
+        :param MemoryBudget self: this
+        :param int nbytes: number of bytes
+        """
+        with self._cv:
+            self._in_use -= nbytes
+            self._cv.notify_all()
+
+    def terminate(self):
+        # type: (MemoryBudget) -> None
+        """Terminate and wake all waiters
+        :param MemoryBudget self: this
+        """
+        with self._cv:
+            self._terminated = True
+            self._cv.notify_all()
+
+
+class RelayPipe(object):
+    """Bounded byte pipe from a producer thread to a consumer thread. The
+    consumer side is a non-seekable file-like object of a fixed length."""
+    def __init__(self, length, max_bytes):
+        # type: (RelayPipe, int, int) -> None
+        """Ctor for RelayPipe
+        :param RelayPipe self: this
+        :param int length: total number of bytes to pass through the pipe
+        :param int max_bytes: maximum buffered bytes
+        """
+        self._cv = threading.Condition()
+        self._buffer = collections.deque()
+        self._buffered = 0
+        self._length = length
+        self._max_bytes = max_bytes
+        self._closed = False
+        self._error = None
+
+    def __len__(self):
+        # type: (RelayPipe) -> int
+        """Total length of data
+        :param RelayPipe self: this
+        :rtype: int
+        :return: length
+        """
+        return self._length
+
+    @property
+    def error(self):
+        # type: (RelayPipe) -> Exception
+        """Exception the pipe was aborted with
+        :param RelayPipe self: this
+        :rtype: Exception
+        :return: exception or None
+        """
+        with self._cv:
+            return self._error
+
+    def write(self, data):
+        # type: (RelayPipe, bytes) -> bool
+        """Write data, waiting while the buffer is full
+        :param RelayPipe self: this
+        :param bytes data: data
+        :rtype: bool
+        :return: True if written, False if aborted
+        """
+        with self._cv:
+            self._cv.wait_for(
+                lambda: self._error is not None or
+                self._buffered < self._max_bytes)
+            if self._error is not None:
+                return False
+            self._buffer.append(data)
+            self._buffered += len(data)
+            self._cv.notify_all()
+            return True
+
+    def close(self):
+        # type: (RelayPipe) -> None
+        """Signal end of data
+        :param RelayPipe self: this
+        """
+        with self._cv:
+            self._closed = True
+            self._cv.notify_all()
+
+    def abort(self, exc):
+        # type: (RelayPipe, Exception) -> None
+        """Abort the pipe, discarding buffered data and waking the
+        producer and consumer
+        :param RelayPipe self: this
+        :param Exception exc: exception to raise in the consumer
+        """
+        with self._cv:
+            if self._error is None:
+                self._error = exc
+            self._buffer.clear()
+            self._buffered = 0
+            self._cv.notify_all()
+
+    def read(self, size=-1):
+        # type: (RelayPipe, int) -> bytes
+        """Read up to size bytes, waiting until size bytes are buffered or
+        the pipe is closed. Reads are limited to the buffer size.
+        :param RelayPipe self: this
+        :param int size: number of bytes to read
+        :rtype: bytes
+        :return: data, empty if the pipe is closed and drained
+        """
+        with self._cv:
+            if size is None or size < 0 or size > self._max_bytes:
+                size = self._max_bytes
+            self._cv.wait_for(
+                lambda: self._error is not None or self._closed or
+                self._buffered >= size)
+            if self._error is not None:
+                raise self._error
+            parts = []
+            nbytes = 0
+            while nbytes < size and len(self._buffer) > 0:
+                data = self._buffer.popleft()
+                if nbytes + len(data) > size:
+                    split = size - nbytes
+                    self._buffer.appendleft(data[split:])
+                    data = data[:split]
+                parts.append(data)
+                nbytes += len(data)
+            self._buffered -= nbytes
+            self._cv.notify_all()
+            return b''.join(parts)
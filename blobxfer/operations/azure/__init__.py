@@ -25,7 +25,10 @@
 # stdlib imports
 import logging
 import re
+import time
 # non-stdlib imports
+import azure.storage.common._http
+import azure.storage.common.models
 import requests
 # local imports
 import blobxfer.models
@@ -36,6 +39,7 @@ import blobxfer.operations.azure.blob.append
 import blobxfer.operations.azure.blob.block
 import blobxfer.operations.azure.blob.page
 import blobxfer.operations.azure.file
+import blobxfer.retry
 import blobxfer.util
 
 # create logger
@@ -143,6 +147,8 @@ class StorageAccount(object):
                 self.name, self.endpoint, self.is_sas,
                 self.can_create_containers, self.can_list_container_objects,
                 self.can_read_object, self.can_write_object))
+        # coordinate throttling of all requests against the account
+        self.throttle = blobxfer.retry.AccountThrottle(self.name)
         # create requests session for connection pooling
         self.session = requests.Session()
         self.session.mount(
@@ -738,3 +744,67 @@ class DestinationPath(blobxfer.models._BaseSourcePaths):
         :return: storage account associated with path
         """
         return self._path_map[blobxfer.util.normalize_azure_path(remote_path)]
+
+
+def get_source_range_stream(src_ase, offsets, timeout=None):
+    # type: (blobxfer.models.azure.StorageEntity,
+    #        blobxfer.models.upload.Offsets, int) -> requests.Response
+    """Open a ranged read of a blob or file without reading the response
+    body. Each attempt is admitted by the request callback of the client
+    which coordinates throttling across the storage account, and failed
+    attempts are retried with the retry policy of the client.
+    :param blobxfer.models.azure.StorageEntity src_ase:
+        Source Azure StorageEntity
+    :param blobxfer.models.upload.Offsets offsets: range offsets
+    :param int timeout: timeout
+    :rtype: requests.Response
+    :return: response with unread body
+    """
+    params = None
+    if src_ase.snapshot is not None:
+        if src_ase.mode == blobxfer.models.azure.StorageModes.File:
+            params = {'sharesnapshot': src_ase.snapshot}
+        else:
+            params = {'snapshot': src_ase.snapshot}
+    client = src_ase.client
+    httpclient = client._httpclient
+    url = blobxfer.operations.azure.blob.block.get_source_url(src_ase)
+    context = azure.storage.common.models.RetryContext()
+    while True:
+        if client.request_callback is not None:
+            client.request_callback(None)
+        context.response = None
+        try:
+            response = httpclient.session.get(
+                url,
+                params=params,
+                headers={
+                    'Range': 'bytes={}-{}'.format(
+                        offsets.range_start, offsets.range_end),
+                },
+                stream=True,
+                timeout=timeout or httpclient.timeout,
+                proxies=httpclient.proxies,
+            )
+        except requests.RequestException as e:
+            context.exception = e
+        else:
+            if response.status_code == 206:
+                return response
+            # release the connection before any retry
+            response.close()
+            context.exception = RuntimeError(
+                'unexpected status {} for range {}-{} of {}'.format(
+                    response.status_code, offsets.range_start,
+                    offsets.range_end, src_ase.path))
+            # a successful response which ignores the range cannot be
+            # retried
+            if response.status_code < 300:
+                raise context.exception
+            context.response = azure.storage.common._http.HTTPResponse(
+                response.status_code, response.reason,
+                {k.lower(): v for k, v in response.headers.items()}, None)
+        backoff = client.retry(context)
+        if backoff is None:
+            raise context.exception
+        time.sleep(backoff)
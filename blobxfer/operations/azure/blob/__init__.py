@@ -141,19 +141,20 @@ def list_blobs(client, container, prefix, mode, recursive, timeout=None):
         yield blob
 
 
-def list_all_blobs(client, container, timeout=None):
-    # type: (azure.storage.blob.BaseBlobService, str, int) ->
+def list_all_blobs(client, container, timeout=None, prefix=None):
+    # type: (azure.storage.blob.BaseBlobService, str, int, str) ->
     #        azure.storage.blob.models.Blob
     """List all blobs in a container
     :param azure.storage.blob.BaseBlobService client: blob client
     :param str container: container
     :param int timeout: timeout
+    :param str prefix: name prefix to list blobs under
     :rtype: azure.storage.blob.models.Blob
     :return: generator of blobs
     """
     blobs = client.list_blobs(
         container_name=container,
-        prefix=None,
+        prefix=prefix,
         timeout=timeout,
     )
     for blob in blobs:
@@ -222,13 +223,16 @@ def create_container(ase, containers_created, timeout=None):
 
 
 def set_blob_properties(ase, md5, timeout=None):
-    # type: (blobxfer.models.azure.StorageEntity, str, int) -> None
+    # type: (blobxfer.models.azure.StorageEntity, str, int) ->
+    #        azure.storage.blob.models.ResourceProperties
     """Set blob properties
     :param blobxfer.models.azure.StorageEntity ase: Azure StorageEntity
     :param str md5: md5 as base64
     :param int timeout: timeout
+    :rtype: azure.storage.blob.models.ResourceProperties
+    :return: properties of the updated blob
     """
-    ase.client.set_blob_properties(
+    return ase.client.set_blob_properties(
         container_name=ase.container,
         blob_name=ase.name,
         content_settings=azure.storage.blob.models.ContentSettings(
@@ -240,14 +244,62 @@ def set_blob_properties(ase, md5, timeout=None):
 
 
 def set_blob_metadata(ase, metadata, timeout=None):
-    # type: (blobxfer.models.azure.StorageEntity, dict, int) -> None
+    # type: (blobxfer.models.azure.StorageEntity, dict, int) ->
+    #        azure.storage.blob.models.ResourceProperties
     """Set blob metadata
     :param blobxfer.models.azure.StorageEntity ase: Azure StorageEntity
     :param dict metadata: metadata kv pairs
     :param int timeout: timeout
+    :rtype: azure.storage.blob.models.ResourceProperties
+    :return: properties of the updated blob
     """
-    ase.client.set_blob_metadata(
+    return ase.client.set_blob_metadata(
         container_name=ase.container,
         blob_name=ase.name,
         metadata=metadata,
         timeout=timeout)  # noqa
+
+
+def start_copy_blob(src_url, ase, timeout=None):
+    # type: (str, blobxfer.models.azure.StorageEntity, int) -> str
+    """Start an asynchronous server side copy of a whole blob
+    :param str src_url: authorized source URL
+    :param blobxfer.models.azure.StorageEntity ase: Azure StorageEntity
+    :param int timeout: timeout
+    :rtype: str
+    :return: copy id
+    """
+    return ase.client.copy_blob(
+        container_name=ase.container,
+        blob_name=ase.name,
+        copy_source=src_url,
+        timeout=timeout).id
+
+
+def get_copy_properties(ase, timeout=None):
+    # type: (blobxfer.models.azure.StorageEntity, int) ->
+    #        azure.storage.blob.models.CopyProperties
+    """Get the properties of the last copy to a blob
+    :param blobxfer.models.azure.StorageEntity ase: Azure StorageEntity
+    :param int timeout: timeout
+    :rtype: azure.storage.blob.models.CopyProperties
+    :return: copy properties
+    """
+    return ase.client.get_blob_properties(
+        container_name=ase.container,
+        blob_name=ase.name,
+        timeout=timeout).properties.copy
+
+
+def abort_copy_blob(ase, copy_id, timeout=None):
+    # type: (blobxfer.models.azure.StorageEntity, str, int) -> None
+    """Abort a pending asynchronous copy to a blob
+    :param blobxfer.models.azure.StorageEntity ase: Azure StorageEntity
+    :param str copy_id: copy id
+    :param int timeout: timeout
+    """
+    ase.client.abort_copy_blob(
+        container_name=ase.container,
+        blob_name=ase.name,
+        copy_id=copy_id,
+        timeout=timeout)  # noqa
@@ -63,9 +63,11 @@ def create_client(storage_account, timeout, proxy):
     if proxy is not None:
         client.set_proxy(
             proxy.host, proxy.port, proxy.username, proxy.password)
-    # set retry policy
+    # set retry policy and coordinate throttling across the account
     client.retry = blobxfer.retry.ExponentialRetryWithMaxWait(
-        max_retries=timeout.max_retries).retry
+        max_retries=timeout.max_retries,
+        throttle=storage_account.throttle).retry
+    client.request_callback = storage_account.throttle.acquire
     return client
 
 
@@ -25,14 +25,75 @@
 # stdlib imports
 import datetime
 import logging
+import re
+import threading
 # non-stdlib imports
 import azure.storage.blob
+import azure.storage.file
 # local imports
 import blobxfer.models.azure
 import blobxfer.retry
+import blobxfer.util
 
 # create logger
 logger = logging.getLogger(__name__)
+# global defines
+_SOURCE_SAS_VALIDITY = datetime.timedelta(days=7)
+_SOURCE_SAS_REFRESH_MARGIN = datetime.timedelta(hours=1)
+_DIGEST_BLOCK_ID_REGEX = re.compile(r'^\d{8}-([0-9a-f]{32})$')
+
+
+class _SourceSasCache(object):
+    """Cache of read-only container and share SAS tokens for sources of
+    server side copies, so a token is not generated for every block"""
+    def __init__(self):
+        # type: (_SourceSasCache) -> None
+        """Ctor for _SourceSasCache
+        :param _SourceSasCache self: this
+        """
+        self._lock = threading.Lock()
+        self._tokens = {}
+
+    def get(self, src_ase):
+        # type: (_SourceSasCache,
+        #        blobxfer.models.azure.StorageEntity) -> str
+        """Get a SAS token for the container or share of the source,
+        generating a new token if none exists or it expires soon
+        :param _SourceSasCache self: this
+        :param blobxfer.models.azure.StorageEntity src_ase:
+            Source Azure StorageEntity
+        :rtype: str
+        :return: SAS token
+        """
+        is_file = src_ase.mode == blobxfer.models.azure.StorageModes.File
+        key = (src_ase.client.primary_endpoint, src_ase.container, is_file)
+        now = datetime.datetime.utcnow()
+        with self._lock:
+            token = self._tokens.get(key)
+            if (token is not None and
+                    token[1] - now > _SOURCE_SAS_REFRESH_MARGIN):
+                return token[0]
+            expiry = now + _SOURCE_SAS_VALIDITY
+            if is_file:
+                sas = src_ase.client.generate_share_shared_access_signature(
+                    share_name=src_ase.container,
+                    permission=azure.storage.file.SharePermissions(
+                        read=True),
+                    expiry=expiry,
+                )
+            else:
+                sas = src_ase.client.\
+                    generate_container_shared_access_signature(
+                        container_name=src_ase.container,
+                        permission=azure.storage.blob.ContainerPermissions(
+                            read=True),
+                        expiry=expiry,
+                    )
+            self._tokens[key] = (sas, expiry)
+            return sas
+
+
+_SOURCE_SAS_CACHE = _SourceSasCache()
 
 
 def create_client(storage_account, timeout, proxy):
@@ -65,23 +126,27 @@ def create_client(storage_account, timeout, proxy):
     if proxy is not None:
         client.set_proxy(
             proxy.host, proxy.port, proxy.username, proxy.password)
-    # set retry policy
+    # set retry policy and coordinate throttling across the account
     client.retry = blobxfer.retry.ExponentialRetryWithMaxWait(
-        max_retries=timeout.max_retries).retry
+        max_retries=timeout.max_retries,
+        throttle=storage_account.throttle).retry
+    client.request_callback = storage_account.throttle.acquire
     return client
 
 
 def create_blob(ase, data, md5, metadata, timeout=None):
     # type: (blobxfer.models.azure.StorageEntity, bytes, str, dict,
-    #        int) -> None
+    #        int) -> azure.storage.blob.models.ResourceProperties
     """Create one shot block blob
     :param blobxfer.models.azure.StorageEntity ase: Azure StorageEntity
     :param bytes data: blob data
     :param str md5: md5 as base64
     :param dict metadata: metadata kv pairs
     :param int timeout: timeout
+    :rtype: azure.storage.blob.models.ResourceProperties
+    :return: properties of the updated blob
     """
-    ase.client._put_blob(
+    return ase.client._put_blob(
         container_name=ase.container,
         blob_name=ase.name,
         blob=data,
@@ -95,98 +160,116 @@ def create_blob(ase, data, md5, metadata, timeout=None):
         timeout=timeout)  # noqa
 
 
-def _format_block_id(chunk_num):
-    # type: (int) -> str
-    """Create a block id given a block (chunk) number
+def _format_block_id(chunk_num, digest=None):
+    # type: (int, str) -> str
+    """Create a block id given a block (chunk) number and optionally the
+    hex digest of the block content
     :param int chunk_num: chunk number
+    :param str digest: hex digest of block content
     :rtype: str
     :return: block id
     """
-    return '{0:08d}'.format(chunk_num)
+    if digest is None:
+        return '{0:08d}'.format(chunk_num)
+    return '{0:08d}-{1}'.format(chunk_num, digest)
 
 
-def put_block(ase, offsets, data, timeout=None):
+def parse_block_id_digest(block_id):
+    # type: (str) -> str
+    """Parse the hex digest of block content from a block id
+    :param str block_id: block id
+    :rtype: str
+    :return: hex digest or None if block id does not carry a digest
+    """
+    match = _DIGEST_BLOCK_ID_REGEX.match(block_id)
+    if match is None:
+        return None
+    return match.group(1)
+
+
+def put_block(ase, offsets, data, digest=None, timeout=None):
     # type: (blobxfer.models.azure.StorageEntity,
-    #        blobxfer.models.upload.Offsets, bytes, int) -> None
+    #        blobxfer.models.upload.Offsets, bytes, str, int) -> None
     """Puts a block into remote blob
     :param blobxfer.models.azure.StorageEntity ase: Azure StorageEntity
     :param blobxfer.models.upload.Offsets offsets: upload offsets
     :param bytes data: data
+    :param str digest: hex digest of data to encode in block id
     :param int timeout: timeout
     """
     ase.client.put_block(
         container_name=ase.container,
         blob_name=ase.name,
         block=data,
-        block_id=_format_block_id(offsets.chunk_num),
+        block_id=_format_block_id(offsets.chunk_num, digest),
         validate_content=False,  # integrity is enforced with HTTPS
         timeout=timeout)  # noqa
 
 
-def put_block_from_url(src_ase, dst_ase, offsets, timeout=None):
+def get_source_url(src_ase):
+    # type: (blobxfer.models.azure.StorageEntity) -> str
+    """Get an authorized URL of the source of a server side copy
+    :param blobxfer.models.azure.StorageEntity src_ase:
+        Source Azure StorageEntity
+    :rtype: str
+    :return: source URL
+    """
+    if src_ase.is_arbitrary_url:
+        return src_ase.path
+    if blobxfer.util.is_not_empty(src_ase.client.account_key):
+        sas = _SOURCE_SAS_CACHE.get(src_ase)
+    else:
+        sas = src_ase.client.sas_token
+    return 'https://{}/{}?{}'.format(
+        src_ase.client.primary_endpoint, src_ase.path, sas)
+
+
+def put_block_from_url(src_ase, dst_ase, offsets, digest=None, timeout=None):
     # type: (blobxfer.models.azure.StorageEntity,
     #        blobxfer.models.azure.StorageEntity,
-    #        blobxfer.models.upload.Offsets, int) -> None
+    #        blobxfer.models.upload.Offsets, str, int) -> None
     """Puts a block into remote blob
     :param blobxfer.models.azure.StorageEntity src_ase:
         Source Azure StorageEntity
     :param blobxfer.models.azure.StorageEntity dst_ase:
         Destination Azure StorageEntity
     :param blobxfer.models.upload.Offsets offsets: upload offsets
+    :param str digest: hex digest of data to encode in block id
     :param int timeout: timeout
     """
-    if src_ase.is_arbitrary_url:
-        src_url = src_ase.path
-    else:
-        if blobxfer.util.is_not_empty(src_ase.client.account_key):
-            if src_ase.mode == blobxfer.models.azure.StorageModes.File:
-                sas = src_ase.client.generate_file_shared_access_signature(
-                    share_name=src_ase.container,
-                    file_name=src_ase.name,
-                    permission=azure.storage.file.FilePermissions(read=True),
-                    expiry=datetime.datetime.utcnow() + datetime.timedelta(
-                        days=7),
-                )
-            else:
-                sas = src_ase.client.generate_blob_shared_access_signature(
-                    container_name=src_ase.container,
-                    blob_name=src_ase.name,
-                    permission=azure.storage.blob.BlobPermissions(read=True),
-                    expiry=datetime.datetime.utcnow() + datetime.timedelta(
-                        days=7),
-                )
-        else:
-            sas = src_ase.client.sas_token
-        src_url = 'https://{}/{}?{}'.format(
-            src_ase.client.primary_endpoint, src_ase.path, sas)
     dst_ase.client.put_block_from_url(
         container_name=dst_ase.container,
         blob_name=dst_ase.name,
-        copy_source_url=src_url,
+        copy_source_url=get_source_url(src_ase),
         source_range_start=offsets.range_start,
         source_range_end=offsets.range_end,
-        block_id=_format_block_id(offsets.chunk_num),
+        block_id=_format_block_id(offsets.chunk_num, digest),
         source_content_md5=None,
         timeout=timeout)  # noqa
 
 
 def put_block_list(
-        ase, last_block_num, md5, metadata, timeout=None):
+        ase, last_block_num, md5, metadata, digests=None, timeout=None):
     # type: (blobxfer.models.azure.StorageEntity, bytes, str, dict,
-    #        int) -> None
+    #        list, int) -> azure.storage.blob.models.ResourceProperties
     """Create block blob from blocks
     :param blobxfer.models.azure.StorageEntity ase: Azure StorageEntity
     :param int last_block_num: last block number (chunk_num)
     :param str md5: md5 as base64
     :param dict metadata: metadata kv pairs
+    :param list digests: hex digests of blocks encoded in block ids
     :param int timeout: timeout
+    :rtype: azure.storage.blob.models.ResourceProperties
+    :return: properties of the updated blob
     """
-    # construct block list
+    # construct block list, blocks with ids already committed resolve
+    # to the committed block if not uploaded again
     block_list = [
-        azure.storage.blob.BlobBlock(id=_format_block_id(x))
+        azure.storage.blob.BlobBlock(id=_format_block_id(
+            x, digests[x] if digests is not None else None))
         for x in range(0, last_block_num + 1)
     ]
-    ase.client.put_block_list(
+    return ase.client.put_block_list(
         container_name=ase.container,
         blob_name=ase.name,
         block_list=block_list,
@@ -222,6 +305,20 @@ def get_committed_block_list(ase, timeout=None):
         timeout=timeout).committed_blocks
 
 
+def get_committed_block_digests(ase, timeout=None):
+    # type: (blobxfer.models.azure.StorageEntity, int) -> list
+    """Get the content digests and sizes of committed blocks
+    :param blobxfer.models.azure.StorageEntity ase: Azure StorageEntity
+    :param int timeout: timeout
+    :rtype: list
+    :return: list of (hex digest or None, size) tuples in block order
+    """
+    return [
+        (parse_block_id_digest(block.id), block.size)
+        for block in get_committed_block_list(ase, timeout=timeout)
+    ]
+
+
 def set_blob_access_tier(ase, timeout=None):
     # type: (blobxfer.models.azure.StorageEntity, int) -> None
     """Set blob access tier
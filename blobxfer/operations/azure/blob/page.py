@@ -64,9 +64,11 @@ def create_client(storage_account, timeout, proxy):
     if proxy is not None:
         client.set_proxy(
             proxy.host, proxy.port, proxy.username, proxy.password)
-    # set retry policy
+    # set retry policy and coordinate throttling across the account
     client.retry = blobxfer.retry.ExponentialRetryWithMaxWait(
-        max_retries=timeout.max_retries).retry
+        max_retries=timeout.max_retries,
+        throttle=storage_account.throttle).retry
+    client.request_callback = storage_account.throttle.acquire
     return client
 
 
@@ -86,6 +88,21 @@ def create_blob(ase, timeout=None):
         timeout=timeout)  # noqa
 
 
+def get_page_ranges(ase, timeout=None):
+    # type: (blobxfer.models.azure.StorageEntity, int) -> list
+    """Get populated page ranges of a page blob
+    :param blobxfer.models.azure.StorageEntity ase: Azure StorageEntity
+    :param int timeout: timeout
+    :rtype: list
+    :return: list of page ranges
+    """
+    return ase.client.get_page_ranges(
+        container_name=ase.container,
+        blob_name=ase.name,
+        snapshot=ase.snapshot,
+        timeout=timeout)  # noqa
+
+
 def put_page(ase, page_start, page_end, data, timeout=None):
     # type: (blobxfer.models.azure.StorageEntity,
     #        int, int, bytes, int) -> None
@@ -107,13 +124,16 @@ def put_page(ase, page_start, page_end, data, timeout=None):
 
 
 def resize_blob(ase, size, timeout=None):
-    # type: (blobxfer.models.azure.StorageEntity, int, int) -> None
+    # type: (blobxfer.models.azure.StorageEntity, int, int) ->
+    #        azure.storage.blob.models.ResourceProperties
     """Resizes a page blob
     :param blobxfer.models.azure.StorageEntity ase: Azure StorageEntity
     :param int size: content length
     :param int timeout: timeout
+    :rtype: azure.storage.blob.models.ResourceProperties
+    :return: properties of the updated blob
     """
-    ase.client.resize_blob(
+    return ase.client.resize_blob(
         container_name=ase.container,
         blob_name=ase.name,
         content_length=blobxfer.util.page_align_content_length(size),
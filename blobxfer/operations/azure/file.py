@@ -66,9 +66,11 @@ def create_client(storage_account, timeout, proxy):
     if proxy is not None:
         client.set_proxy(
             proxy.host, proxy.port, proxy.username, proxy.password)
-    # set retry policy
+    # set retry policy and coordinate throttling across the account
     client.retry = blobxfer.retry.ExponentialRetryWithMaxWait(
-        max_retries=timeout.max_retries).retry
+        max_retries=timeout.max_retries,
+        throttle=storage_account.throttle).retry
+    client.request_callback = storage_account.throttle.acquire
     return client
 
 
@@ -201,16 +203,17 @@ def list_files(
                     dirs.append(fspath)
 
 
-def list_all_files(client, fileshare, timeout=None):
-    # type: (azure.storage.file.FileService, str, int) -> str
+def list_all_files(client, fileshare, timeout=None, prefix=None):
+    # type: (azure.storage.file.FileService, str, int, str) -> str
     """List all files in share
     :param azure.storage.file.FileService client: file client
     :param str fileshare: file share
     :param int timeout: timeout
+    :param str prefix: directory to list files under
     :rtype: str
     :return: file name
     """
-    dirs = [None]
+    dirs = [prefix]
     while len(dirs) > 0:
         dir = dirs.pop()
         files = client.list_directories_and_files(
@@ -0,0 +1,206 @@
+# Copyright (c) Microsoft Corporation
+#
+# All rights reserved.
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+# stdlib imports
+import collections
+import logging
+import threading
+# non-stdlib imports
+# local imports
+import blobxfer.retry
+
+# create logger
+logger = logging.getLogger(__name__)
+# global defines
+_MIN_CHUNKSIZE_BYTES = 1048576
+_PROBE_SAMPLES = 8
+_SAMPLE_WINDOW = 64
+_TARGET_OVERHEAD_FRACTION = 0.1
+_PROBE_SIZE_DIVISOR = 4
+_MAX_GROWTH_FACTOR = 2
+
+# named tuples
+ChunkSizeModel = collections.namedtuple(
+    'ChunkSizeModel', [
+        'bandwidth',
+        'chunk_size',
+        'overhead',
+        'samples',
+    ]
+)
+
+
+class AdaptiveChunkSizer(object):
+    """Chunk size advisor which models the latency of each request as a
+    fixed per-request overhead plus the transfer time at the measured
+    bandwidth. The first entities of a run are assigned alternating probe
+    chunk sizes until enough samples are recorded to fit the model, after
+    which entities are assigned the chunk size at which the per-request
+    overhead is a small fraction of the request latency. Chunk sizes are
+    halved while storage accounts are throttling requests."""
+    def __init__(
+            self, default, maximum, description,
+            minimum=_MIN_CHUNKSIZE_BYTES, throttle_counter=None):
+        # type: (AdaptiveChunkSizer, int, int, str, int,
+        #        blobxfer.retry.ThrottleCounter) -> None
+        """Ctor for AdaptiveChunkSizer
+        :param AdaptiveChunkSizer self: this
+        :param int default: default chunk size in bytes
+        :param int maximum: maximum chunk size in bytes
+        :param str description: description for logging
+        :param int minimum: minimum chunk size in bytes
+        :param blobxfer.retry.ThrottleCounter throttle_counter:
+            throttle counter
+        """
+        self.description = description
+        self._minimum = min((minimum, default))
+        self._maximum = max((maximum, default))
+        self._default = default
+        self._probe_sizes = (
+            default, max((default // _PROBE_SIZE_DIVISOR, self._minimum)),
+        )
+        if throttle_counter is None:
+            throttle_counter = blobxfer.retry.throttle_counter
+        self._throttle_counter = throttle_counter
+        self._last_throttled = throttle_counter.total
+        self._throttle_scale = 1
+        self._lock = threading.Lock()
+        self._samples = collections.deque(maxlen=_SAMPLE_WINDOW)
+        self._probes = 0
+        self._model = None
+
+    @property
+    def model(self):
+        # type: (AdaptiveChunkSizer) -> ChunkSizeModel
+        """Most recently fitted model
+        :param AdaptiveChunkSizer self: this
+        :rtype: ChunkSizeModel
+        :return: model or None if still probing
+        """
+        with self._lock:
+            return self._model
+
+    def record(self, nbytes, latency):
+        # type: (AdaptiveChunkSizer, int, float) -> None
+        """Record a completed request
+        :param AdaptiveChunkSizer self: this
+        :param int nbytes: number of bytes transferred
+        :param float latency: request latency in seconds
+        """
+        if nbytes <= 0 or latency <= 0:
+            return
+        with self._lock:
+            self._samples.append((nbytes, latency))
+            if len(self._samples) >= _PROBE_SAMPLES:
+                self._fit()
+
+    def _fit(self):
+        # type: (AdaptiveChunkSizer) -> None
+        """Fit latency against request size by least squares. Lock must
+        be held by the caller.
+        :param AdaptiveChunkSizer self: this
+        """
+        sizes = [x[0] for x in self._samples]
+        # sizes must vary sufficiently to separate overhead from bandwidth
+        if max(sizes) < 2 * min(sizes):
+            return
+        n = len(self._samples)
+        mean_x = sum(sizes) / n
+        mean_y = sum(x[1] for x in self._samples) / n
+        var = sum((x - mean_x) ** 2 for x in sizes)
+        cov = sum(
+            (x[0] - mean_x) * (x[1] - mean_y) for x in self._samples)
+        slope = cov / var
+        overhead = mean_y - slope * mean_x
+        if slope <= 0:
+            # latency does not grow with size which is likely noise, keep
+            # the previous model or fall back to the default chunk size
+            if self._model is not None:
+                return
+            bandwidth = None
+            chunk_size = self._default
+        elif overhead <= 0:
+            # overhead is negligible, chunk size does not matter
+            bandwidth = 1 / slope
+            chunk_size = self._default
+        else:
+            bandwidth = 1 / slope
+            chunk_size = int(
+                overhead * bandwidth * (1 - _TARGET_OVERHEAD_FRACTION) /
+                _TARGET_OVERHEAD_FRACTION)
+        # limit growth per fit so a single noisy window cannot jump to
+        # the maximum chunk size
+        previous = (
+            self._default if self._model is None else self._model.chunk_size
+        )
+        chunk_size = self._clamp(
+            min((chunk_size, previous * _MAX_GROWTH_FACTOR)))
+        if self._model is None or self._model.chunk_size != chunk_size:
+            logger.debug(
+                ('{} chunk size model: overhead={:.4f}s bandwidth={} '
+                 'bytes/s chunk_size={} samples={}').format(
+                     self.description, overhead,
+                     'unbounded' if bandwidth is None else int(bandwidth),
+                     chunk_size, n))
+        self._model = ChunkSizeModel(
+            bandwidth=bandwidth,
+            chunk_size=chunk_size,
+            overhead=max((overhead, 0.0)),
+            samples=n,
+        )
+
+    def _clamp(self, chunk_size):
+        # type: (AdaptiveChunkSizer, int) -> int
+        """Clamp and align chunk size
+        :param AdaptiveChunkSizer self: this
+        :param int chunk_size: chunk size
+        :rtype: int
+        :return: chunk size within bounds
+        """
+        chunk_size = (chunk_size // self._minimum) * self._minimum
+        return min((max((chunk_size, self._minimum)), self._maximum))
+
+    def next_chunk_size(self):
+        # type: (AdaptiveChunkSizer) -> int
+        """Chunk size for the next entity
+        :param AdaptiveChunkSizer self: this
+        :rtype: int
+        :return: chunk size in bytes
+        """
+        with self._lock:
+            # adjust for throttling since the last entity
+            throttled = self._throttle_counter.total
+            if throttled > self._last_throttled:
+                if self._throttle_scale < self._maximum // self._minimum:
+                    self._throttle_scale *= 2
+            elif self._throttle_scale > 1:
+                self._throttle_scale //= 2
+            self._last_throttled = throttled
+            if self._model is None:
+                chunk_size = self._probe_sizes[
+                    self._probes % len(self._probe_sizes)]
+                self._probes += 1
+            else:
+                chunk_size = self._model.chunk_size
+            return self._clamp(chunk_size // self._throttle_scale)
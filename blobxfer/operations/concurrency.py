@@ -0,0 +1,333 @@
+# Copyright (c) Microsoft Corporation
+#
+# All rights reserved.
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+# stdlib imports
+import collections
+import logging
+import math
+import threading
+import time
+# non-stdlib imports
+# local imports
+import blobxfer.retry
+
+# create logger
+logger = logging.getLogger(__name__)
+# global defines
+_DECISION_INTERVAL_SECONDS = 5
+_ADDITIVE_INCREASE = 1
+_MULTIPLICATIVE_DECREASE = 0.5
+_GOODPUT_TOLERANCE = 0.05
+_LATENCY_INFLATION_FACTOR = 2.0
+_BASELINE_LATENCY_INTERVALS = 12
+
+# named tuples
+ConcurrencyDecision = collections.namedtuple(
+    'ConcurrencyDecision', [
+        'action',
+        'goodput',
+        'latency_p50',
+        'latency_p95',
+        'limit',
+        'previous_limit',
+        'reason',
+        'samples',
+        'throttled',
+    ]
+)
+
+
+def _percentile(values, pct):
+    # type: (list, float) -> float
+    """Nearest-rank percentile of sorted values
+    :param list values: sorted values
+    :param float pct: percentile in (0, 100]
+    :rtype: float
+    :return: percentile value
+    """
+    if len(values) == 0:
+        return 0.0
+    rank = int(math.ceil(pct / 100.0 * len(values)))
+    return values[max((rank, 1)) - 1]
+
+
+class AdaptiveConcurrencyController(object):
+    """Additive-increase/multiplicative-decrease controller for the number
+    of active transfer workers. Transfer threads are spawned up to the
+    maximum and admitted by the controller for the duration of each
+    request. The controller periodically adjusts its limit from measured
+    goodput, latency percentiles and throttling responses counted by the
+    retry policy."""
+    def __init__(
+            self, initial, maximum, description, minimum=1,
+            interval=_DECISION_INTERVAL_SECONDS, throttle_counter=None):
+        # type: (AdaptiveConcurrencyController, int, int, str, int, float,
+        #        blobxfer.retry.ThrottleCounter) -> None
+        """Ctor for AdaptiveConcurrencyController
+        :param AdaptiveConcurrencyController self: this
+        :param int initial: initial number of active workers
+        :param int maximum: maximum number of active workers
+        :param str description: description for decision trace
+        :param int minimum: minimum number of active workers
+        :param float interval: seconds between decisions
+        :param blobxfer.retry.ThrottleCounter throttle_counter: throttle
+            counter
+        """
+        if minimum < 1 or maximum < minimum:
+            raise ValueError(
+                'invalid concurrency bounds: minimum={} maximum={}'.format(
+                    minimum, maximum))
+        self._minimum = minimum
+        self._maximum = maximum
+        self._limit = min((max((initial, minimum)), maximum))
+        self._description = description
+        self._interval = interval
+        self._throttle_counter = (
+            throttle_counter or blobxfer.retry.throttle_counter
+        )
+        self._cv = threading.Condition()
+        self._active = 0
+        self._peak_active = 0
+        self._bytes = 0
+        self._latencies = []
+        self._last_time = time.monotonic()
+        self._last_throttled = self._throttle_counter.total
+        self._last_goodput = None
+        self._last_decision = None
+        self._baseline_latencies = collections.deque(
+            maxlen=_BASELINE_LATENCY_INTERVALS)
+        self._terminated = False
+        self._thread = None
+
+    @property
+    def limit(self):
+        # type: (AdaptiveConcurrencyController) -> int
+        """Current number of workers admitted
+        :param AdaptiveConcurrencyController self: this
+        :rtype: int
+        :return: active worker limit
+        """
+        with self._cv:
+            return self._limit
+
+    @property
+    def maximum(self):
+        # type: (AdaptiveConcurrencyController) -> int
+        """Maximum number of workers admitted
+        :param AdaptiveConcurrencyController self: this
+        :rtype: int
+        :return: maximum active worker limit
+        """
+        return self._maximum
+
+    @property
+    def active(self):
+        # type: (AdaptiveConcurrencyController) -> int
+        """Number of active workers
+        :param AdaptiveConcurrencyController self: this
+        :rtype: int
+        :return: active workers
+        """
+        with self._cv:
+            return self._active
+
+    @property
+    def last_decision(self):
+        # type: (AdaptiveConcurrencyController) -> ConcurrencyDecision
+        """Last decision made
+        :param AdaptiveConcurrencyController self: this
+        :rtype: ConcurrencyDecision
+        :return: last decision or None
+        """
+        return self._last_decision
+
+    def start(self):
+        # type: (AdaptiveConcurrencyController) -> None
+        """Start the periodic decision thread
+        :param AdaptiveConcurrencyController self: this
+        """
+        logger.info(
+            '{} concurrency auto: starting with {} of at most {} transfer '
+            'workers'.format(self._description, self._limit, self._maximum))
+        self._thread = threading.Thread(target=self._decision_loop)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _decision_loop(self):
+        # type: (AdaptiveConcurrencyController) -> None
+        """Make decisions each interval until terminated
+        :param AdaptiveConcurrencyController self: this
+        """
+        while True:
+            with self._cv:
+                self._cv.wait_for(lambda: self._terminated, self._interval)
+                if self._terminated:
+                    break
+            self.evaluate()
+
+    def acquire(self):
+        # type: (AdaptiveConcurrencyController) -> bool
+        """Wait until a worker is admitted or terminated
+        :param AdaptiveConcurrencyController self: this
+        :rtype: bool
+        :return: True if admitted, False if terminated
+        """
+        with self._cv:
+            self._cv.wait_for(
+                lambda: self._terminated or self._active < self._limit)
+            if self._terminated:
+                return False
+            self._active += 1
+            if self._active > self._peak_active:
+                self._peak_active = self._active
+            return True
+
+    def release(self):
+        # type: (AdaptiveConcurrencyController) -> None
+        """Release an admitted worker
+        :param AdaptiveConcurrencyController self: this
+        """
+        with self._cv:
+            self._active -= 1
+            self._cv.notify_all()
+
+    def record(self, nbytes, latency):
+        # type: (AdaptiveConcurrencyController, int, float) -> None
+        """Record a completed transfer request
+        :param AdaptiveConcurrencyController self: this
+        :param int nbytes: number of bytes transferred
+        :param float latency: request latency in seconds
+        """
+        with self._cv:
+            self._bytes += nbytes
+            self._latencies.append(latency)
+
+    def evaluate(self, now=None):
+        # type: (AdaptiveConcurrencyController, float) -> ConcurrencyDecision
+        """Adjust the worker limit from measurements since the last
+        decision
+        :param AdaptiveConcurrencyController self: this
+        :param float now: monotonic time of decision
+        :rtype: ConcurrencyDecision
+        :return: decision
+        """
+        if now is None:
+            now = time.monotonic()
+        with self._cv:
+            elapsed = now - self._last_time
+            nbytes = self._bytes
+            latencies = sorted(self._latencies)
+            peak_active = self._peak_active
+            limit = self._limit
+            self._last_time = now
+            self._bytes = 0
+            self._latencies = []
+            self._peak_active = self._active
+        throttled_total = self._throttle_counter.total
+        throttled = throttled_total - self._last_throttled
+        self._last_throttled = throttled_total
+        goodput = nbytes / elapsed if elapsed > 0 else 0.0
+        p50 = _percentile(latencies, 50)
+        p95 = _percentile(latencies, 95)
+        baseline = (
+            min(self._baseline_latencies)
+            if len(self._baseline_latencies) > 0 else None
+        )
+        new_limit = limit
+        if throttled > 0:
+            # server busy: back off multiplicatively
+            new_limit = int(limit * _MULTIPLICATIVE_DECREASE)
+            reason = 'throttled'
+        elif len(latencies) == 0:
+            reason = 'idle'
+        elif (baseline is not None and
+              p50 > baseline * _LATENCY_INFLATION_FACTOR and
+              goodput < self._last_goodput * (1 + _GOODPUT_TOLERANCE)):
+            # queueing without more goodput: back off multiplicatively
+            new_limit = int(limit * _MULTIPLICATIVE_DECREASE)
+            reason = 'latency inflation'
+        elif (self._last_decision is not None and
+              self._last_decision.action == 'increase' and
+              goodput < self._last_goodput * (1 - _GOODPUT_TOLERANCE)):
+            # last increase did not pay off: undo it
+            new_limit = limit - _ADDITIVE_INCREASE
+            reason = 'goodput regression'
+        elif peak_active < limit:
+            reason = 'underutilized'
+        elif limit >= self._maximum:
+            reason = 'at maximum'
+        else:
+            new_limit = limit + _ADDITIVE_INCREASE
+            reason = 'probing'
+        new_limit = min((max((new_limit, self._minimum)), self._maximum))
+        if new_limit > limit:
+            action = 'increase'
+        elif new_limit < limit:
+            action = 'decrease'
+        else:
+            action = 'hold'
+        if len(latencies) > 0:
+            self._last_goodput = goodput
+            self._baseline_latencies.append(p50)
+        with self._cv:
+            self._limit = new_limit
+            self._cv.notify_all()
+        decision = ConcurrencyDecision(
+            action=action,
+            goodput=goodput,
+            latency_p50=p50,
+            latency_p95=p95,
+            limit=new_limit,
+            previous_limit=limit,
+            reason=reason,
+            samples=len(latencies),
+            throttled=throttled,
+        )
+        self._last_decision = decision
+        msg = (
+            '{} concurrency {}: {} -> {} transfer workers ({}) '
+            'goodput={:.3f} MiB/s p50={:.1f}ms p95={:.1f}ms samples={} '
+            'throttled={}').format(
+                self._description, action, limit, new_limit, reason,
+                goodput / 1048576, p50 * 1000, p95 * 1000, len(latencies),
+                throttled)
+        if action == 'hold':
+            logger.debug(msg)
+        else:
+            logger.info(msg)
+        return decision
+
+    def terminate(self):
+        # type: (AdaptiveConcurrencyController) -> None
+        """Terminate and wake all waiters
+        :param AdaptiveConcurrencyController self: this
+        """
+        with self._cv:
+            if self._terminated:
+                return
+            self._terminated = True
+            self._cv.notify_all()
+        logger.info(
+            '{} concurrency auto: finished with {} transfer workers'.format(
+                self._description, self._limit))
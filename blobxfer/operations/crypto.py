@@ -29,11 +29,14 @@ import logging
 import os
 import queue
 import tempfile
+import threading
 # non-stdlib imports
 import cryptography.hazmat.backends
 import cryptography.hazmat.primitives.asymmetric.padding
 import cryptography.hazmat.primitives.asymmetric.rsa
+import cryptography.exceptions
 import cryptography.hazmat.primitives.ciphers
+import cryptography.hazmat.primitives.ciphers.aead
 import cryptography.hazmat.primitives.ciphers.algorithms
 import cryptography.hazmat.primitives.ciphers.modes
 import cryptography.hazmat.primitives.constant_time
@@ -41,6 +44,8 @@ import cryptography.hazmat.primitives.hashes
 import cryptography.hazmat.primitives.padding
 import cryptography.hazmat.primitives.serialization
 # local imports
+import blobxfer.models.crypto
+import blobxfer.models.filehandle
 import blobxfer.models.offload
 import blobxfer.util
 
@@ -49,12 +54,16 @@ logger = logging.getLogger(__name__)
 
 # encryption constants
 _AES256_KEYLENGTH_BYTES = 32
+# shared memory ring slots per crypto worker: one in process, one queued
+# and the remainder awaiting retrieval by the main process
+_SHM_SLOTS_PER_WORKER = 4
 
 
 # enums
 class CryptoAction(enum.Enum):
     Encrypt = 1
     Decrypt = 2
+    DecryptRegions = 3
 
 
 def load_rsa_private_key_file(rsakeyfile, passphrase):
@@ -155,6 +164,21 @@ def pkcs7_pad(buf):
     return padder.update(buf) + padder.finalize()
 
 
+def pkcs7_pad_into(buf, length):
+    # type: (memoryview, int) -> memoryview
+    """Appends PKCS7 padding in place after the first length bytes of a
+    buffer
+    :param memoryview buf: buffer with capacity for a block of padding
+    :param int length: length of data in buffer
+    :rtype: memoryview
+    :return: view of buffer with PKCS7_PADDING
+    """
+    blocksize = blobxfer.models.crypto.AES256_BLOCKSIZE_BYTES
+    padlen = blocksize - (length % blocksize)
+    buf[length:length + padlen] = bytes((padlen,)) * padlen
+    return buf[:length + padlen]
+
+
 def pkcs7_unpad(buf):
     # type: (bytes) -> bytes
     """Removes PKCS7 padding a decrypted object
@@ -218,15 +242,130 @@ def aes_cbc_encrypt_data(symkey, iv, data, pad):
         return cipher.update(data) + cipher.finalize()
 
 
+def _aes_gcm_region_aad(region_num):
+    # type: (int) -> bytes
+    """Generate the associated data binding a region to its position
+    :param int region_num: region number
+    :rtype: bytes
+    :return: associated data
+    """
+    return region_num.to_bytes(8, byteorder='big')
+
+
+def aes_gcm_encrypt_region(symkey, region_num, data):
+    # type: (bytes, int, bytes) -> bytes
+    """Encrypt a region of data using AES GCM with a random nonce
+    :param bytes symkey: symmetric key
+    :param int region_num: region number
+    :param bytes data: data to encrypt
+    :rtype: bytes
+    :return: nonce, encrypted data and tag
+    """
+    nonce = os.urandom(blobxfer.models.crypto.AES256_GCM_NONCE_LENGTH_BYTES)
+    aesgcm = cryptography.hazmat.primitives.ciphers.aead.AESGCM(symkey)
+    return nonce + aesgcm.encrypt(
+        nonce, data, _aes_gcm_region_aad(region_num))
+
+
+def aes_gcm_region_tags(region_size, encdata):
+    # type: (int, bytes) -> bytes
+    """Extract the authentication tags of encrypted regions
+    :param int region_size: plaintext region size
+    :param bytes encdata: encrypted regions
+    :rtype: bytes
+    :return: concatenated tags
+    """
+    stride = (
+        region_size + blobxfer.models.crypto.AES256_GCM_REGION_OVERHEAD_BYTES
+    )
+    taglen = blobxfer.models.crypto.AES256_GCM_TAG_LENGTH_BYTES
+    tags = []
+    for start in range(0, len(encdata), stride):
+        end = min((start + stride, len(encdata)))
+        tags.append(bytes(encdata[end - taglen:end]))
+    return b''.join(tags)
+
+
+def aes_gcm_decrypt_regions(symkey, region_num, region_size, encdata):
+    # type: (bytes, int, int, bytes) -> bytes
+    """Decrypt and authenticate consecutive regions using AES GCM
+    :param bytes symkey: symmetric key
+    :param int region_num: region number of the first region
+    :param int region_size: plaintext region size
+    :param bytes encdata: encrypted regions
+    :rtype: bytes
+    :return: decrypted data
+    """
+    overhead = blobxfer.models.crypto.AES256_GCM_REGION_OVERHEAD_BYTES
+    noncelen = blobxfer.models.crypto.AES256_GCM_NONCE_LENGTH_BYTES
+    stride = region_size + overhead
+    aesgcm = cryptography.hazmat.primitives.ciphers.aead.AESGCM(symkey)
+    encdata = memoryview(encdata)
+    data = []
+    for start in range(0, len(encdata), stride):
+        region = encdata[start:start + stride]
+        if len(region) <= overhead:
+            raise RuntimeError(
+                'encrypted region {} is truncated'.format(region_num))
+        try:
+            data.append(aesgcm.decrypt(
+                region[:noncelen],
+                region[noncelen:],
+                _aes_gcm_region_aad(region_num)))
+        except cryptography.exceptions.InvalidTag:
+            raise RuntimeError(
+                'encrypted region {} failed authentication'.format(
+                    region_num))
+        region_num += 1
+    return b''.join(data)
+
+
 class CryptoOffload(blobxfer.models.offload._MultiprocessOffload):
-    def __init__(self, num_workers):
-        # type: (CryptoOffload, int) -> None
+    def __init__(self, num_workers, slot_size=None):
+        # type: (CryptoOffload, int, int) -> None
         """Ctor for Crypto Offload
         :param CryptoOffload self: this
         :param int num_workers: number of worker processes
+        :param int slot_size: shared memory ring slot size, or None to
+            exchange chunk data through temporary files
         """
+        self._ring = None
+        self._ring_lock = threading.Lock()
+        self._pending_slots = {}
+        if slot_size is not None and slot_size > 0:
+            self._ring = blobxfer.models.offload.SharedMemoryRing.create(
+                slot_size, num_workers * _SHM_SLOTS_PER_WORKER)
         super().__init__(CryptoOffload._worker_process, num_workers, 'Crypto')
 
+    @property
+    def ring(self):
+        # type: (CryptoOffload) -> blobxfer.models.offload.SharedMemoryRing
+        """Shared memory ring
+        :param CryptoOffload self: this
+        :rtype: blobxfer.models.offload.SharedMemoryRing
+        :return: shared memory ring or None if not in use
+        """
+        return self._ring
+
+    @staticmethod
+    def _read_source(source, attached, remove):
+        # type: (object, dict, bool) -> object
+        """Read chunk data from a shared memory slot or a file
+        :param object source: shared memory slot or file path
+        :param dict attached: shared memory segments attached by name
+        :param bool remove: remove file once read
+        :rtype: bytes or memoryview
+        :return: chunk data
+        """
+        if isinstance(source, blobxfer.models.offload.SharedMemorySlot):
+            return blobxfer.models.offload.SharedMemoryRing.attach(
+                source, attached)
+        with open(source, 'rb') as fd:
+            data = fd.read()
+        if remove:
+            os.unlink(source)
+        return data
+
     @staticmethod
     def _worker_process(term_signal, task_queue, done_cv, done_queue):
         # type: (multiprocessing.Value, multiprocessing.Queue,
@@ -237,50 +376,153 @@ class CryptoOffload(blobxfer.models.offload._MultiprocessOffload):
         :param multiprocessing.Condition done_cv: done condition variable
         :param multiprocessing.Queue done_queue: done queue
         """
+        attached = {}
         while term_signal.value != 1:
             try:
                 inst = task_queue.get(True, 0.1)
             except queue.Empty:
                 continue
-            # UNUSED due to AES256-CBC FullBlob mode
-            if inst[0] == CryptoAction.Encrypt:  # noqa
-                local_file, offsets, symkey, iv = \
-                    inst[1], inst[2], inst[3], inst[4]
-                with open(local_file, 'rb') as fd:
-                    data = fd.read()
-                encdata = blobxfer.operations.crypto.aes_cbc_encrypt_data(
-                    symkey, iv, data, offsets.pad)
-                with tempfile.NamedTemporaryFile(
-                        mode='wb', delete=False) as fd:
-                    fpath = fd.name
-                    fd.write(encdata)
+            if inst[0] == CryptoAction.Encrypt:
+                uid, local_file, fd_start, offsets, num_bytes, symkey, \
+                    dest = \
+                    inst[1], inst[2], inst[3], inst[4], inst[5], inst[6], \
+                    inst[7]
+                error = None
+                try:
+                    with open(local_file, 'rb') as fd:
+                        fd.seek(fd_start, 0)
+                        data = fd.read(num_bytes)
+                    encdata = blobxfer.operations.crypto.\
+                        aes_gcm_encrypt_region(
+                            symkey, offsets.chunk_num, data)
+                    if dest is not None and dest.length >= len(encdata):
+                        dest = dest._replace(length=len(encdata))
+                        view = blobxfer.models.offload.SharedMemoryRing.\
+                            attach(dest, attached)
+                        view[:] = encdata
+                        view.release()
+                    else:
+                        with tempfile.NamedTemporaryFile(
+                                mode='wb', delete=False) as fd:
+                            dest = fd.name
+                            fd.write(encdata)
+                except Exception as e:
+                    error = str(e)
                 done_cv.acquire()
-                done_queue.put(fpath)
+                done_queue.put((uid, offsets, dest, error))
             elif inst[0] == CryptoAction.Decrypt:
                 final_path, internal_fdstart, offsets, symkey, iv, \
-                    hmac_datafile = \
+                    source = \
                     inst[1], inst[2], inst[3], inst[4], inst[5], inst[6]
-                # read encrypted data from disk
-                with open(hmac_datafile, 'rb') as fd:
-                    encdata = fd.read()
+                # read encrypted data from shared memory or disk, the
+                # temporary file is retained for the integrity check
+                encdata = CryptoOffload._read_source(source, attached, False)
                 data = blobxfer.operations.crypto.aes_cbc_decrypt_data(
                     symkey, iv, encdata, offsets.unpad)
+                if isinstance(encdata, memoryview):
+                    encdata.release()
                 # write decrypted data to disk
-                if len(data) > 0:
-                    with open(final_path, 'r+b') as fd:
-                        fd.seek(internal_fdstart + offsets.fd_start, 0)
-                        fd.write(data)
+                blobxfer.models.filehandle.pwrite(
+                    final_path, internal_fdstart + offsets.fd_start, data)
                 done_cv.acquire()
-                done_queue.put((final_path, offsets))
+                done_queue.put((final_path, offsets, None))
+            elif inst[0] == CryptoAction.DecryptRegions:
+                final_path, internal_fdstart, offsets, symkey, \
+                    region_num, region_size, source = \
+                    inst[1], inst[2], inst[3], inst[4], inst[5], inst[6], \
+                    inst[7]
+                error = None
+                encdata = None
+                try:
+                    encdata = CryptoOffload._read_source(
+                        source, attached, True)
+                    data = blobxfer.operations.crypto.aes_gcm_decrypt_regions(
+                        symkey, region_num, region_size, encdata)
+                    blobxfer.models.filehandle.pwrite(
+                        final_path, internal_fdstart + offsets.fd_start, data)
+                except Exception as e:
+                    error = str(e)
+                if isinstance(encdata, memoryview):
+                    encdata.release()
+                done_cv.acquire()
+                done_queue.put((final_path, offsets, error))
             # notify and release condition var
             done_cv.notify()
             done_cv.release()
+        blobxfer.models.offload.SharedMemoryRing.detach(attached)
+
+    def finalize_processes(self):
+        # type: (CryptoOffload) -> None
+        """Finalize processes and remove the shared memory ring
+        :param CryptoOffload self: this
+        """
+        super().finalize_processes()
+        if self._ring is not None:
+            self._ring.close()
+
+    def pop_done_queue(self):
+        # type: (CryptoOffload) -> object
+        """Get item from done queue, releasing any shared memory slot
+        which held the encrypted data of a decrypted chunk
+        :param CryptoOffload self: this
+        :rtype: object or None
+        :return: object from done queue, if exists
+        """
+        result = super().pop_done_queue()
+        if result is not None and len(result) == 3:
+            with self._ring_lock:
+                slot = self._pending_slots.pop(
+                    (result[0], result[1].chunk_num), None)
+            if slot is not None:
+                self._ring.release(slot)
+        return result
+
+    def stage_data(self, data):
+        # type: (CryptoOffload, bytes) -> object
+        """Stage chunk data for a crypto worker in the shared memory ring
+        :param CryptoOffload self: this
+        :param bytes data: data
+        :rtype: blobxfer.models.offload.SharedMemorySlot
+        :return: slot or None if the ring is not in use or overflows
+        """
+        if self._ring is None:
+            return None
+        return self._ring.put(data)
+
+    def retrieve_data(self, source):
+        # type: (CryptoOffload, object) -> bytes
+        """Retrieve chunk data produced by a crypto worker
+        :param CryptoOffload self: this
+        :param object source: shared memory slot or file path
+        :rtype: bytes
+        :return: data
+        """
+        if isinstance(source, blobxfer.models.offload.SharedMemorySlot):
+            return self._ring.get(source)
+        with open(source, 'rb') as fd:
+            data = fd.read()
+        os.unlink(source)
+        return data
+
+    def _track_slot(self, final_path, offsets, source):
+        # type: (CryptoOffload, str, blobxfer.models.download.Offsets,
+        #        object) -> None
+        """Track a shared memory slot to release on decrypt completion
+        :param CryptoOffload self: this
+        :param str final_path: final path
+        :param blobxfer.models.download.Offsets offsets: offsets
+        :param object source: shared memory slot or file path
+        """
+        if isinstance(source, blobxfer.models.offload.SharedMemorySlot):
+            with self._ring_lock:
+                self._pending_slots[
+                    (final_path, offsets.chunk_num)] = source
 
     def add_decrypt_chunk(
             self, final_path, internal_fdstart, offsets, symkey, iv,
-            hmac_datafile):
+            source):
         # type: (CryptoOffload, str, int, blobxfer.models.download.Offsets,
-        #        bytes, bytes, str) -> None
+        #        bytes, bytes, object) -> None
         """Add a chunk to decrypt
         :param CryptoOffload self: this
         :param str final_path: final path
@@ -288,24 +530,57 @@ class CryptoOffload(blobxfer.models.offload._MultiprocessOffload):
         :param blobxfer.models.download.Offsets offsets: offsets
         :param bytes symkey: symmetric key
         :param bytes iv: initialization vector
-        :param str hmac_datafile: encrypted data file
+        :param object source: shared memory slot or encrypted data file
         """
+        self._track_slot(final_path, offsets, source)
         self._task_queue.put(
             (CryptoAction.Decrypt, final_path, internal_fdstart, offsets,
-             symkey, iv, hmac_datafile)
+             symkey, iv, source)
+        )
+
+    def add_decrypt_regions_chunk(
+            self, final_path, internal_fdstart, offsets, symkey, region_num,
+            region_size, source):
+        # type: (CryptoOffload, str, int, blobxfer.models.download.Offsets,
+        #        bytes, int, int, object) -> None
+        """Add a chunk of encrypted regions to decrypt
+        :param CryptoOffload self: this
+        :param str final_path: final path
+        :param int internal_fdstart: internal fd offset start
+        :param blobxfer.models.download.Offsets offsets: offsets
+        :param bytes symkey: symmetric key
+        :param int region_num: region number of the first region
+        :param int region_size: plaintext region size
+        :param object source: shared memory slot or encrypted data file,
+            the file is removed once read
+        """
+        self._track_slot(final_path, offsets, source)
+        self._task_queue.put(
+            (CryptoAction.DecryptRegions, final_path, internal_fdstart,
+             offsets, symkey, region_num, region_size, source)
         )
 
-    # UNUSED due to AES256-CBC FullBlob mode
-    def add_encrypt_chunk(self, local_file, offsets, symkey, iv):  # noqa
-        # type: (CryptoOffload, pathlib.Path, blobxfer.models.upload.Offsets,
-        #        bytes, bytes) -> None
-        """Add a chunk to encrypt
+    def add_encrypt_chunk(
+            self, uid, local_file, fd_start, offsets, num_bytes, symkey):
+        # type: (CryptoOffload, str, pathlib.Path, int,
+        #        blobxfer.models.upload.Offsets, int, bytes) -> None
+        """Add a chunk to encrypt as a single region
         :param CryptoOffload self: this
+        :param str uid: unique id of upload descriptor
         :param pathlib.Path local_file: local file
+        :param int fd_start: file offset of plaintext
         :param blobxfer.models.upload.Offsets offsets: offsets
+        :param int num_bytes: number of plaintext bytes
         :param bytes symkey: symmetric key
-        :param bytes iv: initialization vector
         """
+        # encrypted output is placed into the shared memory ring if a
+        # slot is available, otherwise into a temporary file
+        dest = None
+        if self._ring is not None:
+            dest = self._ring.allocate(
+                num_bytes +
+                blobxfer.models.crypto.AES256_GCM_REGION_OVERHEAD_BYTES)
         self._task_queue.put(
-            (CryptoAction.Encrypt, str(local_file), offsets, symkey, iv)
+            (CryptoAction.Encrypt, uid, str(local_file), fd_start, offsets,
+             num_bytes, symkey, dest)
         )
@@ -27,18 +27,25 @@ import enum
 import logging
 import pathlib
 import queue
+import tempfile
 import threading
 import time
 # non-stdlib imports
 # local imports
 import blobxfer.models.crypto
+import blobxfer.models.filehandle
 import blobxfer.models.metadata
+import blobxfer.models.options
+import blobxfer.models.workqueue
 import blobxfer.operations.azure.blob
 import blobxfer.operations.azure.file
+import blobxfer.operations.chunksize
+import blobxfer.operations.concurrency
 import blobxfer.operations.crypto
 import blobxfer.operations.md5
 import blobxfer.operations.progress
 import blobxfer.operations.resume
+import blobxfer.operations.syncstate
 import blobxfer.util
 
 # create logger
@@ -69,14 +76,22 @@ class Downloader(object):
         self._md5_map = {}
         self._md5_offload = None
         self._transfer_lock = threading.Lock()
-        self._transfer_queue = queue.Queue()
+        self._transfer_queue = blobxfer.models.workqueue.WorkQueue()
         self._transfer_set = set()
         self._transfer_threads = []
         self._transfer_cc = {}
         self._disk_operation_lock = threading.Lock()
-        self._disk_queue = queue.Queue()
+        self._disk_queue = blobxfer.models.workqueue.WorkQueue()
         self._disk_set = set()
+        self._disk_backpressure = blobxfer.models.workqueue.Backpressure(
+            self._disk_operation_lock)
         self._disk_threads = []
+        self._memory_budget = blobxfer.models.workqueue.MemoryBudget(
+            general_options.concurrency.max_memory_bytes)
+        self._concurrency_controller = None
+        self._chunk_sizer = None
+        self._writer_pool = blobxfer.models.filehandle.FileWriterPool(
+            durability=spec.options.durability)
         self._download_start_time = None
         self._download_total = 0
         self._download_sofar = 0
@@ -91,6 +106,7 @@ class Downloader(object):
         self._creds = creds
         self._spec = spec
         self._resume = None
+        self._sync_state = None
         self._exceptions = []
 
     @property
@@ -195,6 +211,22 @@ class Downloader(object):
              dd.entity.path, str(offsets.range_start))
         )
 
+    @staticmethod
+    def compute_inflight_bytes(dd, offsets):
+        # type: (blobxfer.models.download.Descriptor,
+        #        blobxfer.models.download.Offsets) -> int
+        """Compute the number of in-flight memory bytes required to
+        download and process a chunk
+        :param blobxfer.models.download.Descriptor dd: download descriptor
+        :param blobxfer.models.download.Offsets offsets: download offsets
+        :rtype: int
+        :return: number of bytes
+        """
+        # encrypted chunks are held along with their decrypted data
+        if dd.entity.is_encrypted:
+            return offsets.num_bytes << 1
+        return offsets.num_bytes
+
     def _update_progress_bar(self):
         # type: (Downloader) -> None
         """Update progress bar
@@ -208,8 +240,77 @@ class Downloader(object):
             self._download_sofar,
             self._download_bytes_total,
             self._download_bytes_sofar,
+            memory_budget=self._memory_budget,
         )
 
+    def _initialize_sync_state(self):
+        # type: (Downloader) -> None
+        """Initialize sync state, if specified
+        :param Downloader self: this
+        """
+        if self._general_options.sync_state is None:
+            return
+        self._sync_state = blobxfer.operations.syncstate.SyncStateManager(
+            self._general_options.sync_state)
+
+    def _sync_state_eligible(self, rfile):
+        # type: (Downloader, blobxfer.models.azure.StorageEntity) -> bool
+        """Check if a remote file can be tracked in the sync state
+        :param Downloader self: this
+        :param blobxfer.models.azure.StorageEntity rfile: remote file
+        :rtype: bool
+        :return: if eligible
+        """
+        return (self._sync_state is not None and
+                not self._general_options.dry_run and
+                rfile.vectored_io is None)
+
+    def _check_sync_state(self, lpath, rfile):
+        # type: (Downloader, pathlib.Path,
+        #        blobxfer.models.azure.StorageEntity) -> bool
+        """Check if a local file and its remote source are unchanged since
+        the last sync
+        :param Downloader self: this
+        :param pathlib.Path lpath: local path
+        :param blobxfer.models.azure.StorageEntity rfile: remote file
+        :rtype: bool
+        :return: if unchanged
+        """
+        if not self._sync_state_eligible(rfile):
+            return False
+        key = blobxfer.operations.syncstate.SyncStateManager.\
+            generate_local_key(lpath)
+        record = self._sync_state.get_record(key)
+        if (record is None or
+                not blobxfer.operations.syncstate.SyncStateManager.
+                remote_matches(record, rfile.etag, rfile.lmt) or
+                not blobxfer.operations.syncstate.SyncStateManager.
+                local_matches(record, lpath.stat())):
+            return False
+        self._sync_state.mark_unchanged(key, record)
+        if self._general_options.verbose:
+            logger.debug('sync state unchanged: {} -> {}'.format(
+                rfile.path, lpath))
+        return True
+
+    def _update_sync_state(self, lpath, rfile):
+        # type: (Downloader, pathlib.Path,
+        #        blobxfer.models.azure.StorageEntity) -> None
+        """Record the local and remote state of a synchronized file
+        :param Downloader self: this
+        :param pathlib.Path lpath: local path
+        :param blobxfer.models.azure.StorageEntity rfile: remote file
+        """
+        if not self._sync_state_eligible(rfile):
+            return
+        try:
+            stat = lpath.stat()
+        except OSError:
+            return
+        self._sync_state.add_or_update_record(
+            blobxfer.operations.syncstate.SyncStateManager.generate_local_key(
+                lpath), stat, rfile.etag, rfile.lmt, rfile.md5)
+
     def _check_download_conditions(self, lpath, rfile):
         # type: (Downloader, pathlib.Path,
         #        blobxfer.models.azure.StorageEntity) -> DownloadAction
@@ -233,6 +334,9 @@ class Downloader(object):
                 'not overwriting local file: {} (remote: {})'.format(
                     lpath, rfile.path))
             return DownloadAction.Skip
+        # skip if unchanged since the last sync
+        if self._check_sync_state(lpath, rfile):
+            return DownloadAction.Skip
         # check skip on options, MD5 match takes priority
         md5 = blobxfer.models.metadata.get_md5_from_metadata(rfile)
         if self._spec.skip_on.md5_match and blobxfer.util.is_not_empty(md5):
@@ -328,6 +432,8 @@ class Downloader(object):
             if self._general_options.dry_run:
                 logger.info('[DRY RUN] MD5 match, skipping: {} -> {}'.format(
                     rfile.path, lpath))
+            else:
+                self._update_sync_state(lpath, rfile)
         else:
             if self._general_options.dry_run:
                 with self._transfer_lock:
@@ -365,6 +471,9 @@ class Downloader(object):
             if result is not None:
                 self._post_md5_skip_on_check(
                     result[0], result[1], result[2], result[3], result[4])
+        # wake workers if the last download was skipped
+        if self.termination_check:
+            self._signal_termination()
 
     def _check_for_crypto_done(self):
         # type: (Downloader) -> None
@@ -388,7 +497,11 @@ class Downloader(object):
             cv.release()
             if result is not None:
                 try:
-                    final_path, offsets = result
+                    final_path, offsets, error = result
+                    if error is not None:
+                        raise RuntimeError(
+                            'failed to decrypt chunk {} of {}: {}'.format(
+                                offsets.chunk_num, final_path, error))
                     with self._transfer_lock:
                         dd = self._dd_map[final_path]
                     self._finalize_chunk(dd, offsets)
@@ -396,6 +509,10 @@ class Downloader(object):
                     # this can happen if all of the last integrity
                     # chunks are processed at once
                     pass
+                except Exception as e:
+                    with self._transfer_lock:
+                        self._exceptions.append(e)
+        self._signal_termination()
 
     def _add_to_download_queue(self, lpath, rfile):
         # type: (Downloader, pathlib.Path,
@@ -406,9 +523,15 @@ class Downloader(object):
         :param blobxfer.models.azure.StorageEntity rfile: remote file
         """
         # prepare remote file for download
+        if self._chunk_sizer is not None:
+            auto_chunk_size = self._chunk_sizer.next_chunk_size()
+        else:
+            auto_chunk_size = None
         dd = blobxfer.models.download.Descriptor(
             lpath, rfile, self._spec.options, self._general_options,
-            self._resume)
+            self._resume, writer=self._writer_pool,
+            auto_chunk_size=auto_chunk_size,
+            memory_budget=self._memory_budget)
         with self._transfer_lock:
             self._transfer_cc[dd.entity.path] = 0
             if dd.entity.is_encrypted:
@@ -432,14 +555,49 @@ class Downloader(object):
             self._disk_threads.append(thr)
             thr.start()
 
+    def _initialize_concurrency_controller(self):
+        # type: (Downloader) -> None
+        """Initialize adaptive concurrency controller in auto mode
+        :param Downloader self: this
+        """
+        if (self._general_options.concurrency.mode !=
+                blobxfer.models.options.ConcurrencyMode.Auto):
+            return
+        self._concurrency_controller = blobxfer.operations.concurrency.\
+            AdaptiveConcurrencyController(
+                initial=self._general_options.concurrency.transfer_threads,
+                maximum=self._general_options.concurrency.
+                max_transfer_threads,
+                description='download')
+        self._concurrency_controller.start()
+
+    def _initialize_chunk_sizer(self):
+        # type: (Downloader) -> None
+        """Initialize adaptive chunk sizer if chunk sizes are auto-selected
+        in adaptive mode
+        :param Downloader self: this
+        """
+        if (self._spec.options.chunk_size_bytes != 0 or
+                self._spec.options.chunk_size_mode !=
+                blobxfer.models.options.ChunkSizeMode.Adaptive):
+            return
+        self._chunk_sizer = blobxfer.operations.chunksize.AdaptiveChunkSizer(
+            default=blobxfer.models.download._AUTO_SELECT_CHUNKSIZE_BYTES,
+            maximum=blobxfer.models.download._MAX_ADAPTIVE_CHUNKSIZE_BYTES,
+            description='download')
+
     def _initialize_transfer_threads(self):
         # type: (Downloader) -> None
         """Initialize transfer threads
         :param Downloader self: this
         """
-        logger.debug('spawning {} transfer threads'.format(
-            self._general_options.concurrency.transfer_threads))
-        for _ in range(self._general_options.concurrency.transfer_threads):
+        # in auto mode, spawn threads up to the maximum to be admitted
+        # by the concurrency controller
+        num_threads = self._general_options.concurrency.transfer_threads
+        if self._concurrency_controller is not None:
+            num_threads = self._concurrency_controller.maximum
+        logger.debug('spawning {} transfer threads'.format(num_threads))
+        for _ in range(num_threads):
             thr = threading.Thread(target=self._worker_thread_transfer)
             self._transfer_threads.append(thr)
             thr.start()
@@ -452,6 +610,8 @@ class Downloader(object):
         """
         if terminate:
             self._download_terminate = terminate
+        if self.termination_check:
+            self._signal_termination()
         for thr in self._disk_threads:
             thr.join()
 
@@ -463,9 +623,23 @@ class Downloader(object):
         """
         if terminate:
             self._download_terminate = terminate
+        if self.termination_check:
+            self._signal_termination()
         for thr in self._transfer_threads:
             thr.join()
 
+    def _signal_termination(self):
+        # type: (Downloader) -> None
+        """Wake all threads blocked on work queues or backpressure
+        :param Downloader self: this
+        """
+        self._transfer_queue.terminate()
+        self._disk_queue.terminate()
+        self._disk_backpressure.terminate()
+        self._memory_budget.terminate()
+        if self._concurrency_controller is not None:
+            self._concurrency_controller.terminate()
+
     def _worker_thread_transfer(self):
         # type: (Downloader) -> None
         """Worker thread download
@@ -473,12 +647,12 @@ class Downloader(object):
         """
         max_set_len = self._general_options.concurrency.disk_threads << 2
         while not self.termination_check:
+            # wait for outstanding disk operations to drain below threshold
+            if not self._disk_backpressure.wait(
+                    lambda: len(self._disk_set) <= max_set_len):
+                continue
             try:
-                if len(self._disk_set) > max_set_len:
-                    time.sleep(0.1)
-                    continue
-                else:
-                    dd = self._transfer_queue.get(block=False, timeout=0.1)
+                dd = self._transfer_queue.get()
             except queue.Empty:
                 continue
             try:
@@ -486,6 +660,7 @@ class Downloader(object):
             except Exception as e:
                 with self._transfer_lock:
                     self._exceptions.append(e)
+        self._signal_termination()
 
     def _worker_thread_disk(self):
         # type: (Downloader) -> None
@@ -494,8 +669,7 @@ class Downloader(object):
         """
         while not self.termination_check:
             try:
-                dd, offsets, data = self._disk_queue.get(
-                    block=False, timeout=0.1)
+                dd, offsets, data = self._disk_queue.get()
             except queue.Empty:
                 continue
             try:
@@ -503,6 +677,7 @@ class Downloader(object):
             except Exception as e:
                 with self._transfer_lock:
                     self._exceptions.append(e)
+        self._signal_termination()
 
     def _process_download_descriptor(self, dd):
         # type: (Downloader, blobxfer.models.download.Descriptor) -> None
@@ -522,7 +697,11 @@ class Downloader(object):
                     resume_bytes, self._download_bytes_sofar, dd.entity.name))
             del resume_bytes
         # check if all operations completed
-        if offsets is None and dd.all_operations_completed:
+        if offsets is None:
+            # descriptors with outstanding chunks are re-enqueued for
+            # finalization when the last chunk completes
+            if not dd.claim_finalization():
+                return
             finalize = True
             sfpath = str(dd.final_path)
             # finalize integrity
@@ -542,6 +721,7 @@ class Downloader(object):
             # finalize file
             if finalize:
                 dd.finalize_file()
+                self._update_sync_state(dd.final_path, dd.entity)
             # accounting
             with self._transfer_lock:
                 self._download_sofar += 1
@@ -552,9 +732,10 @@ class Downloader(object):
                     create_unique_transfer_operation_id(dd.entity))
                 self._transfer_cc.pop(dd.entity.path, None)
             return
-        # re-enqueue for other threads to download
-        if offsets is None:
-            self._transfer_queue.put(dd)
+        # wait for in-flight memory to be available for this chunk
+        if not self._memory_budget.acquire(
+                blobxfer.operations.download.Downloader.
+                compute_inflight_bytes(dd, offsets)):
             return
         # ensure forthcoming disk operation is accounted for
         with self._disk_operation_lock:
@@ -567,13 +748,27 @@ class Downloader(object):
             cc_xfer = self._transfer_cc[dd.entity.path]
         if cc_xfer <= self._spec.options.max_single_object_concurrency:
             self._transfer_queue.put(dd)
+        # wait to be admitted by the concurrency controller
+        if (self._concurrency_controller is not None and
+                not self._concurrency_controller.acquire()):
+            return
         # issue get range
-        if dd.entity.mode == blobxfer.models.azure.StorageModes.File:
-            data = blobxfer.operations.azure.file.get_file_range(
-                dd.entity, offsets)
-        else:
-            data = blobxfer.operations.azure.blob.get_blob_range(
-                dd.entity, offsets)
+        try:
+            start = time.monotonic()
+            if dd.entity.mode == blobxfer.models.azure.StorageModes.File:
+                data = blobxfer.operations.azure.file.get_file_range(
+                    dd.entity, offsets)
+            else:
+                data = blobxfer.operations.azure.blob.get_blob_range(
+                    dd.entity, offsets)
+            latency = time.monotonic() - start
+        finally:
+            if self._concurrency_controller is not None:
+                self._concurrency_controller.release()
+        if self._concurrency_controller is not None:
+            self._concurrency_controller.record(len(data), latency)
+        if self._chunk_sizer is not None:
+            self._chunk_sizer.record(len(data), latency)
         with self._transfer_lock:
             self._transfer_cc[dd.entity.path] -= 1
         if cc_xfer > self._spec.options.max_single_object_concurrency:
@@ -591,7 +786,38 @@ class Downloader(object):
         :param bytes data: data to process
         """
         # decrypt if necessary
-        if dd.entity.is_encrypted:
+        if dd.is_encrypted_in_regions:
+            region_size = dd.entity.encryption_metadata.encrypted_region_size
+            region_num = offsets.range_start // dd.encrypted_region_stride
+            # retain region tags for the mac over all tags
+            dd.write_unchecked_hmac_data(
+                offsets,
+                blobxfer.operations.crypto.aes_gcm_region_tags(
+                    region_size, data),
+                persist=False)
+            # decrypt and authenticate regions
+            if self._crypto_offload is not None:
+                # hand data to the worker through shared memory, using a
+                # temp file only if the ring overflows
+                source = self._crypto_offload.stage_data(data)
+                if source is None:
+                    with tempfile.NamedTemporaryFile(
+                            mode='wb', delete=False) as fd:
+                        fd.write(data)
+                    source = fd.name
+                self._crypto_offload.add_decrypt_regions_chunk(
+                    str(dd.final_path), dd.view.fd_start, offsets,
+                    dd.entity.encryption_metadata.symmetric_key,
+                    region_num, region_size, source)
+                # data will be integrity checked and written once
+                # retrieved from crypto queue
+                return
+            else:
+                data = blobxfer.operations.crypto.aes_gcm_decrypt_regions(
+                    dd.entity.encryption_metadata.symmetric_key,
+                    region_num, region_size, data)
+                dd.write_data(offsets, data)
+        elif dd.entity.is_encrypted:
             # slice data to proper bounds and get iv for chunk
             if offsets.chunk_num == 0:
                 # set iv
@@ -603,17 +829,24 @@ class Downloader(object):
             else:
                 # set iv
                 iv = data[:blobxfer.models.crypto.AES256_BLOCKSIZE_BYTES]
-                # set data to decrypt
-                encdata = data[blobxfer.models.crypto.AES256_BLOCKSIZE_BYTES:]
-            # write encdata to disk for hmac later
+                # set data to decrypt as a view to avoid copying the chunk
+                encdata = memoryview(data)[
+                    blobxfer.models.crypto.AES256_BLOCKSIZE_BYTES:]
+            # hand encdata to crypto offload through shared memory if
+            # possible, otherwise persist it to disk
+            source = None
+            if self._crypto_offload is not None:
+                source = self._crypto_offload.stage_data(encdata)
+            # retain encdata for hmac later
             _hmac_datafile = dd.write_unchecked_hmac_data(
-                offsets, encdata)
+                offsets, encdata,
+                persist=self._crypto_offload is not None and source is None)
             # decrypt data
             if self._crypto_offload is not None:
                 self._crypto_offload.add_decrypt_chunk(
                     str(dd.final_path), dd.view.fd_start, offsets,
                     dd.entity.encryption_metadata.symmetric_key,
-                    iv, _hmac_datafile)
+                    iv, source or _hmac_datafile)
                 # data will be integrity checked and written once
                 # retrieved from crypto queue
                 return
@@ -647,6 +880,13 @@ class Downloader(object):
                 blobxfer.operations.download.Downloader.
                 create_unique_disk_operation_id(dd, offsets))
             self._download_bytes_sofar += offsets.num_bytes
+            self._disk_backpressure.notify()
+        self._memory_budget.release(
+            blobxfer.operations.download.Downloader.
+            compute_inflight_bytes(dd, offsets))
+        # re-enqueue for finalization once the last chunk completes
+        if dd.all_operations_completed:
+            self._transfer_queue.put(dd)
 
     def _cleanup_temporary_files(self):
         # type: (Downloader) -> None
@@ -712,6 +952,8 @@ class Downloader(object):
         if self._general_options.resume_file is not None:
             self._resume = blobxfer.operations.resume.DownloadResumeManager(
                 self._general_options.resume_file)
+        # initialize sync state if specified
+        self._initialize_sync_state()
         # initialize MD5 processes
         if (self._spec.options.check_file_md5 and
                 self._general_options.concurrency.md5_processes > 0):
@@ -722,10 +964,15 @@ class Downloader(object):
         # initialize crypto processes
         if self._general_options.concurrency.crypto_processes > 0:
             self._crypto_offload = blobxfer.operations.crypto.CryptoOffload(
-                num_workers=self._general_options.concurrency.crypto_processes)
+                num_workers=self._general_options.concurrency.crypto_processes,
+                slot_size=blobxfer.models.download.Descriptor.max_chunk_size(
+                    self._spec.options) +
+                blobxfer.models.crypto.AES256_BLOCKSIZE_BYTES)
             self._crypto_offload.initialize_check_thread(
                 self._check_for_crypto_done)
         # initialize download threads
+        self._initialize_concurrency_controller()
+        self._initialize_chunk_sizer()
         self._initialize_transfer_threads()
         self._initialize_disk_threads()
         # initialize local counters
@@ -855,6 +1102,7 @@ class Downloader(object):
                  'GiB: {1:.3f} sec, {2:.4f} Mbps ({3:.3f} MiB/sec)').format(
                      download_size_mib / 1024, dltime, dlmibspeed * 8,
                      dlmibspeed))
+        blobxfer.operations.progress.output_memory_usage(self._memory_budget)
         end_time = blobxfer.util.datetime_now()
         logger.info('blobxfer end time: {0} (elapsed: {1:.3f} sec)'.format(
             end_time, (end_time - self._start_time).total_seconds()))
@@ -889,6 +1137,10 @@ class Downloader(object):
                 self._md5_offload.finalize_processes()
             if self._crypto_offload is not None:
                 self._crypto_offload.finalize_processes()
-            # close resume file
+            # close pooled file descriptors
+            self._writer_pool.close_all()
+            # close resume file and sync state
             if self._resume is not None:
                 self._resume.close()
+            if self._sync_state is not None:
+                self._sync_state.close()
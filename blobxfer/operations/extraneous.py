@@ -0,0 +1,301 @@
+# Copyright (c) Microsoft Corporation
+#
+# All rights reserved.
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+# stdlib imports
+import logging
+import pathlib
+import queue
+import threading
+# non-stdlib imports
+import azure.common
+# local imports
+import blobxfer.models.spill
+import blobxfer.models.workqueue
+import blobxfer.operations.azure.blob
+import blobxfer.operations.azure.file
+import blobxfer.util
+
+# create logger
+logger = logging.getLogger(__name__)
+
+
+class KeepManifest(object):
+    """Ids of destination entities to keep when deleting extraneous
+    entities. Ids are held in memory until a threshold is reached and are
+    then spilled to a sorted on-disk database."""
+    def __init__(
+            self,
+            spill_threshold=blobxfer.models.spill.DEFAULT_SPILL_THRESHOLD):
+        # type: (KeepManifest, int) -> None
+        """Ctor for KeepManifest
+        :param KeepManifest self: this
+        :param int spill_threshold: number of ids held in memory before
+            the manifest is spilled to disk
+        """
+        self._lock = threading.Lock()
+        self._ids = blobxfer.models.spill.SpillableStore(
+            'keep_manifest', spill_threshold=spill_threshold)
+
+    @property
+    def spilled(self):
+        # type: (KeepManifest) -> bool
+        """Check if manifest has spilled to disk
+        :param KeepManifest self: this
+        :rtype: bool
+        :return: if manifest is on disk
+        """
+        return self._ids.spilled
+
+    def add(self, id):
+        # type: (KeepManifest, str) -> None
+        """Add an id to keep
+        :param KeepManifest self: this
+        :param str id: id
+        """
+        with self._lock:
+            self._ids.put(id)
+
+    def __contains__(self, id):
+        # type: (KeepManifest, str) -> bool
+        """Check if an id is kept
+        :param KeepManifest self: this
+        :param str id: id
+        :rtype: bool
+        :return: if id is kept
+        """
+        with self._lock:
+            return id in self._ids
+
+    def __len__(self):
+        # type: (KeepManifest) -> int
+        """Number of ids kept
+        :param KeepManifest self: this
+        :rtype: int
+        :return: number of ids
+        """
+        with self._lock:
+            return len(self._ids)
+
+    def close(self):
+        # type: (KeepManifest) -> None
+        """Close the manifest and remove any on-disk database
+        :param KeepManifest self: this
+        """
+        with self._lock:
+            self._ids.close()
+
+
+class ExtraneousDeleter(object):
+    """Delete extraneous entities under destination paths. Each path is
+    listed by prefix on a lister thread and entities which are not in the
+    keep manifest are deleted by a pool of threads."""
+    def __init__(
+            self, manifest, create_id, num_threads, dry_run=False,
+            verbose=False):
+        # type: (ExtraneousDeleter, KeepManifest, callable, int, bool,
+        #        bool) -> None
+        """Ctor for ExtraneousDeleter
+        :param ExtraneousDeleter self: this
+        :param KeepManifest manifest: ids of entities to keep
+        :param callable create_id: creates an id from a client, container
+            and name
+        :param int num_threads: number of delete threads
+        :param bool dry_run: only log deletions
+        :param bool verbose: log each deletion
+        """
+        self._manifest = manifest
+        self._create_id = create_id
+        self._num_threads = max((num_threads, 1))
+        self._dry_run = dry_run
+        self._verbose = verbose
+        self._lock = threading.Lock()
+        self._queue = blobxfer.models.workqueue.WorkQueue()
+        self._backpressure = blobxfer.models.workqueue.Backpressure(
+            self._lock)
+        self._outstanding = 0
+        self._threads = []
+        self._exceptions = []
+        self._deleted = 0
+        self._terminated = False
+
+    @property
+    def deleted(self):
+        # type: (ExtraneousDeleter) -> int
+        """Number of entities deleted
+        :param ExtraneousDeleter self: this
+        :rtype: int
+        :return: deleted count
+        """
+        with self._lock:
+            return self._deleted
+
+    def start(self, paths):
+        # type: (ExtraneousDeleter, list) -> None
+        """Start listing paths and deleting extraneous entities
+        :param ExtraneousDeleter self: this
+        :param list paths: list of (storage account, container, virtual
+            path, is file) tuples
+        """
+        thr = threading.Thread(target=self._lister_thread, args=(paths, ))
+        self._threads.append(thr)
+        thr.start()
+        for _ in range(self._num_threads):
+            thr = threading.Thread(target=self._worker_thread)
+            self._threads.append(thr)
+            thr.start()
+
+    def terminate(self):
+        # type: (ExtraneousDeleter) -> None
+        """Stop listing and deleting, and wait for threads to exit
+        :param ExtraneousDeleter self: this
+        """
+        with self._lock:
+            self._terminated = True
+        self._backpressure.terminate()
+        self._queue.terminate()
+        for thr in self._threads:
+            thr.join()
+
+    def join(self):
+        # type: (ExtraneousDeleter) -> None
+        """Wait for all deletions to complete
+        :param ExtraneousDeleter self: this
+        """
+        for thr in self._threads:
+            thr.join()
+        logger.info('deleted {} extraneous blobs/files'.format(
+            self._deleted))
+        if len(self._exceptions) > 0:
+            raise self._exceptions[0]
+
+    @staticmethod
+    def _list(sa, container, vpath, is_file):
+        # type: (blobxfer.operations.azure.StorageAccount, str, str,
+        #        bool) -> str
+        """List entity names under a virtual path
+        :param blobxfer.operations.azure.StorageAccount sa: storage account
+        :param str container: container or file share
+        :param str vpath: virtual path
+        :param bool is_file: if entities are files
+        :rtype: str
+        :return: generator of names
+        """
+        prefix = vpath if blobxfer.util.is_not_empty(vpath) else None
+        try:
+            if is_file:
+                names = blobxfer.operations.azure.file.list_all_files(
+                    sa.file_client, container, prefix=prefix)
+            else:
+                names = (
+                    blob.name for blob in
+                    blobxfer.operations.azure.blob.list_all_blobs(
+                        sa.block_blob_client, container, prefix=prefix)
+                )
+            for name in names:
+                # blob prefixes may match names outside of the virtual path
+                if prefix is not None:
+                    try:
+                        pathlib.Path(name).relative_to(prefix)
+                    except ValueError:
+                        continue
+                yield name
+        except azure.common.AzureMissingResourceHttpError:
+            # virtual path is not a directory
+            if not is_file:
+                raise
+
+    def _lister_thread(self, paths):
+        # type: (ExtraneousDeleter, list) -> None
+        """Lister thread
+        :param ExtraneousDeleter self: this
+        :param list paths: list of (storage account, container, virtual
+            path, is file) tuples
+        """
+        checked = set()
+        try:
+            for sa, container, vpath, is_file in paths:
+                key = ';'.join((sa.name, sa.endpoint, container, vpath or ''))
+                if key in checked:
+                    continue
+                checked.add(key)
+                logger.debug(
+                    'attempting to delete extraneous blobs/files from: '
+                    '{}'.format(key))
+                client = sa.file_client if is_file else sa.block_blob_client
+                for name in ExtraneousDeleter._list(
+                        sa, container, vpath, is_file):
+                    if self._terminated:
+                        return
+                    if self._create_id(client, container, name) in \
+                            self._manifest:
+                        continue
+                    if self._dry_run:
+                        logger.info('[DRY RUN] deleting {}: {}'.format(
+                            'file' if is_file else 'blob', name))
+                        continue
+                    # limit queued deletions
+                    if not self._backpressure.wait(
+                            lambda: self._outstanding <
+                            4 * self._num_threads):
+                        return
+                    with self._lock:
+                        self._outstanding += 1
+                    self._queue.put((client, container, name, is_file))
+        except Exception as e:
+            with self._lock:
+                self._exceptions.append(e)
+        finally:
+            self._queue.terminate()
+
+    def _worker_thread(self):
+        # type: (ExtraneousDeleter) -> None
+        """Delete worker thread
+        :param ExtraneousDeleter self: this
+        """
+        while not self._terminated:
+            try:
+                client, container, name, is_file = self._queue.get()
+            except queue.Empty:
+                break
+            try:
+                if self._verbose:
+                    logger.debug('deleting {}: {}'.format(
+                        'file' if is_file else 'blob', name))
+                if is_file:
+                    blobxfer.operations.azure.file.delete_file(
+                        client, container, name)
+                else:
+                    blobxfer.operations.azure.blob.delete_blob(
+                        client, container, name)
+                with self._lock:
+                    self._deleted += 1
+            except azure.common.AzureMissingResourceHttpError:
+                # already deleted through an overlapping path
+                pass
+            except Exception as e:
+                with self._lock:
+                    self._exceptions.append(e)
+            finally:
+                with self._lock:
+                    self._outstanding -= 1
+                    self._backpressure.notify()
@@ -0,0 +1,306 @@
+# Copyright (c) Microsoft Corporation
+#
+# All rights reserved.
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+# stdlib imports
+import logging
+import threading
+# non-stdlib imports
+import azure.common
+import azure.storage.blob.models
+# local imports
+import blobxfer.models.azure
+import blobxfer.models.spill
+import blobxfer.operations.azure.blob
+import blobxfer.operations.azure.file
+import blobxfer.util
+
+# create logger
+logger = logging.getLogger(__name__)
+
+
+class RemoteIndex(object):
+    """Index of remote entities under destination prefixes, populated by a
+    single listing per prefix instead of a property request per entity"""
+    def __init__(
+            self,
+            spill_threshold=blobxfer.models.spill.DEFAULT_SPILL_THRESHOLD):
+        # type: (RemoteIndex, int) -> None
+        """Ctor for RemoteIndex
+        :param RemoteIndex self: this
+        :param int spill_threshold: number of entries held in memory before
+            the index is spilled to disk
+        """
+        self._lock = threading.Lock()
+        self._prefixes = {}
+        self._entries = blobxfer.models.spill.SpillableStore(
+            'remote_index', spill_threshold=spill_threshold)
+        self._num_entries = 0
+
+    @property
+    def num_entries(self):
+        # type: (RemoteIndex) -> int
+        """Number of entries indexed
+        :param RemoteIndex self: this
+        :rtype: int
+        :return: number of entries
+        """
+        return self._num_entries
+
+    @property
+    def spilled(self):
+        # type: (RemoteIndex) -> bool
+        """Check if index has spilled to disk
+        :param RemoteIndex self: this
+        :rtype: bool
+        :return: if index is on disk
+        """
+        return self._entries.spilled
+
+    @staticmethod
+    def _normalize_prefix(prefix):
+        # type: (str) -> str
+        """Normalize a prefix
+        :param str prefix: prefix
+        :rtype: str
+        :return: normalized prefix
+        """
+        if blobxfer.util.is_none_or_empty(prefix):
+            return ''
+        return prefix.strip('/')
+
+    @staticmethod
+    def _entry_key(sa, container, is_file, name):
+        # type: (blobxfer.operations.azure.StorageAccount, str, bool,
+        #        str) -> str
+        """Generate an entry key
+        :param blobxfer.operations.azure.StorageAccount sa: storage account
+        :param str container: container or file share
+        :param bool is_file: if entity is a file
+        :param str name: entity name
+        :rtype: str
+        :return: entry key
+        """
+        return '{}:{}:{}:{}'.format(
+            sa.name, container, 'f' if is_file else 'b', name)
+
+    def add_prefix(self, sa, container, prefix):
+        # type: (RemoteIndex, blobxfer.operations.azure.StorageAccount, str,
+        #        str) -> None
+        """Add a destination prefix to index. The prefix is listed upon
+        the first lookup of an entity under it.
+        :param RemoteIndex self: this
+        :param blobxfer.operations.azure.StorageAccount sa: storage account
+        :param str container: container or file share
+        :param str prefix: prefix
+        """
+        prefix = RemoteIndex._normalize_prefix(prefix)
+        with self._lock:
+            for is_file in (False, True):
+                key = (sa.name, container, is_file)
+                self._prefixes.setdefault(key, {}).setdefault(prefix, False)
+
+    def _find_prefix(self, sa, container, is_file, name):
+        # type: (RemoteIndex, blobxfer.operations.azure.StorageAccount, str,
+        #        bool, str) -> str
+        """Find the longest added prefix covering a name
+        :param RemoteIndex self: this
+        :param blobxfer.operations.azure.StorageAccount sa: storage account
+        :param str container: container or file share
+        :param bool is_file: if entity is a file
+        :param str name: entity name
+        :rtype: str
+        :return: prefix or None if name is not covered
+        """
+        prefixes = self._prefixes.get((sa.name, container, is_file))
+        if prefixes is None:
+            return None
+        match = None
+        for prefix in prefixes:
+            if (prefix == '' or name == prefix or
+                    name.startswith(prefix + '/')):
+                if match is None or len(prefix) > len(match):
+                    match = prefix
+        return match
+
+    def _add_entry(self, key, value):
+        # type: (RemoteIndex, str, tuple) -> None
+        """Add an entry to the index
+        :param RemoteIndex self: this
+        :param str key: entry key
+        :param tuple value: entry value
+        """
+        self._num_entries += 1
+        self._entries.put(key, value)
+
+    def _get_entry(self, key):
+        # type: (RemoteIndex, str) -> tuple
+        """Get an entry from the index
+        :param RemoteIndex self: this
+        :param str key: entry key
+        :rtype: tuple
+        :return: entry value or None if it does not exist
+        """
+        return self._entries.get(key)
+
+    def _populate_blobs(self, sa, container, prefix, timeout=None):
+        # type: (RemoteIndex, blobxfer.operations.azure.StorageAccount, str,
+        #        str, int) -> None
+        """Populate index from a blob listing
+        :param RemoteIndex self: this
+        :param blobxfer.operations.azure.StorageAccount sa: storage account
+        :param str container: container
+        :param str prefix: prefix
+        :param int timeout: timeout
+        """
+        try:
+            blobs = blobxfer.operations.azure.blob.list_blobs(
+                sa.block_blob_client, container, prefix,
+                blobxfer.models.azure.StorageModes.Auto, True,
+                timeout=timeout)
+            for blob in blobs:
+                if not (prefix == '' or blob.name == prefix or
+                        blob.name.startswith(prefix + '/')):
+                    continue
+                props = blob.properties
+                self._add_entry(
+                    RemoteIndex._entry_key(sa, container, False, blob.name),
+                    (props.blob_type, props.content_length,
+                     props.last_modified,
+                     props.content_settings.content_md5,
+                     props.content_settings.cache_control,
+                     props.content_settings.content_type,
+                     props.blob_tier, blob.metadata, props.etag))
+        except azure.common.AzureMissingResourceHttpError:
+            pass
+
+    def _populate_files(self, sa, fileshare, prefix, timeout=None):
+        # type: (RemoteIndex, blobxfer.operations.azure.StorageAccount, str,
+        #        str, int) -> None
+        """Populate index from a file listing. Only names are indexed as
+        file listings do not include properties.
+        :param RemoteIndex self: this
+        :param blobxfer.operations.azure.StorageAccount sa: storage account
+        :param str fileshare: file share
+        :param str prefix: prefix
+        :param int timeout: timeout
+        """
+        try:
+            files = blobxfer.operations.azure.file.list_all_files(
+                sa.file_client, fileshare, timeout=timeout,
+                prefix=prefix if prefix != '' else None)
+            for name in files:
+                self._add_entry(
+                    RemoteIndex._entry_key(sa, fileshare, True, name), ())
+        except azure.common.AzureMissingResourceHttpError:
+            # prefix may be a single file rather than a directory
+            if prefix == '':
+                return
+            if blobxfer.operations.azure.file.get_file_properties(
+                    sa.file_client, fileshare, prefix,
+                    timeout=timeout) is not None:
+                self._add_entry(
+                    RemoteIndex._entry_key(sa, fileshare, True, prefix), ())
+
+    @staticmethod
+    def _entry_to_blob(name, entry, mode):
+        # type: (str, tuple, blobxfer.models.azure.StorageModes) ->
+        #        azure.storage.blob.models.Blob
+        """Convert an index entry to a blob
+        :param str name: blob name
+        :param tuple entry: index entry
+        :param blobxfer.models.azure.StorageModes mode: storage mode
+        :rtype: azure.storage.blob.models.Blob
+        :return: blob
+        """
+        blob_type = entry[0]
+        if ((mode == blobxfer.models.azure.StorageModes.Append and
+             blob_type != azure.storage.blob.models._BlobTypes.AppendBlob) or
+                (mode == blobxfer.models.azure.StorageModes.Block and
+                 blob_type !=
+                 azure.storage.blob.models._BlobTypes.BlockBlob) or
+                (mode == blobxfer.models.azure.StorageModes.Page and
+                 blob_type != azure.storage.blob.models._BlobTypes.PageBlob)):
+            raise RuntimeError(
+                'existing blob type {} mismatch with mode {}'.format(
+                    blob_type, mode))
+        blob = azure.storage.blob.models.Blob(name=name, metadata=entry[7])
+        blob.properties.blob_type = blob_type
+        blob.properties.content_length = entry[1]
+        blob.properties.last_modified = entry[2]
+        blob.properties.content_settings.content_md5 = entry[3]
+        blob.properties.content_settings.cache_control = entry[4]
+        blob.properties.content_settings.content_type = entry[5]
+        blob.properties.blob_tier = entry[6]
+        blob.properties.etag = entry[8]
+        return blob
+
+    def get_properties(self, sa, container, name, mode, timeout=None):
+        # type: (RemoteIndex, blobxfer.operations.azure.StorageAccount, str,
+        #        str, blobxfer.models.azure.StorageModes, int) -> object
+        """Get properties of a remote entity. Entities which are not covered
+        by an added prefix are retrieved directly.
+        :param RemoteIndex self: this
+        :param blobxfer.operations.azure.StorageAccount sa: storage account
+        :param str container: container or file share
+        :param str name: entity name
+        :param blobxfer.models.azure.StorageModes mode: storage mode
+        :param int timeout: timeout
+        :rtype: azure.storage.blob.models.Blob or
+            azure.storage.file.models.File
+        :return: blob or file properties or None if entity does not exist
+        """
+        is_file = mode == blobxfer.models.azure.StorageModes.File
+        with self._lock:
+            prefix = self._find_prefix(sa, container, is_file, name)
+            if prefix is not None:
+                prefixes = self._prefixes[(sa.name, container, is_file)]
+                if not prefixes[prefix]:
+                    if is_file:
+                        self._populate_files(sa, container, prefix, timeout)
+                    else:
+                        self._populate_blobs(sa, container, prefix, timeout)
+                    prefixes[prefix] = True
+                entry = self._get_entry(
+                    RemoteIndex._entry_key(sa, container, is_file, name))
+        if prefix is None:
+            if is_file:
+                return blobxfer.operations.azure.file.get_file_properties(
+                    sa.file_client, container, name, timeout=timeout)
+            return blobxfer.operations.azure.blob.get_blob_properties(
+                sa.block_blob_client, container, name, mode, timeout=timeout)
+        if entry is None:
+            return None
+        if is_file:
+            # file listings do not contain properties or metadata
+            return blobxfer.operations.azure.file.get_file_properties(
+                sa.file_client, container, name, timeout=timeout)
+        return RemoteIndex._entry_to_blob(name, entry, mode)
+
+    def close(self):
+        # type: (RemoteIndex) -> None
+        """Close the index and remove any on-disk database
+        :param RemoteIndex self: this
+        """
+        with self._lock:
+            self._entries.close()
@@ -34,6 +34,7 @@ import requests
 # local imports
 import blobxfer.models.azure
 import blobxfer.models.download
+import blobxfer.models.options
 import blobxfer.models.synccopy
 import blobxfer.models.upload
 import blobxfer.util
@@ -45,9 +46,10 @@ logger = logging.getLogger(__name__)
 
 def update_progress_bar(
         go, optext, start, total_files, files_sofar, total_bytes,
-        bytes_sofar, stdin_upload=False):
+        bytes_sofar, stdin_upload=False, memory_budget=None):
     # type: (blobxfer.models.options.General, str, datetime.datetime, int,
-    #        int, int, int, bool) -> None
+    #        int, int, int, bool,
+    #        blobxfer.models.workqueue.MemoryBudget) -> None
     """Update the progress bar
     :param blobxfer.models.options.General go: general options
     :param str optext: operation prefix text
@@ -57,6 +59,8 @@ def update_progress_bar(
     :param int total_bytes: total number of bytes
     :param int bytes_sofar: bytes transferred so far
     :param bool stdin_upload: stdin upload
+    :param blobxfer.models.workqueue.MemoryBudget memory_budget:
+        in-flight memory budget
     """
     if (go.quiet or not go.progress_bar or
             blobxfer.util.is_none_or_empty(go.log_file) or
@@ -91,11 +95,30 @@ def update_progress_bar(
              '{4} {5}').format(
                  optext, '>' * int(done * 30), done * 100, rate, fprog, rtext)
         )
+    if memory_budget is not None and memory_budget.limited:
+        sys.stdout.write(', {0:.1f}/{1:.1f} MiB in-flight'.format(
+            memory_budget.in_use / blobxfer.util.MEGABYTE,
+            memory_budget.max_bytes / blobxfer.util.MEGABYTE))
     if files_sofar == total_files:
         sys.stdout.write('\n')
     sys.stdout.flush()
 
 
+def output_memory_usage(memory_budget):
+    # type: (blobxfer.models.workqueue.MemoryBudget) -> None
+    """Log peak in-flight memory usage
+    :param blobxfer.models.workqueue.MemoryBudget memory_budget:
+        in-flight memory budget
+    """
+    if memory_budget.limited:
+        limit = '{0:.3f} MiB'.format(
+            memory_budget.max_bytes / blobxfer.util.MEGABYTE)
+    else:
+        limit = 'unlimited'
+    logger.info('peak in-flight memory: {0:.3f} MiB (limit: {1})'.format(
+        memory_budget.peak / blobxfer.util.MEGABYTE, limit))
+
+
 def output_parameters(general_options, spec):
     # type: (blobxfer.models.options.General, object) -> None
     """Output parameters
@@ -138,13 +161,14 @@ def output_parameters(general_options, spec):
         log.append('       transfer direction: {}'.format('local -> Azure'))
         log.append(
             ('                  workers: disk={} xfer={} md5={} '
-             'crypto={}').format(
+             'crypto={} scan={}').format(
                  general_options.concurrency.disk_threads,
                  general_options.concurrency.transfer_threads,
                  general_options.concurrency.md5_processes
                  if spec.skip_on.md5_match or
                  spec.options.store_file_properties.md5 else 0,
-                 0))
+                 0,
+                 general_options.concurrency.scan_threads))
     elif isinstance(spec, blobxfer.models.synccopy.Specification):
         log.append('       transfer direction: {}'.format('Azure -> Azure'))
         log.append(
@@ -155,12 +179,25 @@ def output_parameters(general_options, spec):
                  general_options.concurrency.md5_processes,
                  general_options.concurrency.crypto_processes))
     # common block
+    if (general_options.concurrency.mode ==
+            blobxfer.models.options.ConcurrencyMode.Auto):
+        log.append('         concurrency mode: auto (max xfer={})'.format(
+            general_options.concurrency.max_transfer_threads))
+    if general_options.concurrency.max_memory_bytes > 0:
+        log.append('               max memory: {}'.format(
+            general_options.concurrency.max_memory_bytes))
     log.append('                 log file: {}'.format(
         general_options.log_file))
     log.append('                  dry run: {}'.format(
         general_options.dry_run))
     log.append('              resume file: {}'.format(
         general_options.resume_file))
+    if general_options.sync_state is not None:
+        log.append(
+            '               sync state: {} revalidate={}s/{}'.format(
+                general_options.sync_state.state_file,
+                general_options.sync_state.revalidate_interval,
+                general_options.sync_state.revalidate_sample))
     log.append(
         '                  timeout: connect={} read={} max_retries={}'.format(
             general_options.timeout.connect, general_options.timeout.read,
@@ -193,8 +230,8 @@ def output_parameters(general_options, spec):
         spec.options.strip_components))
     # specific epilog
     if isinstance(spec, blobxfer.models.download.Specification):
-        log.append('         chunk size bytes: {}'.format(
-            spec.options.chunk_size_bytes))
+        log.append('         chunk size bytes: {} ({})'.format(
+            spec.options.chunk_size_bytes, spec.options.chunk_size_mode))
         log.append('         compute file md5: {}'.format(
             spec.options.check_file_md5))
         log.append('       restore properties: attr={} lmt={}'.format(
@@ -207,8 +244,8 @@ def output_parameters(general_options, spec):
     elif isinstance(spec, blobxfer.models.upload.Specification):
         log.append('              access tier: {}'.format(
             spec.options.access_tier))
-        log.append('         chunk size bytes: {}'.format(
-            spec.options.chunk_size_bytes))
+        log.append('         chunk size bytes: {} ({})'.format(
+            spec.options.chunk_size_bytes, spec.options.chunk_size_mode))
         log.append('           one shot bytes: {}'.format(
             spec.options.one_shot_bytes))
         if spec.options.store_file_properties.content_type is not None:
@@ -224,11 +261,18 @@ def output_parameters(general_options, spec):
                 spec.options.store_file_properties.md5))
         log.append('           rsa public key: {}'.format(
             'Loaded' if spec.options.rsa_public_key else 'None'))
+        if spec.options.rsa_public_key:
+            log.append('          encryption mode: {}'.format(
+                spec.options.encryption_mode))
+        log.append('             remote index: {}'.format(
+            spec.options.remote_index))
         log.append('       local source paths: {}'.format(
             ' '.join([str(src) for src in spec.sources.paths])))
     elif isinstance(spec, blobxfer.models.synccopy.Specification):
         log.append('              access tier: {}'.format(
             spec.options.access_tier))
+        log.append('             remote index: {}'.format(
+            spec.options.remote_index))
     log.append(sep)
     log = '\n'.join(log)
     if blobxfer.util.is_not_empty(general_options.log_file):
@@ -25,9 +25,10 @@
 # stdlib imports
 import contextlib
 import logging
+import os
 import pathlib
 import pickle
-import shelve
+import sqlite3
 import threading
 # non-stdlib imports
 # local imports
@@ -36,42 +37,137 @@ import blobxfer.util
 
 # create logger
 logger = logging.getLogger(__name__)
+# global defines
+_SCHEMA_VERSION = 4
+_CHECKPOINT_INTERVAL_SECONDS = 0.5
+_CHECKPOINT_RECORDS = 256
+
+
+def _encode_bitmap(value):
+    # type: (int) -> bytes
+    """Encode a completed chunks integer as bytes
+    :param int value: completed chunks
+    :rtype: bytes
+    :return: big-endian two's complement bytes
+    """
+    return value.to_bytes(
+        (value.bit_length() + 8) // 8, byteorder='big', signed=True)
+
+
+def _decode_bitmap(value):
+    # type: (bytes) -> int
+    """Decode a completed chunks integer from bytes
+    :param bytes value: big-endian two's complement bytes
+    :rtype: int
+    :return: completed chunks
+    """
+    return int.from_bytes(value, byteorder='big', signed=True)
 
 
 class _BaseResumeManager(object):
-    """Base Resume Manager"""
-    def __init__(self, resume_file):
-        # type: (_BaseResumeManager, str) -> None
+    """Base Resume Manager. Records are kept in a SQLite database in WAL
+    mode. Updates are applied to an in-memory cache and group committed to
+    the database at checkpoints, which occur periodically and once a
+    number of records have been updated."""
+    _TABLE = None
+    _COLUMNS = None
+
+    def __init__(
+            self, resume_file, checkpoint_interval=None,
+            checkpoint_records=None):
+        # type: (_BaseResumeManager, pathlib.Path, float, int) -> None
         """Ctor for _BaseResumeManager
         :param _BaseResumeManager self: this
         :param pathlib.Path resume_file: resume file
+        :param float checkpoint_interval: seconds between checkpoints
+        :param int checkpoint_records: updated records to force checkpoint
         """
         self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._checkpoint_lock = threading.Lock()
         self._resume_file = resume_file
-        self._data = shelve.open(
-            str(resume_file), protocol=pickle.HIGHEST_PROTOCOL)
+        self._checkpoint_interval = (
+            checkpoint_interval or _CHECKPOINT_INTERVAL_SECONDS
+        )
+        self._checkpoint_records = checkpoint_records or _CHECKPOINT_RECORDS
+        self._records = {}
+        self._dirty = set()
+        self._data = self._open()
+        # prime the cache with records of entities left to transfer
+        self._records.update(self.incomplete_records())
+        logger.debug('loaded {} incomplete records from resume file {}'.format(
+            len(self._records), self._resume_file))
+        self._checkpoint_stop = threading.Event()
+        self._checkpoint_thread = threading.Thread(
+            target=self._checkpoint_worker, daemon=True)
+        self._checkpoint_thread.start()
 
-    def close(self):
-        # type: (_BaseResumeManager) -> None
-        """Close the internal data store
+    def _connect(self):
+        # type: (_BaseResumeManager) -> sqlite3.Connection
+        """Connect to the resume database and ensure the schema
+        :param _BaseResumeManager self: this
+        :rtype: sqlite3.Connection
+        :return: connection
+        """
+        conn = sqlite3.connect(
+            str(self._resume_file), check_same_thread=False,
+            isolation_level=None)
+        # records may contain integrity states of interrupted uploads
+        try:
+            os.chmod(str(self._resume_file), 0o600)
+        except OSError as e:
+            logger.warning(
+                'could not restrict resume db permissions: {}'.format(e))
+        try:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            if version != 0 and version != _SCHEMA_VERSION:
+                raise sqlite3.DatabaseError(
+                    'unsupported schema version {}'.format(version))
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA user_version={}'.format(_SCHEMA_VERSION))
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS {} ({}) WITHOUT ROWID'.format(
+                    self._TABLE, ', '.join(
+                        '{} {}'.format(name, kind)
+                        for name, kind in self._COLUMNS)))
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS {0}_completed ON {0} '
+                '(completed)'.format(self._TABLE))
+        except sqlite3.DatabaseError:
+            conn.close()
+            raise
+        return conn
+
+    def _open(self):
+        # type: (_BaseResumeManager) -> sqlite3.Connection
+        """Open the resume database, replacing incompatible files
         :param _BaseResumeManager self: this
+        :rtype: sqlite3.Connection
+        :return: connection
         """
-        if self._data is not None:
-            self._data.close()
-            self._data = None
+        try:
+            return self._connect()
+        except sqlite3.DatabaseError as e:
+            logger.warning(
+                'replacing incompatible resume file {}: {}'.format(
+                    self._resume_file, e))
+            self._unlink_files()
+            return self._connect()
 
-    def delete(self):
+    def _unlink_files(self):
         # type: (_BaseResumeManager) -> None
-        """Delete the resume file db
+        """Unlink the resume database and any auxiliary files
         :param _BaseResumeManager self: this
         """
-        self.close()
         if self._resume_file.exists():  # noqa
             try:
                 self._resume_file.unlink()
             except OSError as e:
                 logger.warning('could not unlink resume db: {}'.format(e))
-        for ext in ('.bak', '.dat', '.dir'):  # noqa
+        # remove write-ahead log files as well as files of resume dbs
+        # created by earlier versions
+        for ext in ('-wal', '-shm', '-journal', '.bak', '.dat', '.dir'):  # noqa
             fp = pathlib.Path(str(self._resume_file) + ext)
             if fp.exists():
                 try:
@@ -79,6 +175,29 @@ class _BaseResumeManager(object):
                 except OSError as e:
                     logger.warning('could not unlink resume db: {}'.format(e))
 
+    def close(self):
+        # type: (_BaseResumeManager) -> None
+        """Checkpoint and close the internal data store
+        :param _BaseResumeManager self: this
+        """
+        if self._data is None:
+            return
+        self._checkpoint_stop.set()
+        self._checkpoint_thread.join()
+        self.checkpoint()
+        with self._lock:
+            with self._db_lock:
+                self._data.close()
+                self._data = None
+
+    def delete(self):
+        # type: (_BaseResumeManager) -> None
+        """Delete the resume file db
+        :param _BaseResumeManager self: this
+        """
+        self.close()
+        self._unlink_files()
+
     @contextlib.contextmanager
     def datalock(self, acquire=True):
         # type: (_BaseResumeManager) -> None
@@ -94,6 +213,79 @@ class _BaseResumeManager(object):
             if acquire:
                 self._lock.release()
 
+    def _checkpoint_worker(self):
+        # type: (_BaseResumeManager) -> None
+        """Periodically checkpoint updated records
+        :param _BaseResumeManager self: this
+        """
+        while not self._checkpoint_stop.wait(self._checkpoint_interval):
+            try:
+                self.checkpoint()
+            except Exception as e:
+                logger.exception(e)
+
+    def checkpoint(self):
+        # type: (_BaseResumeManager) -> None
+        """Commit all updated records to the database in one transaction
+        :param _BaseResumeManager self: this
+        """
+        with self._checkpoint_lock:
+            with self._lock:
+                if self._data is None or len(self._dirty) == 0:
+                    return
+                rows = [
+                    self._to_row(key, self._records[key])
+                    for key in self._dirty
+                ]
+                completed = [
+                    key for key in self._dirty if self._records[key].completed
+                ]
+                self._dirty.clear()
+            with self._db_lock:
+                self._data.execute('BEGIN')
+                try:
+                    self._data.executemany(
+                        'INSERT OR REPLACE INTO {} VALUES ({})'.format(
+                            self._TABLE,
+                            ', '.join('?' * len(self._COLUMNS))),
+                        rows)
+                except Exception:
+                    self._data.execute('ROLLBACK')
+                    raise
+                self._data.execute('COMMIT')
+            # completed records are not updated further and are read back
+            # from the database if needed
+            with self._lock:
+                for key in completed:
+                    if key not in self._dirty:
+                        self._records.pop(key, None)
+
+    def _update_record(self, key, record):
+        # type: (_BaseResumeManager, str, object) -> bool
+        """Mark a record as updated. Lock must be held by the caller.
+        :param _BaseResumeManager self: this
+        :param str key: record key
+        :param object record: resume record object
+        :rtype: bool
+        :return: if a checkpoint is due
+        """
+        self._records[key] = record
+        self._dirty.add(key)
+        return len(self._dirty) >= self._checkpoint_records
+
+    def incomplete_records(self):
+        # type: (_BaseResumeManager) -> dict
+        """Query records of entities which have not completed
+        :param _BaseResumeManager self: this
+        :rtype: dict
+        :return: resume record objects keyed by record key
+        """
+        with self._db_lock:
+            rows = self._data.execute(
+                'SELECT * FROM {} WHERE completed = 0'.format(
+                    self._TABLE)).fetchall()
+        return {row[0]: self._from_row(row) for row in rows}
+
     @staticmethod
     def generate_record_key(ase):
         # type: (blobxfer.models.azure.StorageEntity) -> str
@@ -119,27 +311,98 @@ class _BaseResumeManager(object):
                 generate_record_key(ase)
         with self.datalock(lock):
             try:
-                return self._data[key]
+                return self._records[key]
             except KeyError:
+                pass
+            with self._db_lock:
+                row = self._data.execute(
+                    'SELECT * FROM {} WHERE key = ?'.format(self._TABLE),
+                    (key, )).fetchone()
+            if row is None:
                 return None
+            record = self._from_row(row)
+            self._records[key] = record
+            return record
 
 
 class DownloadResumeManager(_BaseResumeManager):
     """Download Resume Manager"""
-    def __init__(self, resume_file):
-        # type: (DownloadResumeManager, str) -> None
+    _TABLE = 'download'
+    _COLUMNS = (
+        ('key', 'TEXT PRIMARY KEY'),
+        ('final_path', 'TEXT'),
+        ('length', 'INTEGER'),
+        ('chunk_size', 'INTEGER'),
+        ('next_integrity_chunk', 'INTEGER'),
+        ('completed_chunks', 'BLOB'),
+        ('completed', 'INTEGER'),
+        ('md5', 'TEXT'),
+        ('md5_state', 'BLOB'),
+        ('file_size', 'INTEGER'),
+        ('file_mtime_ns', 'INTEGER'),
+        ('hmac_state', 'BLOB'),
+    )
+
+    def __init__(self, resume_file, **kwargs):
+        # type: (DownloadResumeManager, str, dict) -> None
         """Ctor for DownloadResumeManager
         :param DownloadResumeManager self: this
         :param pathlib.Path resume_file: resume file
+        :param dict kwargs: checkpoint options
+        """
+        super().__init__(resume_file, **kwargs)
+
+    @staticmethod
+    def _to_row(key, record):
+        # type: (str, blobxfer.models.resume.Download) -> tuple
+        """Convert a record to a database row
+        :param str key: record key
+        :param blobxfer.models.resume.Download record: record
+        :rtype: tuple
+        :return: row
+        """
+        if record.completed_chunks is not None:
+            completed_chunks = _encode_bitmap(record.completed_chunks)
+        else:
+            completed_chunks = None
+        return (
+            key, record.final_path, record.length, record.chunk_size,
+            record.next_integrity_chunk, completed_chunks,
+            int(record.completed), record.md5hexdigest, record.md5_state,
+            record.file_size, record.file_mtime_ns, record.hmac_state,
+        )
+
+    @staticmethod
+    def _from_row(row):
+        # type: (tuple) -> blobxfer.models.resume.Download
+        """Convert a database row to a record
+        :param tuple row: row
+        :rtype: blobxfer.models.resume.Download
+        :return: record
         """
-        super().__init__(resume_file)
+        return blobxfer.models.resume.Download(
+            final_path=row[1],
+            length=row[2],
+            chunk_size=row[3],
+            next_integrity_chunk=row[4],
+            completed=bool(row[6]),
+            md5=row[7],
+            completed_chunks=(
+                _decode_bitmap(row[5]) if row[5] is not None else None
+            ),
+            md5_state=row[8],
+            file_size=row[9],
+            file_mtime_ns=row[10],
+            hmac_state=row[11],
+        )
 
     def add_or_update_record(
             self, final_path, ase, chunk_size, next_integrity_chunk,
-            completed, md5):
+            completed, md5, completed_chunks=None, md5_state=None,
+            file_size=None, file_mtime_ns=None, hmac_state=None):
         # type: (DownloadResumeManager, pathlib.Path,
         #        blobxfer.models.azure.StorageEntity, int, int, bool,
-        #        str) -> None
+        #        str, int, bytes, int, int, bytes) -> None
         """Add or update a resume record
         :param DownloadResumeManager self: this
         :param pathlib.Path final_path: final path
@@ -148,6 +411,12 @@ class DownloadResumeManager(_BaseResumeManager):
         :param int next_integrity_chunk: next integrity chunk
         :param bool completed: if completed
         :param str md5: md5 hex digest
+        :param int completed_chunks: chunks written, including those past
+            the next integrity chunk
+        :param bytes md5_state: md5 hasher state matching md5
+        :param int file_size: local file size
+        :param int file_mtime_ns: local file modification time
+        :param bytes hmac_state: hmac hasher state
         """
         key = blobxfer.operations.resume._BaseResumeManager.\
             generate_record_key(ase)
@@ -161,6 +430,11 @@ class DownloadResumeManager(_BaseResumeManager):
                     next_integrity_chunk=next_integrity_chunk,
                     completed=completed,
                     md5=md5,
+                    completed_chunks=completed_chunks,
+                    md5_state=md5_state,
+                    file_size=file_size,
+                    file_mtime_ns=file_mtime_ns,
+                    hmac_state=hmac_state,
                 )
             else:
                 if (dl.completed or
@@ -171,26 +445,96 @@ class DownloadResumeManager(_BaseResumeManager):
                 else:
                     dl.next_integrity_chunk = next_integrity_chunk
                     dl.md5hexdigest = md5
-            self._data[key] = dl
-            self._data.sync()
+                    dl.md5_state = md5_state
+                    dl.hmac_state = hmac_state
+                    if completed_chunks is not None:
+                        dl.completed_chunks = completed_chunks
+                    if file_size is not None:
+                        dl.file_size = file_size
+                        dl.file_mtime_ns = file_mtime_ns
+            checkpoint = self._update_record(key, dl)
+        if checkpoint:
+            self.checkpoint()
 
 
 class UploadResumeManager(_BaseResumeManager):
     """Upload Resume Manager"""
-    def __init__(self, resume_file):
-        # type: (UploadResumeManager, str) -> None
+    _TABLE = 'upload'
+    _COLUMNS = (
+        ('key', 'TEXT PRIMARY KEY'),
+        ('local_path', 'TEXT'),
+        ('length', 'INTEGER'),
+        ('chunk_size', 'INTEGER'),
+        ('total_chunks', 'INTEGER'),
+        ('completed_chunks', 'BLOB'),
+        ('completed', 'INTEGER'),
+        ('md5', 'TEXT'),
+        ('md5_state', 'BLOB'),
+        ('file_size', 'INTEGER'),
+        ('file_mtime_ns', 'INTEGER'),
+        ('encryption_keys', 'TEXT'),
+        ('encryption_iv', 'BLOB'),
+        ('hmac_state', 'BLOB'),
+    )
+
+    def __init__(self, resume_file, **kwargs):
+        # type: (UploadResumeManager, str, dict) -> None
         """Ctor for UploadResumeManager
         :param UploadResumeManager self: this
         :param pathlib.Path resume_file: resume file
+        :param dict kwargs: checkpoint options
+        """
+        super().__init__(resume_file, **kwargs)
+
+    @staticmethod
+    def _to_row(key, record):
+        # type: (str, blobxfer.models.resume.Upload) -> tuple
+        """Convert a record to a database row
+        :param str key: record key
+        :param blobxfer.models.resume.Upload record: record
+        :rtype: tuple
+        :return: row
+        """
+        return (
+            key, record.local_path, record.length, record.chunk_size,
+            record.total_chunks, _encode_bitmap(record.completed_chunks),
+            int(record.completed), record.md5hexdigest, record.md5_state,
+            record.file_size, record.file_mtime_ns, record.encryption_keys,
+            record.encryption_iv, record.hmac_state,
+        )
+
+    @staticmethod
+    def _from_row(row):
+        # type: (tuple) -> blobxfer.models.resume.Upload
+        """Convert a database row to a record
+        :param tuple row: row
+        :rtype: blobxfer.models.resume.Upload
+        :return: record
         """
-        super().__init__(resume_file)
+        return blobxfer.models.resume.Upload(
+            local_path=row[1],
+            length=row[2],
+            chunk_size=row[3],
+            total_chunks=row[4],
+            completed_chunks=_decode_bitmap(row[5]),
+            completed=bool(row[6]),
+            md5=row[7],
+            md5_state=row[8],
+            file_size=row[9],
+            file_mtime_ns=row[10],
+            encryption_keys=row[11],
+            encryption_iv=row[12],
+            hmac_state=row[13],
+        )
 
     def add_or_update_record(
             self, local_path, ase, chunk_size, total_chunks, completed_chunks,
-            completed, md5):
+            completed, md5, md5_state=None, file_size=None,
+            file_mtime_ns=None, encryption_keys=None, encryption_iv=None,
+            hmac_state=None):
         # type: (UploadResumeManager, pathlib.Path,
         #        blobxfer.models.azure.StorageEntity, int, int, int, bool,
-        #        str) -> None
+        #        str, bytes, int, int, str, bytes, bytes) -> None
         """Add or update a resume record
         :param UploadResumeManager self: this
         :param pathlib.Path local_path: local path
@@ -200,6 +544,12 @@ class UploadResumeManager(_BaseResumeManager):
         :param int completed_chunks: completed chunks bitarray
         :param bool completed: if completed
         :param str md5: md5 hex digest
+        :param bytes md5_state: md5 hasher state matching md5
+        :param int file_size: local file size
+        :param int file_mtime_ns: local file modification time
+        :param str encryption_keys: serialized encryption keys
+        :param bytes encryption_iv: chaining iv for the next chunk
+        :param bytes hmac_state: hmac hasher state
         """
         key = blobxfer.operations.resume._BaseResumeManager.\
             generate_record_key(ase)
@@ -214,6 +564,12 @@ class UploadResumeManager(_BaseResumeManager):
                     completed_chunks=completed_chunks,
                     completed=completed,
                     md5=md5,
+                    md5_state=md5_state,
+                    file_size=file_size,
+                    file_mtime_ns=file_mtime_ns,
+                    encryption_keys=encryption_keys,
+                    encryption_iv=encryption_iv,
+                    hmac_state=hmac_state,
                 )
             else:
                 if ul.completed or completed_chunks == ul.completed_chunks:
@@ -221,21 +577,80 @@ class UploadResumeManager(_BaseResumeManager):
                 ul.completed_chunks = completed_chunks
                 if completed:
                     ul.completed = completed
-                else:
-                    ul.md5hexdigest = md5
-            self._data[key] = ul
-            self._data.sync()
+                # hasher states are kept on completion so the upload can
+                # be finalized if interrupted before finalization
+                ul.md5hexdigest = md5
+                ul.md5_state = md5_state
+                ul.hmac_state = hmac_state
+                ul.encryption_iv = encryption_iv
+                if encryption_keys is not None:
+                    ul.encryption_keys = encryption_keys
+                if file_size is not None:
+                    ul.file_size = file_size
+                    ul.file_mtime_ns = file_mtime_ns
+            checkpoint = self._update_record(key, ul)
+        if checkpoint:
+            self.checkpoint()
 
 
 class SyncCopyResumeManager(_BaseResumeManager):
     """SyncCopy Resume Manager"""
-    def __init__(self, resume_file):
-        # type: (SyncCopyResumeManager, str) -> None
+    _TABLE = 'synccopy'
+    _COLUMNS = (
+        ('key', 'TEXT PRIMARY KEY'),
+        ('length', 'INTEGER'),
+        ('src_block_list', 'BLOB'),
+        ('offset', 'INTEGER'),
+        ('chunk_size', 'INTEGER'),
+        ('total_chunks', 'INTEGER'),
+        ('completed_chunks', 'BLOB'),
+        ('completed', 'INTEGER'),
+    )
+
+    def __init__(self, resume_file, **kwargs):
+        # type: (SyncCopyResumeManager, str, dict) -> None
         """Ctor for SyncCopyResumeManager
         :param SyncCopyResumeManager self: this
         :param pathlib.Path resume_file: resume file
+        :param dict kwargs: checkpoint options
+        """
+        super().__init__(resume_file, **kwargs)
+
+    @staticmethod
+    def _to_row(key, record):
+        # type: (str, blobxfer.models.resume.SyncCopy) -> tuple
+        """Convert a record to a database row. The source block list is
+        stored pickled.
+        :param str key: record key
+        :param blobxfer.models.resume.SyncCopy record: record
+        :rtype: tuple
+        :return: row
+        """
+        return (
+            key, record.length,
+            pickle.dumps(
+                record.src_block_list, protocol=pickle.HIGHEST_PROTOCOL),
+            record.offset, record.chunk_size, record.total_chunks,
+            _encode_bitmap(record.completed_chunks), int(record.completed),
+        )
+
+    @staticmethod
+    def _from_row(row):
+        # type: (tuple) -> blobxfer.models.resume.SyncCopy
+        """Convert a database row to a record
+        :param tuple row: row
+        :rtype: blobxfer.models.resume.SyncCopy
+        :return: record
         """
-        super().__init__(resume_file)
+        return blobxfer.models.resume.SyncCopy(
+            length=row[1],
+            src_block_list=pickle.loads(row[2]),
+            offset=row[3],
+            chunk_size=row[4],
+            total_chunks=row[5],
+            completed_chunks=_decode_bitmap(row[6]),
+            completed=bool(row[7]),
+        )
 
     def add_or_update_record(
             self, dst_ase, src_block_list, offset, chunk_size, total_chunks,
@@ -274,5 +689,6 @@ class SyncCopyResumeManager(_BaseResumeManager):
                 sc.completed_chunks = completed_chunks
                 if completed:
                     sc.completed = completed
-            self._data[key] = sc
-            self._data.sync()
+            checkpoint = self._update_record(key, sc)
+        if checkpoint:
+            self.checkpoint()
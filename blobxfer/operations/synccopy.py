@@ -24,15 +24,23 @@
 
 # stdlib imports
 import enum
+import heapq
+import itertools
 import logging
 import pathlib
 import queue
 import threading
+import time
 # non-stdlib imports
 # local imports
 import blobxfer.models.metadata
+import blobxfer.models.options
+import blobxfer.models.workqueue
 import blobxfer.operations.azure.blob
 import blobxfer.operations.azure.file
+import blobxfer.operations.concurrency
+import blobxfer.operations.extraneous
+import blobxfer.operations.index
 import blobxfer.operations.md5
 import blobxfer.operations.progress
 import blobxfer.operations.resume
@@ -40,6 +48,11 @@ import blobxfer.util
 
 # create logger
 logger = logging.getLogger(__name__)
+# global defines
+_ASYNC_COPY_POLL_INTERVAL_MIN = 1.0
+_ASYNC_COPY_POLL_INTERVAL_MAX = 60.0
+_RELAY_PIPE_BYTES = 4194304
+_RELAY_READ_BYTES = 65536
 
 
 class SynccopyAction(enum.Enum):
@@ -47,6 +60,213 @@ class SynccopyAction(enum.Enum):
     Copy = 2
 
 
+class _AsyncCopyJob(object):
+    """Asynchronous server side copy of a source to a destination"""
+    def __init__(self, src_ase, dst_ase, transfer_id):
+        # type: (_AsyncCopyJob, blobxfer.models.azure.StorageEntity,
+        #        blobxfer.models.azure.StorageEntity, str) -> None
+        """Ctor for _AsyncCopyJob
+        :param _AsyncCopyJob self: this
+        :param blobxfer.models.azure.StorageEntity src_ase: src ase
+        :param blobxfer.models.azure.StorageEntity dst_ase: dst ase
+        :param str transfer_id: unique transfer operation id
+        """
+        self.src_ase = src_ase
+        self.dst_ase = dst_ase
+        self.transfer_id = transfer_id
+        self.copy_id = None
+        self.interval = _ASYNC_COPY_POLL_INTERVAL_MIN
+
+
+class AsyncCopyEngine(object):
+    """Whole object asynchronous server side copies. Copies are started as
+    they are added and the copy status is polled by a bounded number of
+    threads at exponentially increasing intervals"""
+    def __init__(
+            self, num_threads, termination_check, complete_callback,
+            error_callback):
+        # type: (AsyncCopyEngine, int, callable, callable,
+        #        callable) -> None
+        """Ctor for AsyncCopyEngine
+        :param AsyncCopyEngine self: this
+        :param int num_threads: number of threads issuing requests
+        :param callable termination_check: termination check
+        :param callable complete_callback: called with the source,
+            destination and transfer id of a completed copy
+        :param callable error_callback: called with exceptions
+        """
+        self._num_threads = num_threads
+        self._termination_check = termination_check
+        self._complete_callback = complete_callback
+        self._error_callback = error_callback
+        self._cond = threading.Condition()
+        self._schedule = []
+        self._seq = itertools.count()
+        self._active = set()
+        self._threads = []
+        self._terminated = False
+
+    def add(self, src_ase, dst_ase, transfer_id):
+        # type: (AsyncCopyEngine, blobxfer.models.azure.StorageEntity,
+        #        blobxfer.models.azure.StorageEntity, str) -> None
+        """Add a copy to be started
+        :param AsyncCopyEngine self: this
+        :param blobxfer.models.azure.StorageEntity src_ase: src ase
+        :param blobxfer.models.azure.StorageEntity dst_ase: dst ase
+        :param str transfer_id: unique transfer operation id
+        """
+        self._schedule_job(_AsyncCopyJob(src_ase, dst_ase, transfer_id), 0)
+
+    def start(self):
+        # type: (AsyncCopyEngine) -> None
+        """Start threads
+        :param AsyncCopyEngine self: this
+        """
+        logger.debug('spawning {} async copy threads'.format(
+            self._num_threads))
+        for _ in range(self._num_threads):
+            thr = threading.Thread(target=self._worker_thread)
+            self._threads.append(thr)
+            thr.start()
+
+    def terminate(self):
+        # type: (AsyncCopyEngine) -> None
+        """Terminate threads
+        :param AsyncCopyEngine self: this
+        """
+        with self._cond:
+            self._terminated = True
+            self._cond.notify_all()
+
+    def join(self):
+        # type: (AsyncCopyEngine) -> None
+        """Wait for threads to exit
+        :param AsyncCopyEngine self: this
+        """
+        for thr in self._threads:
+            thr.join()
+
+    def abort(self):
+        # type: (AsyncCopyEngine) -> None
+        """Abort pending copies, should only be called once threads have
+        exited
+        :param AsyncCopyEngine self: this
+        """
+        with self._cond:
+            jobs = list(self._active)
+            self._active.clear()
+        for job in jobs:
+            try:
+                blobxfer.operations.azure.blob.abort_copy_blob(
+                    job.dst_ase, job.copy_id)
+                logger.info('aborted copy of {} to {}'.format(
+                    job.src_ase.path, job.dst_ase.path))
+            except Exception as e:
+                logger.error('could not abort copy of {} to {}: {}'.format(
+                    job.src_ase.path, job.dst_ase.path, e))
+
+    def _schedule_job(self, job, delay):
+        # type: (AsyncCopyEngine, _AsyncCopyJob, float) -> None
+        """Schedule a job to be processed after a delay
+        :param AsyncCopyEngine self: this
+        :param _AsyncCopyJob job: job
+        :param float delay: delay in seconds
+        """
+        with self._cond:
+            heapq.heappush(
+                self._schedule,
+                (time.monotonic() + delay, next(self._seq), job))
+            self._cond.notify()
+
+    def _next_job(self):
+        # type: (AsyncCopyEngine) -> _AsyncCopyJob
+        """Get the next job that is due, waiting up to one second
+        :param AsyncCopyEngine self: this
+        :rtype: _AsyncCopyJob
+        :return: job or None if no job is due
+        """
+        with self._cond:
+            if self._terminated:
+                return None
+            wait = 1
+            if len(self._schedule) > 0:
+                wait = min((self._schedule[0][0] - time.monotonic(), wait))
+                if wait <= 0:
+                    return heapq.heappop(self._schedule)[2]
+            self._cond.wait(wait)
+            return None
+
+    def _worker_thread(self):
+        # type: (AsyncCopyEngine) -> None
+        """Worker thread
+        :param AsyncCopyEngine self: this
+        """
+        while not self._terminated and not self._termination_check():
+            job = self._next_job()
+            if job is None:
+                continue
+            try:
+                self._process_job(job)
+            except Exception as e:
+                self._error_callback(e)
+
+    def _start_copy(self, job):
+        # type: (AsyncCopyEngine, _AsyncCopyJob) -> None
+        """Start a copy, resuming a pending copy of the same source
+        :param AsyncCopyEngine self: this
+        :param _AsyncCopyJob job: job
+        """
+        src_url = blobxfer.operations.azure.blob.block.get_source_url(
+            job.src_ase)
+        if not job.dst_ase.from_local:
+            props = blobxfer.operations.azure.blob.get_copy_properties(
+                job.dst_ase)
+            if (props.status == 'pending' and
+                    blobxfer.util.is_not_empty(props.source) and
+                    props.source.split('?')[0] == src_url.split('?')[0]):
+                job.copy_id = props.id
+                logger.info('resuming pending copy of {} to {}'.format(
+                    job.src_ase.path, job.dst_ase.path))
+        if job.copy_id is None:
+            job.copy_id = blobxfer.operations.azure.blob.start_copy_blob(
+                src_url, job.dst_ase)
+        with self._cond:
+            self._active.add(job)
+
+    def _process_job(self, job):
+        # type: (AsyncCopyEngine, _AsyncCopyJob) -> None
+        """Start a copy or check its status
+        :param AsyncCopyEngine self: this
+        :param _AsyncCopyJob job: job
+        """
+        if job.copy_id is None:
+            self._start_copy(job)
+            self._schedule_job(job, job.interval)
+            return
+        props = blobxfer.operations.azure.blob.get_copy_properties(
+            job.dst_ase)
+        if props.id != job.copy_id:
+            with self._cond:
+                self._active.discard(job)
+            raise RuntimeError(
+                'copy of {} to {} was superseded by copy id {}'.format(
+                    job.src_ase.path, job.dst_ase.path, props.id))
+        if props.status == 'pending':
+            logger.debug('copy of {} to {} pending: {}'.format(
+                job.src_ase.path, job.dst_ase.path, props.progress))
+            job.interval = min(
+                (job.interval * 2, _ASYNC_COPY_POLL_INTERVAL_MAX))
+            self._schedule_job(job, job.interval)
+            return
+        with self._cond:
+            self._active.discard(job)
+        if props.status != 'success':
+            raise RuntimeError('copy of {} to {} {}: {}'.format(
+                job.src_ase.path, job.dst_ase.path, props.status,
+                props.status_description))
+        self._complete_callback(job.src_ase, job.dst_ase, job.transfer_id)
+
+
 class SyncCopy(object):
     """SyncCopy"""
     def __init__(self, general_options, creds, spec):
@@ -62,8 +282,13 @@ class SyncCopy(object):
         self._all_remote_files_processed = False
         self._transfer_lock = threading.Lock()
         self._transfer_threads = []
-        self._transfer_queue = queue.Queue()
+        self._transfer_queue = blobxfer.models.workqueue.WorkQueue()
         self._transfer_set = set()
+        self._memory_budget = blobxfer.models.workqueue.MemoryBudget(
+            general_options.concurrency.max_memory_bytes)
+        self._concurrency_controller = None
+        self._async_copy = None
+        self._async_copy_refs = {}
         self._synccopy_start_time = None
         self._synccopy_total = 0
         self._synccopy_sofar = 0
@@ -71,7 +296,8 @@ class SyncCopy(object):
         self._synccopy_bytes_sofar = 0
         self._synccopy_terminate = False
         self._start_time = None
-        self._delete_exclude = set()
+        self._delete_exclude = blobxfer.operations.extraneous.KeepManifest()
+        self._extraneous_deleter = None
         self._containers_created = set()
         self._fileshare_dir_lock = threading.Lock()
         self._dirs_created = {}
@@ -79,6 +305,7 @@ class SyncCopy(object):
         self._creds = creds
         self._spec = spec
         self._resume = None
+        self._remote_index = None
         self._exceptions = []
 
     @property
@@ -135,6 +362,7 @@ class SyncCopy(object):
             self._synccopy_sofar,
             self._synccopy_bytes_total,
             self._synccopy_bytes_sofar,
+            memory_budget=self._memory_budget,
         )
 
     def _global_dest_mode_is_file(self):
@@ -167,6 +395,27 @@ class SyncCopy(object):
         else:
             return self._spec.options.dest_mode
 
+    def _start_extraneous_deletion(self):
+        # type: (SyncCopy) -> None
+        """Start deleting extraneous files on the remote
+        :param SyncCopy self: this
+        """
+        if (not self._spec.options.delete_extraneous_destination or
+                self._extraneous_deleter is not None):
+            return
+        is_file = self._global_dest_mode_is_file()
+        self._extraneous_deleter = \
+            blobxfer.operations.extraneous.ExtraneousDeleter(
+                self._delete_exclude,
+                blobxfer.operations.synccopy.SyncCopy.create_deletion_id,
+                self._general_options.concurrency.transfer_threads,
+                dry_run=self._general_options.dry_run,
+                verbose=self._general_options.verbose)
+        self._extraneous_deleter.start([
+            (sa, container, vpath, is_file)
+            for sa, container, vpath, _ in self._get_destination_paths()
+        ])
+
     def _delete_extraneous_files(self):
         # type: (SyncCopy) -> None
         """Delete extraneous files on the remote
@@ -174,52 +423,88 @@ class SyncCopy(object):
         """
         if not self._spec.options.delete_extraneous_destination:
             return
-        # list blobs for all destinations
-        checked = set()
-        deleted = 0
-        for sa, container, _, _ in self._get_destination_paths():
-            key = ';'.join((sa.name, sa.endpoint, container))
-            if key in checked:
-                continue
-            logger.debug(
-                'attempting to delete extraneous blobs/files from: {}'.format(
-                    key))
-            if self._global_dest_mode_is_file():
-                files = blobxfer.operations.azure.file.list_all_files(
-                    sa.file_client, container)
-                for file in files:
-                    id = blobxfer.operations.synccopy.SyncCopy.\
-                        create_deletion_id(sa.file_client, container, file)
-                    if id not in self._delete_exclude:
-                        if self._general_options.dry_run:
-                            logger.info('[DRY RUN] deleting file: {}'.format(
-                                file))
-                        else:
-                            if self._general_options.verbose:
-                                logger.debug('deleting file: {}'.format(file))
-                            blobxfer.operations.azure.file.delete_file(
-                                sa.file_client, container, file)
-                            deleted += 1
-            else:
-                blobs = blobxfer.operations.azure.blob.list_all_blobs(
-                    sa.block_blob_client, container)
-                for blob in blobs:
-                    id = blobxfer.operations.synccopy.SyncCopy.\
-                        create_deletion_id(
-                            sa.block_blob_client, container, blob.name)
-                    if id not in self._delete_exclude:
-                        if self._general_options.dry_run:
-                            logger.info('[DRY RUN] deleting blob: {}'.format(
-                                blob.name))
-                        else:
-                            if self._general_options.verbose:
-                                logger.debug('deleting blob: {}'.format(
-                                    blob.name))
-                            blobxfer.operations.azure.blob.delete_blob(
-                                sa.block_blob_client, container, blob.name)
-                            deleted += 1
-            checked.add(key)
-        logger.info('deleted {} extraneous blobs/files'.format(deleted))
+        self._start_extraneous_deletion()
+        try:
+            self._extraneous_deleter.join()
+        finally:
+            self._extraneous_deleter = None
+
+    def _is_async_copyable(self, src_ase, dst_ase):
+        # type: (SyncCopy, blobxfer.models.azure.StorageEntity,
+        #        blobxfer.models.azure.StorageEntity) -> bool
+        """Check if a source can be copied as a whole object by an
+        asynchronous server side copy
+        :param SyncCopy self: this
+        :param blobxfer.models.azure.StorageEntity src_ase: src ase
+        :param blobxfer.models.azure.StorageEntity dst_ase: dst ase
+        :rtype: bool
+        :return: if async copyable
+        """
+        # the copy source url does not address snapshots
+        return (
+            self._async_copy is not None and
+            src_ase.snapshot is None and
+            src_ase.mode == dst_ase.mode and
+            dst_ase.mode != blobxfer.models.azure.StorageModes.File
+        )
+
+    def _add_to_async_copy(self, src_ase, dst_ase):
+        # type: (SyncCopy, blobxfer.models.azure.StorageEntity,
+        #        blobxfer.models.azure.StorageEntity) -> None
+        """Add async copies of source to destination and replica targets
+        :param SyncCopy self: this
+        :param blobxfer.models.azure.StorageEntity src_ase: src ase
+        :param blobxfer.models.azure.StorageEntity dst_ase: dst ase
+        """
+        dests = [dst_ase]
+        if blobxfer.util.is_not_empty(dst_ase.replica_targets):
+            dests.extend(dst_ase.replica_targets)
+        transfer_id = blobxfer.operations.synccopy.SyncCopy.\
+            create_unique_transfer_operation_id(src_ase, dst_ase)
+        with self._transfer_lock:
+            self._async_copy_refs[transfer_id] = len(dests)
+        for ase in dests:
+            blobxfer.operations.azure.blob.create_container(
+                ase, self._containers_created)
+            self._async_copy.add(src_ase, ase, transfer_id)
+        if self._synccopy_start_time is None:
+            with self._transfer_lock:
+                if self._synccopy_start_time is None:
+                    self._synccopy_start_time = blobxfer.util.datetime_now()
+
+    def _complete_async_copy(self, src_ase, dst_ase, transfer_id):
+        # type: (SyncCopy, blobxfer.models.azure.StorageEntity,
+        #        blobxfer.models.azure.StorageEntity, str) -> None
+        """Complete an async copy
+        :param SyncCopy self: this
+        :param blobxfer.models.azure.StorageEntity src_ase: src ase
+        :param blobxfer.models.azure.StorageEntity dst_ase: dst ase
+        :param str transfer_id: unique transfer operation id
+        """
+        if (dst_ase.mode == blobxfer.models.azure.StorageModes.Block and
+                dst_ase.access_tier is not None):
+            blobxfer.operations.azure.blob.block.set_blob_access_tier(
+                dst_ase)
+        with self._transfer_lock:
+            self._synccopy_bytes_sofar += src_ase.size
+            self._async_copy_refs[transfer_id] -= 1
+            if self._async_copy_refs[transfer_id] == 0:
+                self._async_copy_refs.pop(transfer_id)
+                self._transfer_set.remove(transfer_id)
+                self._synccopy_sofar += 1
+        self._update_progress_bar()
+        if self.termination_check:
+            self._signal_termination()
+
+    def _async_copy_error(self, exc):
+        # type: (SyncCopy, Exception) -> None
+        """Record an async copy exception
+        :param SyncCopy self: this
+        :param Exception exc: exception
+        """
+        with self._transfer_lock:
+            self._exceptions.append(exc)
+        self._signal_termination()
 
     def _add_to_transfer_queue(self, src_ase, dst_ase):
         # type: (SyncCopy, blobxfer.models.azure.StorageEntity,
@@ -229,6 +514,10 @@ class SyncCopy(object):
         :param blobxfer.models.azure.StorageEntity src_ase: src ase
         :param blobxfer.models.azure.StorageEntity dst_ase: dst ase
         """
+        # copy whole objects server side if possible
+        if self._is_async_copyable(src_ase, dst_ase):
+            self._add_to_async_copy(src_ase, dst_ase)
+            return
         # prepare remote file for download
         # if remote file is a block blob, need to retrieve block list
         if (src_ase.mode == dst_ase.mode ==
@@ -238,10 +527,41 @@ class SyncCopy(object):
                 src_ase)
         else:
             bl = None
-        # TODO future optimization for page blob synccopies: query
-        # page ranges and omit cleared pages from being transferred
+        # if remote file is a page blob, only transfer populated page
+        # ranges to destinations which read back zeros for unwritten ranges
+        if (src_ase.mode == blobxfer.models.azure.StorageModes.Page and
+                not src_ase.is_arbitrary_url and
+                (dst_ase.mode == blobxfer.models.azure.StorageModes.Page or
+                 dst_ase.mode == blobxfer.models.azure.StorageModes.File)):
+            pr = blobxfer.operations.azure.blob.page.get_page_ranges(src_ase)
+        else:
+            pr = None
+        # if delta copying between block blobs, retrieve the committed
+        # blocks of an existing destination
+        if bl is not None and self._spec.options.delta:
+            src_digests = [
+                blobxfer.operations.azure.blob.block.parse_block_id_digest(
+                    x.id) for x in bl
+            ]
+            if dst_ase.from_local:
+                dst_blocks = None
+            else:
+                dst_blocks = blobxfer.operations.azure.blob.block.\
+                    get_committed_block_digests(dst_ase)
+        else:
+            src_digests = None
+            dst_blocks = None
         sd = blobxfer.models.synccopy.Descriptor(
-            src_ase, dst_ase, bl, self._spec.options, self._resume)
+            src_ase, dst_ase, bl, self._spec.options, self._resume,
+            page_ranges=pr, src_block_digests=src_digests,
+            dst_blocks=dst_blocks)
+        # account for cleared pages which are not transferred
+        sparse_bytes = sd.sparse_bytes
+        if sparse_bytes > 0:
+            if blobxfer.util.is_not_empty(dst_ase.replica_targets):
+                sparse_bytes *= len(dst_ase.replica_targets) + 1
+            with self._transfer_lock:
+                self._synccopy_bytes_sofar += sparse_bytes
         # add download descriptor to queue
         self._transfer_queue.put(sd)
         if self._synccopy_start_time is None:
@@ -249,14 +569,48 @@ class SyncCopy(object):
                 if self._synccopy_start_time is None:
                     self._synccopy_start_time = blobxfer.util.datetime_now()
 
+    def _initialize_concurrency_controller(self):
+        # type: (SyncCopy) -> None
+        """Initialize adaptive concurrency controller in auto mode
+        :param SyncCopy self: this
+        """
+        if (self._general_options.concurrency.mode !=
+                blobxfer.models.options.ConcurrencyMode.Auto):
+            return
+        self._concurrency_controller = blobxfer.operations.concurrency.\
+            AdaptiveConcurrencyController(
+                initial=self._general_options.concurrency.transfer_threads,
+                maximum=self._general_options.concurrency.
+                max_transfer_threads,
+                description='synccopy')
+        self._concurrency_controller.start()
+
+    def _initialize_async_copy(self):
+        # type: (SyncCopy) -> None
+        """Initialize async copy engine if enabled
+        :param SyncCopy self: this
+        """
+        if not self._spec.options.async_copy:
+            return
+        self._async_copy = AsyncCopyEngine(
+            num_threads=self._general_options.concurrency.transfer_threads,
+            termination_check=lambda: self.termination_check,
+            complete_callback=self._complete_async_copy,
+            error_callback=self._async_copy_error)
+        self._async_copy.start()
+
     def _initialize_transfer_threads(self):
         # type: (SyncCopy) -> None
         """Initialize transfer threads
         :param SyncCopy self: this
         """
-        logger.debug('spawning {} transfer threads'.format(
-            self._general_options.concurrency.transfer_threads))
-        for _ in range(self._general_options.concurrency.transfer_threads):
+        # in auto mode, spawn threads up to the maximum to be admitted
+        # by the concurrency controller
+        num_threads = self._general_options.concurrency.transfer_threads
+        if self._concurrency_controller is not None:
+            num_threads = self._concurrency_controller.maximum
+        logger.debug('spawning {} transfer threads'.format(num_threads))
+        for _ in range(num_threads):
             thr = threading.Thread(target=self._worker_thread_transfer)
             self._transfer_threads.append(thr)
             thr.start()
@@ -269,8 +623,28 @@ class SyncCopy(object):
         """
         if terminate:
             self._synccopy_terminate = terminate
+        if self.termination_check:
+            self._signal_termination()
         for thr in self._transfer_threads:
             thr.join()
+        if self._async_copy is not None:
+            self._async_copy.join()
+            # pending copies are left running to be resumed if a resume
+            # file is specified
+            if terminate and self._general_options.resume_file is None:
+                self._async_copy.abort()
+
+    def _signal_termination(self):
+        # type: (SyncCopy) -> None
+        """Wake all threads blocked on the work queue or memory budget
+        :param SyncCopy self: this
+        """
+        self._transfer_queue.terminate()
+        self._memory_budget.terminate()
+        if self._concurrency_controller is not None:
+            self._concurrency_controller.terminate()
+        if self._async_copy is not None:
+            self._async_copy.terminate()
 
     def _worker_thread_transfer(self):
         # type: (SyncCopy) -> None
@@ -279,7 +653,7 @@ class SyncCopy(object):
         """
         while not self.termination_check:
             try:
-                sd = self._transfer_queue.get(block=False, timeout=0.1)
+                sd = self._transfer_queue.get()
             except queue.Empty:
                 continue
             try:
@@ -287,6 +661,7 @@ class SyncCopy(object):
             except Exception as e:
                 with self._transfer_lock:
                     self._exceptions.append(e)
+        self._signal_termination()
 
     def _put_data(self, sd, ase, offsets, data):
         # type: (SyncCopy, blobxfer.models.synccopy.Descriptor,
@@ -316,12 +691,14 @@ class SyncCopy(object):
             # server side copy
             if sd.is_server_side_copyable:
                 blobxfer.operations.azure.blob.block.put_block_from_url(
-                    sd.src_entity, ase, offsets)
+                    sd.src_entity, ase, offsets,
+                    digest=sd.delta_block_digest(offsets.chunk_num))
                 return
             # upload block
             if data is not None:
                 blobxfer.operations.azure.blob.block.put_block(
-                    ase, offsets, data)
+                    ase, offsets, data,
+                    digest=sd.delta_block_digest(offsets.chunk_num))
         elif ase.mode == blobxfer.models.azure.StorageModes.File:
             # upload range
             if data is not None:
@@ -353,14 +730,143 @@ class SyncCopy(object):
         :param blobxfer.models.synccopy.Offsets offsets: offsets
         :param bytes data: data to process
         """
-        # issue put data
-        self._put_data(sd, ase, offsets, data)
+        # issue put data, unless the block is already committed
+        if not sd.is_delta_block_unchanged(offsets.chunk_num):
+            self._put_data(sd, ase, offsets, data)
         # accounting
         with self._transfer_lock:
             self._synccopy_bytes_sofar += offsets.num_bytes
         # complete offset upload and save resume state
         sd.complete_offset_upload(offsets.chunk_num)
 
+    def _put_data_stream(self, sd, ase, offsets, pipe):
+        # type: (SyncCopy, blobxfer.models.synccopy.Descriptor,
+        #        blobxfer.models.azure.StorageEntity,
+        #        blobxfer.models.upload.Offsets,
+        #        blobxfer.models.workqueue.RelayPipe) -> None
+        """Put data in Azure as it is read from a relay pipe
+        :param SyncCopy self: this
+        :param blobxfer.models.synccopy.Descriptor sd: synccopy descriptor
+        :param blobxfer.models.azure.StorageEntity ase: Storage entity
+        :param blobxfer.models.upload.Offsets offsets: offsets
+        :param blobxfer.models.workqueue.RelayPipe pipe: relay pipe
+        """
+        if ase.mode == blobxfer.models.azure.StorageModes.Block:
+            # stream the pipe as the request body of the block
+            blobxfer.operations.azure.blob.block.put_block(
+                ase, offsets, pipe,
+                digest=sd.delta_block_digest(offsets.chunk_num))
+            return
+        # put page or file ranges as each buffer fills
+        range_start = offsets.range_start
+        while True:
+            data = pipe.read(_RELAY_PIPE_BYTES)
+            if len(data) == 0:
+                break
+            self._put_data(sd, ase, offsets._replace(
+                num_bytes=len(data), range_start=range_start,
+                range_end=range_start + len(data) - 1), data)
+            range_start += len(data)
+
+    def _relay_consumer(self, sd, ase, offsets, pipe, errors):
+        # type: (SyncCopy, blobxfer.models.synccopy.Descriptor,
+        #        blobxfer.models.azure.StorageEntity,
+        #        blobxfer.models.upload.Offsets,
+        #        blobxfer.models.workqueue.RelayPipe, list) -> None
+        """Relay consumer thread
+        :param SyncCopy self: this
+        :param blobxfer.models.synccopy.Descriptor sd: synccopy descriptor
+        :param blobxfer.models.azure.StorageEntity ase: Storage entity
+        :param blobxfer.models.upload.Offsets offsets: offsets
+        :param blobxfer.models.workqueue.RelayPipe pipe: relay pipe
+        :param list errors: list to append exceptions to
+        """
+        try:
+            self._put_data_stream(sd, ase, offsets, pipe)
+        except Exception as e:
+            errors.append(e)
+            pipe.abort(e)
+
+    def _relay_stream(self, sd, offsets):
+        # type: (SyncCopy, blobxfer.models.synccopy.Descriptor,
+        #        blobxfer.models.upload.Offsets) -> bool
+        """Stream a ranged read of the source to the destination and
+        replica targets through bounded pipes
+        :param SyncCopy self: this
+        :param blobxfer.models.synccopy.Descriptor sd: synccopy descriptor
+        :param blobxfer.models.upload.Offsets offsets: offsets
+        :rtype: bool
+        :return: if relayed, False if not eligible or failed
+        """
+        if not self._spec.options.stream_relay or sd.is_one_shot_block_blob:
+            return False
+        dests = [sd.dst_entity]
+        if blobxfer.util.is_not_empty(sd.dst_entity.replica_targets):
+            dests.extend(sd.dst_entity.replica_targets)
+        # appends cannot be retried if only partially streamed
+        if any(ase.mode == blobxfer.models.azure.StorageModes.Append
+               for ase in dests):
+            return False
+        # each destination may hold a full pipe and a read buffer
+        inflight = 2 * min((offsets.num_bytes, _RELAY_PIPE_BYTES)) * len(dests)
+        if not self._memory_budget.acquire(inflight):
+            return False
+        try:
+            pipes = []
+            threads = []
+            errors = []
+            for ase in dests:
+                pipe = blobxfer.models.workqueue.RelayPipe(
+                    offsets.num_bytes, _RELAY_PIPE_BYTES)
+                thr = threading.Thread(
+                    target=self._relay_consumer,
+                    args=(sd, ase, offsets, pipe, errors))
+                pipes.append(pipe)
+                threads.append(thr)
+                thr.start()
+            try:
+                response = blobxfer.operations.azure.get_source_range_stream(
+                    sd.src_entity, offsets)
+                try:
+                    nbytes = 0
+                    for data in response.iter_content(_RELAY_READ_BYTES):
+                        nbytes += len(data)
+                        if nbytes > offsets.num_bytes:
+                            break
+                        for pipe in pipes:
+                            if not pipe.write(data):
+                                raise pipe.error
+                finally:
+                    response.close()
+                if nbytes != offsets.num_bytes:
+                    raise RuntimeError(
+                        'read {} bytes of {} for range {}-{} of {}'.format(
+                            nbytes, offsets.num_bytes, offsets.range_start,
+                            offsets.range_end, sd.src_entity.path))
+                for pipe in pipes:
+                    pipe.close()
+            except Exception as e:
+                errors.append(e)
+                for pipe in pipes:
+                    pipe.abort(e)
+            for thr in threads:
+                thr.join()
+        finally:
+            self._memory_budget.release(inflight)
+        if len(errors) > 0:
+            logger.warning(
+                'falling back to buffered relay for range {}-{} of {}: '
+                '{}'.format(
+                    offsets.range_start, offsets.range_end,
+                    sd.src_entity.path, errors[0]))
+            return False
+        # accounting
+        for _ in dests:
+            with self._transfer_lock:
+                self._synccopy_bytes_sofar += offsets.num_bytes
+            sd.complete_offset_upload(offsets.chunk_num)
+        return True
+
     def _prepare_upload(self, ase):
         # type: (SyncCopy, blobxfer.models.azure.StorageEntity) -> None
         """Prepare upload
@@ -415,7 +921,11 @@ class SyncCopy(object):
                     sd.dst_entity.name))
             del resume_bytes
         # check if all operations completed
-        if offsets is None and sd.all_operations_completed:
+        if offsets is None:
+            # descriptors with outstanding chunks are re-enqueued for
+            # finalization when the last chunk completes
+            if not sd.claim_finalization():
+                return
             # finalize upload for non-one shots
             if not sd.is_one_shot_block_blob:
                 self._finalize_upload(sd)
@@ -432,10 +942,6 @@ class SyncCopy(object):
                         sd.src_entity, sd.dst_entity))
                 self._synccopy_sofar += 1
             return
-        # re-enqueue for finalization if no offsets
-        if offsets is None:
-            self._transfer_queue.put(sd)
-            return
         # prepare upload
         if offsets.chunk_num == 0:
             self._prepare_upload(sd.dst_entity)
@@ -447,26 +953,58 @@ class SyncCopy(object):
         # re-enqueue for other threads to download next offset if not append
         if sd.src_entity.mode != blobxfer.models.azure.StorageModes.Append:
             self._transfer_queue.put(sd)
-        # issue get range
-        if sd.src_entity.mode == blobxfer.models.azure.StorageModes.File:
-            data = blobxfer.operations.azure.file.get_file_range(
-                sd.src_entity, offsets)
-        else:
-            if sd.is_server_side_copyable:
-                data = None
-            elif offsets.range_start < offsets.range_end:
-                data = blobxfer.operations.azure.blob.get_blob_range(
-                    sd.src_entity, offsets)
-            else:
-                data = None
-        # process data for upload
-        self._process_data(sd, sd.dst_entity, offsets, data)
-        # iterate replicas
-        if blobxfer.util.is_not_empty(sd.dst_entity.replica_targets):
-            for ase in sd.dst_entity.replica_targets:
-                self._process_data(sd, ase, offsets, data)
-        # re-enqueue for append blobs
-        if sd.src_entity.mode == blobxfer.models.azure.StorageModes.Append:
+        # wait for in-flight memory to be available for this chunk if
+        # data is relayed through this client
+        unchanged = sd.is_delta_block_unchanged(offsets.chunk_num)
+        relay = not unchanged and (
+            sd.src_entity.mode == blobxfer.models.azure.StorageModes.File or
+            (not sd.is_server_side_copyable and
+             offsets.range_start < offsets.range_end)
+        )
+        # wait to be admitted by the concurrency controller if requests
+        # are issued for this chunk
+        admit = self._concurrency_controller is not None and not unchanged
+        if admit and not self._concurrency_controller.acquire():
+            return
+        try:
+            start = time.monotonic()
+            # stream relayed data if enabled, otherwise or if streaming
+            # fails, read the chunk into memory before putting it
+            if not relay or not self._relay_stream(sd, offsets):
+                inflight = offsets.num_bytes if relay else 0
+                if not self._memory_budget.acquire(inflight):
+                    return
+                start = time.monotonic()
+                try:
+                    # issue get range
+                    if not relay:
+                        data = None
+                    elif (sd.src_entity.mode ==
+                            blobxfer.models.azure.StorageModes.File):
+                        data = blobxfer.operations.azure.file.get_file_range(
+                            sd.src_entity, offsets)
+                    else:
+                        data = blobxfer.operations.azure.blob.get_blob_range(
+                            sd.src_entity, offsets)
+                    # process data for upload
+                    self._process_data(sd, sd.dst_entity, offsets, data)
+                    # iterate replicas
+                    if blobxfer.util.is_not_empty(
+                            sd.dst_entity.replica_targets):
+                        for ase in sd.dst_entity.replica_targets:
+                            self._process_data(sd, ase, offsets, data)
+                finally:
+                    self._memory_budget.release(inflight)
+            if admit:
+                self._concurrency_controller.record(
+                    offsets.num_bytes, time.monotonic() - start)
+        finally:
+            if admit:
+                self._concurrency_controller.release()
+        # re-enqueue for append blobs or for finalization once the last
+        # chunk completes
+        if (sd.src_entity.mode == blobxfer.models.azure.StorageModes.Append or
+                sd.all_operations_completed):
             self._transfer_queue.put(sd)
 
     def _finalize_block_blob(self, sd, metadata, digest):
@@ -478,8 +1016,16 @@ class SyncCopy(object):
         :param dict metadata: metadata dict
         :param str digest: md5 digest
         """
+        if sd.is_delta:
+            unchanged_blocks, unchanged_bytes = sd.delta_unchanged
+            logger.info(
+                ('delta copy of {}: {} of {} blocks ({} bytes) '
+                 'unchanged').format(
+                     sd.dst_entity.path, unchanged_blocks,
+                     sd.last_block_num + 1, unchanged_bytes))
         blobxfer.operations.azure.blob.block.put_block_list(
-            sd.dst_entity, sd.last_block_num, digest, metadata)
+            sd.dst_entity, sd.last_block_num, digest, metadata,
+            digests=sd.delta_block_digests)
         if blobxfer.util.is_not_empty(sd.dst_entity.replica_targets):
             for ase in sd.dst_entity.replica_targets:
                 blobxfer.operations.azure.blob.block.put_block_list(
@@ -645,7 +1191,9 @@ class SyncCopy(object):
         :rtype: blobxfer.models.azure.StorageEntity
         :return: remote storage entity
         """
-        if mode == blobxfer.models.azure.StorageModes.File:
+        if self._remote_index is not None:
+            fp = self._remote_index.get_properties(sa, cont, name, mode)
+        elif mode == blobxfer.models.azure.StorageModes.File:
             fp = blobxfer.operations.azure.file.get_file_properties(
                 sa.file_client, cont, name)
         else:
@@ -669,6 +1217,17 @@ class SyncCopy(object):
             ase = None
         return ase
 
+    def _initialize_remote_index(self):
+        # type: (SyncCopy) -> None
+        """Initialize remote index of destination paths, if specified
+        :param SyncCopy self: this
+        """
+        if not self._spec.options.remote_index:
+            return
+        self._remote_index = blobxfer.operations.index.RemoteIndex()
+        for sa, cont, dir, _ in self._get_destination_paths():
+            self._remote_index.add_prefix(sa, cont, dir)
+
     def _get_destination_paths(self):
         # type: (SyncCopy) ->
         #        Tuple[blobxfer.operations.azure.StorageAccount, str, str, str]
@@ -822,8 +1381,12 @@ class SyncCopy(object):
         if self._general_options.resume_file is not None:
             self._resume = blobxfer.operations.resume.SyncCopyResumeManager(
                 self._general_options.resume_file)
+        # initialize remote index if specified
+        self._initialize_remote_index()
         # initialize download threads
+        self._initialize_concurrency_controller()
         self._initialize_transfer_threads()
+        self._initialize_async_copy()
         # iterate through source paths to download
         processed_files = 0
         for src_ase, dst_ase in self._bind_sources_to_destination():
@@ -849,6 +1412,11 @@ class SyncCopy(object):
         # set remote files processed
         with self._transfer_lock:
             self._all_remote_files_processed = True
+        # the keep manifest is complete, extraneous deletion may overlap
+        # with transfers
+        if self._spec.options.delete_during_transfer:
+            self._start_extraneous_deletion()
+        with self._transfer_lock:
             if self._spec.options.delete_only:
                 logger.info(
                     'skipping sync transfers as only deletion option '
@@ -897,6 +1465,7 @@ class SyncCopy(object):
                  'GiB: {1:.3f} sec, {2:.4f} Mbps ({3:.3f} MiB/sec)').format(
                      synccopy_size_mib / 1024, dltime, dlmibspeed * 8,
                      dlmibspeed))
+        blobxfer.operations.progress.output_memory_usage(self._memory_budget)
         end_time = blobxfer.util.datetime_now()
         logger.info('blobxfer end time: {0} (elapsed: {1:.3f} sec)'.format(
             end_time, (end_time - self._start_time).total_seconds()))
@@ -918,11 +1487,18 @@ class SyncCopy(object):
                     'processes and threads (this may take a while)...')
             try:
                 self._wait_for_transfer_threads(terminate=True)
+                if self._extraneous_deleter is not None:
+                    self._extraneous_deleter.terminate()
             except Exception as tex:
                 logger.exception(tex)
             finally:
                 raise ex
         finally:
+            # close remote index
+            if self._remote_index is not None:
+                self._remote_index.close()
+            # close keep manifest
+            self._delete_exclude.close()
             # close resume file
             if self._resume is not None:
                 self._resume.close()
@@ -0,0 +1,198 @@
+# Copyright (c) Microsoft Corporation
+#
+# All rights reserved.
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+# stdlib imports
+import collections
+import logging
+import pickle
+import random
+import shelve
+import threading
+import time
+# non-stdlib imports
+# local imports
+
+# create logger
+logger = logging.getLogger(__name__)
+
+# named tuples
+SyncStateRecord = collections.namedtuple(
+    'SyncStateRecord', [
+        'local_size',
+        'local_mtime_ns',
+        'local_inode',
+        'remote_etag',
+        'remote_lmt',
+        'remote_md5',
+        'validated',
+    ]
+)
+
+
+class SyncStateManager(object):
+    """Sync State Manager"""
+    def __init__(self, options):
+        # type: (SyncStateManager, blobxfer.models.options.SyncState) -> None
+        """Ctor for SyncStateManager
+        :param SyncStateManager self: this
+        :param blobxfer.models.options.SyncState options: sync state options
+        """
+        self._lock = threading.Lock()
+        self._revalidate_interval = options.revalidate_interval
+        self._revalidate_sample = options.revalidate_sample
+        self._state_file = options.state_file
+        self._data = shelve.open(
+            str(self._state_file), protocol=pickle.HIGHEST_PROTOCOL)
+        self._unchanged = 0
+        self._updated = 0
+
+    def close(self):
+        # type: (SyncStateManager) -> None
+        """Close the internal data store
+        :param SyncStateManager self: this
+        """
+        with self._lock:
+            if self._data is None:
+                return
+            self._data.close()
+            self._data = None
+        logger.info(
+            'sync state: {} entities unchanged, {} entities updated'.format(
+                self._unchanged, self._updated))
+
+    @staticmethod
+    def generate_remote_key(endpoint, container, name):
+        # type: (str, str, str) -> str
+        """Generate a record key for a remote destination
+        :param str endpoint: primary endpoint of the storage client
+        :param str container: container or file share
+        :param str name: entity name
+        :rtype: str
+        :return: record key
+        """
+        return '{}:{}/{}'.format(endpoint, container, name)
+
+    @staticmethod
+    def generate_local_key(path):
+        # type: (pathlib.Path) -> str
+        """Generate a record key for a local destination
+        :param pathlib.Path path: local path
+        :rtype: str
+        :return: record key
+        """
+        return 'local:{}'.format(path)
+
+    @staticmethod
+    def local_matches(record, stat):
+        # type: (SyncStateRecord, os.stat_result) -> bool
+        """Check if a local file is unchanged from the record
+        :param SyncStateRecord record: sync state record
+        :param os.stat_result stat: stat result of the local file
+        :rtype: bool
+        :return: if local file is unchanged
+        """
+        return (record.local_size == stat.st_size and
+                record.local_mtime_ns == stat.st_mtime_ns and
+                record.local_inode == stat.st_ino)
+
+    @staticmethod
+    def remote_matches(record, etag, lmt):
+        # type: (SyncStateRecord, str, datetime.datetime) -> bool
+        """Check if a remote entity is unchanged from the record
+        :param SyncStateRecord record: sync state record
+        :param str etag: remote ETag
+        :param datetime.datetime lmt: remote last modified time
+        :rtype: bool
+        :return: if remote entity is unchanged
+        """
+        if etag is not None and record.remote_etag is not None:
+            return etag == record.remote_etag
+        return lmt is not None and lmt == record.remote_lmt
+
+    def get_record(self, key):
+        # type: (SyncStateManager, str) -> SyncStateRecord
+        """Get a sync state record
+        :param SyncStateManager self: this
+        :param str key: record key
+        :rtype: SyncStateRecord
+        :return: sync state record
+        """
+        with self._lock:
+            try:
+                return self._data[key]
+            except KeyError:
+                return None
+
+    def requires_revalidation(self, record):
+        # type: (SyncStateManager, SyncStateRecord) -> bool
+        """Check if the remote of an unchanged record should be revalidated
+        :param SyncStateManager self: this
+        :param SyncStateRecord record: sync state record
+        :rtype: bool
+        :return: if remote should be revalidated
+        """
+        if (self._revalidate_interval > 0 and
+                time.time() - record.validated >= self._revalidate_interval):
+            return True
+        return (self._revalidate_sample > 0 and
+                random.random() < self._revalidate_sample)
+
+    def mark_unchanged(self, key, record, validated=False):
+        # type: (SyncStateManager, str, SyncStateRecord, bool) -> None
+        """Mark a record as unchanged
+        :param SyncStateManager self: this
+        :param str key: record key
+        :param SyncStateRecord record: sync state record
+        :param bool validated: if the remote was revalidated
+        """
+        with self._lock:
+            self._unchanged += 1
+            if validated and self._data is not None:
+                self._data[key] = record._replace(validated=time.time())
+
+    def add_or_update_record(self, key, stat, etag, lmt, md5):
+        # type: (SyncStateManager, str, os.stat_result, str,
+        #        datetime.datetime, str) -> None
+        """Add or update a sync state record
+        :param SyncStateManager self: this
+        :param str key: record key
+        :param os.stat_result stat: stat result of the local file
+        :param str etag: remote ETag
+        :param datetime.datetime lmt: remote last modified time
+        :param str md5: remote md5
+        """
+        record = SyncStateRecord(
+            local_size=stat.st_size,
+            local_mtime_ns=stat.st_mtime_ns,
+            local_inode=stat.st_ino,
+            remote_etag=etag,
+            remote_lmt=lmt,
+            remote_md5=md5,
+            validated=time.time(),
+        )
+        with self._lock:
+            if self._data is None:
+                return
+            self._data[key] = record
+            self._updated += 1
@@ -32,17 +32,26 @@ import threading
 import time
 # non-stdlib imports
 # local imports
+import blobxfer.models.buffer
 import blobxfer.models.crypto
+import blobxfer.models.filehandle
 import blobxfer.models.metadata
+import blobxfer.models.options
+import blobxfer.models.workqueue
 import blobxfer.operations.azure.blob
 import blobxfer.operations.azure.blob.append
 import blobxfer.operations.azure.blob.block
 import blobxfer.operations.azure.blob.page
 import blobxfer.operations.azure.file
+import blobxfer.operations.chunksize
+import blobxfer.operations.concurrency
 import blobxfer.operations.crypto
+import blobxfer.operations.extraneous
+import blobxfer.operations.index
 import blobxfer.operations.md5
 import blobxfer.operations.progress
 import blobxfer.operations.resume
+import blobxfer.operations.syncstate
 import blobxfer.util
 
 # create logger
@@ -69,11 +78,12 @@ class Uploader(object):
         """
         self._all_files_processed = False
         self._crypto_offload = None
+        self._fd_cache = blobxfer.models.filehandle.FileHandleCache()
         self._md5_meta_lock = threading.Lock()
         self._md5_map = {}
         self._md5_offload = None
         self._upload_lock = threading.Lock()
-        self._upload_queue = queue.Queue()
+        self._upload_queue = blobxfer.models.workqueue.WorkQueue()
         self._upload_set = set()
         self._upload_start_time = None
         self._disk_threads = []
@@ -83,11 +93,24 @@ class Uploader(object):
         self._upload_bytes_sofar = 0
         self._upload_terminate = False
         self._transfer_lock = threading.Lock()
-        self._transfer_queue = queue.Queue()
+        self._transfer_queue = blobxfer.models.workqueue.WorkQueue()
         self._transfer_set = set()
+        self._transfer_backpressure = blobxfer.models.workqueue.Backpressure(
+            self._transfer_lock)
         self._transfer_threads = []
+        self._memory_budget = blobxfer.models.workqueue.MemoryBudget(
+            general_options.concurrency.max_memory_bytes)
+        self._concurrency_controller = None
+        self._chunk_sizer = None
+        self._memory_refs = {}
+        if self._memory_budget.limited:
+            self._buffer_pool = blobxfer.models.buffer.BufferPool(
+                max_retained_bytes=self._memory_budget.max_bytes)
+        else:
+            self._buffer_pool = blobxfer.models.buffer.BufferPool()
         self._start_time = None
-        self._delete_exclude = set()
+        self._delete_exclude = blobxfer.operations.extraneous.KeepManifest()
+        self._extraneous_deleter = None
         self._ud_map = {}
         self._containers_created = set()
         self._fileshare_dir_lock = threading.Lock()
@@ -96,6 +119,9 @@ class Uploader(object):
         self._creds = creds
         self._spec = spec
         self._resume = None
+        self._remote_index = None
+        self._sync_state = None
+        self._sync_state_unchanged = set()
         self._exceptions = []
 
     @property
@@ -159,6 +185,22 @@ class Uploader(object):
              ase.path, str(local_path.view.fd_start), str(offsets.range_start))
         )
 
+    @staticmethod
+    def compute_inflight_bytes(ud, offsets):
+        # type: (blobxfer.models.upload.Descriptor,
+        #        blobxfer.models.upload.Offsets) -> int
+        """Compute the number of in-flight memory bytes required to read
+        and process a chunk
+        :param blobxfer.models.upload.Descriptor ud: upload descriptor
+        :param blobxfer.models.upload.Offsets offsets: upload offsets
+        :rtype: int
+        :return: number of bytes
+        """
+        # encrypted chunks account for both plaintext and ciphertext
+        if ud.entity.is_encrypted:
+            return offsets.num_bytes << 1
+        return offsets.num_bytes
+
     @staticmethod
     def create_destination_id(client, container, name):
         # type: (azure.storage.StorageClient, str, str) -> str
@@ -200,6 +242,7 @@ class Uploader(object):
             self._upload_bytes_total,
             self._upload_bytes_sofar,
             stdin_upload=stdin,
+            memory_budget=self._memory_budget,
         )
 
     def _pre_md5_skip_on_check(self, src, rfile):
@@ -238,6 +281,8 @@ class Uploader(object):
             if self._general_options.dry_run:
                 logger.info('[DRY RUN] MD5 match, skipping: {} -> {}'.format(
                     src.absolute_path, rfile.path))
+            else:
+                self._update_sync_state(src, rfile, refresh=False)
         else:
             if self._general_options.dry_run:
                 with self._upload_lock:
@@ -270,6 +315,63 @@ class Uploader(object):
             cv.release()
             if result is not None:
                 self._post_md5_skip_on_check(result[0], result[3], result[4])
+        # wake workers if the last upload was skipped
+        if self.termination_check:
+            self._signal_termination()
+
+    def _check_for_crypto_done(self):
+        # type: (Uploader) -> None
+        """Check queue for crypto done
+        :param Uploader self: this
+        """
+        cv = self._crypto_offload.done_cv
+        while not self.termination_check:
+            result = None
+            cv.acquire()
+            while True:
+                result = self._crypto_offload.pop_done_queue()
+                if result is None:
+                    # use cv timeout due to possible non-wake while running
+                    cv.wait(0.1)
+                    # check for terminating conditions
+                    if self.termination_check:
+                        break
+                else:
+                    break
+            cv.release()
+            if result is not None:
+                try:
+                    self._process_encrypted_chunk(*result)
+                except Exception as e:
+                    with self._upload_lock:
+                        self._exceptions.append(e)
+        self._signal_termination()
+
+    def _process_encrypted_chunk(self, uid, offsets, source, error):
+        # type: (Uploader, str, blobxfer.models.upload.Offsets, object,
+        #        str) -> None
+        """Process a chunk encrypted by the crypto offload
+        :param Uploader self: this
+        :param str uid: unique id of upload descriptor
+        :param blobxfer.models.upload.Offsets offsets: offsets
+        :param object source: shared memory slot or temporary file
+            containing encrypted data
+        :param str error: error encountered during encryption
+        """
+        with self._upload_lock:
+            ud = self._ud_map[uid]
+        # always retrieve data to release the slot or remove the file
+        data = None
+        if source is not None:
+            data = self._crypto_offload.retrieve_data(source)
+        if error is not None:
+            raise RuntimeError('failed to encrypt chunk {} of {}: {}'.format(
+                offsets.chunk_num, ud.local_path.absolute_path, error))
+        ud.add_region_tag(offsets.chunk_num, data)
+        self._add_to_transfer_queue(
+            ud, offsets, data,
+            blobxfer.operations.upload.Uploader.compute_inflight_bytes(
+                ud, offsets))
 
     def _add_to_upload_queue(self, src, rfile, uid):
         # type: (Uploader, blobxfer.models.upload.LocalPath,
@@ -281,9 +383,23 @@ class Uploader(object):
         :param str uid: unique id
         """
         # prepare local file for upload
+        if self._chunk_sizer is not None:
+            auto_chunk_size = self._chunk_sizer.next_chunk_size()
+        else:
+            auto_chunk_size = None
+        # retrieve committed blocks of existing block blobs for delta
+        if (self._spec.options.delta and not rfile.from_local and
+                rfile.mode == blobxfer.models.azure.StorageModes.Block and
+                self._spec.options.rsa_public_key is None):
+            remote_blocks = blobxfer.operations.azure.blob.block.\
+                get_committed_block_digests(rfile)
+        else:
+            remote_blocks = None
         ud = blobxfer.models.upload.Descriptor(
             src, rfile, uid, self._spec.options, self._general_options,
-            self._resume)
+            self._resume, fd_cache=self._fd_cache,
+            buffer_pool=self._buffer_pool, auto_chunk_size=auto_chunk_size,
+            remote_blocks=remote_blocks)
         if ud.entity.is_encrypted:
             with self._upload_lock:
                 self._ud_map[uid] = ud
@@ -306,14 +422,49 @@ class Uploader(object):
             self._disk_threads.append(thr)
             thr.start()
 
+    def _initialize_concurrency_controller(self):
+        # type: (Uploader) -> None
+        """Initialize adaptive concurrency controller in auto mode
+        :param Uploader self: this
+        """
+        if (self._general_options.concurrency.mode !=
+                blobxfer.models.options.ConcurrencyMode.Auto):
+            return
+        self._concurrency_controller = blobxfer.operations.concurrency.\
+            AdaptiveConcurrencyController(
+                initial=self._general_options.concurrency.transfer_threads,
+                maximum=self._general_options.concurrency.
+                max_transfer_threads,
+                description='upload')
+        self._concurrency_controller.start()
+
+    def _initialize_chunk_sizer(self):
+        # type: (Uploader) -> None
+        """Initialize adaptive chunk sizer if chunk sizes are auto-selected
+        in adaptive mode
+        :param Uploader self: this
+        """
+        if (self._spec.options.chunk_size_bytes != 0 or
+                self._spec.options.chunk_size_mode !=
+                blobxfer.models.options.ChunkSizeMode.Adaptive):
+            return
+        self._chunk_sizer = blobxfer.operations.chunksize.AdaptiveChunkSizer(
+            default=blobxfer.models.upload._DEFAULT_AUTO_CHUNKSIZE_BYTES,
+            maximum=blobxfer.models.upload._MAX_BLOCK_BLOB_CHUNKSIZE_BYTES,
+            description='upload')
+
     def _initialize_transfer_threads(self):
         # type: (Uploader) -> None
         """Initialize transfer threads
         :param Uploader self: this
         """
-        logger.debug('spawning {} transfer threads'.format(
-            self._general_options.concurrency.transfer_threads))
-        for _ in range(self._general_options.concurrency.transfer_threads):
+        # in auto mode, spawn threads up to the maximum to be admitted
+        # by the concurrency controller
+        num_threads = self._general_options.concurrency.transfer_threads
+        if self._concurrency_controller is not None:
+            num_threads = self._concurrency_controller.maximum
+        logger.debug('spawning {} transfer threads'.format(num_threads))
+        for _ in range(num_threads):
             thr = threading.Thread(target=self._worker_thread_transfer)
             self._transfer_threads.append(thr)
             thr.start()
@@ -326,6 +477,8 @@ class Uploader(object):
         """
         if terminate:
             self._upload_terminate = terminate
+        if self.termination_check:
+            self._signal_termination()
         for thr in self._disk_threads:
             thr.join()
 
@@ -337,9 +490,23 @@ class Uploader(object):
         """
         if terminate:
             self._upload_terminate = terminate
+        if self.termination_check:
+            self._signal_termination()
         for thr in self._transfer_threads:
             thr.join()
 
+    def _signal_termination(self):
+        # type: (Uploader) -> None
+        """Wake all threads blocked on work queues or backpressure
+        :param Uploader self: this
+        """
+        self._upload_queue.terminate()
+        self._transfer_queue.terminate()
+        self._transfer_backpressure.terminate()
+        self._memory_budget.terminate()
+        if self._concurrency_controller is not None:
+            self._concurrency_controller.terminate()
+
     def _worker_thread_transfer(self):
         # type: (Uploader) -> None
         """Worker thread transfer
@@ -347,8 +514,7 @@ class Uploader(object):
         """
         while not self.termination_check:
             try:
-                ud, ase, offsets, data = self._transfer_queue.get(
-                    block=False, timeout=0.1)
+                ud, ase, offsets, data = self._transfer_queue.get()
             except queue.Empty:
                 continue
             try:
@@ -356,6 +522,7 @@ class Uploader(object):
             except Exception as e:
                 with self._upload_lock:
                     self._exceptions.append(e)
+        self._signal_termination()
 
     def _process_transfer(self, ud, ase, offsets, data):
         # type: (Uploader, blobxfer.models.upload.Descriptor,
@@ -368,10 +535,38 @@ class Uploader(object):
         :param blobxfer.models.upload.Offsets offsets: offsets
         :param bytes data: data to upload
         """
-        # issue put range
-        self._put_data(ud, ase, offsets, data)
+        # issue put range, unless the block is already committed
+        if not ud.is_delta_block_unchanged(offsets.chunk_num):
+            # wait to be admitted by the concurrency controller
+            if (self._concurrency_controller is not None and
+                    not self._concurrency_controller.acquire()):
+                return
+            try:
+                start = time.monotonic()
+                self._put_data(ud, ase, offsets, data)
+                latency = time.monotonic() - start
+            finally:
+                if self._concurrency_controller is not None:
+                    self._concurrency_controller.release()
+            if self._concurrency_controller is not None:
+                self._concurrency_controller.record(
+                    offsets.num_bytes, latency)
+            if self._chunk_sizer is not None:
+                self._chunk_sizer.record(offsets.num_bytes, latency)
         # accounting
+        inflight = 0
         with self._transfer_lock:
+            # release in-flight memory once the chunk is transferred to
+            # all replicas
+            memkey = blobxfer.operations.upload.Uploader.\
+                create_unique_transfer_id(ud.local_path, ud.entity, offsets)
+            ref = self._memory_refs[memkey]
+            ref[0] -= 1
+            if ref[0] == 0:
+                self._memory_refs.pop(memkey)
+                inflight = ref[1]
+                # return pooled chunk buffer
+                self._buffer_pool.release(data)
             if ud.local_path.use_stdin:
                 self._upload_bytes_total += offsets.num_bytes
             elif offsets.chunk_num == 0:
@@ -380,9 +575,14 @@ class Uploader(object):
             self._transfer_set.remove(
                 blobxfer.operations.upload.Uploader.create_unique_transfer_id(
                     ud.local_path, ase, offsets))
+            self._transfer_backpressure.notify()
+        if inflight > 0:
+            self._memory_budget.release(inflight)
         ud.complete_offset_upload(offsets.chunk_num)
-        # add descriptor back to upload queue only for append blobs
-        if ud.entity.mode == blobxfer.models.azure.StorageModes.Append:
+        # add descriptor back to upload queue only for append blobs or
+        # for finalization once the last outstanding chunk completes
+        if (ud.entity.mode == blobxfer.models.azure.StorageModes.Append or
+                ud.all_operations_completed):
             self._upload_queue.put(ud)
         # update progress bar
         self._update_progress_bar(stdin=ud.local_path.use_stdin)
@@ -411,13 +611,15 @@ class Uploader(object):
                         ud.md5.digest())
                 else:
                     digest = None
-                blobxfer.operations.azure.blob.block.create_blob(
+                props = blobxfer.operations.azure.blob.block.create_blob(
                     ase, data, digest, metadata)
+                ase.update_from_response(props, digest)
                 return
             # upload block
             if data is not None:
                 blobxfer.operations.azure.blob.block.put_block(
-                    ase, offsets, data)
+                    ase, offsets, data,
+                    digest=ud.delta_block_digest(offsets.chunk_num))
         elif ase.mode == blobxfer.models.azure.StorageModes.File:
             # upload range
             if data is not None:
@@ -429,29 +631,36 @@ class Uploader(object):
             # compute aligned size
             aligned = blobxfer.util.page_align_content_length(
                 offsets.num_bytes)
-            # align page
+            # align page, pooled buffers are zero padded in place
             if aligned != offsets.num_bytes:
-                data = data.ljust(aligned, b'\0')
+                data = blobxfer.models.buffer.zero_pad(data, aligned)
             if blobxfer.operations.md5.check_data_is_empty(data):
                 return
             # upload page
             blobxfer.operations.azure.blob.page.put_page(
                 ase, offsets.range_start, offsets.range_start + aligned - 1,
-                data)
+                blobxfer.models.buffer.to_bytes(data))
 
     def _worker_thread_upload(self):
         # type: (Uploader) -> None
         """Worker thread upload
         :param Uploader self: this
         """
-        max_set_len = self._general_options.concurrency.transfer_threads << 2
+        # in auto mode, keep enough chunks outstanding for the maximum
+        # number of transfer workers
+        if self._concurrency_controller is not None:
+            max_set_len = self._concurrency_controller.maximum << 2
+        else:
+            max_set_len = (
+                self._general_options.concurrency.transfer_threads << 2
+            )
         while not self.termination_check:
+            # wait for outstanding transfers to drain below threshold
+            if not self._transfer_backpressure.wait(
+                    lambda: len(self._transfer_set) <= max_set_len):
+                continue
             try:
-                if len(self._transfer_set) > max_set_len:
-                    time.sleep(0.1)
-                    continue
-                else:
-                    ud = self._upload_queue.get(block=False, timeout=0.1)
+                ud = self._upload_queue.get()
             except queue.Empty:
                 continue
             try:
@@ -459,6 +668,7 @@ class Uploader(object):
             except Exception as e:
                 with self._upload_lock:
                     self._exceptions.append(e)
+        self._signal_termination()
 
     def _prepare_upload(self, ase):
         # type: (Uploader, blobxfer.models.azure.StorageEntity) -> None
@@ -512,9 +722,15 @@ class Uploader(object):
                     resume_bytes, self._upload_bytes_sofar, ud.entity.name))
             del resume_bytes
         # check if all operations completed
-        if offsets is None and ud.all_operations_completed:
+        if offsets is None:
+            # descriptors with outstanding chunks are re-enqueued for
+            # finalization when the last chunk completes
+            if not ud.claim_finalization():
+                return
             # finalize file
-            self._finalize_upload(ud)
+            current = self._finalize_upload(ud)
+            self._update_sync_state(
+                ud.local_path, ud.entity, refresh=not current)
             # accounting
             with self._upload_lock:
                 if ud.entity.is_encrypted:
@@ -522,9 +738,10 @@ class Uploader(object):
                 self._upload_set.remove(ud.unique_id)
                 self._upload_sofar += 1
             return
-        # if nothing to upload, re-enqueue for finalization
-        if offsets is None:
-            self._upload_queue.put(ud)
+        # wait for in-flight memory to be available for this chunk
+        inflight = blobxfer.operations.upload.Uploader.\
+            compute_inflight_bytes(ud, offsets)
+        if not self._memory_budget.acquire(inflight):
             return
         # prepare upload
         if offsets.chunk_num == 0:
@@ -535,46 +752,99 @@ class Uploader(object):
                 if offsets.chunk_num == 0:
                     self._prepare_upload(ase)
         # encrypt if necessary
+        requeued = False
         if ud.entity.is_encrypted and ud.entity.size > 0:
-            # send iv through hmac if first chunk
-            if offsets.chunk_num == 0:
-                ud.hmac_data(ud.current_iv)
-            # encrypt data
-            if self._crypto_offload is None:
-                # read data from file and encrypt
+            if ud.is_encrypted_in_regions:
+                # regions are encrypted independently, the descriptor is
+                # re-enqueued before encryption so chunks are encrypted
+                # in parallel. the pre-encrypted md5 requires reading data
+                # in order so offload is only used without md5
+                if (self._crypto_offload is not None and
+                        not ud.must_compute_md5):
+                    self._upload_queue.put(ud)
+                    # count the chunk as outstanding for backpressure
+                    with self._transfer_lock:
+                        self._transfer_set.add(
+                            blobxfer.operations.upload.Uploader.
+                            create_unique_transfer_id(
+                                ud.local_path, ud.entity, offsets))
+                    start, num_bytes = ud.compute_read_range(offsets)
+                    self._crypto_offload.add_encrypt_chunk(
+                        ud.unique_id, ud.local_path.absolute_path, start,
+                        offsets, num_bytes,
+                        ud.entity.encryption_metadata.symmetric_key)
+                    # encrypted data will be retrieved from shared memory
+                    # or a temp file once retrieved from crypto queue
+                    return
+                data, _ = ud.read_data(offsets)
+                self._upload_queue.put(ud)
+                requeued = True
+                encdata = blobxfer.operations.crypto.aes_gcm_encrypt_region(
+                    ud.entity.encryption_metadata.symmetric_key,
+                    offsets.chunk_num, data)
+                self._buffer_pool.release(data)
+                ud.add_region_tag(offsets.chunk_num, encdata)
+                data = encdata
+            else:
+                # send iv through hmac if first chunk
+                if offsets.chunk_num == 0:
+                    ud.hmac_data(ud.current_iv)
+                # read data from file and encrypt, padding pooled
+                # buffers in place
                 data, _ = ud.read_data(offsets)
+                pad = offsets.pad
+                if pad and isinstance(data, memoryview):
+                    plaintext = blobxfer.operations.crypto.pkcs7_pad_into(
+                        memoryview(data.obj), len(data))
+                    pad = False
+                else:
+                    plaintext = data
                 encdata = blobxfer.operations.crypto.aes_cbc_encrypt_data(
                     ud.entity.encryption_metadata.symmetric_key,
-                    ud.current_iv, data, offsets.pad)
-                # send encrypted data through hmac
-                ud.hmac_data(encdata)
+                    ud.current_iv, plaintext, pad)
+                self._buffer_pool.release(data)
+                del plaintext
+                # send encrypted data through hmac and save last 16
+                # encrypted bytes for next IV
+                ud.complete_encrypted_chunk(offsets.chunk_num, encdata)
                 data = encdata
-                # save last 16 encrypted bytes for next IV
-                ud.current_iv = \
-                    encdata[-blobxfer.models.crypto.AES256_BLOCKSIZE_BYTES:]
-            else:  # noqa
-                # crypto offload is not supported with AES256-CBC FullBlob
-                raise NotImplementedError()
-                # self._crypto_offload.add_encrypt_chunk(
-                #     str(ud.local_path.absolute_path), offsets,
-                #     ud.entity.encryption_metadata.symmetric_key,
-                #     ud.current_iv)
-                # encrypted data will be retrieved from a temp file once
-                # retrieved from crypto queue
-                # return_early = True
         else:
             data, newoffset = ud.read_data(offsets)
             # set new offset if stdin
             if newoffset is not None:
                 offsets = newoffset
+            # digest block to check against the remote if delta
+            if ud.is_delta:
+                ud.compute_delta_block(offsets, data)
         # re-enqueue for other threads to upload if not append
-        if ud.entity.mode != blobxfer.models.azure.StorageModes.Append:
+        if (not requeued and
+                ud.entity.mode != blobxfer.models.azure.StorageModes.Append):
             self._upload_queue.put(ud)
         # no data can be returned on stdin uploads
         if ud.local_path.use_stdin and not data:
+            self._memory_budget.release(inflight)
             return
-        # add data to transfer queue
+        self._add_to_transfer_queue(ud, offsets, data, inflight)
+
+    def _add_to_transfer_queue(self, ud, offsets, data, inflight):
+        # type: (Uploader, blobxfer.models.upload.Descriptor,
+        #        blobxfer.models.upload.Offsets, bytes, int) -> None
+        """Add chunk data to the transfer queue for all destinations
+        :param Uploader self: this
+        :param blobxfer.models.upload.Descriptor: upload descriptor
+        :param blobxfer.models.upload.Offsets offsets: offsets
+        :param bytes data: data to upload
+        :param int inflight: in-flight memory bytes held by the chunk
+        """
+        # the chunk data is shared by all replicas and is held until the
+        # last transfer completes
+        nrefs = 1
+        if blobxfer.util.is_not_empty(ud.entity.replica_targets):
+            nrefs += len(ud.entity.replica_targets)
         with self._transfer_lock:
+            self._memory_refs[
+                blobxfer.operations.upload.Uploader.create_unique_transfer_id(
+                    ud.local_path, ud.entity, offsets)] = [nrefs, inflight]
             self._transfer_set.add(
                 blobxfer.operations.upload.Uploader.create_unique_transfer_id(
                     ud.local_path, ud.entity, offsets))
@@ -591,7 +861,8 @@ class Uploader(object):
 
     def _finalize_block_blob(self, ud, metadata):
         # type: (Uploader, blobxfer.models.upload.Descriptor, dict) -> None
-        """Finalize Block blob
+        """Finalize Block blob and update entity properties from the
+        response
         :param Uploader self: this
         :param blobxfer.models.upload.Descriptor ud: upload descriptor
         :param dict metadata: metadata dict
@@ -600,70 +871,108 @@ class Uploader(object):
             digest = blobxfer.util.base64_encode_as_string(ud.md5.digest())
         else:
             digest = None
-        blobxfer.operations.azure.blob.block.put_block_list(
-            ud.entity, ud.last_block_num, digest, metadata)
+        if ud.is_delta:
+            block_digests = ud.delta_block_digests
+            unchanged_blocks, unchanged_bytes = ud.delta_unchanged
+            logger.info(
+                ('delta upload of {}: {} of {} blocks ({} bytes) '
+                 'unchanged').format(
+                     ud.entity.path, unchanged_blocks, len(block_digests),
+                     unchanged_bytes))
+        else:
+            block_digests = None
+        props = blobxfer.operations.azure.blob.block.put_block_list(
+            ud.entity, ud.last_block_num, digest, metadata,
+            digests=block_digests)
+        ud.entity.update_from_response(props, digest)
         if blobxfer.util.is_not_empty(ud.entity.replica_targets):
             for ase in ud.entity.replica_targets:
                 blobxfer.operations.azure.blob.block.put_block_list(
                     ase, ud.last_block_num, digest, metadata)
 
     def _set_blob_properties(self, ud):
-        # type: (Uploader, blobxfer.models.upload.Descriptor) -> None
+        # type: (Uploader, blobxfer.models.upload.Descriptor) ->
+        #        azure.storage.blob.models.ResourceProperties
         """Set blob properties (md5, cache control)
         :param Uploader self: this
         :param blobxfer.models.upload.Descriptor ud: upload descriptor
+        :rtype: azure.storage.blob.models.ResourceProperties
+        :return: properties of the updated primary blob
         """
         if ud.requires_non_encrypted_md5_put:
             digest = blobxfer.util.base64_encode_as_string(ud.md5.digest())
         else:
             digest = None
-        blobxfer.operations.azure.blob.set_blob_properties(ud.entity, digest)
+        props = blobxfer.operations.azure.blob.set_blob_properties(
+            ud.entity, digest)
         if blobxfer.util.is_not_empty(ud.entity.replica_targets):
             for ase in ud.entity.replica_targets:
                 blobxfer.operations.azure.blob.set_blob_properties(ase, digest)
+        return props
 
     def _set_blob_metadata(self, ud, metadata):
-        # type: (Uploader, blobxfer.models.upload.Descriptor, dict) -> None
+        # type: (Uploader, blobxfer.models.upload.Descriptor, dict) ->
+        #        azure.storage.blob.models.ResourceProperties
         """Set blob metadata
         :param Uploader self: this
         :param blobxfer.models.upload.Descriptor ud: upload descriptor
         :param dict metadata: metadata dict
+        :rtype: azure.storage.blob.models.ResourceProperties
+        :return: properties of the updated primary blob
         """
-        blobxfer.operations.azure.blob.set_blob_metadata(ud.entity, metadata)
+        props = blobxfer.operations.azure.blob.set_blob_metadata(
+            ud.entity, metadata)
         if blobxfer.util.is_not_empty(ud.entity.replica_targets):
             for ase in ud.entity.replica_targets:
                 blobxfer.operations.azure.blob.set_blob_metadata(ase, metadata)
+        return props
 
     def _resize_blob(self, ud, size):
-        # type: (Uploader, blobxfer.models.upload.Descriptor, int) -> None
+        # type: (Uploader, blobxfer.models.upload.Descriptor, int) ->
+        #        azure.storage.blob.models.ResourceProperties
         """Resize page blob
         :param Uploader self: this
         :param blobxfer.models.upload.Descriptor ud: upload descriptor
         :param int size: content length
+        :rtype: azure.storage.blob.models.ResourceProperties
+        :return: properties of the updated primary blob
         """
-        blobxfer.operations.azure.blob.page.resize_blob(ud.entity, size)
+        props = blobxfer.operations.azure.blob.page.resize_blob(
+            ud.entity, size)
         if blobxfer.util.is_not_empty(ud.entity.replica_targets):
             for ase in ud.entity.replica_targets:
                 blobxfer.operations.azure.blob.page.resize_blob(ase, size)
+        return props
 
     def _finalize_nonblock_blob(self, ud, metadata):
-        # type: (Uploader, blobxfer.models.upload.Descriptor, dict) -> None
+        # type: (Uploader, blobxfer.models.upload.Descriptor, dict) -> bool
         """Finalize Non-Block blob
         :param Uploader self: this
         :param blobxfer.models.upload.Descriptor ud: upload descriptor
         :param dict metadata: metadata dict
+        :rtype: bool
+        :return: if entity properties were updated by a finalize request
         """
+        props = None
         # resize blobs to final size if required
         needs_resize, final_size = ud.requires_resize()
         if needs_resize:
-            self._resize_blob(ud, final_size)
+            props = self._resize_blob(ud, final_size)
         # set md5 page blob property if required
         if (ud.requires_non_encrypted_md5_put or
                 ud.entity.cache_control is not None):
-            self._set_blob_properties(ud)
+            props = self._set_blob_properties(ud)
         # set metadata if needed
         if blobxfer.util.is_not_empty(metadata):
-            self._set_blob_metadata(ud, metadata)
+            props = self._set_blob_metadata(ud, metadata)
+        if props is None:
+            return False
+        if ud.requires_non_encrypted_md5_put:
+            digest = blobxfer.util.base64_encode_as_string(ud.md5.digest())
+        else:
+            digest = None
+        ud.entity.update_from_response(props, digest)
+        return True
 
     def _finalize_azure_file(self, ud, metadata):
         # type: (Uploader, blobxfer.models.upload.Descriptor, dict) -> None
@@ -694,25 +1003,47 @@ class Uploader(object):
                         ase, metadata)
 
     def _finalize_upload(self, ud):
-        # type: (Uploader, blobxfer.models.upload.Descriptor) -> None
+        # type: (Uploader, blobxfer.models.upload.Descriptor) -> bool
         """Finalize file upload
         :param Uploader self: this
         :param blobxfer.models.upload.Descriptor ud: upload descriptor
+        :rtype: bool
+        :return: if entity properties are current with the remote
         """
+        # release cached file handle as all data has been read
+        if not ud.local_path.use_stdin:
+            self._fd_cache.close(ud.local_path.absolute_path)
         metadata = ud.generate_metadata()
+        # one-shot block blob properties are updated on put
+        current = ud.is_one_shot_block_blob
         if ud.requires_put_block_list:
             # put block list for non one-shot block blobs
             self._finalize_block_blob(ud, metadata)
+            current = True
         elif ud.remote_is_page_blob or ud.remote_is_append_blob:
-            # append and page blob finalization
-            self._finalize_nonblock_blob(ud, metadata)
+            # append and page blob finalization, pages and blocks complete
+            # out of order so only a finalize request is authoritative
+            current = self._finalize_nonblock_blob(ud, metadata)
         elif ud.remote_is_file:
-            # azure file finalization
+            # azure file finalization, file requests do not return
+            # properties
             self._finalize_azure_file(ud, metadata)
-        # set access tier
+        # set access tier, which does not modify the entity
         if ud.requires_access_tier_set:
             blobxfer.operations.azure.blob.block.set_blob_access_tier(
                 ud.entity)
+        return current
+
+    def _initialize_remote_index(self):
+        # type: (Uploader) -> None
+        """Initialize remote index of destination paths, if specified
+        :param Uploader self: this
+        """
+        if not self._spec.options.remote_index:
+            return
+        self._remote_index = blobxfer.operations.index.RemoteIndex()
+        for sa, cont, dir, _ in self._get_destination_paths():
+            self._remote_index.add_prefix(sa, cont, dir)
 
     def _get_destination_paths(self):
         # type: (Uploader) ->
@@ -730,6 +1061,29 @@ class Uploader(object):
                     dst.lookup_storage_account(sdpath))
                 yield sa, cont, dir, dpath
 
+    def _start_extraneous_deletion(self):
+        # type: (Uploader) -> None
+        """Start deleting extraneous files on the remote
+        :param Uploader self: this
+        """
+        if (not self._spec.options.delete_extraneous_destination or
+                self._extraneous_deleter is not None):
+            return
+        is_file = (
+            self._spec.options.mode == blobxfer.models.azure.StorageModes.File
+        )
+        self._extraneous_deleter = \
+            blobxfer.operations.extraneous.ExtraneousDeleter(
+                self._delete_exclude,
+                blobxfer.operations.upload.Uploader.create_destination_id,
+                self._general_options.concurrency.transfer_threads,
+                dry_run=self._general_options.dry_run,
+                verbose=self._general_options.verbose)
+        self._extraneous_deleter.start([
+            (sa, container, vpath, is_file)
+            for sa, container, vpath, _ in self._get_destination_paths()
+        ])
+
     def _delete_extraneous_files(self):
         # type: (Uploader) -> None
         """Delete extraneous files on the remote
@@ -737,61 +1091,11 @@ class Uploader(object):
         """
         if not self._spec.options.delete_extraneous_destination:
             return
-        # list blobs for all destinations
-        checked = set()
-        deleted = 0
-        for sa, container, vpath, dpath in self._get_destination_paths():
-            key = ';'.join((sa.name, sa.endpoint, str(dpath)))
-            if key in checked:
-                continue
-            logger.debug(
-                'attempting to delete extraneous blobs/files from: {}'.format(
-                    key))
-            if (self._spec.options.mode ==
-                    blobxfer.models.azure.StorageModes.File):
-                files = blobxfer.operations.azure.file.list_all_files(
-                    sa.file_client, container)
-                for file in files:
-                    try:
-                        pathlib.Path(file).relative_to(vpath)
-                    except ValueError:
-                        continue
-                    id = blobxfer.operations.upload.Uploader.\
-                        create_destination_id(sa.file_client, container, file)
-                    if id not in self._delete_exclude:
-                        if self._general_options.dry_run:
-                            logger.info('[DRY RUN] deleting file: {}'.format(
-                                file))
-                        else:
-                            if self._general_options.verbose:
-                                logger.debug('deleting file: {}'.format(file))
-                            blobxfer.operations.azure.file.delete_file(
-                                sa.file_client, container, file)
-                            deleted += 1
-            else:
-                blobs = blobxfer.operations.azure.blob.list_all_blobs(
-                    sa.block_blob_client, container)
-                for blob in blobs:
-                    try:
-                        pathlib.Path(blob.name).relative_to(vpath)
-                    except ValueError:
-                        continue
-                    id = blobxfer.operations.upload.Uploader.\
-                        create_destination_id(
-                            sa.block_blob_client, container, blob.name)
-                    if id not in self._delete_exclude:
-                        if self._general_options.dry_run:
-                            logger.info('[DRY RUN] deleting blob: {}'.format(
-                                blob.name))
-                        else:
-                            if self._general_options.verbose:
-                                logger.debug('deleting blob: {}'.format(
-                                    blob.name))
-                            blobxfer.operations.azure.blob.delete_blob(
-                                sa.block_blob_client, container, blob.name)
-                            deleted += 1
-            checked.add(key)
-        logger.info('deleted {} extraneous blobs/files'.format(deleted))
+        self._start_extraneous_deletion()
+        try:
+            self._extraneous_deleter.join()
+        finally:
+            self._extraneous_deleter = None
 
     def _check_upload_conditions(self, local_path, rfile):
         # type: (Uploader, blobxfer.models.upload.LocalPath,
@@ -810,6 +1114,14 @@ class Uploader(object):
                 logger.warning(
                     'skipping file that no longer exists: {}'.format(lpath))
             return UploadAction.Skip
+        # skip if unchanged since the last sync
+        if rfile is not None and len(self._sync_state_unchanged) > 0:
+            dest_id = blobxfer.operations.upload.Uploader.\
+                create_destination_id(rfile._client, rfile.container,
+                                      rfile.name)
+            if dest_id in self._sync_state_unchanged:
+                self._sync_state_unchanged.remove(dest_id)
+                return UploadAction.Skip
         # if remote file doesn't exist, upload
         if rfile is None or rfile.from_local:
             return UploadAction.Upload
@@ -862,6 +1174,130 @@ class Uploader(object):
         else:
             return UploadAction.Skip
 
+    def _get_remote_properties(self, sa, cont, name):
+        # type: (Uploader, blobxfer.operations.azure.StorageAccount,
+        #        str, str) -> object
+        """Get properties of a remote file
+        :param Uploader self: this
+        :param blobxfer.operations.azure.StorageAccount sa: storage account
+        :param str cont: container
+        :param str name: entity name
+        :rtype: object
+        :return: blob or file, or None if it does not exist
+        """
+        if self._remote_index is not None:
+            return self._remote_index.get_properties(
+                sa, cont, name, self._spec.options.mode)
+        elif (self._spec.options.mode ==
+                blobxfer.models.azure.StorageModes.File):
+            return blobxfer.operations.azure.file.get_file_properties(
+                sa.file_client, cont, name)
+        else:
+            return blobxfer.operations.azure.blob.get_blob_properties(
+                sa.block_blob_client, cont, name, self._spec.options.mode)
+
+    def _initialize_sync_state(self):
+        # type: (Uploader) -> None
+        """Initialize sync state, if specified
+        :param Uploader self: this
+        """
+        if self._general_options.sync_state is None:
+            return
+        self._sync_state = blobxfer.operations.syncstate.SyncStateManager(
+            self._general_options.sync_state)
+
+    def _sync_state_eligible(self, local_path):
+        # type: (Uploader, blobxfer.models.upload.LocalPath) -> bool
+        """Check if a local path can be tracked in the sync state
+        :param Uploader self: this
+        :param blobxfer.models.upload.LocalPath local_path: local path
+        :rtype: bool
+        :return: if eligible
+        """
+        return (self._sync_state is not None and
+                not self._general_options.dry_run and
+                not local_path.use_stdin and
+                self._spec.options.vectored_io.distribution_mode ==
+                blobxfer.models.upload.VectoredIoDistributionMode.Disabled)
+
+    def _check_sync_state(self, local_path, sa, cont, name):
+        # type: (Uploader, blobxfer.models.upload.LocalPath,
+        #        blobxfer.operations.azure.StorageAccount, str, str) -> bool
+        """Check if a local file is unchanged since it was last synchronized
+        to the destination. The remote is only contacted if the record is
+        due for revalidation.
+        :param Uploader self: this
+        :param blobxfer.models.upload.LocalPath local_path: local path
+        :param blobxfer.operations.azure.StorageAccount sa: storage account
+        :param str cont: container
+        :param str name: entity name
+        :rtype: bool
+        :return: if unchanged
+        """
+        if not self._sync_state_eligible(local_path):
+            return False
+        if (self._spec.options.mode ==
+                blobxfer.models.azure.StorageModes.File):
+            endpoint = sa.file_client.primary_endpoint
+        else:
+            endpoint = sa.block_blob_client.primary_endpoint
+        key = blobxfer.operations.syncstate.SyncStateManager.\
+            generate_remote_key(endpoint, cont, name)
+        record = self._sync_state.get_record(key)
+        if (record is None or
+                not blobxfer.operations.syncstate.SyncStateManager.
+                local_matches(record, local_path.stat)):
+            return False
+        validated = False
+        if self._sync_state.requires_revalidation(record):
+            if not sa.can_read_object:
+                return False
+            fp = self._get_remote_properties(sa, cont, name)
+            if (fp is None or
+                    not blobxfer.operations.syncstate.SyncStateManager.
+                    remote_matches(
+                        record, fp.properties.etag,
+                        fp.properties.last_modified)):
+                return False
+            validated = True
+        self._sync_state.mark_unchanged(key, record, validated=validated)
+        if self._general_options.verbose:
+            logger.debug('sync state unchanged: {} -> {}{}'.format(
+                local_path.absolute_path, endpoint, name))
+        return True
+
+    def _update_sync_state(self, local_path, ase, refresh=True):
+        # type: (Uploader, blobxfer.models.upload.LocalPath,
+        #        blobxfer.models.azure.StorageEntity, bool) -> None
+        """Record the local and remote state of a synchronized file
+        :param Uploader self: this
+        :param blobxfer.models.upload.LocalPath local_path: local path
+        :param blobxfer.models.azure.StorageEntity ase: Storage entity
+        :param bool refresh: retrieve current remote properties
+        """
+        if not self._sync_state_eligible(local_path):
+            return
+        etag = ase.etag
+        lmt = ase.lmt
+        md5 = ase.md5
+        if refresh:
+            if ase.mode == blobxfer.models.azure.StorageModes.File:
+                fp = blobxfer.operations.azure.file.get_file_properties(
+                    ase._client, ase.container, ase.name)
+            else:
+                fp = blobxfer.operations.azure.blob.get_blob_properties(
+                    ase._client, ase.container, ase.name, ase.mode)
+            if fp is None:
+                return
+            etag = fp.properties.etag
+            lmt = fp.properties.last_modified
+            md5 = fp.properties.content_settings.content_md5
+        self._sync_state.add_or_update_record(
+            blobxfer.operations.syncstate.SyncStateManager.
+            generate_remote_key(
+                ase._client.primary_endpoint, ase.container, ase.name),
+            local_path.stat, etag, lmt, md5)
+
     def _check_for_existing_remote(self, sa, cont, name):
         # type: (Uploader, blobxfer.operations.azure.StorageAccount,
         #        str, str) -> bobxfer.models.azure.StorageEntity
@@ -877,18 +1313,14 @@ class Uploader(object):
         if not sa.can_read_object:
             return ase
         # if overwrite and no skip on options specified, then don't bother
-        # checking the remote as we should clobber
-        if (self._spec.options.overwrite and not
+        # checking the remote as we should clobber unless delta uploading
+        if (self._spec.options.overwrite and
+                not self._spec.options.delta and not
                 self._spec.skip_on.filesize_match and not
                 self._spec.skip_on.lmt_ge and not
                 self._spec.skip_on.md5_match):
             return ase
-        if self._spec.options.mode == blobxfer.models.azure.StorageModes.File:
-            fp = blobxfer.operations.azure.file.get_file_properties(
-                sa.file_client, cont, name)
-        else:
-            fp = blobxfer.operations.azure.blob.get_blob_properties(
-                sa.block_blob_client, cont, name, self._spec.options.mode)
+        fp = self._get_remote_properties(sa, cont, name)
         if fp is not None:
             if blobxfer.models.crypto.EncryptionMetadata.\
                     encryption_metadata_exists(fp.metadata):
@@ -947,13 +1379,19 @@ class Uploader(object):
                     ('invalid destination, must specify a container or '
                      'fileshare and remote file name: {}').format(dpath))
             # do not check for existing remote right now if striped
-            # vectored io mode
+            # vectored io mode or if unchanged since the last sync
+            unchanged = False
             if (self._spec.options.vectored_io.distribution_mode ==
                     blobxfer.models.upload.
                     VectoredIoDistributionMode.Stripe):
                 ase = None
             else:
-                ase = self._check_for_existing_remote(sa, cont, name)
+                unchanged = self._check_sync_state(
+                    local_path, sa, cont, name)
+                if unchanged:
+                    ase = None
+                else:
+                    ase = self._check_for_existing_remote(sa, cont, name)
             if ase is None:
                 # encryption metadata will be populated later, if required
                 ase = blobxfer.models.azure.StorageEntity(cont, ed=None)
@@ -964,6 +1402,11 @@ class Uploader(object):
                 )
                 if ase.mode == blobxfer.models.azure.StorageModes.Block:
                     ase.access_tier = self._spec.options.access_tier
+            if unchanged:
+                ase.size = local_path.size
+                self._sync_state_unchanged.add(
+                    blobxfer.operations.upload.Uploader.create_destination_id(
+                        ase._client, ase.container, ase.name))
             yield sa, ase
 
     def _vectorize_and_bind(self, local_path, dest):
@@ -1119,6 +1562,9 @@ class Uploader(object):
         if self._general_options.resume_file is not None:
             self._resume = blobxfer.operations.resume.UploadResumeManager(
                 self._general_options.resume_file)
+        # initialize remote index and sync state if specified
+        self._initialize_remote_index()
+        self._initialize_sync_state()
         # initialize MD5 processes
         if ((self._spec.options.store_file_properties.md5 or
              self._spec.skip_on.md5_match) and
@@ -1130,13 +1576,27 @@ class Uploader(object):
         # initialize crypto processes
         if (self._spec.options.rsa_public_key is not None and
                 self._general_options.concurrency.crypto_processes > 0):
-            logger.warning(
-                'crypto offload for upload is not possible due to '
-                'sequential nature of {} and FullBlob encryption mode'.format(
-                    blobxfer.models.crypto.EncryptionMetadata.
-                    _ENCRYPTION_ALGORITHM)
-            )
+            if (self._spec.options.encryption_mode ==
+                    blobxfer.models.crypto.EncryptionMode.ChunkedBlob):
+                self._crypto_offload = blobxfer.operations.crypto.\
+                    CryptoOffload(
+                        num_workers=self._general_options.concurrency.
+                        crypto_processes,
+                        slot_size=blobxfer.models.upload.Descriptor.
+                        max_encrypted_region_chunk_size(self._spec.options))
+                self._crypto_offload.initialize_check_thread(
+                    self._check_for_crypto_done)
+            else:
+                logger.warning(
+                    'crypto offload for upload is not possible due to '
+                    'sequential nature of {} and FullBlob encryption '
+                    'mode'.format(
+                        blobxfer.models.crypto.EncryptionMetadata.
+                        _ENCRYPTION_ALGORITHM)
+                )
         # initialize worker threads
+        self._initialize_concurrency_controller()
+        self._initialize_chunk_sizer()
         self._initialize_disk_threads()
         self._initialize_transfer_threads()
         # initialize local counters
@@ -1146,7 +1606,9 @@ class Uploader(object):
         approx_total_bytes = 0
         # iterate through source paths to upload
         seen = set()
-        for src in self._spec.sources.files(self._general_options.dry_run):
+        for src in self._spec.sources.files(
+                self._general_options.dry_run,
+                scan_threads=self._general_options.concurrency.scan_threads):
             # create a destination array for the source
             dest = [
                 (sa, ase) for sa, ase in
@@ -1196,6 +1658,10 @@ class Uploader(object):
         # set remote files processed
         with self._md5_meta_lock:
             self._all_files_processed = True
+        # the keep manifest is complete, extraneous deletion may overlap
+        # with transfers
+        if self._spec.options.delete_during_transfer:
+            self._start_extraneous_deletion()
         with self._upload_lock:
             upload_size_mib = approx_total_bytes / blobxfer.util.MEGABYTE
             if self._spec.options.delete_only:
@@ -1251,6 +1717,7 @@ class Uploader(object):
                 ('elapsed upload + verify time and throughput of {0:.4f} '
                  'GiB: {1:.3f} sec, {2:.4f} Mbps ({3:.3f} MiB/s)').format(
                      mibup / 1024, ultime, mibps * 8, mibps))
+        blobxfer.operations.progress.output_memory_usage(self._memory_budget)
         end_time = blobxfer.util.datetime_now()
         logger.info('blobxfer end time: {0} (elapsed: {1:.3f} sec)'.format(
             end_time, (end_time - self._start_time).total_seconds()))
@@ -1273,16 +1740,28 @@ class Uploader(object):
             try:
                 self._wait_for_transfer_threads(terminate=True)
                 self._wait_for_disk_threads(terminate=True)
+                if self._extraneous_deleter is not None:
+                    self._extraneous_deleter.terminate()
             except Exception as tex:
                 logger.exception(tex)
             finally:
                 raise ex
         finally:
+            # close cached file handles and drop pooled buffers
+            self._fd_cache.close_all()
+            self._buffer_pool.clear()
             # shutdown processes
             if self._md5_offload is not None:
                 self._md5_offload.finalize_processes()
             if self._crypto_offload is not None:
                 self._crypto_offload.finalize_processes()
+            # close remote index and sync state
+            if self._remote_index is not None:
+                self._remote_index.close()
+            if self._sync_state is not None:
+                self._sync_state.close()
+            # close keep manifest
+            self._delete_exclude.close()
             # close resume file
             if self._resume is not None:
                 self._resume.close()
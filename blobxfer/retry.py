@@ -23,8 +23,13 @@
 # DEALINGS IN THE SOFTWARE.
 
 # stdlib imports
+import collections
+import email.utils
 import errno
+import logging
 import ssl
+import threading
+import time
 # non-stdlib imports
 import azure.storage.common.models
 import azure.storage.common.retry
@@ -32,6 +37,9 @@ import requests
 import urllib3
 # local imports
 
+# create logger
+logger = logging.getLogger(__name__)
+
 
 # global defines
 _RETRYABLE_ERRNO_MAXRETRY = frozenset((
@@ -61,20 +69,256 @@ _RETRYABLE_STRING_FALLBACK = frozenset((
     'network dropped',
     'timed out',
 ))
+_THROTTLE_STATUS_CODES = frozenset((429, 503))
+_MAX_RETRY_AFTER_SECONDS = 300
+# account throttle token bucket tuning
+_THROTTLE_DEMAND_WINDOW_SECONDS = 5
+_THROTTLE_RATE_DECREASE = 0.5
+_THROTTLE_RATE_INCREASE = 0.05
+_THROTTLE_MIN_RATE = 1.0
+_THROTTLE_DECREASE_INTERVAL_SECONDS = 1
+_THROTTLE_RECOVERY_SECONDS = 5
+_THROTTLE_MAX_BURST = 4.0
+
+
+class ThrottleCounter(object):
+    """Thread-safe counts of throttling (429/503) responses observed by
+    retry policies"""
+    def __init__(self):
+        # type: (ThrottleCounter) -> None
+        """Ctor for ThrottleCounter
+        :param ThrottleCounter self: this
+        """
+        self._lock = threading.Lock()
+        self._counts = {x: 0 for x in _THROTTLE_STATUS_CODES}
+
+    @property
+    def total(self):
+        # type: (ThrottleCounter) -> int
+        """Total number of throttling responses
+        :param ThrottleCounter self: this
+        :rtype: int
+        :return: total throttling responses
+        """
+        with self._lock:
+            return sum(self._counts.values())
+
+    def counts(self):
+        # type: (ThrottleCounter) -> dict
+        """Get a snapshot of throttling response counts
+        :param ThrottleCounter self: this
+        :rtype: dict
+        :return: status code to count
+        """
+        with self._lock:
+            return dict(self._counts)
+
+    def increment(self, status):
+        # type: (ThrottleCounter, int) -> None
+        """Count a response if it is a throttling response
+        :param ThrottleCounter self: this
+        :param int status: response status code
+        """
+        if status in self._counts:
+            with self._lock:
+                self._counts[status] += 1
+
+
+# throttling responses seen by all retry policies in this process
+throttle_counter = ThrottleCounter()
+
+
+def _get_retry_after(response):
+    # type: (azure.storage.common._http.HTTPResponse) -> float
+    """Get the server requested retry delay from a response
+    :param azure.storage.common._http.HTTPResponse response: response
+    :rtype: float
+    :return: retry delay in seconds or None if not specified
+    """
+    headers = response.headers if response is not None else None
+    if not isinstance(headers, dict):
+        return None
+    delay = None
+    ms = headers.get('x-ms-retry-after-ms')
+    if ms is not None:
+        try:
+            delay = float(ms) / 1000
+        except ValueError:
+            pass
+    ra = headers.get('retry-after')
+    if delay is None and ra is not None:
+        try:
+            delay = float(ra)
+        except ValueError:
+            # http-date form
+            try:
+                delay = (
+                    email.utils.parsedate_to_datetime(ra).timestamp() -
+                    time.time()
+                )
+            except (TypeError, ValueError):
+                pass
+    if delay is None:
+        return None
+    return min((max((delay, 0.0)), _MAX_RETRY_AFTER_SECONDS))
+
+
+class AccountThrottle(object):
+    """Throttle coordination shared by all clients and threads issuing
+    requests against a storage account. Throttling responses pause the
+    account for any server requested delay and engage a token bucket
+    which limits the request rate of every thread, recovering additively
+    once throttling subsides."""
+    def __init__(self, name, clock=None, sleep=None):
+        # type: (AccountThrottle, str, function, function) -> None
+        """Ctor for AccountThrottle
+        :param AccountThrottle self: this
+        :param str name: storage account name
+        :param function clock: monotonic clock
+        :param function sleep: sleep function
+        """
+        self.name = name
+        self._clock = clock or time.monotonic
+        self._sleep = sleep or time.sleep
+        self._lock = threading.Lock()
+        self._pause_until = 0.0
+        self._rate = None
+        self._tokens = 0.0
+        self._last_refill = None
+        self._last_throttle = None
+        self._last_decrease = None
+        self._demand_at_engage = None
+        self._requests = collections.deque()
+
+    @property
+    def rate(self):
+        # type: (AccountThrottle) -> float
+        """Current request rate limit
+        :param AccountThrottle self: this
+        :rtype: float
+        :return: requests per second or None if unlimited
+        """
+        with self._lock:
+            return self._rate
+
+    def _demand(self, now):
+        # type: (AccountThrottle, float) -> float
+        """Observed request rate over the demand window. Lock must be held
+        by the caller.
+        :param AccountThrottle self: this
+        :param float now: current time
+        :rtype: float
+        :return: requests per second
+        """
+        while (len(self._requests) > 0 and
+               now - self._requests[0] > _THROTTLE_DEMAND_WINDOW_SECONDS):
+            self._requests.popleft()
+        if len(self._requests) == 0:
+            return 0.0
+        return len(self._requests) / max((now - self._requests[0], 1.0))
+
+    def _refill(self, now):
+        # type: (AccountThrottle, float) -> None
+        """Refill tokens and recover the rate. Lock must be held by the
+        caller.
+        :param AccountThrottle self: this
+        :param float now: current time
+        """
+        # tokens do not accumulate while the account is paused
+        elapsed = max((now - self._last_refill, 0.0))
+        self._last_refill = max((now, self._last_refill))
+        if now - self._last_throttle >= _THROTTLE_RECOVERY_SECONDS:
+            self._rate += max(
+                (_THROTTLE_MIN_RATE,
+                 self._demand_at_engage * _THROTTLE_RATE_INCREASE)) * elapsed
+            # disengage once recovered to the demand prior to throttling
+            # or once the limit is well above demand
+            if (self._rate >= self._demand_at_engage or
+                    self._rate > 2 * max(
+                        (self._demand(now), _THROTTLE_MIN_RATE))):
+                logger.debug(
+                    'request rate limit for account {} lifted'.format(
+                        self.name))
+                self._rate = None
+                return
+        self._tokens = min(
+            (self._tokens + self._rate * elapsed, _THROTTLE_MAX_BURST))
+
+    def acquire(self, request=None):
+        # type: (AccountThrottle, object) -> None
+        """Wait until a request may be issued against the account. Suitable
+        as a storage client request callback.
+        :param AccountThrottle self: this
+        :param object request: request to be issued
+        """
+        while True:
+            with self._lock:
+                now = self._clock()
+                if now < self._pause_until:
+                    wait = self._pause_until - now
+                else:
+                    if self._rate is not None:
+                        self._refill(now)
+                    if self._rate is None or self._tokens >= 1:
+                        if self._rate is not None:
+                            self._tokens -= 1
+                        self._requests.append(now)
+                        return
+                    wait = (1 - self._tokens) / self._rate
+            self._sleep(wait)
+
+    def throttled(self, retry_after=None):
+        # type: (AccountThrottle, float) -> None
+        """Register a throttling response
+        :param AccountThrottle self: this
+        :param float retry_after: server requested delay in seconds
+        """
+        with self._lock:
+            now = self._clock()
+            if self._rate is None:
+                # engage the limit below the observed demand
+                self._demand_at_engage = max(
+                    (self._demand(now), _THROTTLE_MIN_RATE))
+                self._rate = max(
+                    (self._demand_at_engage * _THROTTLE_RATE_DECREASE,
+                     _THROTTLE_MIN_RATE))
+                # allow the throttled request to be retried immediately
+                # once any server requested delay has elapsed
+                self._tokens = 1.0
+                self._last_refill = now
+                self._last_decrease = now
+            elif (now - self._last_decrease >=
+                    _THROTTLE_DECREASE_INTERVAL_SECONDS):
+                # concurrent requests are usually throttled together, so
+                # decrease at most once per interval
+                self._rate = max(
+                    (self._rate * _THROTTLE_RATE_DECREASE,
+                     _THROTTLE_MIN_RATE))
+                self._last_decrease = now
+            self._last_throttle = now
+            if retry_after is not None:
+                self._pause_until = max((self._pause_until, now + retry_after))
+                self._last_refill = max(
+                    (self._last_refill, self._pause_until))
+            logger.debug(
+                'throttled by account {}: rate limit {:.2f} req/s, '
+                'retry after {}'.format(self.name, self._rate, retry_after))
 
 
 class ExponentialRetryWithMaxWait(azure.storage.common.retry._Retry):
     """Exponential Retry with Max Wait Reset"""
     def __init__(
             self, initial_backoff=0.1, max_backoff=1, max_retries=None,
-            reset_at_max=True):
-        # type: (ExponentialRetryWithMaxWait, int, int, int, bool) -> None
+            reset_at_max=True, throttle=None):
+        # type: (ExponentialRetryWithMaxWait, int, int, int, bool,
+        #        AccountThrottle) -> None
         """Ctor for ExponentialRetryWithMaxWait
         :param ExponentialRetryWithMaxWait self: this
         :param int initial_backoff: initial backoff
         :param int max_backoff: max backoff
         :param int max_retries: max retries
         :param bool reset_at_max: reset after reaching max wait
+        :param AccountThrottle throttle: account throttle coordination
         """
         if max_backoff <= 0:
             raise ValueError(
@@ -86,11 +330,10 @@ class ExponentialRetryWithMaxWait(azure.storage.common.retry._Retry):
             raise ValueError(
                 'max backoff {} less than initial backoff {}'.format(
                     max_backoff, initial_backoff))
-        self._backoff_count = 0
-        self._last_backoff = initial_backoff
         self.initial_backoff = initial_backoff
         self.max_backoff = max_backoff
         self.reset_at_max = reset_at_max
+        self.throttle = throttle
         super(ExponentialRetryWithMaxWait, self).__init__(
             max_retries if max_retries is not None else 2147483647, False)
 
@@ -112,6 +355,9 @@ class ExponentialRetryWithMaxWait(azure.storage.common.retry._Retry):
         if context.response and context.response.status:
             status = context.response.status
 
+        # surface throttling responses for adaptive concurrency
+        throttle_counter.increment(status)
+
         # if there is no response status, then handle the exception
         # appropriately from the lower layer
         if status is None:
@@ -165,8 +411,8 @@ class ExponentialRetryWithMaxWait(azure.storage.common.retry._Retry):
                     azure.storage.common.models.LocationMode.SECONDARY):
                 return True
             # response code 408 is a timeout and should be retried
-            # response code 429 is too many requests (throttle)
-            # TODO use "Retry-After" header for backoff amount
+            # response code 429 is too many requests (throttle), the
+            # backoff honors any "Retry-After" header
             if status == 408 or status == 429:
                 return True
             return False
@@ -194,18 +440,33 @@ class ExponentialRetryWithMaxWait(azure.storage.common.retry._Retry):
     def _backoff(self, context):
         # type: (ExponentialRetryWithMaxWait,
         #        azure.storage.common.models.RetryContext) -> int
-        """Backoff calculator
+        """Backoff calculator. Backoff state is kept on the retry context
+        which is unique to each request, as the policy is shared by all
+        threads using a client.
         :param ExponentialRetryWithMaxWait self: this
         :param azure.storage.common.models.RetryContext context: retry context
         :rtype: int
         :return: backoff amount
         """
-        self._backoff_count += 1
-        if self._backoff_count == 1:
-            self._last_backoff = self.initial_backoff
+        count = getattr(context, 'blobxfer_backoff_count', 0) + 1
+        if count == 1:
+            backoff = self.initial_backoff
         else:
-            self._last_backoff *= 2
-        if self._last_backoff > self.max_backoff and self.reset_at_max:
-            self._backoff_count = 1
-            self._last_backoff = self.initial_backoff
-        return self._last_backoff
+            backoff = context.blobxfer_last_backoff * 2
+        if backoff > self.max_backoff and self.reset_at_max:
+            count = 1
+            backoff = self.initial_backoff
+        context.blobxfer_backoff_count = count
+        context.blobxfer_last_backoff = backoff
+        # honor the server requested delay for throttling responses and
+        # slow down all requests to the account
+        status = None
+        if context.response and context.response.status:
+            status = context.response.status
+        if status in _THROTTLE_STATUS_CODES:
+            retry_after = _get_retry_after(context.response)
+            if self.throttle is not None:
+                self.throttle.throttled(retry_after)
+            if retry_after is not None and retry_after > backoff:
+                return retry_after
+        return backoff
@@ -24,9 +24,13 @@
 
 # stdlib imports
 import base64
+import collections
 import copy
+import ctypes
+import ctypes.util
 import datetime
 import hashlib
+import hmac
 import logging
 import logging.handlers
 import mimetypes
@@ -34,6 +38,7 @@ import os
 import platform
 import re
 import sys
+import threading
 # non-stdlib imports
 import dateutil.parser
 import dateutil.tz
@@ -46,6 +51,19 @@ _ON_LINUX = platform.system() == 'Linux'
 _ON_WINDOWS = platform.system() == 'Windows'
 _REGISTERED_LOGGER_HANDLERS = []
 _PAGEBLOB_BOUNDARY = 512
+_BYTE_SIZE_REGEX = re.compile(
+    r'^\s*(\d+(?:\.\d+)?)\s*([kmgt]?)(?:i?b)?\s*$', re.IGNORECASE)
+_BYTE_SIZE_UNITS = {'': 0, 'k': 10, 'm': 20, 'g': 30, 't': 40}
+_SCAN_MAX_FRONTIER = 4096
+_SCAN_BATCH_SIZE = 256
+_SCAN_MAX_PENDING_BATCHES = 64
+_SCAN_DONE = object()
+_LIBCRYPTO_NAMES = ('crypto', 'libcrypto-3-x64', 'libcrypto-1_1-x64')
+_LIBCRYPTO_DIGESTS = {
+    # algorithm: (function prefix, sizeof context)
+    'md5': ('MD5', 92),
+    'sha256': ('SHA256', 112),
+}
 
 
 def on_linux():  # noqa
@@ -174,17 +192,167 @@ def datetime_from_timestamp(ts, tz=None, as_utc=False):
         return dt
 
 
-def scantree(path):
-    # type: (str) -> os.DirEntry
-    """Recursively scan a directory tree
+class _ParallelTreeScanner(object):
+    """Multi-threaded directory tree scanner"""
+    def __init__(self, path, prune, num_threads):
+        # type: (_ParallelTreeScanner, str, callable, int) -> None
+        """Ctor for _ParallelTreeScanner
+        :param _ParallelTreeScanner self: this
+        :param str path: path to scan
+        :param callable prune: directory prune predicate
+        :param int num_threads: number of threads
+        """
+        self._prune = prune
+        self._num_threads = num_threads
+        self._cv = threading.Condition()
+        self._frontier = collections.deque([path])
+        self._outstanding = 1
+        self._results = collections.deque()
+        self._stop = False
+
+    def _put(self, item):
+        # type: (_ParallelTreeScanner, object) -> None
+        """Put an item in the result queue, blocking while the queue is
+        full unless the scan is stopped
+        :param _ParallelTreeScanner self: this
+        :param object item: item
+        """
+        with self._cv:
+            while (len(self._results) >= _SCAN_MAX_PENDING_BATCHES and
+                   not self._stop):
+                self._cv.wait()
+            if self._stop:
+                return
+            self._results.append(item)
+            self._cv.notify_all()
+
+    def _get(self):
+        # type: (_ParallelTreeScanner) -> object
+        """Get an item from the result queue
+        :param _ParallelTreeScanner self: this
+        :rtype: object
+        :return: item
+        """
+        with self._cv:
+            while len(self._results) == 0:
+                self._cv.wait()
+            item = self._results.popleft()
+            self._cv.notify_all()
+        return item
+
+    def _scan(self, path):
+        # type: (_ParallelTreeScanner, str) -> None
+        """Scan a directory, descending inline if the frontier is full
+        :param _ParallelTreeScanner self: this
+        :param str path: path to scan
+        """
+        stack = [path]
+        while len(stack) > 0 and not self._stop:
+            files = []
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=True):
+                        if self._prune is not None and self._prune(entry):
+                            continue
+                        with self._cv:
+                            if len(self._frontier) < _SCAN_MAX_FRONTIER:
+                                self._frontier.append(entry.path)
+                                self._outstanding += 1
+                                # the condition is shared with result
+                                # queue waiters, so wake all threads
+                                self._cv.notify_all()
+                                continue
+                        stack.append(entry.path)
+                        continue
+                    # cache stat result on the entry
+                    try:
+                        entry.stat()
+                    except OSError:
+                        pass
+                    files.append(entry)
+                    if len(files) >= _SCAN_BATCH_SIZE:
+                        self._put(files)
+                        files = []
+            if len(files) > 0:
+                self._put(files)
+
+    def _worker(self):
+        # type: (_ParallelTreeScanner) -> None
+        """Scanner worker thread
+        :param _ParallelTreeScanner self: this
+        """
+        while True:
+            with self._cv:
+                while (len(self._frontier) == 0 and
+                       self._outstanding > 0 and not self._stop):
+                    self._cv.wait()
+                if self._stop or self._outstanding == 0:
+                    return
+                path = self._frontier.popleft()
+            try:
+                self._scan(path)
+            except Exception as e:
+                self._put(e)
+            with self._cv:
+                self._outstanding -= 1
+                done = self._outstanding == 0
+                if done:
+                    self._cv.notify_all()
+            if done:
+                self._put(_SCAN_DONE)
+
+    def scan(self):
+        # type: (_ParallelTreeScanner) -> os.DirEntry
+        """Scan directory tree
+        :param _ParallelTreeScanner self: this
+        :rtype: DirEntry
+        :return: DirEntry via generator
+        """
+        threads = []
+        for _ in range(self._num_threads):
+            thr = threading.Thread(target=self._worker)
+            thr.daemon = True
+            thr.start()
+            threads.append(thr)
+        try:
+            while True:
+                item = self._get()
+                if item is _SCAN_DONE:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                for entry in item:
+                    yield entry
+        finally:
+            with self._cv:
+                self._stop = True
+                self._cv.notify_all()
+            for thr in threads:
+                thr.join()
+
+
+def scantree(path, prune=None, num_threads=1):
+    # type: (str, callable, int) -> os.DirEntry
+    """Recursively scan a directory tree. If more than one thread is
+    specified, directories are scanned concurrently, entries are yielded
+    in no particular order and stat results are cached on each entry.
     :param str path: path to scan
+    :param callable prune: predicate given a directory DirEntry which
+        returns True if the directory should not be descended into
+    :param int num_threads: number of scanning threads
     :rtype: DirEntry
     :return: DirEntry via generator
     """
+    if num_threads is not None and num_threads > 1:
+        for entry in _ParallelTreeScanner(path, prune, num_threads).scan():
+            yield entry
+        return
     for entry in os.scandir(path):
         if entry.is_dir(follow_symlinks=True):
+            if prune is not None and prune(entry):
+                continue
             # due to python2 compat, cannot use yield from here
-            for t in scantree(entry.path):
+            for t in scantree(entry.path, prune=prune):
                 yield t
         else:
             yield entry
@@ -230,6 +398,274 @@ def new_md5_hasher():
     return hashlib.md5()
 
 
+def _load_libcrypto():
+    # type: (None) -> ctypes.CDLL
+    """Load the MD5 and SHA-256 primitives of libcrypto, if available. The
+    library is verified against hashlib before use.
+    :rtype: ctypes.CDLL
+    :return: libcrypto library or None if unavailable
+    """
+    for name in _LIBCRYPTO_NAMES:
+        path = ctypes.util.find_library(name)
+        if path is None:
+            continue
+        try:
+            lib = ctypes.CDLL(path)
+            for prefix, ctx_size in _LIBCRYPTO_DIGESTS.values():
+                init = getattr(lib, '{}_Init'.format(prefix))
+                update = getattr(lib, '{}_Update'.format(prefix))
+                final = getattr(lib, '{}_Final'.format(prefix))
+                for func in (init, update, final):
+                    func.restype = ctypes.c_int
+                init.argtypes = [ctypes.c_char_p]
+                update.argtypes = [
+                    ctypes.c_char_p, ctypes.c_char_p, ctypes.c_size_t]
+                final.argtypes = [ctypes.c_char_p, ctypes.c_char_p]
+        except (AttributeError, OSError):
+            continue
+        valid = True
+        for algorithm, (prefix, ctx_size) in _LIBCRYPTO_DIGESTS.items():
+            ctx = ctypes.create_string_buffer(ctx_size)
+            out = ctypes.create_string_buffer(64)
+            getattr(lib, '{}_Init'.format(prefix))(ctx)
+            getattr(lib, '{}_Update'.format(prefix))(ctx, b'blobxfer', 8)
+            getattr(lib, '{}_Final'.format(prefix))(out, ctx)
+            expected = hashlib.new(algorithm, b'blobxfer').digest()
+            if out.raw[:len(expected)] != expected:
+                valid = False
+        if valid:
+            return lib
+    return None
+
+
+_LIBCRYPTO = _load_libcrypto()
+
+
+def resumable_hasher_supported():
+    # type: (None) -> bool
+    """Check if hasher state can be exported and imported
+    :rtype: bool
+    :return: if resumable hashers are supported
+    """
+    return _LIBCRYPTO is not None
+
+
+class _ResumableDigest(object):
+    """Digest backed by libcrypto whose internal state can be exported
+    and imported"""
+    name = None
+    digest_size = None
+    block_size = 64
+
+    def __init__(self, state=None):
+        # type: (_ResumableDigest, bytes) -> None
+        """Ctor for _ResumableDigest
+        :param _ResumableDigest self: this
+        :param bytes state: exported hasher state
+        """
+        prefix, ctx_size = _LIBCRYPTO_DIGESTS[self.name]
+        self._update = getattr(_LIBCRYPTO, '{}_Update'.format(prefix))
+        self._final = getattr(_LIBCRYPTO, '{}_Final'.format(prefix))
+        self._ctx = ctypes.create_string_buffer(ctx_size)
+        if state is None:
+            getattr(_LIBCRYPTO, '{}_Init'.format(prefix))(self._ctx)
+        elif len(state) != ctx_size:
+            raise ValueError('invalid {} state length {}'.format(
+                self.name, len(state)))
+        else:
+            self._ctx.raw = state
+
+    def update(self, data):
+        # type: (_ResumableDigest, bytes) -> None
+        """Update hasher with data
+        :param _ResumableDigest self: this
+        :param bytes data: data
+        """
+        if not isinstance(data, bytes):
+            data = bytes(data)
+        self._update(self._ctx, data, len(data))
+
+    def copy(self):
+        # type: (_ResumableDigest) -> _ResumableDigest
+        """Copy hasher
+        :param _ResumableDigest self: this
+        :rtype: _ResumableDigest
+        :return: copy of hasher
+        """
+        return type(self)(state=self._ctx.raw)
+
+    def digest(self):
+        # type: (_ResumableDigest) -> bytes
+        """Digest of data hashed so far. The hasher can be updated further.
+        :param _ResumableDigest self: this
+        :rtype: bytes
+        :return: digest
+        """
+        ctx = ctypes.create_string_buffer(self._ctx.raw, len(self._ctx))
+        out = ctypes.create_string_buffer(self.digest_size)
+        self._final(out, ctx)
+        return out.raw
+
+    def hexdigest(self):
+        # type: (_ResumableDigest) -> str
+        """Hex digest of data hashed so far
+        :param _ResumableDigest self: this
+        :rtype: str
+        :return: hex digest
+        """
+        return self.digest().hex()
+
+    def export_state(self):
+        # type: (_ResumableDigest) -> bytes
+        """Export internal hasher state
+        :param _ResumableDigest self: this
+        :rtype: bytes
+        :return: hasher state
+        """
+        return self._ctx.raw
+
+
+class _ResumableMd5(_ResumableDigest):
+    """Resumable MD5 hasher"""
+    name = 'md5'
+    digest_size = 16
+
+
+class _ResumableSha256(_ResumableDigest):
+    """Resumable SHA-256 hasher"""
+    name = 'sha256'
+    digest_size = 32
+
+
+class _ResumableHmacSha256(object):
+    """HMAC-SHA256 whose state can be exported and imported. Only the state
+    of the inner hash is exported as the outer hash is recomputed from the
+    key."""
+    name = 'hmac-sha256'
+    digest_size = 32
+    block_size = 64
+
+    def __init__(self, key, state=None, inner=None):
+        # type: (_ResumableHmacSha256, bytes, bytes,
+        #        _ResumableSha256) -> None
+        """Ctor for _ResumableHmacSha256
+        :param _ResumableHmacSha256 self: this
+        :param bytes key: key
+        :param bytes state: exported hasher state
+        :param _ResumableSha256 inner: inner hasher to continue from
+        """
+        self._key = key
+        if len(key) > self.block_size:
+            key = hashlib.sha256(key).digest()
+        key = key.ljust(self.block_size, b'\0')
+        self._outer_pad = bytes(x ^ 0x5c for x in key)
+        if inner is not None:
+            self._inner = inner
+        elif state is not None:
+            self._inner = _ResumableSha256(state=state)
+        else:
+            self._inner = _ResumableSha256()
+            self._inner.update(bytes(x ^ 0x36 for x in key))
+
+    def update(self, data):
+        # type: (_ResumableHmacSha256, bytes) -> None
+        """Update hasher with data
+        :param _ResumableHmacSha256 self: this
+        :param bytes data: data
+        """
+        self._inner.update(data)
+
+    def copy(self):
+        # type: (_ResumableHmacSha256) -> _ResumableHmacSha256
+        """Copy hasher
+        :param _ResumableHmacSha256 self: this
+        :rtype: _ResumableHmacSha256
+        :return: copy of hasher
+        """
+        return _ResumableHmacSha256(self._key, inner=self._inner.copy())
+
+    def digest(self):
+        # type: (_ResumableHmacSha256) -> bytes
+        """Digest of data hashed so far. The hasher can be updated further.
+        :param _ResumableHmacSha256 self: this
+        :rtype: bytes
+        :return: digest
+        """
+        return hashlib.sha256(
+            self._outer_pad + self._inner.digest()).digest()
+
+    def hexdigest(self):
+        # type: (_ResumableHmacSha256) -> str
+        """Hex digest of data hashed so far
+        :param _ResumableHmacSha256 self: this
+        :rtype: str
+        :return: hex digest
+        """
+        return self.digest().hex()
+
+    def export_state(self):
+        # type: (_ResumableHmacSha256) -> bytes
+        """Export internal hasher state
+        :param _ResumableHmacSha256 self: this
+        :rtype: bytes
+        :return: hasher state
+        """
+        return self._inner.export_state()
+
+
+def new_resumable_md5_hasher(state=None):
+    # type: (bytes) -> object
+    """Create a new MD5 hasher whose state can be exported, if supported,
+    otherwise a regular MD5 hasher
+    :param bytes state: exported hasher state to continue from
+    :rtype: _ResumableMd5 or md5.MD5
+    :return: new MD5 hasher
+    """
+    if _LIBCRYPTO is None:
+        if state is not None:
+            raise RuntimeError('resumable hashers are not supported')
+        return hashlib.md5()
+    return _ResumableMd5(state=state)
+
+
+def new_resumable_hmac_sha256_hasher(key, state=None):
+    # type: (bytes, bytes) -> object
+    """Create a new HMAC-SHA256 hasher whose state can be exported, if
+    supported, otherwise a regular HMAC-SHA256 hasher
+    :param bytes key: key
+    :param bytes state: exported hasher state to continue from
+    :rtype: _ResumableHmacSha256 or hmac.HMAC
+    :return: new HMAC-SHA256 hasher
+    """
+    if _LIBCRYPTO is None:
+        if state is not None:
+            raise RuntimeError('resumable hashers are not supported')
+        return hmac.new(key, digestmod=hashlib.sha256)
+    return _ResumableHmacSha256(key, state=state)
+
+
+def is_resumable_hasher(hasher):
+    # type: (object) -> bool
+    """Check if the state of a hasher can be exported
+    :param object hasher: hasher
+    :rtype: bool
+    :return: if hasher is resumable
+    """
+    return isinstance(hasher, (_ResumableDigest, _ResumableHmacSha256))
+
+
+def export_hasher_state(hasher):
+    # type: (object) -> bytes
+    """Export the state of a hasher
+    :param object hasher: hasher
+    :rtype: bytes
+    :return: hasher state or None if the hasher is not resumable
+    """
+    if is_resumable_hasher(hasher):
+        return hasher.export_state()
+    return None
+
+
 def page_align_content_length(length):
     # type: (int) -> int
     """Compute page boundary alignment
@@ -243,6 +679,25 @@ def page_align_content_length(length):
     return length
 
 
+def parse_byte_size(size):
+    # type: (object) -> int
+    """Parse a byte size with an optional binary unit suffix, e.g., 2GiB
+    :param object size: size as an int or string
+    :rtype: int
+    :return: number of bytes
+    """
+    if size is None:
+        return 0
+    if isinstance(size, int):
+        return size
+    match = _BYTE_SIZE_REGEX.match(str(size))
+    if match is None:
+        raise ValueError('invalid byte size: {}'.format(size))
+    return int(
+        float(match.group(1)) *
+        (1 << _BYTE_SIZE_UNITS[match.group(2).lower()]))
+
+
 def normalize_azure_path(path):
     # type: (str) -> str
     """Normalize remote path (strip slashes and use forward slashes)
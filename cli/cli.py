@@ -158,6 +158,21 @@ def _chunk_size_bytes_option(f):
         callback=callback)(f)
 
 
+def _chunk_size_mode_option(f):
+    def callback(ctx, param, value):
+        clictx = ctx.ensure_object(CliContext)
+        clictx.cli_options['chunk_size_mode'] = value
+        return value
+    return click.option(
+        '--chunk-size-mode',
+        expose_value=False,
+        default=None,
+        help='Chunk size mode when chunk size is auto-selected: static, '
+        'adaptive. adaptive selects chunk sizes from measured request '
+        'latency and bandwidth [static]',
+        callback=callback)(f)
+
+
 def _config_option(f):
     def callback(ctx, param, value):
         clictx = ctx.ensure_object(CliContext)
@@ -172,6 +187,20 @@ def _config_option(f):
         callback=callback)(f)
 
 
+def _concurrency_mode_option(f):
+    def callback(ctx, param, value):
+        clictx = ctx.ensure_object(CliContext)
+        clictx.cli_options['concurrency_mode'] = value
+        return value
+    return click.option(
+        '--concurrency-mode',
+        expose_value=False,
+        default=None,
+        help='Transfer concurrency mode: static, auto. auto adapts the '
+        'number of active transfer threads at runtime [static]',
+        callback=callback)(f)
+
+
 def _connect_timeout_option(f):
     def callback(ctx, param, value):
         clictx = ctx.ensure_object(CliContext)
@@ -312,6 +341,19 @@ def _max_retries_option(f):
         callback=callback)(f)
 
 
+def _max_memory_option(f):
+    def callback(ctx, param, value):
+        clictx = ctx.ensure_object(CliContext)
+        clictx.cli_options['max_memory'] = value
+        return value
+    return click.option(
+        '--max-memory',
+        expose_value=False,
+        default=None,
+        help='Maximum memory for in-flight data, e.g., 2GiB [unlimited]',
+        callback=callback)(f)
+
+
 def _md5_processes_option(f):
     def callback(ctx, param, value):
         clictx = ctx.ensure_object(CliContext)
@@ -437,6 +479,21 @@ def _read_timeout_option(f):
         callback=callback)(f)
 
 
+def _remote_index_option(f):
+    def callback(ctx, param, value):
+        clictx = ctx.ensure_object(CliContext)
+        clictx.cli_options['remote_index'] = value
+        return value
+    return click.option(
+        '--remote-index',
+        expose_value=False,
+        is_flag=True,
+        default=None,
+        help='List destination paths once to check for existing remote '
+        'entities instead of querying each entity [False]',
+        callback=callback)(f)
+
+
 def _rename_option(f):
     def callback(ctx, param, value):
         clictx = ctx.ensure_object(CliContext)
@@ -479,6 +536,20 @@ def _sas_option(f):
         callback=callback)(f)
 
 
+def _scan_threads_option(f):
+    def callback(ctx, param, value):
+        clictx = ctx.ensure_object(CliContext)
+        clictx.cli_options['scan_threads'] = value
+        return value
+    return click.option(
+        '--scan-threads',
+        expose_value=False,
+        type=int,
+        default=None,
+        help='Concurrent local directory scanning threads',
+        callback=callback)(f)
+
+
 def _show_config_option(f):
     def callback(ctx, param, value):
         clictx = ctx.ensure_object(CliContext)
@@ -602,6 +673,7 @@ def common_options(f):
     f = _skip_on_lmt_ge_option(f)
     f = _skip_on_filesize_match_option(f)
     f = _show_config_option(f)
+    f = _scan_threads_option(f)
     f = _sas_option(f)
     f = _resume_file_option(f)
     f = _rename_option(f)
@@ -615,6 +687,7 @@ def common_options(f):
     f = _mode_option(f)
     f = _md5_processes_option(f)
     f = _max_retries_option(f)
+    f = _max_memory_option(f)
     f = _log_file_option(f)
     f = _include_option(f)
     f = _exclude_option(f)
@@ -626,6 +699,7 @@ def common_options(f):
     f = _delete_only_option(f)
     f = _crypto_processes_option(f)
     f = _connect_timeout_option(f)
+    f = _concurrency_mode_option(f)
     f = _config_option(f)
     f = _chunk_size_bytes_option(f)
     f = _access_key_option(f)
@@ -753,7 +827,54 @@ def _storage_url_option(f):
         callback=callback)(f)
 
 
+def _sync_state_file_option(f):
+    def callback(ctx, param, value):
+        clictx = ctx.ensure_object(CliContext)
+        clictx.cli_options['sync_state_file'] = value
+        return value
+    return click.option(
+        '--sync-state-file',
+        expose_value=False,
+        default=None,
+        help='Sync state database file to skip unchanged entities on '
+        'subsequent transfers',
+        callback=callback)(f)
+
+
+def _sync_state_revalidate_interval_option(f):
+    def callback(ctx, param, value):
+        clictx = ctx.ensure_object(CliContext)
+        clictx.cli_options['sync_state_revalidate_interval'] = value
+        return value
+    return click.option(
+        '--sync-state-revalidate-interval',
+        expose_value=False,
+        type=float,
+        default=None,
+        help='Minimum interval in seconds before an unchanged entity in '
+        'the sync state is revalidated against the remote [0]',
+        callback=callback)(f)
+
+
+def _sync_state_revalidate_sample_option(f):
+    def callback(ctx, param, value):
+        clictx = ctx.ensure_object(CliContext)
+        clictx.cli_options['sync_state_revalidate_sample'] = value
+        return value
+    return click.option(
+        '--sync-state-revalidate-sample',
+        expose_value=False,
+        type=float,
+        default=None,
+        help='Fraction of unchanged entities in the sync state to revalidate '
+        'against the remote [0]',
+        callback=callback)(f)
+
+
 def upload_download_options(f):
+    f = _sync_state_revalidate_sample_option(f)
+    f = _sync_state_revalidate_interval_option(f)
+    f = _sync_state_file_option(f)
     f = _storage_account_option(f)
     f = _rsa_private_key_passphrase_option(f)
     f = _rsa_private_key_option(f)
@@ -778,6 +899,21 @@ def _access_tier_option(f):
         callback=callback)(f)
 
 
+def _async_copy_option(f):
+    def callback(ctx, param, value):
+        clictx = ctx.ensure_object(CliContext)
+        clictx.cli_options['async_copy'] = value
+        return value
+    return click.option(
+        '--async-copy',
+        expose_value=False,
+        is_flag=True,
+        default=None,
+        help='Copy whole objects with asynchronous server side copies '
+        'where source and destination modes match [False]',
+        callback=callback)(f)
+
+
 def _delete_option(f):
     def callback(ctx, param, value):
         clictx = ctx.ensure_object(CliContext)
@@ -792,6 +928,21 @@ def _delete_option(f):
         callback=callback)(f)
 
 
+def _delete_during_transfer_option(f):
+    def callback(ctx, param, value):
+        clictx = ctx.ensure_object(CliContext)
+        clictx.cli_options['delete_during_transfer'] = value
+        return value
+    return click.option(
+        '--delete-during-transfer',
+        expose_value=False,
+        is_flag=True,
+        default=None,
+        help='Delete extraneous files on target while transfers are in '
+        'progress [False]',
+        callback=callback)(f)
+
+
 def _delete_only_option(f):
     def callback(ctx, param, value):
         clictx = ctx.ensure_object(CliContext)
@@ -807,6 +958,21 @@ def _delete_only_option(f):
         callback=callback)(f)
 
 
+def _delta_option(f):
+    def callback(ctx, param, value):
+        clictx = ctx.ensure_object(CliContext)
+        clictx.cli_options['delta'] = value
+        return value
+    return click.option(
+        '--delta',
+        expose_value=False,
+        is_flag=True,
+        default=None,
+        help='Upload or copy only blocks changed from existing block '
+        'blobs, comparing content digests stored in block ids [False]',
+        callback=callback)(f)
+
+
 def _distribution_mode(f):
     def callback(ctx, param, value):
         clictx = ctx.ensure_object(CliContext)
@@ -821,6 +987,20 @@ def _distribution_mode(f):
         callback=callback)(f)
 
 
+def _encryption_mode_option(f):
+    def callback(ctx, param, value):
+        clictx = ctx.ensure_object(CliContext)
+        clictx.cli_options['encryption_mode'] = value
+        return value
+    return click.option(
+        '--encryption-mode',
+        expose_value=False,
+        default=None,
+        help='Client-side encryption mode: fullblob, chunkedblob '
+        '[fullblob]',
+        callback=callback)(f)
+
+
 def _file_cache_control_option(f):
     def callback(ctx, param, value):
         clictx = ctx.ensure_object(CliContext)
@@ -847,6 +1027,20 @@ def _file_content_type_option(f):
         callback=callback)(f)
 
 
+def _durability_option(f):
+    def callback(ctx, param, value):
+        clictx = ctx.ensure_object(CliContext)
+        clictx.cli_options['durability'] = value
+        return value
+    return click.option(
+        '--durability',
+        expose_value=False,
+        default=None,
+        help='Durability of downloaded data: none, finalize, periodic '
+        '[none]',
+        callback=callback)(f)
+
+
 def _max_single_object_concurrency(f):
     def callback(ctx, param, value):
         clictx = ctx.ensure_object(CliContext)
@@ -919,6 +1113,21 @@ def _server_side_copy_option(f):
         callback=callback)(f)
 
 
+def _stream_relay_option(f):
+    def callback(ctx, param, value):
+        clictx = ctx.ensure_object(CliContext)
+        clictx.cli_options['stream_relay'] = value
+        return value
+    return click.option(
+        '--stream-relay',
+        expose_value=False,
+        is_flag=True,
+        default=None,
+        help='Stream source data relayed through this client directly to '
+        'destinations with bounded buffering [False]',
+        callback=callback)(f)
+
+
 def _stdin_as_page_blob_size_option(f):
     def callback(ctx, param, value):
         clictx = ctx.ensure_object(CliContext)
@@ -1046,10 +1255,15 @@ def upload_options(f):
     f = _stripe_chunk_size_bytes_option(f)
     f = _stdin_as_page_blob_size_option(f)
     f = _rsa_public_key_option(f)
+    f = _remote_index_option(f)
     f = _one_shot_bytes_option(f)
     f = _file_content_type_option(f)
     f = _file_cache_control_option(f)
+    f = _encryption_mode_option(f)
     f = _distribution_mode(f)
+    f = _delta_option(f)
+    f = _delete_during_transfer_option(f)
+    f = _chunk_size_mode_option(f)
     f = _access_tier_option(f)
     return f
 
@@ -1057,6 +1271,8 @@ def upload_options(f):
 def download_options(f):
     f = _restore_file_lmt_option(f)
     f = _max_single_object_concurrency(f)
+    f = _durability_option(f)
+    f = _chunk_size_mode_option(f)
     return f
 
 
@@ -1069,8 +1285,13 @@ def sync_copy_options(f):
     f = _sync_copy_dest_mode_option(f)
     f = _sync_copy_dest_access_key_option(f)
     f = _storage_account_option(f)
+    f = _stream_relay_option(f)
     f = _server_side_copy_option(f)
     f = _remote_path_option(f)
+    f = _remote_index_option(f)
+    f = _delta_option(f)
+    f = _delete_during_transfer_option(f)
+    f = _async_copy_option(f)
     f = _access_tier_option(f)
     return f
 
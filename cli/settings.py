@@ -27,7 +27,9 @@ import enum
 # non-stdlib imports
 # local imports
 import blobxfer.models.azure
+import blobxfer.models.crypto
 import blobxfer.models.download
+import blobxfer.models.filehandle
 import blobxfer.models.options
 import blobxfer.models.synccopy
 import blobxfer.models.upload
@@ -105,8 +107,10 @@ def add_cli_options(cli_options, action):
             'options': {
                 'check_file_md5': cli_options.get('file_md5'),
                 'chunk_size_bytes': cli_options.get('chunk_size_bytes'),
+                'chunk_size_mode': cli_options.get('chunk_size_mode'),
                 'delete_extraneous_destination': cli_options.get('delete'),
                 'delete_only': cli_options.get('delete_only'),
+                'durability': cli_options.get('durability'),
                 'max_single_object_concurrency': cli_options.get(
                     'max_single_object_concurrency'),
                 'mode': cli_options.get('mode'),
@@ -190,14 +194,20 @@ def add_cli_options(cli_options, action):
             'exclude': cli_options.get('exclude'),
             'options': {
                 'access_tier': cli_options.get('access_tier'),
+                'async_copy': cli_options.get('async_copy'),
                 'chunk_size_bytes': cli_options.get('chunk_size_bytes'),
+                'delete_during_transfer': cli_options.get(
+                    'delete_during_transfer'),
                 'delete_extraneous_destination': cli_options.get('delete'),
                 'delete_only': cli_options.get('delete_only'),
+                'delta': cli_options.get('delta'),
                 'dest_mode': cli_options.get('sync_copy_dest_mode'),
                 'mode': cli_options.get('mode'),
                 'overwrite': cli_options.get('overwrite'),
+                'remote_index': cli_options.get('remote_index'),
                 'rename': cli_options.get('rename'),
                 'server_side_copy': cli_options.get('server_side_copy'),
+                'stream_relay': cli_options.get('stream_relay'),
                 'skip_on': {
                     'filesize_match': cli_options.get(
                         'skip_on_filesize_match'),
@@ -229,12 +239,18 @@ def add_cli_options(cli_options, action):
             'options': {
                 'access_tier': cli_options.get('access_tier'),
                 'chunk_size_bytes': cli_options.get('chunk_size_bytes'),
+                'chunk_size_mode': cli_options.get('chunk_size_mode'),
+                'delete_during_transfer': cli_options.get(
+                    'delete_during_transfer'),
                 'delete_extraneous_destination': cli_options.get('delete'),
                 'delete_only': cli_options.get('delete_only'),
+                'delta': cli_options.get('delta'),
+                'encryption_mode': cli_options.get('encryption_mode'),
                 'mode': cli_options.get('mode'),
                 'one_shot_bytes': cli_options.get('one_shot_bytes'),
                 'overwrite': cli_options.get('overwrite'),
                 'recursive': cli_options.get('recursive'),
+                'remote_index': cli_options.get('remote_index'),
                 'rename': cli_options.get('rename'),
                 'rsa_private_key': cli_options.get('rsa_private_key'),
                 'rsa_private_key_passphrase': cli_options.get(
@@ -351,6 +367,8 @@ def merge_global_settings(config, cli_options):
         config['options']['timeout'] = {}
     if 'proxy' not in config['options']:
         config['options']['proxy'] = {}
+    if 'sync_state' not in config['options']:
+        config['options']['sync_state'] = {}
     options = {
         'enable_azure_storage_logger': _merge_setting(
             cli_options, config['options'], 'enable_azure_storage_logger'),
@@ -387,13 +405,35 @@ def merge_global_settings(config, cli_options):
             'disk_threads': _merge_setting(
                 cli_options, config['options']['concurrency'],
                 'disk_threads', default=0),
+            'max_memory': _merge_setting(
+                cli_options, config['options']['concurrency'],
+                'max_memory', default=0),
+            'mode': _merge_setting(
+                cli_options, config['options']['concurrency'],
+                'mode', name_cli='concurrency_mode', default='static'),
             'md5_processes': _merge_setting(
                 cli_options, config['options']['concurrency'],
                 'md5_processes', default=0),
+            'scan_threads': _merge_setting(
+                cli_options, config['options']['concurrency'],
+                'scan_threads', default=0),
             'transfer_threads': _merge_setting(
                 cli_options, config['options']['concurrency'],
                 'transfer_threads', default=0),
         },
+        'sync_state': {
+            'file': _merge_setting(
+                cli_options, config['options']['sync_state'], 'file',
+                name_cli='sync_state_file'),
+            'revalidate_interval': _merge_setting(
+                cli_options, config['options']['sync_state'],
+                'revalidate_interval',
+                name_cli='sync_state_revalidate_interval', default=0),
+            'revalidate_sample': _merge_setting(
+                cli_options, config['options']['sync_state'],
+                'revalidate_sample',
+                name_cli='sync_state_revalidate_sample', default=0),
+        },
         'proxy': {
             'host': _merge_setting(
                 cli_options, config['options']['proxy'], 'host',
@@ -453,6 +493,16 @@ def create_general_options(config, action):
             username=username,
             password=password,
         )
+    # sync state
+    sync_state = None
+    if blobxfer.util.is_not_empty(config['options']['sync_state']['file']):
+        sync_state = blobxfer.models.options.SyncState(
+            state_file=config['options']['sync_state']['file'],
+            revalidate_interval=config['options']['sync_state'][
+                'revalidate_interval'],
+            revalidate_sample=config['options']['sync_state'][
+                'revalidate_sample'],
+        )
     return blobxfer.models.options.General(
         concurrency=blobxfer.models.options.Concurrency(
             crypto_processes=conc['crypto_processes'],
@@ -460,6 +510,11 @@ def create_general_options(config, action):
             md5_processes=conc['md5_processes'],
             transfer_threads=conc['transfer_threads'],
             action=action.value[0],
+            max_memory_bytes=blobxfer.util.parse_byte_size(
+                conc['max_memory']),
+            scan_threads=conc['scan_threads'],
+            mode=blobxfer.models.options.ConcurrencyMode(
+                conc['mode'].lower()),
         ),
         log_file=config['options']['log_file'],
         progress_bar=config['options']['progress_bar'],
@@ -480,6 +535,7 @@ def create_general_options(config, action):
         quiet=config['options']['quiet'],
         dry_run=config['options']['dry_run'],
         proxy=proxy,
+        sync_state=sync_state,
     )
 
 
@@ -538,11 +594,19 @@ def create_download_specifications(ctx_cli_options, config):
                 chunk_size_bytes=_merge_setting(
                     cli_options, conf_options, 'chunk_size_bytes',
                     default=0),
+                chunk_size_mode=blobxfer.models.options.ChunkSizeMode(
+                    _merge_setting(
+                        cli_options, conf_options, 'chunk_size_mode',
+                        default='static').lower()),
                 delete_extraneous_destination=_merge_setting(
                     cli_options, conf_options,
                     'delete_extraneous_destination', default=False),
                 delete_only=_merge_setting(
                     cli_options, conf_options, 'delete_only', default=False),
+                durability=blobxfer.models.filehandle.WriteDurability(
+                    _merge_setting(
+                        cli_options, conf_options, 'durability',
+                        default='none').lower()),
                 max_single_object_concurrency=_merge_setting(
                     cli_options, conf_options,
                     'max_single_object_concurrency', default=8),
@@ -661,22 +725,33 @@ def create_synccopy_specifications(ctx_cli_options, config):
             synccopy_options=blobxfer.models.options.SyncCopy(
                 access_tier=_merge_setting(
                     cli_options, conf_options, 'access_tier', default=None),
+                async_copy=_merge_setting(
+                    cli_options, conf_options, 'async_copy', default=False),
+                delete_during_transfer=_merge_setting(
+                    cli_options, conf_options, 'delete_during_transfer',
+                    default=False),
                 delete_extraneous_destination=_merge_setting(
                     cli_options, conf_options,
                     'delete_extraneous_destination', default=False),
                 delete_only=_merge_setting(
                     cli_options, conf_options, 'delete_only', default=False),
+                delta=_merge_setting(
+                    cli_options, conf_options, 'delta', default=False),
                 dest_mode=destmode,
                 mode=mode,
                 overwrite=_merge_setting(
                     cli_options, conf_options, 'overwrite', default=True),
                 recursive=_merge_setting(
                     cli_options, conf_options, 'recursive', default=True),
+                remote_index=_merge_setting(
+                    cli_options, conf_options, 'remote_index', default=False),
                 rename=_merge_setting(
                     cli_options, conf_options, 'rename', default=False),
                 server_side_copy=_merge_setting(
                     cli_options, conf_options, 'server_side_copy',
                     default=True),
+                stream_relay=_merge_setting(
+                    cli_options, conf_options, 'stream_relay', default=False),
                 strip_components=_merge_setting(
                     cli_options, conf_options, 'strip_components',
                     default=0),
@@ -693,6 +768,9 @@ def create_synccopy_specifications(ctx_cli_options, config):
         if (scs.options.delete_only and
                 not scs.options.delete_extraneous_destination):
             raise ValueError('delete only specified without delete')
+        if (scs.options.delete_during_transfer and
+                not scs.options.delete_extraneous_destination):
+            raise ValueError('delete during transfer specified without delete')
         # create remote source paths
         for src in conf['source']:
             sa = next(iter(src))
@@ -757,22 +835,24 @@ def create_upload_specifications(ctx_cli_options, config):
             mode = blobxfer.models.azure.StorageModes.Page
         else:
             raise ValueError('unknown mode: {}'.format(mode))
+        # load RSA private key PEM file if specified, the private key
+        # is only used to unwrap keys of resumed encrypted uploads
+        rprk = _merge_setting(cli_options, conf_options, 'rsa_private_key')
+        if blobxfer.util.is_not_empty(rprk):
+            rpkp = _merge_setting(
+                cli_options, conf_options, 'rsa_private_key_passphrase')
+            rprk = blobxfer.operations.crypto.load_rsa_private_key_file(
+                rprk, rpkp)
+        else:
+            rprk = None
         # load RSA public key PEM if specified
         rpk = _merge_setting(cli_options, conf_options, 'rsa_public_key')
         if blobxfer.util.is_not_empty(rpk):
             rpk = blobxfer.operations.crypto.load_rsa_public_key_file(rpk)
-        if rpk is None:
-            # load RSA private key PEM file if specified
-            rpk = _merge_setting(
-                cli_options, conf_options, 'rsa_private_key')
-            if blobxfer.util.is_not_empty(rpk):
-                rpkp = _merge_setting(
-                    cli_options, conf_options, 'rsa_private_key_passphrase')
-                rpk = blobxfer.operations.crypto.load_rsa_private_key_file(
-                    rpk, rpkp)
-                rpk = rpk.public_key()
-            else:
-                rpk = None
+        elif rprk is not None:
+            rpk = rprk.public_key()
+        else:
+            rpk = None
         # create local source paths
         lsp = blobxfer.models.upload.LocalSourcePath()
         lsp.add_paths(conf['source'])
@@ -796,11 +876,24 @@ def create_upload_specifications(ctx_cli_options, config):
                 chunk_size_bytes=_merge_setting(
                     cli_options, conf_options, 'chunk_size_bytes',
                     default=0),
+                chunk_size_mode=blobxfer.models.options.ChunkSizeMode(
+                    _merge_setting(
+                        cli_options, conf_options, 'chunk_size_mode',
+                        default='static').lower()),
+                delete_during_transfer=_merge_setting(
+                    cli_options, conf_options, 'delete_during_transfer',
+                    default=False),
                 delete_extraneous_destination=_merge_setting(
                     cli_options, conf_options,
                     'delete_extraneous_destination', default=False),
                 delete_only=_merge_setting(
                     cli_options, conf_options, 'delete_only', default=False),
+                delta=_merge_setting(
+                    cli_options, conf_options, 'delta', default=False),
+                encryption_mode=blobxfer.models.crypto.EncryptionMode(
+                    _merge_setting(
+                        cli_options, conf_options, 'encryption_mode',
+                        default='fullblob').lower()),
                 mode=mode,
                 one_shot_bytes=_merge_setting(
                     cli_options, conf_options, 'one_shot_bytes', default=0),
@@ -808,8 +901,11 @@ def create_upload_specifications(ctx_cli_options, config):
                     cli_options, conf_options, 'overwrite', default=True),
                 recursive=_merge_setting(
                     cli_options, conf_options, 'recursive', default=True),
+                remote_index=_merge_setting(
+                    cli_options, conf_options, 'remote_index', default=False),
                 rename=_merge_setting(
                     cli_options, conf_options, 'rename', default=False),
+                rsa_private_key=rprk,
                 rsa_public_key=rpk,
                 store_file_properties=blobxfer.models.options.FileProperties(
                     attributes=_merge_setting(
@@ -852,6 +948,9 @@ def create_upload_specifications(ctx_cli_options, config):
         if (us.options.delete_only and
                 not us.options.delete_extraneous_destination):
             raise ValueError('delete only specified without delete')
+        if (us.options.delete_during_transfer and
+                not us.options.delete_extraneous_destination):
+            raise ValueError('delete during transfer specified without delete')
         # create remote destination paths
         for dst in conf['destination']:
             if len(dst) != 1:
@@ -108,6 +108,14 @@ def test_azurestorageentity():
     assert ase.from_local
     assert ase.mode == azmodels.StorageModes.Block
 
+    props = mock.MagicMock()
+    props.etag = 'etag'
+    props.last_modified = 'lmt'
+    ase.update_from_response(props, 'md5')
+    assert ase.etag == 'etag'
+    assert ase.lmt == 'lmt'
+    assert ase.md5 == 'md5'
+
     ase.size = 456
     ase.append_create = False
     ase.encryption_metadata = blobxfer.models.crypto.EncryptionMetadata()
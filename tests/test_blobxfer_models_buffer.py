@@ -0,0 +1,86 @@
+# coding=utf-8
+"""Tests for models buffer"""
+
+# stdlib imports
+# non-stdlib imports
+# local imports
+# module under test
+import blobxfer.models.buffer as buffer
+
+
+def test_zero_pad():
+    assert buffer.zero_pad(b'ab', 2) == b'ab'
+    assert buffer.zero_pad(b'ab', 4) == b'ab\0\0'
+
+    pool = buffer.BufferPool()
+    data = pool.acquire(2)
+    data.obj[:4] = b'abcd'
+    padded = buffer.zero_pad(data, 4)
+    assert padded.obj is data.obj
+    assert padded == b'ab\0\0'
+
+    # insufficient capacity results in a copy
+    padded = buffer.zero_pad(data, len(data.obj) + 1)
+    assert isinstance(padded, bytes)
+    assert len(padded) == len(data.obj) + 1
+    assert padded[:2] == b'ab'
+
+
+def test_to_bytes():
+    assert buffer.to_bytes(b'a') == b'a'
+    assert buffer.to_bytes(None) is None
+    data = buffer.to_bytes(memoryview(bytearray(b'ab'))[:1])
+    assert isinstance(data, bytes)
+    assert data == b'a'
+
+
+def test_buffer_pool():
+    size = buffer._SIZE_CLASS_BYTES
+    assert buffer.BufferPool.size_class(0) == size
+    assert buffer.BufferPool.size_class(1) == size
+    assert buffer.BufferPool.size_class(size) == size
+    assert buffer.BufferPool.size_class(size + 1) == size * 2
+
+    pool = buffer.BufferPool(max_retained_bytes=size * 2)
+    a = pool.acquire(10)
+    assert isinstance(a, memoryview)
+    assert len(a) == 10
+    assert len(a.obj) == size
+    assert pool.allocations == 1
+
+    # buffers are reused by size class
+    pool.release(a)
+    assert pool.retained_bytes == size
+    b = pool.acquire(size)
+    assert b.obj is a.obj
+    assert pool.reuses == 1
+    assert pool.retained_bytes == 0
+    c = pool.acquire(size + 1)
+    assert c.obj is not a.obj
+    assert pool.allocations == 2
+
+    # double release is ignored
+    pool.release(b)
+    pool.release(b[:1])
+    assert pool.retained_bytes == size
+
+    # retention is bounded
+    pool.release(c)
+    assert pool.retained_bytes == size
+    pool.release(pool.acquire(size * 2)[:1])
+    assert pool.retained_bytes == size
+
+    # foreign data is ignored
+    pool.release(b'abc')
+    pool.release(memoryview(b'abc'))
+    pool.release(memoryview(bytearray(3)))
+    assert pool.retained_bytes == size
+
+    pool.clear()
+    assert pool.retained_bytes == 0
+    assert pool.acquire(1).obj is not a.obj
+
+    # negative retention retains nothing
+    pool = buffer.BufferPool(max_retained_bytes=-1)
+    pool.release(pool.acquire(1))
+    assert pool.retained_bytes == 0
@@ -7,6 +7,7 @@ import json
 # non-stdlib imports
 import pytest
 # local imports
+import blobxfer.util as util
 # module under test
 import blobxfer.models.crypto as models
 import blobxfer.operations.crypto as ops
@@ -96,6 +97,87 @@ def test_create_new_metadata():
     assert em.content_encryption_iv is not None
     assert em.encryption_agent is not None
     assert em.encryption_mode is not None
+    assert not em.is_chunked
+    assert em.encrypted_region_size is None
+
+    em = models.EncryptionMetadata()
+    em.create_new_metadata('key', mode=models.EncryptionMode.ChunkedBlob)
+    assert em.content_encryption_iv is None
+    assert em.encryption_agent.encryption_algorithm == 'AES_GCM_256'
+    assert em.is_chunked
+    em.encrypted_region_size = 4194304
+    assert em.encrypted_region_size == 4194304
+    assert em.encrypted_region_info.nonce_length == 12
+    assert em.encrypted_region_info.tag_length == 16
+
+
+def test_convert_resume_json(tmpdir):
+    keyfile = tmpdir.join('keyfile')
+    keyfile.write(_SAMPLE_RSA_KEY)
+    rsaprivatekey = ops.load_rsa_private_key_file(str(keyfile), None)
+    rsapublickey = rsaprivatekey.public_key()
+
+    em = models.EncryptionMetadata()
+    em.create_new_metadata(rsapublickey)
+    resume_json = em.convert_to_resume_json()
+    state = json.loads(resume_json)
+    assert state['EncryptedKey'] != util.base64_encode_as_string(
+        em.symmetric_key)
+    assert state['EncryptedAuthenticationKey'] != \
+        util.base64_encode_as_string(em.signing_key)
+    # wrapped keys match entity metadata
+    ed = json.loads(em.convert_to_json_with_mac(None, None)['encryptiondata'])
+    assert ed['WrappedContentKey']['EncryptedKey'] == state['EncryptedKey']
+    assert ed['WrappedContentKey']['EncryptedAuthenticationKey'] == \
+        state['EncryptedAuthenticationKey']
+
+    em2 = models.EncryptionMetadata()
+    em2.create_new_metadata(rsapublickey)
+    em2.convert_from_resume_json(resume_json, rsaprivatekey)
+    assert em2.symmetric_key == em.symmetric_key
+    assert em2.signing_key == em.signing_key
+    assert em2.content_encryption_iv == em.content_encryption_iv
+    assert em2.wrapped_content_key == em.wrapped_content_key
+
+    # no private key
+    em5 = models.EncryptionMetadata()
+    em5.create_new_metadata(rsapublickey)
+    with pytest.raises(ValueError):
+        em5.convert_from_resume_json(resume_json, None)
+
+    # mode mismatch
+    em3 = models.EncryptionMetadata()
+    em3.create_new_metadata(
+        rsapublickey, mode=models.EncryptionMode.ChunkedBlob)
+    with pytest.raises(ValueError):
+        em3.convert_from_resume_json(resume_json, rsaprivatekey)
+
+    # invalid iv
+    state['ContentEncryptionIV'] = 'YWJj'
+    with pytest.raises(ValueError):
+        em2.convert_from_resume_json(json.dumps(state), rsaprivatekey)
+
+    # keys which are not wrapped
+    state = json.loads(resume_json)
+    state['EncryptedKey'] = util.base64_encode_as_string(em.symmetric_key)
+    with pytest.raises(ValueError):
+        em2.convert_from_resume_json(json.dumps(state), rsaprivatekey)
+
+    em3.encrypted_region_size = 1024
+    resume_json = em3.convert_to_resume_json()
+    em4 = models.EncryptionMetadata()
+    em4.create_new_metadata(
+        rsapublickey, mode=models.EncryptionMode.ChunkedBlob)
+    em4.convert_from_resume_json(resume_json, rsaprivatekey)
+    assert em4.symmetric_key == em3.symmetric_key
+    assert em4.signing_key == em3.signing_key
+    assert em4.encrypted_region_size == 1024
+
+    # invalid region size
+    state = json.loads(resume_json)
+    state['DataLength'] = 0
+    with pytest.raises(ValueError):
+        em4.convert_from_resume_json(json.dumps(state), rsaprivatekey)
 
 
 def test_convert_from_json(tmpdir):
@@ -236,3 +318,45 @@ def test_convert_to_json_with_mac(tmpdir):
     em.convert_from_json(encjson, 'entityname', rsaprivatekey)
     assert em._symkey == symkey
     assert em._signkey == signkey
+
+
+def test_convert_to_json_with_mac_chunked(tmpdir):
+    keyfile = tmpdir.join('keyfile')
+    keyfile.write(_SAMPLE_RSA_KEY)
+    rsaprivatekey = ops.load_rsa_private_key_file(str(keyfile), None)
+    rsapublickey = rsaprivatekey.public_key()
+
+    em = models.EncryptionMetadata()
+    em.create_new_metadata(
+        rsapublickey, mode=models.EncryptionMode.ChunkedBlob)
+    em.encrypted_region_size = 1024
+    symkey = em._symkey
+
+    encjson = em.convert_to_json_with_mac(None, 'hmacdigest')
+    ed = json.loads(encjson['encryptiondata'])
+    assert ed['EncryptionMode'] == 'ChunkedBlob'
+    assert ed['EncryptionAgent']['Protocol'] == '2.0'
+    assert ed['EncryptedRegionInfo']['DataLength'] == 1024
+    assert 'ContentEncryptionIV' not in ed
+
+    em = models.EncryptionMetadata()
+    em.convert_from_json(encjson, 'entityname', rsaprivatekey)
+    assert em._symkey == symkey
+    assert em.is_chunked
+    assert em.encrypted_region_size == 1024
+    assert em.content_encryption_iv is None
+
+    # mismatched algorithm for mode
+    ed['EncryptionAgent']['EncryptionAlgorithm'] = 'AES_CBC_256'
+    md = {'encryptiondata': json.dumps(ed, sort_keys=True)}
+    em = models.EncryptionMetadata()
+    with pytest.raises(RuntimeError):
+        em.convert_from_json(md, 'entityname', None)
+
+    # invalid region info
+    ed['EncryptionAgent']['EncryptionAlgorithm'] = 'AES_GCM_256'
+    ed['EncryptedRegionInfo']['NonceLength'] = 16
+    md = {'encryptiondata': json.dumps(ed, sort_keys=True)}
+    em = models.EncryptionMetadata()
+    with pytest.raises(RuntimeError):
+        em.convert_from_json(md, 'entityname', None)
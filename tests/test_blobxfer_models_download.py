@@ -11,11 +11,16 @@ import pathlib
 import time
 import unittest
 # non-stdlib imports
+import bitstring
 import pytest
 # local imports
 import blobxfer.models.azure as azmodels
+import blobxfer.models.crypto as crypto
+import blobxfer.models.filehandle as filehandle
 import blobxfer.models.options as options
+import blobxfer.models.workqueue as workqueue
 import blobxfer.operations.azure as azops
+import blobxfer.operations.crypto as cryptoops
 import blobxfer.operations.resume as rops
 import blobxfer.util as util
 # module under test
@@ -58,8 +63,10 @@ def test_downloadspecification():
         download_options=options.Download(
             check_file_md5=True,
             chunk_size_bytes=4194304,
+            chunk_size_mode=options.ChunkSizeMode.Static,
             delete_extraneous_destination=False,
             delete_only=False,
+            durability=filehandle.WriteDurability.NoSync,
             max_single_object_concurrency=8,
             mode=azmodels.StorageModes.Auto,
             overwrite=True,
@@ -101,8 +108,10 @@ def test_downloadspecification():
             download_options=options.Download(
                 check_file_md5=False,
                 chunk_size_bytes=4194304,
+                chunk_size_mode=options.ChunkSizeMode.Static,
                 delete_extraneous_destination=False,
                 delete_only=False,
+                durability=filehandle.WriteDurability.NoSync,
                 max_single_object_concurrency=8,
                 mode=azmodels.StorageModes.Auto,
                 overwrite=True,
@@ -131,8 +140,10 @@ def test_downloadspecification():
             download_options=options.Download(
                 check_file_md5=True,
                 chunk_size_bytes=4194304,
+                chunk_size_mode=options.ChunkSizeMode.Static,
                 delete_extraneous_destination=False,
                 delete_only=False,
+                durability=filehandle.WriteDurability.NoSync,
                 max_single_object_concurrency=0,
                 mode=azmodels.StorageModes.Auto,
                 overwrite=True,
@@ -167,8 +178,10 @@ def test_downloadspecification():
                 download_options=options.Download(
                     check_file_md5=True,
                     chunk_size_bytes=-1,
+                    chunk_size_mode=options.ChunkSizeMode.Static,
                     delete_extraneous_destination=False,
                     delete_only=False,
+                    durability=filehandle.WriteDurability.NoSync,
                     max_single_object_concurrency=8,
                     mode=azmodels.StorageModes.Auto,
                     overwrite=True,
@@ -202,6 +215,7 @@ def test_downloaddescriptor(tmpdir):
     ase = azmodels.StorageEntity('cont')
     ase._size = 1024
     ase._encryption = mock.MagicMock()
+    ase._encryption.is_chunked = False
     with pytest.raises(RuntimeError):
         d = models.Descriptor(lp, ase, opts, mock.MagicMock(), None)
 
@@ -239,6 +253,16 @@ def test_downloaddescriptor(tmpdir):
     assert d._allocated
     assert d.final_path.stat().st_size == ase._size
 
+    # adaptive chunk size is only used if auto-selected
+    d = models.Descriptor(
+        lp, ase, opts, mock.MagicMock(), None, auto_chunk_size=256)
+    assert d._chunk_size == 16
+    opts.chunk_size_bytes = 0
+    d = models.Descriptor(
+        lp, ase, opts, mock.MagicMock(), None, auto_chunk_size=256)
+    assert d._chunk_size == 256
+    assert d._total_chunks == 4
+
     # pre-existing file check
     opts.chunk_size_bytes = 0
     ase._size = 0
@@ -256,6 +280,12 @@ def test_downloaddescriptor_compute_allocated_size():
     assert models.Descriptor.compute_allocated_size(32, True) == 16
     assert models.Descriptor.compute_allocated_size(1, False) == 1
 
+    # encrypted regions
+    assert models.Descriptor.compute_allocated_size(
+        124, True, region_size=16) == 40
+    assert models.Descriptor.compute_allocated_size(
+        44, True, region_size=16) == 16
+
 
 def test_downloaddescriptor_generate_view():
     ase = azmodels.StorageEntity('cont')
@@ -274,6 +304,67 @@ def test_downloaddescriptor_generate_view():
     assert total_size == ase.vectored_io.total_size
 
 
+def test_downloaddescriptor_encrypted_regions(tmpdir):
+    lp = pathlib.Path(str(tmpdir.join('a')))
+    plaindata = os.urandom(40)
+
+    em = crypto.EncryptionMetadata()
+    em.create_new_metadata(
+        'key', mode=crypto.EncryptionMode.ChunkedBlob)
+    em.encrypted_region_size = 16
+    encdata = b''.join([
+        cryptoops.aes_gcm_encrypt_region(
+            em.symmetric_key, i, plaindata[i * 16:(i + 1) * 16])
+        for i in range(3)
+    ])
+    _hmac = hmac.new(em.signing_key, digestmod=hashlib.sha256)
+    _hmac.update(cryptoops.aes_gcm_region_tags(16, encdata))
+    em.encryption_authentication = crypto.EncryptionAuthentication(
+        algorithm='HMAC-SHA256',
+        message_authentication_code=util.base64_encode_as_string(
+            _hmac.digest()),
+    )
+
+    opts = mock.MagicMock()
+    opts.check_file_md5 = False
+    opts.chunk_size_bytes = 100
+    ase = azmodels.StorageEntity('cont')
+    ase._size = len(encdata)
+    ase._encryption = em
+
+    d = models.Descriptor(lp, ase, opts, mock.MagicMock(), None)
+    assert d.is_encrypted_in_regions
+    assert d.encrypted_region_stride == 44
+    assert d._chunk_size == 88
+    assert d._total_chunks == 2
+
+    # process chunks out of order
+    offsets = [d.next_offsets()[0], d.next_offsets()[0]]
+    assert d.next_offsets()[0] is None
+    assert d.final_path.stat().st_size == 40
+    assert offsets[0].fd_start == 0
+    assert offsets[0].range_start == 0
+    assert offsets[0].num_bytes == 88
+    assert offsets[1].fd_start == 32
+    assert offsets[1].range_start == 88
+    assert offsets[1].range_end == 123
+    assert not offsets[1].unpad
+    for offset in reversed(offsets):
+        chunk = encdata[offset.range_start:offset.range_end + 1]
+        region_num = offset.range_start // d.encrypted_region_stride
+        d.write_unchecked_hmac_data(
+            offset, cryptoops.aes_gcm_region_tags(16, chunk),
+            persist=False)
+        d.write_data(offset, cryptoops.aes_gcm_decrypt_regions(
+            em.symmetric_key, region_num, 16, chunk))
+        d.mark_unchecked_chunk_decrypted(offset.chunk_num)
+        d.perform_chunked_integrity_check()
+    assert d.all_operations_completed
+    d.finalize_integrity()
+    assert not d._integrity_failed
+    assert d.final_path.read_bytes() == plaindata
+
+
 def test_convert_vectored_io_slice_to_final_path_name():
     lp = pathlib.Path('/local/path/abc.bxslice-0')
     ase = azmodels.StorageEntity('cont')
@@ -371,6 +462,7 @@ def test_downloaddescriptor_resume(tmpdir):
     rmgr = rops.DownloadResumeManager(resumefile)
 
     ase._encryption = mock.MagicMock()
+    ase._encryption.is_chunked = False
     ase._encryption.symmetric_key = b'123'
     rmgr.add_or_update_record(str(fp), ase, 32, 1, False, None)
     d = models.Descriptor(fp, ase, opts, mock.MagicMock(), rmgr)
@@ -390,21 +482,6 @@ def test_downloaddescriptor_resume(tmpdir):
     rb = d._resume()
     assert rb == 32
 
-    # ensure hmac not populated
-    rmgr.delete()
-    rmgr = rops.DownloadResumeManager(resumefile)
-    ase = azmodels.StorageEntity('cont')
-    ase._size = 128
-    ase._name = 'blob'
-    ase._client = mock.MagicMock()
-    fp.touch()
-
-    rmgr.add_or_update_record(str(fp), ase, 32, 1, False, None)
-    d = models.Descriptor(fp, ase, opts, mock.MagicMock(), rmgr)
-    d.hmac = True
-    with pytest.raises(RuntimeError):
-        d._resume()
-
     # md5 hash check
     rmgr.delete()
     rmgr = rops.DownloadResumeManager(resumefile)
@@ -444,6 +521,230 @@ def test_downloaddescriptor_resume(tmpdir):
     assert rb == 32
 
 
+def test_downloaddescriptor_resume_completed_chunks(tmpdir):
+    resumefile = pathlib.Path(str(tmpdir.join('resume')))
+    fp = pathlib.Path(str(tmpdir.join('fp')))
+    data = os.urandom(160)
+
+    opts = mock.MagicMock()
+    opts.check_file_md5 = True
+    opts.chunk_size_bytes = 32
+    ase = azmodels.StorageEntity('cont')
+    ase._size = len(data)
+    ase._name = 'blob'
+    ase._client = mock.MagicMock()
+    ase._md5 = util.base64_encode_as_string(hashlib.md5(data).digest())
+
+    # chunks 0, 2 and 3 completed, of which only chunk 0 was checked
+    with fp.open('wb') as f:
+        f.write(data[:32] + b'\0' * 32 + data[64:128] + b'\0' * 32)
+    completed = bitstring.BitArray(length=5)
+    completed.set(True, (0, 2, 3))
+    rmgr = rops.DownloadResumeManager(resumefile)
+    rmgr.add_or_update_record(
+        str(fp), ase, 32, 1, False, hashlib.md5(data[:32]).hexdigest(),
+        completed_chunks=completed.int)
+
+    d = models.Descriptor(fp, ase, opts, mock.MagicMock(), rmgr)
+    offsets1, rb = d.next_offsets()
+    assert rb == 96
+    assert offsets1.chunk_num == 1
+    assert offsets1.fd_start == 32
+    offsets4, rb = d.next_offsets()
+    assert rb is None
+    assert offsets4.chunk_num == 4
+    assert offsets4.fd_start == 128
+    assert d.next_offsets() == (None, None)
+    assert d._next_integrity_chunk == 1
+
+    # completed chunks are checked from disk once reached
+    d.write_unchecked_data(offsets1, data[32:64])
+    d.perform_chunked_integrity_check()
+    assert d._next_integrity_chunk == 4
+    assert not d.all_operations_completed
+    assert not d.claim_finalization()
+    d.write_unchecked_data(offsets4, data[128:])
+    d.perform_chunked_integrity_check()
+    assert d._next_integrity_chunk == 5
+    assert d.all_operations_completed
+    assert d.claim_finalization()
+    assert not d.claim_finalization()
+    assert d.md5.hexdigest() == hashlib.md5(data).hexdigest()
+    assert rmgr.get_record(ase).completed_chunks == -1
+
+    # all remaining chunks completed
+    rmgr.delete()
+    rmgr = rops.DownloadResumeManager(resumefile)
+    completed.set(True)
+    rmgr.add_or_update_record(
+        str(fp), ase, 32, 1, False, hashlib.md5(data[:32]).hexdigest(),
+        completed_chunks=completed.int)
+    d = models.Descriptor(fp, ase, opts, mock.MagicMock(), rmgr)
+    assert d.next_offsets() == (None, 160)
+    assert d.all_operations_completed
+    assert d.md5.hexdigest() == hashlib.md5(data).hexdigest()
+
+    # chunks completed out of order before the first chunk
+    rmgr.delete()
+    rmgr = rops.DownloadResumeManager(resumefile)
+    completed = bitstring.BitArray(length=5)
+    completed.set(True, (2, 3))
+    rmgr.add_or_update_record(
+        str(fp), ase, 32, 0, False, None, completed_chunks=completed.int)
+    d = models.Descriptor(fp, ase, opts, mock.MagicMock(), rmgr)
+    offsets0, rb = d.next_offsets()
+    assert rb == 64
+    assert offsets0.chunk_num == 0
+    offsets1, rb = d.next_offsets()
+    assert offsets1.chunk_num == 1
+    offsets4, rb = d.next_offsets()
+    assert offsets4.chunk_num == 4
+    assert d.next_offsets() == (None, None)
+    assert d._next_integrity_chunk == 0
+
+    # nothing to resume without completed chunks
+    rmgr.delete()
+    rmgr = rops.DownloadResumeManager(resumefile)
+    rmgr.add_or_update_record(
+        str(fp), ase, 32, 0, False, None, completed_chunks=0)
+    d = models.Descriptor(fp, ase, opts, mock.MagicMock(), rmgr)
+    assert d._resume() is None
+    rmgr.delete()
+
+
+@pytest.mark.skipif(
+    not util.resumable_hasher_supported(),
+    reason='resumable hashers unsupported')
+def test_downloaddescriptor_resume_md5_state(tmpdir):
+    resumefile = pathlib.Path(str(tmpdir.join('resume')))
+    fp = pathlib.Path(str(tmpdir.join('fp')))
+    data = os.urandom(64)
+
+    opts = mock.MagicMock()
+    opts.check_file_md5 = True
+    opts.chunk_size_bytes = 32
+    ase = azmodels.StorageEntity('cont')
+    ase._size = len(data)
+    ase._name = 'blob'
+    ase._client = mock.MagicMock()
+    ase._md5 = util.base64_encode_as_string(hashlib.md5(data).digest())
+
+    # md5 state and file stamp are recorded as chunks are checked
+    rmgr = rops.DownloadResumeManager(resumefile)
+    d = models.Descriptor(fp, ase, opts, mock.MagicMock(), rmgr)
+    offsets, _ = d.next_offsets()
+    d.write_unchecked_data(offsets, data[:32])
+    d.perform_chunked_integrity_check()
+    dr = rmgr.get_record(ase)
+    assert dr.md5hexdigest == hashlib.md5(data[:32]).hexdigest()
+    assert util.new_resumable_md5_hasher(dr.md5_state).hexdigest() == \
+        dr.md5hexdigest
+    assert dr.file_size == fp.stat().st_size
+    assert dr.file_mtime_ns == fp.stat().st_mtime_ns
+    rmgr.close()
+
+    # resume continues from the recorded state without reading the file
+    with fp.open('r+b') as f:
+        f.write(b'\0' * 32)
+    os.utime(str(fp), ns=(dr.file_mtime_ns, dr.file_mtime_ns))
+    rmgr = rops.DownloadResumeManager(resumefile)
+    d = models.Descriptor(fp, ase, opts, mock.MagicMock(), rmgr)
+    offsets, rb = d.next_offsets()
+    assert rb == 32
+    assert offsets.chunk_num == 1
+    d.write_unchecked_data(offsets, data[32:])
+    d.perform_chunked_integrity_check()
+    assert d.md5.hexdigest() == hashlib.md5(data).hexdigest()
+    rmgr.delete()
+
+    # a file changed since the state was recorded is re-hashed
+    rmgr = rops.DownloadResumeManager(resumefile)
+    rmgr.add_or_update_record(
+        str(fp), ase, 32, 1, False, dr.md5hexdigest,
+        md5_state=dr.md5_state, file_size=dr.file_size,
+        file_mtime_ns=dr.file_mtime_ns + 1)
+    d = models.Descriptor(fp, ase, opts, mock.MagicMock(), rmgr)
+    assert d._resume() is None
+    rmgr.delete()
+
+
+@pytest.mark.skipif(
+    not util.resumable_hasher_supported(),
+    reason='resumable hashers unsupported')
+def test_downloaddescriptor_resume_encrypted(tmpdir):
+    resumefile = pathlib.Path(str(tmpdir.join('resume')))
+    fp = pathlib.Path(str(tmpdir.join('fp')))
+    plaindata = os.urandom(64)
+
+    em = crypto.EncryptionMetadata()
+    em.create_new_metadata('key')
+    encdata = cryptoops.aes_cbc_encrypt_data(
+        em.symmetric_key, em.content_encryption_iv, plaindata, True)
+    _hmac = hmac.new(em.signing_key, digestmod=hashlib.sha256)
+    _hmac.update(em.content_encryption_iv)
+    _hmac.update(encdata)
+    em.encryption_authentication = crypto.EncryptionAuthentication(
+        algorithm='HMAC-SHA256',
+        message_authentication_code=util.base64_encode_as_string(
+            _hmac.digest()),
+    )
+
+    opts = mock.MagicMock()
+    opts.check_file_md5 = False
+    opts.chunk_size_bytes = 32
+    ase = azmodels.StorageEntity('cont')
+    ase._size = len(encdata)
+    ase._name = 'blob'
+    ase._client = mock.MagicMock()
+    ase._encryption = em
+
+    def _process(d, offsets):
+        encchunk = encdata[
+            offsets.chunk_num * 32:(offsets.chunk_num + 1) * 32]
+        if offsets.chunk_num == 0:
+            d.hmac_iv(em.content_encryption_iv)
+        d.write_unchecked_hmac_data(offsets, encchunk, persist=False)
+        d.write_data(
+            offsets, plaindata[offsets.fd_start:offsets.fd_start + 32])
+        d.mark_unchecked_chunk_decrypted(offsets.chunk_num)
+        d.perform_chunked_integrity_check()
+
+    # hmac state and file stamp are recorded as chunks are checked
+    rmgr = rops.DownloadResumeManager(resumefile)
+    d = models.Descriptor(fp, ase, opts, mock.MagicMock(), rmgr)
+    assert d.is_resumable
+    offsets, _ = d.next_offsets()
+    _process(d, offsets)
+    dr = rmgr.get_record(ase)
+    assert dr.next_integrity_chunk == 1
+    assert dr.hmac_state is not None
+    assert dr.file_size == fp.stat().st_size
+    assert dr.file_mtime_ns == fp.stat().st_mtime_ns
+    rmgr.close()
+
+    # resume continues the hmac and verifies the entity at finalize
+    rmgr = rops.DownloadResumeManager(resumefile)
+    d = models.Descriptor(fp, ase, opts, mock.MagicMock(), rmgr)
+    offsets, rb = d.next_offsets()
+    assert rb == 32
+    assert offsets.chunk_num == 1
+    _process(d, offsets)
+    offsets, _ = d.next_offsets()
+    _process(d, offsets)
+    assert d.next_offsets() == (None, None)
+    assert d.hmac.digest() == _hmac.digest()
+    rmgr.delete()
+
+    # a file changed since the state was recorded is not resumed
+    rmgr = rops.DownloadResumeManager(resumefile)
+    rmgr.add_or_update_record(
+        str(fp), ase, 32, 1, False, None, hmac_state=dr.hmac_state,
+        file_size=dr.file_size, file_mtime_ns=dr.file_mtime_ns + 1)
+    d = models.Descriptor(fp, ase, opts, mock.MagicMock(), rmgr)
+    assert d._resume() is None
+    rmgr.delete()
+
+
 def test_downloaddescriptor_next_offsets(tmpdir):
     lp = pathlib.Path(str(tmpdir.join('a')))
 
@@ -518,6 +819,7 @@ def test_downloaddescriptor_next_offsets(tmpdir):
     assert d.next_offsets() == (None, None)
 
     ase._encryption = mock.MagicMock()
+    ase._encryption.is_chunked = False
     ase._encryption.symmetric_key = b'123'
     ase._size = 128
     d = models.Descriptor(lp, ase, opts, mock.MagicMock(), None)
@@ -576,6 +878,7 @@ def test_hmac_iv(tmpdir):
     ase = azmodels.StorageEntity('cont')
     ase._size = 128
     ase._encryption = mock.MagicMock()
+    ase._encryption.is_chunked = False
     ase._encryption.symmetric_key = b'123'
     ase._size = 128
     d = models.Descriptor(lp, ase, opts, mock.MagicMock(), None)
@@ -629,6 +932,97 @@ def test_write_unchecked_hmac_data(tmpdir):
     assert not ucc['decrypted']
 
 
+def test_reorder_buffer(tmpdir):
+    lp = pathlib.Path(str(tmpdir.join('a')))
+
+    opts = mock.MagicMock()
+    opts.check_file_md5 = True
+    opts.chunk_size_bytes = 16
+    ase = azmodels.StorageEntity('cont')
+    ase._size = 48
+    ase._md5 = 'md5'
+    d = models.Descriptor(lp, ase, opts, mock.MagicMock(), None)
+    d._allocate_disk_space()
+
+    data = [os.urandom(16) for _ in range(3)]
+    offsets = [d.next_offsets()[0] for _ in range(3)]
+
+    # out of order chunks are retained until the buffer is full, the next
+    # chunk to be checked is always retained
+    with mock.patch('blobxfer.models.download._MAX_REORDER_BUFFER_BYTES', 16):
+        d.write_unchecked_data(offsets[2], data[2])
+        d.write_unchecked_data(offsets[1], data[1])
+        assert d._unchecked_chunks[2]['ucc'].data == data[2]
+        assert d._unchecked_chunks[1]['ucc'].data is None
+        assert d._buffered_bytes == 16
+        d.write_unchecked_data(offsets[0], data[0])
+        assert d._unchecked_chunks[0]['ucc'].data == data[0]
+        assert d._buffered_bytes == 32
+
+    # retained chunks are not read back from disk
+    lp.write_bytes(data[0] + data[1] + b'\0' * 16)
+    d.perform_chunked_integrity_check()
+    assert d._next_integrity_chunk == 3
+    assert len(d._unchecked_chunks) == 0
+    assert d._buffered_bytes == 0
+    md5 = util.new_md5_hasher()
+    md5.update(b''.join(data))
+    assert d.md5.digest() == md5.digest()
+
+    # retained chunks are charged against a limited memory budget
+    budget = workqueue.MemoryBudget(32)
+    assert budget.acquire(16)
+    d = models.Descriptor(
+        lp, ase, opts, mock.MagicMock(), None, memory_budget=budget)
+    offsets = [d.next_offsets()[0] for _ in range(3)]
+    d.write_unchecked_data(offsets[2], data[2])
+    d.write_unchecked_data(offsets[1], data[1])
+    assert d._unchecked_chunks[2]['ucc'].data == data[2]
+    assert d._unchecked_chunks[1]['ucc'].data is None
+    assert budget.in_use == 32
+    d.write_unchecked_data(offsets[0], data[0])
+    assert d._unchecked_chunks[0]['ucc'].data == data[0]
+    assert budget.in_use == 48
+    lp.write_bytes(data[0] + data[1] + data[2])
+    d.perform_chunked_integrity_check()
+    assert d._next_integrity_chunk == 3
+    assert d._buffered_bytes == 0
+    assert budget.in_use == 16
+
+    # encrypted data is only persisted if required or buffer is full
+    opts.check_file_md5 = False
+    ase._encryption = mock.MagicMock()
+    ase._encryption.is_chunked = False
+    ase._encryption.symmetric_key = b'123'
+    d = models.Descriptor(lp, ase, opts, mock.MagicMock(), None)
+    offsets = [d.next_offsets()[0] for _ in range(3)]
+
+    with mock.patch('blobxfer.models.download._MAX_REORDER_BUFFER_BYTES', 16):
+        assert d.write_unchecked_hmac_data(
+            offsets[2], data[2], persist=False) is None
+        ucc = d._unchecked_chunks[2]['ucc']
+        assert ucc.data == data[2]
+        assert ucc.file_path is None
+        assert not ucc.temp
+        fname = d.write_unchecked_hmac_data(
+            offsets[1], data[1], persist=False)
+        ucc = d._unchecked_chunks[1]['ucc']
+        assert ucc.data is None
+        assert ucc.temp
+        assert str(ucc.file_path) == fname
+        fname = d.write_unchecked_hmac_data(offsets[0], data[0])
+        ucc = d._unchecked_chunks[0]['ucc']
+        assert ucc.data == data[0]
+        assert ucc.temp
+    for i in range(3):
+        d.mark_unchecked_chunk_decrypted(i)
+    d.perform_chunked_integrity_check()
+    assert d._next_integrity_chunk == 3
+    assert d._buffered_bytes == 0
+    assert not pathlib.Path(fname).exists()
+    assert d.hmac.update.call_count == 3
+
+
 def test_mark_unchecked_chunk_decrypted():
     opts = mock.MagicMock()
     opts.check_file_md5 = False
@@ -670,6 +1064,7 @@ def test_perform_chunked_integrity_check(tmpdir):
     ase = azmodels.StorageEntity('cont')
     ase._size = 32
     ase._encryption = mock.MagicMock()
+    ase._encryption.is_chunked = False
     ase._encryption.symmetric_key = b'123'
     d = models.Descriptor(lp, ase, opts, mock.MagicMock(), None)
 
@@ -791,6 +1186,16 @@ def test_write_data(tmpdir):
     assert d.final_path.exists()
     assert d.final_path.stat().st_size == len(data)
 
+    # test with writer pool
+    lp = pathlib.Path(str(tmpdir.join('b')))
+    writer = mock.MagicMock()
+    d = models.Descriptor(
+        lp, ase, opts, mock.MagicMock(), None, writer=writer)
+    d._allocate_disk_space()
+    offsets, _ = d.next_offsets()
+    d.write_data(offsets, data)
+    writer.pwrite.assert_called_once_with(lp, 0, data)
+
 
 def test_finalize_integrity_and_file(tmpdir):
     # already finalized
@@ -821,6 +1226,7 @@ def test_finalize_integrity_and_file(tmpdir):
     ase = azmodels.StorageEntity('cont')
     ase._size = 32
     ase._encryption = mock.MagicMock()
+    ase._encryption.is_chunked = False
     ase._encryption.symmetric_key = b'123'
     signkey = os.urandom(32)
     ase._encryption.initialize_hmac = mock.MagicMock()
@@ -875,13 +1281,16 @@ def test_finalize_integrity_and_file(tmpdir):
 
     data = b'0' * ase._size
 
-    d = models.Descriptor(lp, ase, opts, mock.MagicMock(), None)
+    writer = mock.MagicMock()
+    d = models.Descriptor(
+        lp, ase, opts, mock.MagicMock(), None, writer=writer)
     d._allocate_disk_space()
     d.finalize_integrity()
     d.finalize_file()
 
     assert d.final_path.exists()
     assert d.final_path.stat().st_size == len(data)
+    writer.finalize.assert_called_once_with(lp, sync=True)
 
     # md5 mismatch
     lp = pathlib.Path(str(tmpdir.join('d')))
@@ -894,13 +1303,16 @@ def test_finalize_integrity_and_file(tmpdir):
     data = b'0' * ase._size
     ase._md5 = 'oops'
 
-    d = models.Descriptor(lp, ase, opts, mock.MagicMock(), None)
+    writer = mock.MagicMock()
+    d = models.Descriptor(
+        lp, ase, opts, mock.MagicMock(), None, writer=writer)
     d._allocate_disk_space()
     d.md5.update(data)
     d.finalize_integrity()
     d.finalize_file()
 
     assert not d.final_path.exists()
+    writer.finalize.assert_called_once_with(lp, sync=False)
 
 
 @unittest.skipIf(
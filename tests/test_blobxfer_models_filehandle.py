@@ -0,0 +1,309 @@
+# coding=utf-8
+"""Tests for file handle cache"""
+
+# stdlib imports
+import os
+import threading
+import unittest
+import unittest.mock as mock
+# non-stdlib imports
+import pytest
+# local imports
+import blobxfer.models.upload as upload
+import blobxfer.util as util
+# module under test
+import blobxfer.models.filehandle as filehandle
+
+
+@unittest.skipIf(util.on_windows(), 'pread does not exist')
+def test_file_handle_cache_pread(tmpdir):
+    with pytest.raises(ValueError):
+        filehandle.FileHandleCache(max_handles=0)
+
+    tmpdir.join('a').write('abcdef')
+    path = str(tmpdir.join('a'))
+    view = upload.LocalPathView(
+        fd_end=6, fd_start=0, mode=None, next=None, slice_num=0,
+        total_slices=1)
+
+    a = filehandle.FileHandleCache()
+    assert a.pread(path, 0, 2, view=view) == b'ab'
+    assert a.num_open == 1
+    assert a.pread(path, 4, 4, view=view) == b'ef'
+    assert a.pread(path, 6, 1) == b''
+    assert a.num_open == 1
+
+    a.close(path)
+    assert a.num_open == 0
+    a.close(path)
+
+    # test short read continuation
+    with mock.patch('os.pread') as patched_pread:
+        patched_pread.side_effect = [b'a', b'bc', b'']
+        assert a.pread(path, 0, 4) == b'abc'
+        assert patched_pread.call_count == 3
+    a.close_all()
+    assert a.num_open == 0
+
+    # test fadvise failure is not fatal
+    with mock.patch('os.posix_fadvise', create=True) as patched_fadvise:
+        patched_fadvise.side_effect = OSError()
+        with mock.patch('blobxfer.models.filehandle._HAS_FADVISE', True):
+            assert a.pread(path, 1, 2, view=view) == b'bc'
+    a.close_all()
+
+    # test no pread support
+    with mock.patch('blobxfer.models.filehandle._HAS_PREAD', False):
+        assert a.pread(path, 2, 2) == b'cd'
+        assert a.num_open == 0
+
+
+@unittest.skipIf(util.on_windows(), 'preadv does not exist')
+def test_file_handle_cache_preadinto(tmpdir):
+    tmpdir.join('a').write('abcdef')
+    path = str(tmpdir.join('a'))
+    view = upload.LocalPathView(
+        fd_end=6, fd_start=0, mode=None, next=None, slice_num=0,
+        total_slices=1)
+
+    a = filehandle.FileHandleCache()
+    buf = memoryview(bytearray(4))
+    assert a.preadinto(path, 1, buf[:2], view=view) == 2
+    assert buf[:2] == b'bc'
+    assert a.num_open == 1
+    assert a.preadinto(path, 4, buf) == 2
+    assert buf[:2] == b'ef'
+    assert a.preadinto(path, 6, buf) == 0
+
+    # test short read continuation
+    with mock.patch('os.preadv') as patched_preadv:
+        patched_preadv.side_effect = [1, 2, 0]
+        assert a.preadinto(path, 0, buf) == 3
+        assert patched_preadv.call_count == 3
+        assert patched_preadv.call_args[0][2] == 3
+    a.close_all()
+
+    # test no preadv support
+    with mock.patch('blobxfer.models.filehandle._HAS_PREADV', False):
+        assert a.preadinto(path, 2, buf) == 4
+        assert buf == b'cdef'
+        assert a.num_open == 0
+
+
+@unittest.skipIf(util.on_windows(), 'pread does not exist')
+def test_file_handle_cache_eviction(tmpdir):
+    paths = []
+    for name in ('a', 'b', 'c'):
+        tmpdir.join(name).write(name)
+        paths.append(str(tmpdir.join(name)))
+
+    a = filehandle.FileHandleCache(max_handles=2)
+    for path in paths:
+        a.pread(path, 0, 1)
+    assert a.num_open == 2
+    assert paths[0] not in a._handles
+
+    # evicted handles that are in use are closed upon release
+    with a._acquire(paths[1], None) as handle:
+        fd = handle.fd
+        a.close_all()
+        assert a.num_open == 0
+        assert os.pread(fd, 1, 0) == b'b'
+    with pytest.raises(OSError):
+        os.fstat(fd)
+
+    with a._acquire(paths[0], None) as handle:
+        fd = handle.fd
+        a.close(paths[0])
+        assert os.pread(fd, 1, 0) == b'a'
+    with pytest.raises(OSError):
+        os.fstat(fd)
+
+
+@unittest.skipIf(util.on_windows(), 'pread does not exist')
+def test_file_handle_cache_concurrent_open(tmpdir):
+    tmpdir.join('a').write('a')
+    path = str(tmpdir.join('a'))
+    a = filehandle.FileHandleCache()
+
+    # simulate another thread inserting a handle while opening
+    fd = os.open(path, os.O_RDONLY)
+    real_open = os.open
+
+    def _open(*args, **kwargs):
+        ret = real_open(*args, **kwargs)
+        a._handles[path] = filehandle._FileHandle(fd)
+        return ret
+
+    with mock.patch('os.open', side_effect=_open):
+        assert a.pread(path, 0, 1) == b'a'
+    assert a._handles[path].fd == fd
+    a.close_all()
+
+
+@unittest.skipIf(util.on_windows(), 'pwrite does not exist')
+def test_pwrite_all():
+    # test partial writes across buffers
+    with mock.patch('os.pwritev', create=True) as patched_pwritev:
+        with mock.patch('os.pwrite') as patched_pwrite:
+            with mock.patch(
+                    'blobxfer.models.filehandle._HAS_PWRITEV', True):
+                patched_pwritev.side_effect = [3, 2]
+                patched_pwrite.return_value = 1
+                filehandle._pwrite_all(0, [b'ab', b'cd', b'ef'], 10)
+                assert patched_pwritev.call_count == 2
+                assert patched_pwritev.call_args_list[1][0][2] == 13
+                assert patched_pwrite.call_count == 1
+                assert patched_pwrite.call_args[0][1] == b'f'
+                assert patched_pwrite.call_args[0][2] == 15
+
+
+@unittest.skipIf(util.on_windows(), 'pwrite does not exist')
+def test_pwrite(tmpdir):
+    tmpdir.join('a').write('abcdef')
+    path = str(tmpdir.join('a'))
+    filehandle.pwrite(path, 2, b'')
+    filehandle.pwrite(path, 2, b'XY')
+    assert tmpdir.join('a').read() == 'abXYef'
+
+    with mock.patch('blobxfer.models.filehandle._HAS_PWRITE', False):
+        filehandle.pwrite(path, 0, b'Z')
+    assert tmpdir.join('a').read() == 'ZbXYef'
+
+
+@unittest.skipIf(util.on_windows(), 'pwrite does not exist')
+def test_file_writer_pool_pwrite(tmpdir):
+    with pytest.raises(ValueError):
+        filehandle.FileWriterPool(sync_interval_bytes=0)
+
+    tmpdir.join('a').write('\0' * 8)
+    path = str(tmpdir.join('a'))
+
+    a = filehandle.FileWriterPool()
+    a.pwrite(path, 0, b'')
+    assert a.num_open == 0
+    a.pwrite(path, 4, b'efgh')
+    a.pwrite(path, 0, b'abcd')
+    assert a.num_open == 1
+    with mock.patch('blobxfer.models.filehandle._datasync') as patched_sync:
+        a.finalize(path)
+        assert patched_sync.call_count == 0
+    assert a.num_open == 0
+    assert tmpdir.join('a').read() == 'abcdefgh'
+
+    # test no pwrite support
+    with mock.patch('blobxfer.models.filehandle._HAS_PWRITE', False):
+        a.pwrite(path, 0, b'A')
+        assert a.num_open == 0
+    assert tmpdir.join('a').read() == 'Abcdefgh'
+
+    # test write error is propagated to writer
+    a.pwrite(path, 0, b'a')
+    with mock.patch('os.pwrite', side_effect=OSError()):
+        with pytest.raises(OSError):
+            a.pwrite(path, 1, b'B')
+    a.close_all()
+
+
+@unittest.skipIf(util.on_windows(), 'pwrite does not exist')
+def test_file_writer_pool_durability(tmpdir):
+    tmpdir.join('a').write('\0' * 8)
+    path = str(tmpdir.join('a'))
+
+    a = filehandle.FileWriterPool(
+        durability=filehandle.WriteDurability.Finalize)
+    with mock.patch('blobxfer.models.filehandle._datasync') as patched_sync:
+        a.pwrite(path, 0, b'ab')
+        assert patched_sync.call_count == 0
+        a.finalize(path, sync=False)
+        assert patched_sync.call_count == 0
+        a.finalize(path)
+        assert patched_sync.call_count == 1
+        assert a.num_open == 0
+
+    a = filehandle.FileWriterPool(
+        durability=filehandle.WriteDurability.Periodic,
+        sync_interval_bytes=4)
+    with mock.patch('blobxfer.models.filehandle._datasync') as patched_sync:
+        a.pwrite(path, 0, b'ab')
+        assert patched_sync.call_count == 0
+        a.pwrite(path, 2, b'cd')
+        assert patched_sync.call_count == 1
+        a.pwrite(path, 4, b'ef')
+        assert patched_sync.call_count == 1
+        a.finalize(path)
+        assert patched_sync.call_count == 2
+    assert tmpdir.join('a').read() == 'abcdef\0\0'
+
+    # test fsync fallback
+    fd = os.open(path, os.O_RDONLY)
+    with mock.patch('os.fsync') as patched_fsync:
+        with mock.patch.object(os, 'fdatasync', create=True):
+            del os.fdatasync
+            filehandle._datasync(fd)
+        assert patched_fsync.call_count == 1
+    os.close(fd)
+
+
+@unittest.skipIf(util.on_windows(), 'pwrite does not exist')
+def test_file_writer_pool_coalesce(tmpdir):
+    tmpdir.join('a').write('\0' * 8)
+    path = str(tmpdir.join('a'))
+    a = filehandle.FileWriterPool()
+
+    # queue writes behind an in-progress batch
+    a.pwrite(path, 7, b'h')
+    handle = a._handles[path]
+    reqs = [
+        filehandle._WriteRequest(4, b'ef'),
+        filehandle._WriteRequest(0, b'ab'),
+        filehandle._WriteRequest(2, b'cd'),
+    ]
+    handle.pending.extend(reqs)
+    with mock.patch(
+            'blobxfer.models.filehandle._pwrite_all',
+            wraps=filehandle._pwrite_all) as patched_write:
+        a.pwrite(path, 6, b'g')
+        # adjacent regions are written with a single call
+        assert patched_write.call_count == 1
+        assert patched_write.call_args[0][2] == 0
+    assert all(x.done for x in reqs)
+    assert not handle.writing
+    assert len(handle.pending) == 0
+    a.close_all()
+    assert tmpdir.join('a').read() == 'abcdefgh'
+
+    # test non-adjacent regions and errors are isolated
+    a.pwrite(path, 0, b'A')
+    handle = a._handles[path]
+    req = filehandle._WriteRequest(4, b'E')
+    handle.pending.append(req)
+    with mock.patch(
+            'blobxfer.models.filehandle._pwrite_all',
+            side_effect=[None, OSError()]):
+        a.pwrite(path, 0, b'A')
+    assert isinstance(req.exc, OSError)
+    a.close_all()
+
+
+@unittest.skipIf(util.on_windows(), 'pwrite does not exist')
+def test_file_writer_pool_concurrent(tmpdir):
+    size = 65536
+    tmpdir.join('a').write('\0' * size)
+    path = str(tmpdir.join('a'))
+    data = os.urandom(size)
+    a = filehandle.FileWriterPool()
+
+    def _writer(start):
+        for offset in range(start, size, 1024):
+            a.pwrite(path, offset, data[offset:offset + 256])
+
+    threads = [
+        threading.Thread(target=_writer, args=(x * 256,)) for x in range(4)
+    ]
+    for thr in threads:
+        thr.start()
+    for thr in threads:
+        thr.join()
+    a.finalize(path)
+    assert tmpdir.join('a').read_binary() == data
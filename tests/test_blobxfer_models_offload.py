@@ -2,6 +2,8 @@
 """Tests for offload"""
 
 # stdlib imports
+import importlib
+import sys
 import unittest.mock as mock
 # non-stdlib imports
 import pytest
@@ -43,3 +45,74 @@ def test_multiprocess_offload():
         assert not proc.is_alive()
 
     assert a.pop_done_queue() == item
+
+
+def test_shared_memory_ring():
+    with pytest.raises(ValueError):
+        offload.SharedMemoryRing(0, 1)
+    with pytest.raises(ValueError):
+        offload.SharedMemoryRing(1, None)
+
+    a = offload.SharedMemoryRing(4, 2)
+    try:
+        assert a.slot_size == 4
+        assert a.free_slots == 2
+        assert a.allocate(5) is None
+
+        s0 = a.put(b'abc')
+        assert s0.slot == 0
+        assert s0.offset == 0
+        assert s0.length == 3
+        assert s0.name == a.name
+        s1 = a.allocate(4)
+        assert s1.offset == 4
+        assert a.free_slots == 0
+        assert a.put(b'a') is None
+
+        # worker views share the segment
+        attached = {}
+        view = offload.SharedMemoryRing.attach(s1, attached)
+        view[:] = b'wxyz'
+        view.release()
+        assert a.get(s1) == b'wxyz'
+        assert a.free_slots == 1
+        offload.SharedMemoryRing.detach(attached)
+        assert len(attached) == 0
+
+        assert a.get(s0) == b'abc'
+        assert a.free_slots == 2
+    finally:
+        a.close()
+
+
+def test_shared_memory_ring_create():
+    with mock.patch('blobxfer.util.on_linux', return_value=True):
+        with mock.patch('os.path.isdir', return_value=True):
+            with mock.patch('os.statvfs') as patched_sv:
+                patched_sv.return_value.f_bavail = 1
+                patched_sv.return_value.f_frsize = 4096
+                assert offload.SharedMemoryRing.create(4096, 2) is None
+                patched_sv.side_effect = OSError()
+                assert offload.SharedMemoryRing.create(4096, 2) is None
+
+    with mock.patch('blobxfer.util.on_linux', return_value=False):
+        with mock.patch(
+                'blobxfer.models.offload.SharedMemoryRing.__init__',
+                side_effect=OSError()):
+            assert offload.SharedMemoryRing.create(4096, 2) is None
+        a = offload.SharedMemoryRing.create(4096, 2)
+        assert a is not None
+        a.close()
+        a.close()
+
+
+def test_shared_memory_ring_create_unsupported():
+    try:
+        with mock.patch.dict(
+                sys.modules, {'multiprocessing.shared_memory': None}):
+            importlib.reload(offload)
+            assert not offload._SHARED_MEMORY_SUPPORTED
+            assert offload.SharedMemoryRing.create(4096, 2) is None
+    finally:
+        importlib.reload(offload)
+    assert offload._SHARED_MEMORY_SUPPORTED
@@ -24,6 +24,23 @@ def test_timeout():
     assert a.max_retries == 3
 
 
+def test_sync_state():
+    a = options.SyncState('ss', None, None)
+    assert a.state_file == pathlib.Path('ss')
+    assert a.revalidate_interval == 0
+    assert a.revalidate_sample == 0
+
+    a = options.SyncState('ss', 3600, 0.1)
+    assert a.revalidate_interval == 3600
+    assert a.revalidate_sample == 0.1
+
+    a = options.SyncState('ss', -1, 1)
+    assert a.revalidate_interval == 0
+
+    with pytest.raises(ValueError):
+        options.SyncState('ss', 0, -0.1)
+
+
 @mock.patch('multiprocessing.cpu_count', return_value=1)
 def test_concurrency_options(patched_cc):
     a = options.Concurrency(
@@ -37,18 +54,48 @@ def test_concurrency_options(patched_cc):
     assert a.md5_processes == 1
     assert a.disk_threads == 2
     assert a.transfer_threads == 4
+    assert a.max_transfer_threads == 4
+    assert a.max_memory_bytes == 0
+    assert a.scan_threads == 1
+    assert a.mode == options.ConcurrencyMode.Static
 
     a = options.Concurrency(
         crypto_processes=-1,
         md5_processes=0,
         disk_threads=1,
         transfer_threads=-1,
+        max_memory_bytes=-1,
     )
 
     assert a.crypto_processes == 0
     assert a.md5_processes == 1
     assert a.disk_threads == 1
     assert a.transfer_threads == 4
+    assert a.max_memory_bytes == 0
+
+
+@mock.patch('multiprocessing.cpu_count', return_value=1)
+def test_concurrency_options_auto_mode(patched_cc):
+    a = options.Concurrency(
+        crypto_processes=0,
+        md5_processes=0,
+        disk_threads=0,
+        transfer_threads=0,
+        mode=options.ConcurrencyMode.Auto,
+    )
+    assert str(a.mode) == 'auto'
+    assert a.transfer_threads == 4
+    assert a.max_transfer_threads == 96
+
+    a = options.Concurrency(
+        crypto_processes=0,
+        md5_processes=0,
+        disk_threads=0,
+        transfer_threads=128,
+        mode=options.ConcurrencyMode.Auto,
+    )
+    assert a.transfer_threads == 128
+    assert a.max_transfer_threads == 128
 
 
 @mock.patch('multiprocessing.cpu_count', return_value=64)
@@ -62,6 +109,7 @@ def test_concurrency_options_max_disk_and_transfer_threads(patched_cc):
 
     assert a.disk_threads == 64
     assert a.transfer_threads == 96
+    assert a.scan_threads == 16
 
     a = options.Concurrency(
         crypto_processes=1,
@@ -85,6 +133,7 @@ def test_concurrency_options_max_disk_and_transfer_threads(patched_cc):
     assert a.md5_processes == 0
     assert a.crypto_processes == 0
     assert a.disk_threads == 0
+    assert a.scan_threads == 0
     assert a.transfer_threads == 96
 
 
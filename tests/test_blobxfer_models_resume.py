@@ -22,6 +22,21 @@ def test_download():
     d.md5hexdigest = 'abc'
     assert d.md5hexdigest == 'abc'
 
+    assert d.md5_state is None
+    d.md5_state = b'state'
+    d.md5_state = None
+    assert d.md5_state == b'state'
+
+    d.file_size = 1
+    d.file_mtime_ns = 2
+    assert d.file_size == 1
+    assert d.file_mtime_ns == 2
+
+    assert d.hmac_state is None
+    d.hmac_state = b'hmac'
+    d.hmac_state = None
+    assert d.hmac_state == b'hmac'
+
     d.next_integrity_chunk = 1
     assert d.next_integrity_chunk == 1
 
@@ -47,6 +62,28 @@ def test_upload():
     u.md5hexdigest = 'abc'
     assert u.md5hexdigest == 'abc'
 
+    assert u.md5_state is None
+    u.md5_state = b'state'
+    u.md5_state = None
+    assert u.md5_state == b'state'
+
+    u.file_size = 1
+    u.file_mtime_ns = 2
+    assert u.file_size == 1
+    assert u.file_mtime_ns == 2
+
+    assert u.encryption_keys is None
+    u.encryption_keys = '{}'
+    assert u.encryption_keys == '{}'
+    assert u.encryption_iv is None
+    u.encryption_iv = b'iv'
+    u.encryption_iv = None
+    assert u.encryption_iv == b'iv'
+    assert u.hmac_state is None
+    u.hmac_state = b'hmac'
+    u.hmac_state = None
+    assert u.hmac_state == b'hmac'
+
     u.completed_chunks = 1
     assert u.completed_chunks == 1
 
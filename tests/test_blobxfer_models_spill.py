@@ -0,0 +1,63 @@
+# coding=utf-8
+"""Tests for spillable store"""
+
+# stdlib imports
+import unittest.mock as mock
+# non-stdlib imports
+import pytest
+# local imports
+# module under test
+import blobxfer.models.spill as spill
+
+
+def test_spillable_store():
+    with pytest.raises(ValueError):
+        spill.SpillableStore('test', spill_threshold=0)
+
+    ss = spill.SpillableStore('test')
+    assert ss.dbpath is None
+    ss.put('a')
+    ss.put('b', (1, 2))
+    ss.put('b', (3, ))
+    assert 'a' in ss
+    assert 'c' not in ss
+    assert ss.get('a') is None
+    assert ss.get('b') == (3, )
+    assert ss.get('c', 'd') == 'd'
+    assert len(ss) == 2
+    assert not ss.spilled
+    ss.close()
+    assert 'a' not in ss
+    assert len(ss) == 0
+
+
+def test_spillable_store_spill():
+    ss = spill.SpillableStore('test', spill_threshold=1)
+    ss.put('a', (1, ))
+    assert not ss.spilled
+    ss.put('b', ())
+    assert ss.spilled
+    dbpath = ss.dbpath
+    assert dbpath.name == 'test.db'
+    assert dbpath.exists()
+    assert len(ss._entries) == 0
+
+    with mock.patch('blobxfer.models.spill._SPILL_BATCH_SIZE', 2):
+        ss.put('c')
+        assert len(ss._pending) == 1
+        ss.put('a', (2, ))
+        assert len(ss._pending) == 0
+    ss.put('d', {'k': 'v'})
+    assert 'c' in ss
+    assert 'e' not in ss
+    assert ss.get('a') == (2, )
+    assert ss.get('b') == ()
+    assert ss.get('c') is None
+    assert ss.get('d') == {'k': 'v'}
+    assert ss.get('e', 'f') == 'f'
+    assert len(ss) == 4
+
+    ss.close()
+    assert not ss.spilled
+    assert ss.dbpath is None
+    assert not dbpath.parent.exists()
@@ -17,14 +17,19 @@ def test_specification():
     spec = synccopy.Specification(
         synccopy_options=options.SyncCopy(
             access_tier=None,
+            async_copy=False,
+            delete_during_transfer=False,
             delete_extraneous_destination=False,
             delete_only=False,
+            delta=False,
             dest_mode=azmodels.StorageModes.Auto,
             mode=azmodels.StorageModes.Auto,
             overwrite=True,
             recursive=True,
+            remote_index=False,
             rename=False,
             server_side_copy=True,
+            stream_relay=False,
             strip_components=0,
         ),
         skip_on_options=options.SkipOn(
@@ -70,6 +75,7 @@ def test_descriptor():
     assert d.src_entity == src_ase
     assert d.dst_entity == dst_ase
     assert not d.all_operations_completed
+    assert not d.claim_finalization()
     assert d.is_resumable
     assert d.last_block_num == -1
     assert not d.remote_is_file
@@ -203,6 +209,71 @@ def test_descriptor_compute_total_chunks():
     assert d._compute_total_chunks(0) == 1
 
 
+def test_descriptor_delta():
+    opts = mock.MagicMock()
+    opts.dest_mode = azmodels.StorageModes.Auto
+    opts.mode = azmodels.StorageModes.Auto
+    opts.server_side_copy = True
+    opts.delta = True
+
+    src_ase = azmodels.StorageEntity('cont')
+    src_ase._mode = azmodels.StorageModes.Block
+    src_ase._name = 'name'
+    src_ase._size = 10
+    src_ase._encryption = None
+    src_ase._is_arbitrary_url = False
+
+    dst_ase = azmodels.StorageEntity('cont2')
+    dst_ase._mode = azmodels.StorageModes.Block
+    dst_ase._name = 'name'
+    dst_ase._size = 10
+    dst_ase._encryption = None
+    dst_ase.replica_targets = None
+
+    bl = []
+    for size in (4, 4, 2):
+        block = mock.MagicMock()
+        block.size = size
+        bl.append(block)
+
+    # source blocks without digests are copied in full
+    d = synccopy.Descriptor(
+        src_ase, dst_ase, bl, opts, mock.MagicMock(),
+        src_block_digests=['a', None, 'c'], dst_blocks=[('a', 4)])
+    assert not d.is_delta
+    assert d.is_resumable
+    assert d.delta_block_digests is None
+    assert d.delta_block_digest(0) is None
+    assert not d.is_delta_block_unchanged(0)
+
+    # blocks must match digest, size and offset
+    d = synccopy.Descriptor(
+        src_ase, dst_ase, bl, opts, mock.MagicMock(),
+        src_block_digests=['a', 'b', 'c'],
+        dst_blocks=[('a', 4), ('x', 4), ('c', 2)])
+    assert d.is_delta
+    assert not d.is_resumable
+    assert d.delta_block_digests == ['a', 'b', 'c']
+    assert d.delta_block_digest(1) == 'b'
+    assert d.is_delta_block_unchanged(0)
+    assert not d.is_delta_block_unchanged(1)
+    assert d.is_delta_block_unchanged(2)
+    assert d.delta_unchanged == (2, 6)
+
+    d = synccopy.Descriptor(
+        src_ase, dst_ase, bl, opts, mock.MagicMock(),
+        src_block_digests=['a', 'b', 'c'],
+        dst_blocks=[('a', 3), ('b', 4), ('c', 2)])
+    assert d.delta_unchanged == (0, 0)
+
+    # new destinations have no committed blocks
+    d = synccopy.Descriptor(
+        src_ase, dst_ase, bl, opts, mock.MagicMock(),
+        src_block_digests=['a', 'b', 'c'])
+    assert d.is_delta
+    assert d.delta_unchanged == (0, 0)
+
+
 def test_resume():
     opts = mock.MagicMock()
     opts.dest_mode = azmodels.StorageModes.Auto
@@ -338,3 +409,93 @@ def test_descriptor_next_offsets():
     assert offsets.range_end == 31
     assert d._offset == 32
     assert d._chunk_num == 1
+
+
+def test_descriptor_page_ranges():
+    opts = mock.MagicMock()
+    opts.dest_mode = azmodels.StorageModes.Auto
+    opts.mode = azmodels.StorageModes.Auto
+    opts.server_side_copy = False
+
+    src_ase = azmodels.StorageEntity('cont')
+    src_ase._mode = azmodels.StorageModes.Page
+    src_ase._name = 'name'
+    src_ase._size = synccopy._MAX_NONBLOCK_BLOB_CHUNKSIZE_BYTES * 4
+    src_ase._encryption = None
+
+    dst_ase = azmodels.StorageEntity('cont2')
+    dst_ase._mode = azmodels.StorageModes.Page
+    dst_ase._name = 'name'
+    dst_ase._size = src_ase._size
+    dst_ase._encryption = None
+    dst_ase.replica_targets = None
+
+    chunk = synccopy._MAX_NONBLOCK_BLOB_CHUNKSIZE_BYTES
+    # adjacent ranges are coalesced and split at the chunk size
+    prs = [
+        mock.MagicMock(start=chunk + 512, end=chunk * 3 + 511),
+        mock.MagicMock(start=0, end=511),
+        mock.MagicMock(start=512, end=1023),
+    ]
+    d = synccopy.Descriptor(
+        src_ase, dst_ase, None, opts, None, page_ranges=prs)
+    assert d._src_page_chunks == [
+        (0, 1024), (chunk + 512, chunk), (chunk * 2 + 512, chunk),
+    ]
+    assert d._total_chunks == 3
+    assert d._outstanding_ops == 3
+    assert d.sparse_bytes == src_ase._size - 1024 - chunk * 2
+
+    offsets, rb = d.next_offsets()
+    assert rb is None
+    assert offsets.chunk_num == 0
+    assert offsets.range_start == 0
+    assert offsets.range_end == 1023
+    offsets, _ = d.next_offsets()
+    assert offsets.chunk_num == 1
+    assert offsets.range_start == chunk + 512
+    assert offsets.num_bytes == chunk
+    assert offsets.range_end == chunk * 2 + 511
+    offsets, _ = d.next_offsets()
+    assert offsets.range_start == chunk * 2 + 512
+    assert offsets.range_end == chunk * 3 + 511
+    assert d.next_offsets() == (None, None)
+
+    # resume accounts only for populated bytes
+    resume = mock.MagicMock()
+    nc = mock.MagicMock()
+    nc.offset = chunk * 2 + 512
+    nc.length = src_ase._size
+    nc.completed = False
+    nc.total_chunks = 3
+    nc.chunk_size = chunk
+    cc = bitstring.BitArray(length=nc.total_chunks)
+    cc.set(True, [0, 1])
+    nc.completed_chunks = cc.int
+    resume.get_record.return_value = nc
+    d = synccopy.Descriptor(
+        src_ase, dst_ase, None, opts, resume, page_ranges=prs)
+    offsets, rb = d.next_offsets()
+    assert rb == 1024 + chunk
+    assert offsets.chunk_num == 2
+    assert offsets.range_start == chunk * 2 + 512
+
+    nc.completed = True
+    d = synccopy.Descriptor(
+        src_ase, dst_ase, None, opts, resume, page_ranges=prs)
+    assert d._resume() == 1024 + chunk * 2
+
+    # changed page ranges are not resumed
+    nc.completed = False
+    d = synccopy.Descriptor(
+        src_ase, dst_ase, None, opts, resume, page_ranges=prs[1:])
+    assert d._resume() is None
+
+    # no populated ranges still creates the destination
+    d = synccopy.Descriptor(
+        src_ase, dst_ase, None, opts, None, page_ranges=[])
+    assert d.sparse_bytes == src_ase._size
+    offsets, _ = d.next_offsets()
+    assert offsets.chunk_num == 0
+    assert offsets.num_bytes == 0
+    assert d.next_offsets() == (None, None)
@@ -4,15 +4,23 @@
 # stdlib imports
 import hashlib
 import unittest.mock as mock
+import os
 import pathlib
 # non-stdlib imports
 import bitstring
+import cryptography.hazmat.backends
+import cryptography.hazmat.primitives.asymmetric.rsa
 import pytest
 # local imports
 import blobxfer.models.azure as azmodels
+import blobxfer.models.buffer as buffer
+import blobxfer.models.crypto as crypto
+import blobxfer.models.filehandle as filehandle
 import blobxfer.models.metadata as metadata
 import blobxfer.models.options as options
 import blobxfer.operations.azure as azops
+import blobxfer.operations.crypto as ops
+import blobxfer.operations.resume as rops
 import blobxfer.util as util
 # module under test
 import blobxfer.models.upload as upload
@@ -156,6 +164,39 @@ def test_localsourcepaths_files(tmpdir):
     assert i == 2
 
 
+def test_localsourcepaths_files_prune(tmpdir):
+    tmpdir.mkdir('abc')
+    abcpath = tmpdir.join('abc')
+    abcpath.join('hello.txt').write('hello')
+    abcpath.mkdir('def')
+    abcpath.join('def').join('world.txt').write('world')
+    tmpdir.mkdir('xyz').join('moo.cow').write('z')
+
+    a = upload.LocalSourcePath()
+    a.add_excludes('abc/def*')
+    a.add_excludes('*.cow')
+    a.add_path(str(tmpdir))
+    with mock.patch.object(
+            a, '_inclusion_check', wraps=a._inclusion_check) as patched_ic:
+        files = [str(x.relative_path) for x in a.files(True, scan_threads=2)]
+    assert files == [str(pathlib.Path('abc/hello.txt'))]
+    # pruned directory contents are never inclusion checked
+    checked = [str(x[0][0]) for x in patched_ic.call_args_list]
+    assert str(pathlib.Path('abc/def/world.txt')) not in checked
+    assert str(pathlib.Path('xyz/moo.cow')) in checked
+
+
+def test_localpath_stat(tmpdir):
+    tmpdir.join('a').write('abc')
+    stat = os.stat(str(tmpdir.join('a')))
+    with mock.patch('pathlib.Path.stat') as patched_stat:
+        lp = upload.LocalPath(
+            pathlib.Path(str(tmpdir)), pathlib.Path('a'), stat=stat)
+        assert patched_stat.call_count == 0
+    assert lp.size == 3
+    assert lp.lmt == stat.st_mtime
+
+
 def test_specification(tmpdir):
     lsp = upload.LocalSourcePath()
     lsp.add_paths(['-', '/dev/stdin'])
@@ -164,13 +205,19 @@ def test_specification(tmpdir):
             upload_options=options.Upload(
                 access_tier=None,
                 chunk_size_bytes=4194304,
+                chunk_size_mode=options.ChunkSizeMode.Static,
+                delete_during_transfer=False,
                 delete_extraneous_destination=False,
                 delete_only=False,
+                delta=False,
+                encryption_mode=None,
                 mode=azmodels.StorageModes.Auto,
                 one_shot_bytes=0,
                 overwrite=True,
                 recursive=True,
+                remote_index=False,
                 rename=True,
+                rsa_private_key=None,
                 rsa_public_key=None,
                 stdin_as_page_blob_size=0,
                 store_file_properties=options.FileProperties(
@@ -198,13 +245,19 @@ def test_specification(tmpdir):
             upload_options=options.Upload(
                 access_tier=None,
                 chunk_size_bytes=4194304,
+                chunk_size_mode=options.ChunkSizeMode.Static,
+                delete_during_transfer=False,
                 delete_extraneous_destination=False,
                 delete_only=False,
+                delta=False,
+                encryption_mode=None,
                 mode=azmodels.StorageModes.Auto,
                 one_shot_bytes=0,
                 overwrite=True,
                 recursive=True,
+                remote_index=False,
                 rename=True,
+                rsa_private_key=None,
                 rsa_public_key=None,
                 stdin_as_page_blob_size=0,
                 store_file_properties=options.FileProperties(
@@ -232,13 +285,19 @@ def test_specification(tmpdir):
             upload_options=options.Upload(
                 access_tier=None,
                 chunk_size_bytes=-1,
+                chunk_size_mode=options.ChunkSizeMode.Static,
+                delete_during_transfer=False,
                 delete_extraneous_destination=False,
                 delete_only=False,
+                delta=False,
+                encryption_mode=None,
                 mode=azmodels.StorageModes.Auto,
                 one_shot_bytes=0,
                 overwrite=True,
                 recursive=True,
+                remote_index=False,
                 rename=False,
+                rsa_private_key=None,
                 rsa_public_key=None,
                 stdin_as_page_blob_size=0,
                 store_file_properties=options.FileProperties(
@@ -264,13 +323,19 @@ def test_specification(tmpdir):
             upload_options=options.Upload(
                 access_tier=None,
                 chunk_size_bytes=upload._MAX_BLOCK_BLOB_CHUNKSIZE_BYTES + 1,
+                chunk_size_mode=options.ChunkSizeMode.Static,
+                delete_during_transfer=False,
                 delete_extraneous_destination=False,
                 delete_only=False,
+                delta=False,
+                encryption_mode=None,
                 mode=azmodels.StorageModes.Auto,
                 one_shot_bytes=0,
                 overwrite=True,
                 recursive=True,
+                remote_index=False,
                 rename=False,
+                rsa_private_key=None,
                 rsa_public_key=None,
                 stdin_as_page_blob_size=0,
                 store_file_properties=options.FileProperties(
@@ -296,13 +361,19 @@ def test_specification(tmpdir):
             upload_options=options.Upload(
                 access_tier=None,
                 chunk_size_bytes=4194304,
+                chunk_size_mode=options.ChunkSizeMode.Static,
+                delete_during_transfer=False,
                 delete_extraneous_destination=False,
                 delete_only=False,
+                delta=False,
+                encryption_mode=None,
                 mode=azmodels.StorageModes.Auto,
                 one_shot_bytes=-1,
                 overwrite=True,
                 recursive=True,
+                remote_index=False,
                 rename=False,
+                rsa_private_key=None,
                 rsa_public_key=None,
                 stdin_as_page_blob_size=0,
                 store_file_properties=options.FileProperties(
@@ -328,13 +399,19 @@ def test_specification(tmpdir):
             upload_options=options.Upload(
                 access_tier=None,
                 chunk_size_bytes=4194304,
+                chunk_size_mode=options.ChunkSizeMode.Static,
+                delete_during_transfer=False,
                 delete_extraneous_destination=False,
                 delete_only=False,
+                delta=False,
+                encryption_mode=None,
                 mode=azmodels.StorageModes.Auto,
                 one_shot_bytes=upload._MAX_BLOCK_BLOB_ONESHOT_BYTES + 1,
                 overwrite=True,
                 recursive=True,
+                remote_index=False,
                 rename=False,
+                rsa_private_key=None,
                 rsa_public_key=None,
                 stdin_as_page_blob_size=0,
                 store_file_properties=options.FileProperties(
@@ -359,13 +436,19 @@ def test_specification(tmpdir):
         upload_options=options.Upload(
             access_tier=None,
             chunk_size_bytes=4194304,
+            chunk_size_mode=options.ChunkSizeMode.Static,
+            delete_during_transfer=False,
             delete_extraneous_destination=False,
             delete_only=False,
+            delta=False,
+            encryption_mode=None,
             mode=azmodels.StorageModes.Auto,
             one_shot_bytes=0,
             overwrite=True,
             recursive=True,
+            remote_index=False,
             rename=False,
+            rsa_private_key=None,
             rsa_public_key=None,
             stdin_as_page_blob_size=0,
             store_file_properties=options.FileProperties(
@@ -442,6 +525,7 @@ def test_descriptor(tmpdir):
     ase._name = 'name'
     ase._size = size
     ase._encryption = mock.MagicMock()
+    ase._encryption.is_chunked = False
     opts.rsa_public_key = None
     with pytest.raises(RuntimeError):
         ud = upload.Descriptor(
@@ -477,6 +561,7 @@ def test_descriptor_complete_offset_upload(tmpdir):
     ud.complete_offset_upload(1)
     assert ud._outstanding_ops == 2
     assert ud._replica_counters[1] == 0
+    assert not ud.claim_finalization()
 
     # fill md5 cache with junk to trigger gc on next complete
     for i in range(-30, -1):
@@ -492,6 +577,10 @@ def test_descriptor_complete_offset_upload(tmpdir):
     assert 1 not in ud._replica_counters
     assert len(ud._md5_cache) == 0
 
+    # finalization can only be claimed once
+    assert ud.claim_finalization()
+    assert not ud.claim_finalization()
+
 
 def test_descriptor_hmac_data(tmpdir):
     tmpdir.join('a').write('z' * 32)
@@ -508,6 +597,7 @@ def test_descriptor_hmac_data(tmpdir):
     ase._name = 'name'
     ase._size = 32
     ase._encryption = mock.MagicMock()
+    ase._encryption.is_chunked = False
     ase._encryption.symmetric_key = 'abc'
     ase.replica_targets = [ase]
 
@@ -525,6 +615,7 @@ def test_descriptor_initialize_encryption(tmpdir):
     opts.chunk_size_bytes = 16
     opts.one_shot_bytes = 0
     opts.store_file_properties.md5 = True
+    opts.rsa_private_key = None
     opts.rsa_public_key = 'abc'
 
     ase = azmodels.StorageEntity('cont')
@@ -538,6 +629,93 @@ def test_descriptor_initialize_encryption(tmpdir):
     assert ud.entity.is_encrypted
 
 
+def test_descriptor_encrypted_regions(tmpdir):
+    plaindata = os.urandom(40)
+    tmpdir.join('a').write_binary(plaindata)
+    lp = upload.LocalPath(pathlib.Path(str(tmpdir)), pathlib.Path('a'))
+
+    opts = mock.MagicMock()
+    opts.chunk_size_bytes = 16
+    opts.one_shot_bytes = 0
+    opts.store_file_properties.attributes = False
+    opts.store_file_properties.md5 = True
+    opts.rsa_private_key = None
+    opts.rsa_public_key = 'abc'
+    opts.encryption_mode = crypto.EncryptionMode.ChunkedBlob
+
+    ase = azmodels.StorageEntity('cont')
+    ase._mode = azmodels.StorageModes.Block
+    ase._name = 'name'
+    ase2 = azmodels.StorageEntity('cont')
+    ase2._mode = azmodels.StorageModes.Block
+    ase2._name = 'name2'
+    ase.replica_targets = [ase2]
+
+    ud = upload.Descriptor(
+        lp, ase, 'uid', opts, mock.MagicMock(), mock.MagicMock())
+    em = ud.entity.encryption_metadata
+    assert ud.is_encrypted_in_regions
+    assert em.encrypted_region_size == 16
+    assert ud._chunk_size == 16 + 28
+    assert ud.entity.size == 40 + 3 * 28
+    assert ase2.size == ud.entity.size
+    assert ud._total_chunks == 3
+    assert not ud.is_one_shot_block_blob
+
+    encdata = []
+    for i in range(3):
+        offsets, _ = ud.next_offsets()
+        assert offsets.chunk_num == i
+        assert offsets.range_start == i * 44
+        assert not offsets.pad
+        start, num_bytes = ud.compute_read_range(offsets)
+        assert start == i * 16
+        assert num_bytes == (8 if i == 2 else 16)
+        data, _ = ud.read_data(offsets)
+        assert data == plaindata[start:start + num_bytes]
+        encdata.append(
+            ops.aes_gcm_encrypt_region(em.symmetric_key, i, data))
+        assert len(encdata[-1]) == offsets.num_bytes
+    assert ud.next_offsets()[0] is None
+    assert ud.md5.digest() == hashlib.md5(plaindata).digest()
+
+    # tags may be added out of order
+    for i in (2, 0, 1):
+        ud.add_region_tag(i, encdata[i])
+    _hmac = em.initialize_hmac()
+    _hmac.update(ops.aes_gcm_region_tags(16, b''.join(encdata)))
+    with mock.patch.object(
+            em, 'convert_to_json_with_mac',
+            return_value={'encmeta': 'encmeta'}) as patched_conv:
+        meta = ud.generate_metadata()
+        assert 'encmeta' in meta
+        assert patched_conv.call_args[0][1] == \
+            util.base64_encode_as_string(_hmac.digest())
+
+    # region size is bounded by the maximum chunk size for the mode
+    opts.chunk_size_bytes = upload._MAX_NONBLOCK_BLOB_CHUNKSIZE_BYTES
+    ase = azmodels.StorageEntity('cont')
+    ase._mode = azmodels.StorageModes.File
+    ase._name = 'name'
+    ud = upload.Descriptor(
+        lp, ase, 'uid', opts, mock.MagicMock(), mock.MagicMock())
+    assert ud.entity.encryption_metadata.encrypted_region_size == 40
+    assert ud._chunk_size == 40 + 28
+
+    tmpdir.join('b').write_binary(b'\0' * (4 << 20))
+    lp = upload.LocalPath(pathlib.Path(str(tmpdir)), pathlib.Path('b'))
+    ase = azmodels.StorageEntity('cont')
+    ase._mode = azmodels.StorageModes.File
+    ase._name = 'name'
+    ud = upload.Descriptor(
+        lp, ase, 'uid', opts, mock.MagicMock(), mock.MagicMock())
+    assert ud._chunk_size == upload._MAX_NONBLOCK_BLOB_CHUNKSIZE_BYTES
+    assert ud.entity.encryption_metadata.encrypted_region_size == \
+        upload._MAX_NONBLOCK_BLOB_CHUNKSIZE_BYTES - 28
+    assert ud._total_chunks == 2
+    assert ud.entity.size == (4 << 20) + 2 * 28
+
+
 def test_descriptor_compute_remote_size(tmpdir):
     tmpdir.join('a').write('z' * 32)
     lp = upload.LocalPath(pathlib.Path(str(tmpdir)), pathlib.Path('a'))
@@ -547,12 +725,14 @@ def test_descriptor_compute_remote_size(tmpdir):
     opts.chunk_size_bytes = 16
     opts.one_shot_bytes = 0
     opts.store_file_properties.md5 = True
+    opts.rsa_private_key = None
     opts.rsa_public_key = 'abc'
 
     ase = azmodels.StorageEntity('cont')
     ase._mode = azmodels.StorageModes.Block
     ase._name = 'name'
     ase._encryption = mock.MagicMock()
+    ase._encryption.is_chunked = False
     ase._encryption.symmetric_key = 'abc'
     ase2 = azmodels.StorageEntity('cont')
     ase2._mode = azmodels.StorageModes.Block
@@ -647,6 +827,20 @@ def test_descriptor_adjust_chunk_size(tmpdir):
                 ud = upload.Descriptor(
                     lp, ase, 'uid', opts, mock.MagicMock(), mock.MagicMock())
                 assert ud._chunk_size == 2
+                # adaptive chunk size is a starting point subject to the
+                # maximum number of blocks
+                ud = upload.Descriptor(
+                    lp, ase, 'uid', opts, mock.MagicMock(), mock.MagicMock(),
+                    auto_chunk_size=1)
+                assert ud._chunk_size == 2
+
+    tmpdir.join('a').write('z' * 32)
+    lp = upload.LocalPath(pathlib.Path(str(tmpdir)), pathlib.Path('a'))
+    ud = upload.Descriptor(
+        lp, ase, 'uid', opts, mock.MagicMock(), mock.MagicMock(),
+        auto_chunk_size=8)
+    assert ud._chunk_size == 8
+    assert ud._total_chunks == 4
 
     lp = upload.LocalPath(
         pathlib.Path(str(tmpdir)), pathlib.Path('-'), use_stdin=True)
@@ -666,6 +860,18 @@ def test_descriptor_adjust_chunk_size(tmpdir):
         lp, ase, 'uid', opts, mock.MagicMock(), mock.MagicMock())
     assert ud._chunk_size == 32
 
+    # adaptive chunk sizes never exceed the non-block maximum
+    with mock.patch(
+            'blobxfer.models.upload._MAX_NONBLOCK_BLOB_CHUNKSIZE_BYTES', 16):
+        ud = upload.Descriptor(
+            lp, ase, 'uid', opts, mock.MagicMock(), mock.MagicMock(),
+            auto_chunk_size=64)
+        assert ud._chunk_size == 16
+        ud = upload.Descriptor(
+            lp, ase, 'uid', opts, mock.MagicMock(), mock.MagicMock(),
+            auto_chunk_size=8)
+        assert ud._chunk_size == 8
+
     ase = azmodels.StorageEntity('cont')
     ase._mode = azmodels.StorageModes.Append
     ase._name = 'name'
@@ -763,6 +969,77 @@ def test_compute_total_chunks(tmpdir):
         ud._compute_total_chunks(1)
 
 
+def test_descriptor_delta(tmpdir):
+    tmpdir.join('a').write('abcdefghij')
+    lp = upload.LocalPath(pathlib.Path(str(tmpdir)), pathlib.Path('a'))
+
+    opts = mock.MagicMock()
+    opts.chunk_size_bytes = 2
+    opts.one_shot_bytes = 0
+    opts.store_file_properties.md5 = False
+    opts.rsa_public_key = None
+    opts.delta = False
+
+    ase = azmodels.StorageEntity('cont')
+    ase._mode = azmodels.StorageModes.Block
+    ase._name = 'name'
+    ase._encryption = None
+
+    ud = upload.Descriptor(
+        lp, ase, 'uid', opts, mock.MagicMock(), mock.MagicMock())
+    assert not ud.is_delta
+    assert ud.is_resumable
+    assert ud.delta_block_digest(0) is None
+    assert not ud.is_delta_block_unchanged(0)
+
+    def _digest(data):
+        return hashlib.md5(data).hexdigest()
+
+    # chunk size follows remote blocks and resume is disabled
+    opts.delta = True
+    remote_blocks = [
+        (_digest(b'abcd'), 4), (_digest(b'XXXX'), 4), (_digest(b'ij'), 2),
+    ]
+    ud = upload.Descriptor(
+        lp, ase, 'uid', opts, mock.MagicMock(), mock.MagicMock(),
+        remote_blocks=remote_blocks)
+    assert ud.is_delta
+    assert not ud.is_resumable
+    assert ud._chunk_size == 4
+    assert ud._total_chunks == 3
+    unchanged = []
+    while True:
+        offsets, _ = ud.next_offsets()
+        if offsets is None:
+            break
+        data, _ = ud.read_data(offsets)
+        unchanged.append(ud.compute_delta_block(offsets, data))
+    assert unchanged == [True, False, True]
+    assert ud.is_delta_block_unchanged(0)
+    assert not ud.is_delta_block_unchanged(1)
+    assert ud.delta_block_digest(1) == _digest(b'efgh')
+    assert ud.delta_block_digests == [
+        _digest(b'abcd'), _digest(b'efgh'), _digest(b'ij')]
+    assert ud.delta_unchanged == (2, 6)
+
+    # blocks not aligned to the chunk size are not reused
+    remote_blocks = [
+        (_digest(b'abcd'), 4), (None, 3), (_digest(b'hij'), 3),
+    ]
+    ud = upload.Descriptor(
+        lp, ase, 'uid', opts, mock.MagicMock(), mock.MagicMock(),
+        remote_blocks=remote_blocks)
+    assert ud._chunk_size == 4
+    assert list(ud._remote_block_digests.keys()) == [0]
+
+    # one-shot uploads are not delta uploads
+    opts.one_shot_bytes = 16
+    ud = upload.Descriptor(
+        lp, ase, 'uid', opts, mock.MagicMock(), mock.MagicMock(),
+        remote_blocks=remote_blocks)
+    assert not ud.is_delta
+
+
 def test_resume(tmpdir):
     tmpdir.join('a').write('zz')
     lp = upload.LocalPath(pathlib.Path(str(tmpdir)), pathlib.Path('a'))
@@ -800,22 +1077,24 @@ def test_resume(tmpdir):
     comp.completed = True
     comp.total_chunks = 1
     comp.chunk_size = 2
-    comp.completed_chunks = 1
+    comp.completed_chunks = -1
     resume.get_record.return_value = comp
-    ud._completed_chunks = mock.MagicMock()
     ud._src_ase = ase
     assert ud._resume() == 2
+    assert ud._chunk_size == 2
+    assert len(ud._completed_chunks) == 1
+    assert ud._completed_chunks.all(True)
 
     ase.replica_targets = [ase]
     ud = upload.Descriptor(lp, ase, 'uid', opts, mock.MagicMock(), resume)
-    ud._completed_chunks = mock.MagicMock()
     ud._src_ase = ase
     assert ud._resume() == 4
 
-    # check no encryption
+    # check no encryption state
     ase = azmodels.StorageEntity('cont')
     ase._mode = azmodels.StorageModes.Block
     ase._name = 'name'
+    opts.rsa_private_key = None
     opts.rsa_public_key = 'abc'
 
     nc = mock.MagicMock()
@@ -825,6 +1104,8 @@ def test_resume(tmpdir):
     nc.chunk_size = 1
     nc.completed_chunks = 1
 
+    nc.encryption_keys = None
+
     resume.get_record.return_value = nc
     ud = upload.Descriptor(lp, ase, 'uid', opts, mock.MagicMock(), resume)
     assert ud._resume() is None
@@ -907,6 +1188,186 @@ def test_resume(tmpdir):
     assert ud._resume() == 1
 
 
+@pytest.mark.skipif(
+    not util.resumable_hasher_supported(),
+    reason='resumable hashers unsupported')
+def test_resume_md5_state(tmpdir):
+    tmpdir.join('a').write('ab')
+    lp = upload.LocalPath(pathlib.Path(str(tmpdir)), pathlib.Path('a'))
+
+    opts = mock.MagicMock()
+    opts.chunk_size_bytes = 0
+    opts.one_shot_bytes = 0
+    opts.store_file_properties.md5 = True
+    opts.rsa_public_key = None
+
+    ase = azmodels.StorageEntity('cont')
+    ase._mode = azmodels.StorageModes.Block
+    ase._name = 'name'
+
+    # state is recorded for data which differs from the file on disk, so a
+    # successful resume shows the file was not read back
+    md5 = util.new_resumable_md5_hasher()
+    md5.update(b'z')
+    nc = mock.MagicMock()
+    nc.length = 2
+    nc.completed = False
+    nc.total_chunks = 2
+    nc.chunk_size = 1
+    cc = bitstring.BitArray(length=nc.total_chunks)
+    cc.set(True, 0)
+    nc.completed_chunks = cc.int
+    nc.local_path = lp.absolute_path
+    nc.md5hexdigest = md5.hexdigest()
+    nc.md5_state = util.export_hasher_state(md5)
+    nc.file_size = lp.total_size
+    nc.file_mtime_ns = lp.stat.st_mtime_ns
+
+    resume = mock.MagicMock()
+    resume.get_record.return_value = nc
+    ud = upload.Descriptor(lp, ase, 'uid', opts, mock.MagicMock(), resume)
+    assert ud._resume() == 1
+    ud.md5.update(b'b')
+    assert ud.md5.hexdigest() == hashlib.md5(b'zb').hexdigest()
+
+    # changed file falls back to re-hashing from the start
+    nc.file_mtime_ns += 1
+    ud = upload.Descriptor(lp, ase, 'uid', opts, mock.MagicMock(), resume)
+    assert ud._resume() is None
+
+    # state which does not match the recorded md5 is not used
+    nc.file_mtime_ns -= 1
+    nc.md5hexdigest = hashlib.md5(b'a').hexdigest()
+    nc.md5_state = util.export_hasher_state(
+        util.new_resumable_md5_hasher())
+    ud = upload.Descriptor(lp, ase, 'uid', opts, mock.MagicMock(), resume)
+    assert ud._resume() == 1
+    assert ud.md5.hexdigest() == nc.md5hexdigest
+
+
+@pytest.mark.skipif(
+    not util.resumable_hasher_supported(),
+    reason='resumable hashers unsupported')
+def test_resume_encrypted(tmpdir):
+    plaindata = os.urandom(40)
+    tmpdir.join('a').write_binary(plaindata)
+    lp = upload.LocalPath(pathlib.Path(str(tmpdir)), pathlib.Path('a'))
+    resumefile = pathlib.Path(str(tmpdir.join('resume')))
+    client = mock.MagicMock()
+
+    opts = mock.MagicMock()
+    opts.chunk_size_bytes = 16
+    opts.one_shot_bytes = 0
+    opts.store_file_properties.md5 = True
+    opts.rsa_private_key = \
+        cryptography.hazmat.primitives.asymmetric.rsa.generate_private_key(
+            public_exponent=65537, key_size=2048,
+            backend=cryptography.hazmat.backends.default_backend())
+    opts.rsa_public_key = opts.rsa_private_key.public_key()
+    opts.encryption_mode = crypto.EncryptionMode.FullBlob
+
+    def _descriptor(rmgr):
+        ase = azmodels.StorageEntity('cont')
+        ase._mode = azmodels.StorageModes.Block
+        ase._name = 'name'
+        ase._client = client
+        return upload.Descriptor(
+            lp, ase, 'uid', opts, mock.MagicMock(), rmgr)
+
+    def _upload_cbc(ud, offsets):
+        if offsets.chunk_num == 0:
+            ud.hmac_data(ud.current_iv)
+        data, _ = ud.read_data(offsets)
+        encdata = ops.aes_cbc_encrypt_data(
+            ud.entity.encryption_metadata.symmetric_key, ud.current_iv,
+            bytes(data), offsets.pad)
+        ud.complete_encrypted_chunk(offsets.chunk_num, encdata)
+        ud.complete_offset_upload(offsets.chunk_num)
+
+    # resume is disabled without a private key to unwrap keys
+    rmgr = rops.UploadResumeManager(resumefile)
+    rsa_private_key = opts.rsa_private_key
+    opts.rsa_private_key = None
+    ud = _descriptor(rmgr)
+    assert not ud.is_resumable
+    opts.rsa_private_key = rsa_private_key
+    rmgr.close()
+
+    # interrupt cbc upload after two chunks
+    rmgr = rops.UploadResumeManager(resumefile)
+    ud = _descriptor(rmgr)
+    assert ud.is_resumable
+    em = ud.entity.encryption_metadata
+    for _ in range(2):
+        offsets, _ = ud.next_offsets()
+        _upload_cbc(ud, offsets)
+    rmgr.close()
+    encdata = ops.aes_cbc_encrypt_data(
+        em.symmetric_key, em.content_encryption_iv, plaindata, True)
+    _hmac = em.initialize_hmac()
+    _hmac.update(em.content_encryption_iv)
+    _hmac.update(encdata)
+
+    # resume continues with the same keys, chaining iv and hmac
+    rmgr = rops.UploadResumeManager(resumefile)
+    ud = _descriptor(rmgr)
+    offsets, rb = ud.next_offsets()
+    assert rb == 32
+    assert offsets.chunk_num == 2
+    assert ud.entity.encryption_metadata.symmetric_key == em.symmetric_key
+    assert ud.current_iv == encdata[16:32]
+    _upload_cbc(ud, offsets)
+    assert ud.next_offsets()[0] is None
+    assert ud.hmac.digest() == _hmac.digest()
+    assert ud.md5.digest() == hashlib.md5(plaindata).digest()
+    rmgr.close()
+
+    # completed upload is finalized with the recorded state
+    rmgr = rops.UploadResumeManager(resumefile)
+    ud = _descriptor(rmgr)
+    assert ud.next_offsets() == (None, 48)
+    assert ud.hmac.digest() == _hmac.digest()
+    assert ud.md5.digest() == hashlib.md5(plaindata).digest()
+    rmgr.close()
+
+    # state is not used if the local file changed
+    os.utime(str(lp.absolute_path), ns=(1, 1))
+    lp = upload.LocalPath(pathlib.Path(str(tmpdir)), pathlib.Path('a'))
+    rmgr = rops.UploadResumeManager(resumefile)
+    ud = _descriptor(rmgr)
+    assert ud._resume() is None
+    rmgr.delete()
+
+    # interrupt chunked upload with out of order region tags
+    opts.encryption_mode = crypto.EncryptionMode.ChunkedBlob
+    rmgr = rops.UploadResumeManager(resumefile)
+    ud = _descriptor(rmgr)
+    em = ud.entity.encryption_metadata
+    encdata = []
+    for i in range(3):
+        offsets, _ = ud.next_offsets()
+        data, _ = ud.read_data(offsets)
+        encdata.append(
+            ops.aes_gcm_encrypt_region(em.symmetric_key, i, bytes(data)))
+    ud.add_region_tag(1, encdata[1])
+    ud.add_region_tag(0, encdata[0])
+    ud.complete_offset_upload(1)
+    ud.complete_offset_upload(0)
+    rmgr.close()
+    _hmac = em.initialize_hmac()
+    _hmac.update(ops.aes_gcm_region_tags(16, b''.join(encdata)))
+
+    rmgr = rops.UploadResumeManager(resumefile)
+    ud = _descriptor(rmgr)
+    offsets, rb = ud.next_offsets()
+    assert rb == 2 * 44
+    assert offsets.chunk_num == 2
+    assert ud.entity.encryption_metadata.symmetric_key == em.symmetric_key
+    ud.add_region_tag(2, encdata[2])
+    assert ud.hmac.digest() == _hmac.digest()
+    rmgr.delete()
+
+
 def test_descriptor_next_offsets(tmpdir):
     tmpdir.join('a').write('ab')
     lp = upload.LocalPath(pathlib.Path(str(tmpdir)), pathlib.Path('a'))
@@ -976,6 +1437,7 @@ def test_descriptor_next_offsets(tmpdir):
     tmpdir.join('a').write('z' * 16)
     lp = upload.LocalPath(pathlib.Path(str(tmpdir)), pathlib.Path('a'))
     opts.chunk_size_bytes = 16
+    opts.rsa_private_key = None
     opts.rsa_public_key = 'abc'
 
     ud = upload.Descriptor(
@@ -1039,6 +1501,53 @@ def test_descriptor_read_data(tmpdir):
     assert data == b'a'
     assert newoffset is None
 
+    # test read via file handle cache
+    fdc = filehandle.FileHandleCache()
+    ud2 = upload.Descriptor(
+        lp, ase, 'uid', opts, mock.MagicMock(), mock.MagicMock(),
+        fd_cache=fdc)
+    ud2._resume = mock.MagicMock()
+    ud2._resume.return_value = None
+    offsets2, _ = ud2.next_offsets()
+    offsets2, _ = ud2.next_offsets()
+    data, newoffset = ud2.read_data(offsets2)
+    assert data == b'b'
+    assert newoffset is None
+    assert fdc.num_open == 1
+    fdc.close_all()
+
+    # test read into pooled buffer for page alignment
+    pool = buffer.BufferPool()
+    pase = azmodels.StorageEntity('cont')
+    pase._mode = azmodels.StorageModes.Page
+    pase._name = 'name'
+    pase._encryption = None
+    ud3 = upload.Descriptor(
+        lp, pase, 'uid', opts, mock.MagicMock(), mock.MagicMock(),
+        fd_cache=fdc, buffer_pool=pool)
+    ud3._resume = mock.MagicMock()
+    ud3._resume.return_value = None
+    offsets3, _ = ud3.next_offsets()
+    data, newoffset = ud3.read_data(offsets3)
+    assert isinstance(data, memoryview)
+    assert data == b'a'
+    assert len(data.obj) == buffer.BufferPool.size_class(512)
+    assert ud3.md5.digest() == hashlib.md5(b'a').digest()
+    pool.release(data)
+    assert pool.retained_bytes == len(data.obj)
+
+    # test pooled buffer is returned on read failure
+    with mock.patch.object(fdc, 'preadinto', side_effect=OSError()):
+        with pytest.raises(OSError):
+            ud3.read_data(offsets3)
+    assert pool.reuses == 1
+    assert pool.retained_bytes == len(data.obj)
+
+    # test no buffer pool for aligned unencrypted data
+    offsets3 = offsets3._replace(num_bytes=512)
+    assert not ud3._use_buffer_pool(offsets3)
+    fdc.close_all()
+
     # test stdin
     with mock.patch(
             'blobxfer.STDIN', new_callable=mock.PropertyMock) as patched_stdin:
@@ -1142,10 +1651,12 @@ def test_descriptor_generate_metadata(tmpdir):
     # test enc meta
     opts.store_file_properties.attributes = False
     opts.store_file_properties.md5 = False
+    opts.rsa_private_key = None
     opts.rsa_public_key = 'abc'
     ud = upload.Descriptor(
         lp, ase, 'uid', opts, mock.MagicMock(), mock.MagicMock())
     ase.encryption_metadata = mock.MagicMock()
+    ase.encryption_metadata.is_chunked = False
     ase.encryption_metadata.convert_to_json_with_mac.return_value = {
         'encmeta': 'encmeta'
     }
@@ -1156,6 +1667,7 @@ def test_descriptor_generate_metadata(tmpdir):
         lp, ase, 'uid', opts, mock.MagicMock(), mock.MagicMock())
     ud.hmac = None
     ase.encryption_metadata = mock.MagicMock()
+    ase.encryption_metadata.is_chunked = False
     ase.encryption_metadata.convert_to_json_with_mac.return_value = {
         'encmeta': 'encmeta'
     }
@@ -1166,6 +1678,7 @@ def test_descriptor_generate_metadata(tmpdir):
     ud = upload.Descriptor(
         lp, ase, 'uid', opts, mock.MagicMock(), mock.MagicMock())
     ase.encryption_metadata = mock.MagicMock()
+    ase.encryption_metadata.is_chunked = False
     ase.encryption_metadata.convert_to_json_with_mac.return_value = {
         'encmeta': 'encmeta'
     }
@@ -0,0 +1,206 @@
+# coding=utf-8
+"""Tests for work queue"""
+
+# stdlib imports
+import queue
+import threading
+# non-stdlib imports
+import pytest
+# local imports
+# module under test
+import blobxfer.models.workqueue as workqueue
+
+
+def test_work_queue():
+    a = workqueue.WorkQueue()
+    assert not a.terminated
+
+    a.put(1)
+    assert a.qsize() == 1
+    assert a.get() == 1
+
+    with pytest.raises(queue.Empty):
+        a.get(block=False)
+
+    with pytest.raises(queue.Empty):
+        a.get(timeout=0.01)
+
+    # blocked consumer is woken by producer
+    result = []
+    thr = threading.Thread(target=lambda: result.append(a.get()))
+    thr.start()
+    a.put(2)
+    thr.join(5)
+    assert not thr.is_alive()
+    assert result == [2]
+
+    # blocked consumer is woken by termination
+    result = []
+
+    def _consume():
+        try:
+            a.get()
+        except queue.Empty:
+            result.append(None)
+
+    thr = threading.Thread(target=_consume)
+    thr.start()
+    a.terminate()
+    thr.join(5)
+    assert not thr.is_alive()
+    assert result == [None]
+    assert a.terminated
+
+    # items are still retrievable after termination
+    a.put(3)
+    assert a.get() == 3
+    with pytest.raises(queue.Empty):
+        a.get()
+
+
+def test_backpressure():
+    lock = threading.Lock()
+    pending = set([0, 1, 2])
+    a = workqueue.Backpressure(lock)
+    assert not a.terminated
+
+    assert a.wait(lambda: len(pending) <= 3)
+
+    # blocked waiter is woken when state changes
+    result = []
+    thr = threading.Thread(
+        target=lambda: result.append(a.wait(lambda: len(pending) <= 1)))
+    thr.start()
+    with lock:
+        pending.remove(0)
+        a.notify()
+    with lock:
+        pending.remove(1)
+        a.notify()
+    thr.join(5)
+    assert not thr.is_alive()
+    assert result == [True]
+
+    # blocked waiter is woken by termination
+    result = []
+    thr = threading.Thread(
+        target=lambda: result.append(a.wait(lambda: len(pending) == 0)))
+    thr.start()
+    a.terminate()
+    thr.join(5)
+    assert not thr.is_alive()
+    assert result == [False]
+    assert a.terminated
+    assert not a.wait(lambda: True)
+
+
+def test_memory_budget():
+    a = workqueue.MemoryBudget(None)
+    assert not a.limited
+    assert a.max_bytes == 0
+    assert a.acquire(1 << 40)
+    assert a.in_use == 1 << 40
+    a.release(1 << 40)
+    assert a.in_use == 0
+    assert a.peak == 1 << 40
+
+    a = workqueue.MemoryBudget(10)
+    assert a.limited
+    assert a.max_bytes == 10
+    assert a.acquire(6)
+    assert a.acquire(4)
+    assert a.in_use == 10
+
+    # blocked acquirer is woken when enough bytes are released
+    result = []
+    thr = threading.Thread(target=lambda: result.append(a.acquire(5)))
+    thr.start()
+    a.release(4)
+    assert a.in_use == 6
+    a.release(6)
+    thr.join(5)
+    assert not thr.is_alive()
+    assert result == [True]
+    assert a.in_use == 5
+    a.release(5)
+
+    # oversized requests are granted when nothing is in-flight
+    assert a.acquire(20)
+    assert a.peak == 20
+    a.release(20)
+
+    # blocked acquirer is woken by termination
+    a.acquire(10)
+    result = []
+    thr = threading.Thread(target=lambda: result.append(a.acquire(1)))
+    thr.start()
+    a.terminate()
+    thr.join(5)
+    assert not thr.is_alive()
+    assert result == [False]
+    assert not a.acquire(0)
+    assert a.in_use == 10
+
+
+def test_memory_budget_try_acquire():
+    a = workqueue.MemoryBudget(None)
+    assert a.try_acquire(1 << 40)
+    assert a.in_use == 1 << 40
+
+    a = workqueue.MemoryBudget(10)
+    assert a.try_acquire(20)
+    assert not a.try_acquire(1)
+    a.release(20)
+    assert a.try_acquire(6)
+    assert not a.try_acquire(5)
+    assert a.try_acquire(5, force=True)
+    assert a.in_use == 11
+    assert a.peak == 20
+    a.terminate()
+    assert not a.try_acquire(0, force=True)
+
+
+def test_relay_pipe():
+    a = workqueue.RelayPipe(10, 4)
+    assert len(a) == 10
+    assert a.error is None
+
+    # reads wait for a full buffer and split writes
+    assert a.write(b'abc')
+    result = []
+    thr = threading.Thread(target=lambda: result.append(a.read(4)))
+    thr.start()
+    assert a.write(b'de')
+    thr.join(5)
+    assert not thr.is_alive()
+    assert result == [b'abcd']
+
+    # blocked writer is woken when the buffer drains
+    assert a.write(b'fgh')
+    result = []
+    thr = threading.Thread(target=lambda: result.append(a.write(b'ij')))
+    thr.start()
+    assert a.read(1) == b'e'
+    thr.join(5)
+    assert not thr.is_alive()
+    assert result == [True]
+
+    # reads are limited to the buffer size
+    assert a.read(-1) == b'fghi'
+    a.close()
+    assert a.read(4) == b'j'
+    assert a.read(4) == b''
+
+    # abort wakes the writer and raises in the reader
+    a = workqueue.RelayPipe(10, 4)
+    assert a.write(b'abcd')
+    result = []
+    thr = threading.Thread(target=lambda: result.append(a.write(b'e')))
+    thr.start()
+    a.abort(ValueError('oops'))
+    thr.join(5)
+    assert not thr.is_alive()
+    assert result == [False]
+    assert isinstance(a.error, ValueError)
+    with pytest.raises(ValueError):
+        a.read(1)
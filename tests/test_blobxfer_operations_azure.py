@@ -8,6 +8,7 @@ import pathlib
 import azure.storage.blob
 import azure.storage.file
 import pytest
+import requests
 # local imports
 import blobxfer.models.metadata as md
 import blobxfer.models.options
@@ -622,14 +623,19 @@ def test_azuresourcepath_url():
 
     sc = blobxfer.models.options.SyncCopy(
         access_tier=None,
+        async_copy=False,
+        delete_during_transfer=None,
         delete_extraneous_destination=None,
         delete_only=None,
+        delta=None,
         dest_mode=None,
         mode=None,
         overwrite=None,
         recursive=None,
+        remote_index=None,
         rename=None,
         server_side_copy=True,
+        stream_relay=False,
         strip_components=0,
     )
 
@@ -653,3 +659,74 @@ def test_destinationpath():
         dp.add_path_with_storage_account('/remote/path2/', sa)
 
     assert dp.lookup_storage_account('/remote/path/') is not None
+
+
+@mock.patch('time.sleep')
+def test_get_source_range_stream(patched_sleep):
+    src_ase = mock.MagicMock()
+    src_ase.path = 'https://host/remote/path'
+    src_ase.is_arbitrary_url = True
+    src_ase.snapshot = None
+    src_ase.client._httpclient.timeout = 10
+    session = src_ase.client._httpclient.session
+    session.get.return_value.status_code = 206
+
+    offsets = mock.MagicMock()
+    offsets.range_start = 0
+    offsets.range_end = 9
+
+    resp = azops.get_source_range_stream(src_ase, offsets)
+    assert resp == session.get.return_value
+    assert session.get.call_args[0][0] == src_ase.path
+    assert session.get.call_args[1]['headers']['Range'] == 'bytes=0-9'
+    assert session.get.call_args[1]['params'] is None
+    assert session.get.call_args[1]['stream']
+    assert session.get.call_args[1]['timeout'] == 10
+    assert src_ase.client.request_callback.call_count == 1
+
+    src_ase.snapshot = 'snap'
+    src_ase.mode = azmodels.StorageModes.Page
+    azops.get_source_range_stream(src_ase, offsets, timeout=5)
+    assert session.get.call_args[1]['params'] == {'snapshot': 'snap'}
+    assert session.get.call_args[1]['timeout'] == 5
+
+    src_ase.mode = azmodels.StorageModes.File
+    azops.get_source_range_stream(src_ase, offsets)
+    assert session.get.call_args[1]['params'] == {'sharesnapshot': 'snap'}
+
+    # range ignored by source
+    session.get.return_value.status_code = 200
+    with pytest.raises(RuntimeError):
+        azops.get_source_range_stream(src_ase, offsets)
+    assert session.get.return_value.close.call_count == 1
+    assert src_ase.client.retry.call_count == 0
+
+    # throttled and failed requests are retried by the client retry policy
+    throttled = mock.MagicMock()
+    throttled.status_code = 503
+    throttled.headers = {'Retry-After': '1'}
+    ok = mock.MagicMock()
+    ok.status_code = 206
+    session.get.reset_mock()
+    session.get.return_value = None
+    session.get.side_effect = [
+        throttled, requests.ConnectionError('reset'), ok]
+    src_ase.client.request_callback.reset_mock()
+    src_ase.client.retry.side_effect = [0.1, 0.2]
+    assert azops.get_source_range_stream(src_ase, offsets) == ok
+    assert session.get.call_count == 3
+    assert src_ase.client.request_callback.call_count == 3
+    assert throttled.close.call_count == 1
+    context = src_ase.client.retry.call_args_list[0][0][0]
+    assert context.response is None
+    assert isinstance(context.exception, requests.ConnectionError)
+    assert patched_sleep.call_count == 2
+
+    # retries exhausted
+    session.get.side_effect = [throttled]
+    src_ase.client.retry.side_effect = [None]
+    with pytest.raises(RuntimeError):
+        azops.get_source_range_stream(src_ase, offsets)
+    context = src_ase.client.retry.call_args[0][0]
+    assert context.response.status == 503
+    assert context.response.headers == {'retry-after': '1'}
@@ -141,6 +141,10 @@ def test_list_all_blobs():
 
     assert len(list(ops.list_all_blobs(client, 'cont'))) == 2
 
+    client.list_blobs.reset_mock()
+    assert len(list(ops.list_all_blobs(client, 'cont', prefix='vpath'))) == 2
+    assert client.list_blobs.call_args[1]['prefix'] == 'vpath'
+
 
 def test_get_blob_range():
     ase = mock.MagicMock()
@@ -183,3 +187,23 @@ def test_create_container():
 
     ops.create_container(ase, cc)
     assert len(cc) == 2
+
+
+def test_start_copy_blob():
+    ase = mock.MagicMock()
+    ase.client.copy_blob.return_value.id = 'cid'
+    assert ops.start_copy_blob('url', ase) == 'cid'
+    assert ase.client.copy_blob.call_args[1]['copy_source'] == 'url'
+
+
+def test_get_copy_properties():
+    ase = mock.MagicMock()
+    ret = mock.MagicMock()
+    ase.client.get_blob_properties.return_value = ret
+    assert ops.get_copy_properties(ase) == ret.properties.copy
+
+
+def test_abort_copy_blob():
+    ase = mock.MagicMock()
+    ops.abort_copy_blob(ase, 'cid')
+    assert ase.client.abort_copy_blob.call_args[1]['copy_id'] == 'cid'
@@ -2,6 +2,7 @@
 """Tests for operations: block blob"""
 
 # stdlib imports
+import datetime
 import unittest.mock as mock
 # non-stdlib imports
 import azure.storage.common
@@ -44,6 +45,26 @@ def test_create_client():
 
 def test_format_block_id():
     assert '00000001' == ops._format_block_id(1)
+    digest = 'a' * 32
+    assert '00000001-' + digest == ops._format_block_id(1, digest)
+    assert ops.parse_block_id_digest(
+        ops._format_block_id(1, digest)) == digest
+    assert ops.parse_block_id_digest('00000001') is None
+    assert ops.parse_block_id_digest('00000001-xyz') is None
+
+
+def test_get_source_url():
+    src_ase = mock.MagicMock()
+    src_ase.path = 'https://host/remote/path'
+    src_ase.is_arbitrary_url = True
+    assert ops.get_source_url(src_ase) == src_ase.path
+
+    src_ase.is_arbitrary_url = False
+    src_ase.client.account_key = None
+    src_ase.client.sas_token = 'sastoken'
+    src_ase.client.primary_endpoint = 'ep'
+    src_ase.path = 'cont/blob'
+    assert ops.get_source_url(src_ase) == 'https://ep/cont/blob?sastoken'
 
 
 def test_put_block_from_url():
@@ -63,10 +84,17 @@ def test_put_block_from_url():
     src_ase.is_arbitrary_url = False
 
     src_ase.client.account_key = 'key'
-    src_ase.client.generate_blob_shared_access_signature.return_value = 'sas'
+    src_ase.client.primary_endpoint = 'ep'
+    src_ase.container = 'cont'
+    src_ase.path = 'cont/blob'
+    src_ase.mode = blobxfer.models.azure.StorageModes.Block
+    src_ase.client.generate_container_shared_access_signature.\
+        return_value = 'sas'
 
     ops.put_block_from_url(src_ase, dst_ase, offsets)
     assert dst_ase.client.put_block_from_url.call_count == 2
+    assert dst_ase.client.put_block_from_url.call_args[1][
+        'copy_source_url'] == 'https://ep/cont/blob?sas'
 
     src_ase.client.account_key = None
     src_ase.client.sas_token = 'sastoken'
@@ -77,10 +105,37 @@ def test_put_block_from_url():
     src_ase.client.account_key = 'key'
     src_ase.client.sas_token = None
     src_ase.mode = blobxfer.models.azure.StorageModes.File
-    src_ase.client.generate_file_shared_access_signature.return_value = 'sas'
+    src_ase.client.generate_share_shared_access_signature.return_value = 'sas'
 
     ops.put_block_from_url(src_ase, dst_ase, offsets)
     assert dst_ase.client.put_block_from_url.call_count == 4
+    assert src_ase.client.generate_share_shared_access_signature.\
+        call_count == 1
+
+
+def test_source_sas_cache():
+    cache = ops._SourceSasCache()
+    src_ase = mock.MagicMock()
+    src_ase.client.primary_endpoint = 'ep'
+    src_ase.container = 'cont'
+    src_ase.mode = blobxfer.models.azure.StorageModes.Block
+    gen = src_ase.client.generate_container_shared_access_signature
+    gen.side_effect = ['sas1', 'sas2']
+
+    # tokens are reused across entities of the same container
+    assert cache.get(src_ase) == 'sas1'
+    src_ase.name = 'other'
+    assert cache.get(src_ase) == 'sas1'
+    assert gen.call_count == 1
+
+    # tokens about to expire are refreshed
+    key = ('ep', 'cont', False)
+    cache._tokens[key] = (
+        'sas1', datetime.datetime.utcnow() + datetime.timedelta(minutes=1))
+    assert cache.get(src_ase) == 'sas2'
+    assert gen.call_count == 2
+    assert cache._tokens[key][1] > (
+        datetime.datetime.utcnow() + ops._SOURCE_SAS_REFRESH_MARGIN)
 
 
 def test_put_block_list():
@@ -88,6 +143,13 @@ def test_put_block_list():
     ase.name = 'abc'
     ops.put_block_list(ase, 1, None, None)
     assert ase.client.put_block_list.call_count == 1
+    block_list = ase.client.put_block_list.call_args[1]['block_list']
+    assert [x.id for x in block_list] == ['00000000', '00000001']
+
+    ops.put_block_list(ase, 1, None, None, digests=['a' * 32, 'b' * 32])
+    block_list = ase.client.put_block_list.call_args[1]['block_list']
+    assert [x.id for x in block_list] == [
+        '00000000-' + 'a' * 32, '00000001-' + 'b' * 32]
 
 
 def test_get_committed_block_list():
@@ -101,3 +163,18 @@ def test_get_committed_block_list():
     ase.name = 'abc?snapshot=123'
     gbl.committed_blocks = 2
     assert ops.get_committed_block_list(ase) == 2
+
+
+def test_get_committed_block_digests():
+    ase = mock.MagicMock()
+    ase.name = 'abc'
+    b1 = mock.MagicMock()
+    b1.id = '00000000-' + 'a' * 32
+    b1.size = 4
+    b2 = mock.MagicMock()
+    b2.id = '00000001'
+    b2.size = 2
+    gbl = mock.MagicMock()
+    gbl.committed_blocks = [b1, b2]
+    ase.client.get_block_list.return_value = gbl
+    assert ops.get_committed_block_digests(ase) == [('a' * 32, 4), (None, 2)]
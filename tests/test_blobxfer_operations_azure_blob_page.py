@@ -39,3 +39,17 @@ def test_create_client():
     assert client._USER_AGENT_STRING.startswith(
         'blobxfer/{}'.format(blobxfer.version.__version__))
     assert client._httpclient.proxies is None
+
+
+def test_get_page_ranges():
+    ase = mock.MagicMock()
+    ase.name = 'abc'
+    ase.snapshot = None
+    ase.client.get_page_ranges.return_value = [1]
+    assert ops.get_page_ranges(ase) == [1]
+    assert ase.client.get_page_ranges.call_args[1]['snapshot'] is None
+
+    ase.snapshot = '123'
+    assert ops.get_page_ranges(ase) == [1]
+    assert ase.client.get_page_ranges.call_args[1]['blob_name'] == 'abc'
+    assert ase.client.get_page_ranges.call_args[1]['snapshot'] == '123'
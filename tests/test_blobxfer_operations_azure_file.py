@@ -175,6 +175,16 @@ def test_list_all_files():
         i += 1
     assert i == 1
 
+    client.list_directories_and_files.side_effect = [
+        [
+            azure.storage.file.models.File(name='a'),
+        ],
+    ]
+    files = list(ops.list_all_files(client, 'fshare', prefix='dir'))
+    assert [pathlib.Path(f) for f in files] == [pathlib.Path('dir/a')]
+    assert client.list_directories_and_files.call_args[1][
+        'directory_name'] == 'dir'
+
 
 @mock.patch(
     'blobxfer.operations.azure.file.check_if_single_file',
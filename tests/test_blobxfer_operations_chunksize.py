@@ -0,0 +1,123 @@
+# coding=utf-8
+"""Tests for chunk size operations"""
+
+# stdlib imports
+import unittest.mock as mock
+# non-stdlib imports
+# local imports
+import blobxfer.retry
+# module under test
+import blobxfer.operations.chunksize as ops
+
+_MB = 1048576
+
+
+def _sizer(default=8 * _MB, maximum=64 * _MB):
+    return ops.AdaptiveChunkSizer(
+        default, maximum, 'test',
+        throttle_counter=blobxfer.retry.ThrottleCounter())
+
+
+def _record(sizer, overhead, bandwidth, sizes):
+    for size in sizes:
+        sizer.record(size, overhead + size / bandwidth)
+
+
+def test_probing():
+    sizer = _sizer()
+    assert sizer.model is None
+    assert sizer.next_chunk_size() == 8 * _MB
+    assert sizer.next_chunk_size() == 2 * _MB
+    assert sizer.next_chunk_size() == 8 * _MB
+
+    # invalid samples are ignored
+    sizer.record(0, 1)
+    sizer.record(1, 0)
+    # samples of similar sizes cannot separate overhead from bandwidth
+    _record(sizer, 0.05, 10 * _MB, [8 * _MB] * 16)
+    assert sizer.model is None
+
+    sizer = ops.AdaptiveChunkSizer(
+        _MB, 64 * _MB, 'test', minimum=4 * _MB,
+        throttle_counter=blobxfer.retry.ThrottleCounter())
+    assert sizer.next_chunk_size() == _MB
+    assert sizer.next_chunk_size() == _MB
+
+
+def test_model():
+    # high latency link favors larger chunks
+    sizer = _sizer()
+    _record(sizer, 0.2, 50 * _MB, [8 * _MB, 2 * _MB] * 4)
+    model = sizer.model
+    assert model is not None
+    assert model.samples == 8
+    assert abs(model.overhead - 0.2) < 1e-6
+    assert abs(model.bandwidth - 50 * _MB) < 1
+    # growth is limited to double per fit
+    assert model.chunk_size == 16 * _MB
+    assert sizer.next_chunk_size() == 16 * _MB
+    _record(sizer, 0.2, 50 * _MB, [8 * _MB, 2 * _MB])
+    assert sizer.model.samples == 10
+    assert sizer.next_chunk_size() == 64 * _MB
+
+    # low latency link settles on smaller chunks aligned to the minimum
+    sizer = _sizer()
+    _record(sizer, 0.01, 20 * _MB, [8 * _MB, 2 * _MB] * 4)
+    # 0.01s * 20MiB/s * 9 = 1.8MiB
+    assert sizer.next_chunk_size() == _MB
+
+    sizer = _sizer()
+    _record(sizer, 0.05, 10 * _MB, [8 * _MB, 2 * _MB] * 4)
+    assert sizer.next_chunk_size() == 4 * _MB
+
+    # latency independent of size falls back to the default
+    sizer = _sizer()
+    _record(sizer, 0.05, float('inf'), [8 * _MB, 2 * _MB] * 4)
+    assert sizer.model.bandwidth is None
+    assert sizer.next_chunk_size() == 8 * _MB
+
+    # latency not growing with size keeps the previous model
+    sizer = _sizer()
+    _record(sizer, 0.05, 10 * _MB, [8 * _MB, 2 * _MB] * 4)
+    model = sizer.model
+    for _ in range(4):
+        sizer.record(2 * _MB, 10)
+        sizer.record(8 * _MB, 0.01)
+    assert sizer.model == model
+    assert sizer.next_chunk_size() == 4 * _MB
+
+    # negligible overhead keeps the default
+    sizer = _sizer()
+    for size in [8 * _MB, 2 * _MB] * 4:
+        sizer.record(size, size / (10 * _MB) - 0.01)
+    assert sizer.model.overhead == 0
+    assert sizer.next_chunk_size() == 8 * _MB
+
+
+def test_throttled():
+    counter = blobxfer.retry.ThrottleCounter()
+    sizer = ops.AdaptiveChunkSizer(
+        8 * _MB, 64 * _MB, 'test', throttle_counter=counter)
+    _record(sizer, 0.2, 50 * _MB, [8 * _MB, 2 * _MB] * 5)
+    assert sizer.next_chunk_size() == 64 * _MB
+    counter.increment(503)
+    assert sizer.next_chunk_size() == 32 * _MB
+    counter.increment(429)
+    assert sizer.next_chunk_size() == 16 * _MB
+    # recovers once throttling subsides
+    assert sizer.next_chunk_size() == 32 * _MB
+    assert sizer.next_chunk_size() == 64 * _MB
+    assert sizer.next_chunk_size() == 64 * _MB
+
+    # scale is bounded by the minimum chunk size
+    for _ in range(10):
+        counter.increment(503)
+        assert sizer.next_chunk_size() >= _MB
+    assert sizer._throttle_scale == 64
+
+
+def test_global_throttle_counter():
+    with mock.patch('blobxfer.retry.throttle_counter') as patched_tc:
+        patched_tc.total = 0
+        sizer = ops.AdaptiveChunkSizer(8 * _MB, 64 * _MB, 'test')
+        assert sizer._throttle_counter == patched_tc
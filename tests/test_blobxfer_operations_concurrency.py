@@ -0,0 +1,161 @@
+# coding=utf-8
+"""Tests for concurrency operations"""
+
+# stdlib imports
+import threading
+import unittest.mock as mock
+# non-stdlib imports
+import pytest
+# local imports
+import blobxfer.retry
+# module under test
+import blobxfer.operations.concurrency as ops
+
+
+def _record(acc, nbytes, latency, count):
+    for _ in range(count):
+        acc.record(nbytes, latency)
+
+
+def test_percentile():
+    assert ops._percentile([], 50) == 0.0
+    values = list(range(1, 101))
+    assert ops._percentile(values, 50) == 50
+    assert ops._percentile(values, 95) == 95
+    assert ops._percentile([3], 95) == 3
+
+
+def test_controller_bounds():
+    with pytest.raises(ValueError):
+        ops.AdaptiveConcurrencyController(1, 4, 'test', minimum=0)
+    with pytest.raises(ValueError):
+        ops.AdaptiveConcurrencyController(1, 1, 'test', minimum=2)
+
+    acc = ops.AdaptiveConcurrencyController(0, 4, 'test')
+    assert acc.limit == 1
+    acc = ops.AdaptiveConcurrencyController(8, 4, 'test')
+    assert acc.limit == 4
+    assert acc.maximum == 4
+    assert acc.last_decision is None
+
+
+def test_controller_gate():
+    acc = ops.AdaptiveConcurrencyController(1, 2, 'test')
+    assert acc.acquire()
+    assert acc.active == 1
+
+    admitted = []
+
+    def _worker():
+        admitted.append(acc.acquire())
+
+    thr = threading.Thread(target=_worker)
+    thr.start()
+    thr.join(0.2)
+    # second worker is held until released
+    assert thr.is_alive()
+    acc.release()
+    thr.join(2)
+    assert not thr.is_alive()
+    assert admitted == [True]
+    acc.release()
+    assert acc.active == 0
+
+    # termination wakes waiters without admitting them
+    assert acc.acquire()
+    thr = threading.Thread(target=_worker)
+    thr.start()
+    acc.terminate()
+    thr.join(2)
+    assert not thr.is_alive()
+    assert admitted == [True, False]
+    assert not acc.acquire()
+    acc.terminate()
+
+
+def test_controller_aimd():
+    tc = blobxfer.retry.ThrottleCounter()
+    acc = ops.AdaptiveConcurrencyController(
+        4, 8, 'test', throttle_counter=tc)
+    acc._last_time = 0
+
+    # idle
+    d = acc.evaluate(now=1)
+    assert d.action == 'hold'
+    assert d.reason == 'idle'
+
+    # underutilized: not all admitted workers were busy
+    acc.acquire()
+    acc.release()
+    _record(acc, 1048576, 0.1, 10)
+    d = acc.evaluate(now=2)
+    assert d.action == 'hold'
+    assert d.reason == 'underutilized'
+    assert d.samples == 10
+    assert d.goodput == 10485760
+
+    # saturated with stable latency: additive increase
+    for _ in range(4):
+        acc.acquire()
+    _record(acc, 1048576, 0.1, 10)
+    d = acc.evaluate(now=3)
+    assert d.action == 'increase'
+    assert d.previous_limit == 4
+    assert d.limit == 5
+    assert acc.limit == 5
+    acc.acquire()
+
+    # increase did not improve goodput: undo it
+    _record(acc, 1048576, 0.1, 5)
+    d = acc.evaluate(now=4)
+    assert d.action == 'decrease'
+    assert d.reason == 'goodput regression'
+    assert d.limit == 4
+
+    # latency inflation without goodput gain: multiplicative decrease
+    _record(acc, 1048576, 0.5, 5)
+    d = acc.evaluate(now=5)
+    assert d.action == 'decrease'
+    assert d.reason == 'latency inflation'
+    assert d.limit == 2
+    assert d.latency_p50 == 0.5
+
+    # throttling: multiplicative decrease down to minimum
+    tc.increment(503)
+    _record(acc, 1048576, 0.1, 5)
+    d = acc.evaluate(now=6)
+    assert d.action == 'decrease'
+    assert d.reason == 'throttled'
+    assert d.throttled == 1
+    assert d.limit == 1
+    tc.increment(429)
+    d = acc.evaluate(now=7)
+    assert d.action == 'hold'
+    assert d.limit == 1
+
+    # at maximum
+    acc = ops.AdaptiveConcurrencyController(
+        2, 2, 'test', throttle_counter=tc)
+    acc._last_time = 0
+    acc.acquire()
+    acc.acquire()
+    _record(acc, 1, 0.1, 1)
+    d = acc.evaluate(now=1)
+    assert d.action == 'hold'
+    assert d.reason == 'at maximum'
+
+
+def test_controller_decision_loop():
+    tc = blobxfer.retry.ThrottleCounter()
+    acc = ops.AdaptiveConcurrencyController(
+        1, 2, 'test', interval=0.01, throttle_counter=tc)
+    with mock.patch.object(acc, 'evaluate') as patched_eval:
+        acc.start()
+        for _ in range(100):
+            if patched_eval.call_count > 0:
+                break
+            threading.Event().wait(0.01)
+        acc.terminate()
+        acc._thread.join(2)
+    assert patched_eval.call_count > 0
+    assert not acc._thread.is_alive()
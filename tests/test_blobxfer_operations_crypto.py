@@ -7,8 +7,11 @@ import os
 import time
 # non-stdlib imports
 import cryptography.hazmat.primitives.asymmetric.rsa
+import pytest
 # local imports
 import blobxfer.models.download
+import blobxfer.models.offload
+import blobxfer.models.upload
 # module under test
 import blobxfer.operations.crypto as ops
 
@@ -54,6 +57,16 @@ def test_pkcs7_padding():
     assert buf == buf2
 
 
+def test_pkcs7_pad_into():
+    for length in (0, 15, 16, 31):
+        data = os.urandom(length)
+        buf = memoryview(bytearray(length + 16))
+        buf[:length] = data
+        pbuf = ops.pkcs7_pad_into(buf, length)
+        assert pbuf.obj is buf.obj
+        assert pbuf == ops.pkcs7_pad(data)
+
+
 def test_aes_cbc_encryption():
     enckey = ops.aes256_generate_random_key()
     assert len(enckey) == ops._AES256_KEYLENGTH_BYTES
@@ -90,6 +103,38 @@ def test_aes_cbc_encryption():
     assert decdata == plaindata
 
 
+def test_aes_gcm_regions():
+    enckey = ops.aes256_generate_random_key()
+    plaindata = os.urandom(40)
+
+    # encrypt three regions, the last one short
+    encdata = b''.join([
+        ops.aes_gcm_encrypt_region(enckey, 5, plaindata[:16]),
+        ops.aes_gcm_encrypt_region(enckey, 6, plaindata[16:32]),
+        ops.aes_gcm_encrypt_region(enckey, 7, plaindata[32:]),
+    ])
+    assert len(encdata) == 40 + 3 * 28
+    tags = ops.aes_gcm_region_tags(16, encdata)
+    assert tags == encdata[28:44] + encdata[72:88] + encdata[108:]
+    assert ops.aes_gcm_decrypt_regions(enckey, 5, 16, encdata) == plaindata
+    assert ops.aes_gcm_decrypt_regions(
+        enckey, 6, 16, encdata[44:]) == plaindata[16:]
+
+    # regions are bound to their position
+    with pytest.raises(RuntimeError):
+        ops.aes_gcm_decrypt_regions(enckey, 6, 16, encdata[:44])
+
+    # tampered data
+    tampered = bytearray(encdata)
+    tampered[20] ^= 1
+    with pytest.raises(RuntimeError):
+        ops.aes_gcm_decrypt_regions(enckey, 5, 16, tampered)
+
+    # truncated region
+    with pytest.raises(RuntimeError):
+        ops.aes_gcm_decrypt_regions(enckey, 5, 16, encdata[:60])
+
+
 def test_cryptooffload_decrypt(tmpdir):
     symkey = ops.aes256_generate_random_key()
     iv = os.urandom(16)
@@ -124,7 +169,7 @@ def test_cryptooffload_decrypt(tmpdir):
                 time.sleep(0.3)
                 i -= 1
                 continue
-            assert result == (str(bfile), offsets)
+            assert result == (str(bfile), offsets, None)
             checked = True
             break
         assert checked
@@ -134,3 +179,141 @@ def test_cryptooffload_decrypt(tmpdir):
     finally:
         if a is not None:
             a.finalize_processes()
+
+
+def test_cryptooffload_regions(tmpdir):
+    symkey = ops.aes256_generate_random_key()
+    plaindata = os.urandom(48)
+    afile = tmpdir.join('a')
+    afile.write(plaindata, mode='wb')
+    bfile = tmpdir.join('b')
+    bfile.ensure(file=True)
+
+    def _wait_for_result(offload):
+        for _ in range(33):
+            result = offload.pop_done_queue()
+            if result is not None:
+                return result
+            time.sleep(0.3)
+        return None
+
+    a = None
+    try:
+        a = ops.CryptoOffload(1)
+        # encrypt the second region of the file
+        uloffsets = blobxfer.models.upload.Offsets(
+            chunk_num=1,
+            num_bytes=16 + 28,
+            range_end=87,
+            range_start=44,
+            pad=False,
+        )
+        a.add_encrypt_chunk('uid', str(afile), 16, uloffsets, 16, symkey)
+        uid, offsets, fpath, error = _wait_for_result(a)
+        assert uid == 'uid'
+        assert offsets == uloffsets
+        assert error is None
+        with open(fpath, 'rb') as fd:
+            encdata = fd.read()
+        os.unlink(fpath)
+        assert len(encdata) == 44
+        assert ops.aes_gcm_decrypt_regions(
+            symkey, 1, 16, encdata) == plaindata[16:32]
+
+        # decrypt the region into its local position
+        cfile = tmpdir.join('c')
+        cfile.write(encdata, mode='wb')
+        dloffsets = blobxfer.models.download.Offsets(
+            chunk_num=1,
+            fd_start=16,
+            num_bytes=44,
+            range_end=87,
+            range_start=44,
+            unpad=False,
+        )
+        a.add_decrypt_regions_chunk(
+            str(bfile), 0, dloffsets, symkey, 1, 16, str(cfile))
+        result = _wait_for_result(a)
+        assert result == (str(bfile), dloffsets, None)
+        assert not cfile.check()
+        assert bfile.read(mode='rb')[16:] == plaindata[16:32]
+
+        # decrypting as the wrong region fails
+        cfile.write(encdata, mode='wb')
+        a.add_decrypt_regions_chunk(
+            str(bfile), 0, dloffsets, symkey, 2, 16, str(cfile))
+        result = _wait_for_result(a)
+        assert result[2] is not None
+    finally:
+        if a is not None:
+            a.finalize_processes()
+
+
+def test_cryptooffload_shared_memory(tmpdir):
+    symkey = ops.aes256_generate_random_key()
+    plaindata = os.urandom(48)
+    afile = tmpdir.join('a')
+    afile.write(plaindata, mode='wb')
+    bfile = tmpdir.join('b')
+    bfile.ensure(file=True)
+
+    def _wait_for_result(offload):
+        for _ in range(33):
+            result = offload.pop_done_queue()
+            if result is not None:
+                return result
+            time.sleep(0.3)
+        return None
+
+    a = None
+    try:
+        a = ops.CryptoOffload(1, slot_size=64)
+        assert a.ring is not None
+        num_slots = a.ring.free_slots
+        # encrypted output is returned in a slot
+        uloffsets = blobxfer.models.upload.Offsets(
+            chunk_num=1,
+            num_bytes=16 + 28,
+            range_end=87,
+            range_start=44,
+            pad=False,
+        )
+        a.add_encrypt_chunk('uid', str(afile), 16, uloffsets, 16, symkey)
+        uid, offsets, source, error = _wait_for_result(a)
+        assert error is None
+        assert isinstance(source, blobxfer.models.offload.SharedMemorySlot)
+        assert a.ring.free_slots == num_slots - 1
+        encdata = a.retrieve_data(source)
+        assert a.ring.free_slots == num_slots
+        assert ops.aes_gcm_decrypt_regions(
+            symkey, 1, 16, encdata) == plaindata[16:32]
+
+        # staged encrypted data is decrypted and its slot released
+        dloffsets = blobxfer.models.download.Offsets(
+            chunk_num=1,
+            fd_start=16,
+            num_bytes=44,
+            range_end=87,
+            range_start=44,
+            unpad=False,
+        )
+        source = a.stage_data(encdata)
+        assert a.ring.free_slots == num_slots - 1
+        a.add_decrypt_regions_chunk(
+            str(bfile), 0, dloffsets, symkey, 1, 16, source)
+        result = _wait_for_result(a)
+        assert result == (str(bfile), dloffsets, None)
+        assert a.ring.free_slots == num_slots
+        assert bfile.read(mode='rb')[16:] == plaindata[16:32]
+
+        # data larger than a slot overflows
+        assert a.stage_data(b'\0' * 65) is None
+    finally:
+        if a is not None:
+            a.finalize_processes()
+
+    # retrieve from an overflow temp file
+    cfile = tmpdir.join('c')
+    cfile.write(b'abc', mode='wb')
+    assert a.retrieve_data(str(cfile)) == b'abc'
+    assert not cfile.check()
@@ -13,8 +13,11 @@ import dateutil.tz
 import pytest
 # local imports
 import blobxfer.models.azure as azmodels
+import blobxfer.models.filehandle as filehandle
+import blobxfer.models.offload as offload
 import blobxfer.models.download as models
 import blobxfer.models.options as options
+import blobxfer.models.workqueue as workqueue
 import blobxfer.operations.azure as azops
 import blobxfer.util as util
 # module under test
@@ -32,8 +35,10 @@ def test_ensure_local_destination(patched_blob, patched_file, tmpdir):
         download_options=options.Download(
             check_file_md5=True,
             chunk_size_bytes=4194304,
+            chunk_size_mode=options.ChunkSizeMode.Static,
             delete_extraneous_destination=False,
             delete_only=False,
+            durability=filehandle.WriteDurability.NoSync,
             max_single_object_concurrency=8,
             mode=azmodels.StorageModes.Auto,
             overwrite=True,
@@ -71,8 +76,10 @@ def test_ensure_local_destination(patched_blob, patched_file, tmpdir):
         download_options=options.Download(
             check_file_md5=True,
             chunk_size_bytes=4194304,
+            chunk_size_mode=options.ChunkSizeMode.Static,
             delete_extraneous_destination=False,
             delete_only=False,
+            durability=filehandle.WriteDurability.NoSync,
             max_single_object_concurrency=8,
             mode=azmodels.StorageModes.Auto,
             overwrite=True,
@@ -103,8 +110,10 @@ def test_ensure_local_destination(patched_blob, patched_file, tmpdir):
         download_options=options.Download(
             check_file_md5=True,
             chunk_size_bytes=4194304,
+            chunk_size_mode=options.ChunkSizeMode.Static,
             delete_extraneous_destination=False,
             delete_only=False,
+            durability=filehandle.WriteDurability.NoSync,
             max_single_object_concurrency=8,
             mode=azmodels.StorageModes.File,
             overwrite=True,
@@ -135,8 +144,10 @@ def test_ensure_local_destination(patched_blob, patched_file, tmpdir):
         download_options=options.Download(
             check_file_md5=True,
             chunk_size_bytes=4194304,
+            chunk_size_mode=options.ChunkSizeMode.Static,
             delete_extraneous_destination=False,
             delete_only=False,
+            durability=filehandle.WriteDurability.NoSync,
             max_single_object_concurrency=8,
             mode=azmodels.StorageModes.File,
             overwrite=True,
@@ -171,8 +182,10 @@ def test_ensure_local_destination(patched_blob, patched_file, tmpdir):
         download_options=options.Download(
             check_file_md5=True,
             chunk_size_bytes=4194304,
+            chunk_size_mode=options.ChunkSizeMode.Static,
             delete_extraneous_destination=False,
             delete_only=False,
+            durability=filehandle.WriteDurability.NoSync,
             max_single_object_concurrency=8,
             mode=azmodels.StorageModes.File,
             overwrite=True,
@@ -209,8 +222,10 @@ def test_check_download_conditions(tmpdir):
         download_options=options.Download(
             check_file_md5=True,
             chunk_size_bytes=4194304,
+            chunk_size_mode=options.ChunkSizeMode.Static,
             delete_extraneous_destination=False,
             delete_only=False,
+            durability=filehandle.WriteDurability.NoSync,
             max_single_object_concurrency=8,
             mode=azmodels.StorageModes.Auto,
             overwrite=False,
@@ -247,8 +262,10 @@ def test_check_download_conditions(tmpdir):
         download_options=options.Download(
             check_file_md5=True,
             chunk_size_bytes=4194304,
+            chunk_size_mode=options.ChunkSizeMode.Static,
             delete_extraneous_destination=False,
             delete_only=False,
+            durability=filehandle.WriteDurability.NoSync,
             max_single_object_concurrency=8,
             mode=azmodels.StorageModes.Auto,
             overwrite=True,
@@ -282,8 +299,10 @@ def test_check_download_conditions(tmpdir):
         download_options=options.Download(
             check_file_md5=True,
             chunk_size_bytes=4194304,
+            chunk_size_mode=options.ChunkSizeMode.Static,
             delete_extraneous_destination=False,
             delete_only=False,
+            durability=filehandle.WriteDurability.NoSync,
             max_single_object_concurrency=8,
             mode=azmodels.StorageModes.Auto,
             overwrite=True,
@@ -314,8 +333,10 @@ def test_check_download_conditions(tmpdir):
         download_options=options.Download(
             check_file_md5=True,
             chunk_size_bytes=4194304,
+            chunk_size_mode=options.ChunkSizeMode.Static,
             delete_extraneous_destination=False,
             delete_only=False,
+            durability=filehandle.WriteDurability.NoSync,
             max_single_object_concurrency=8,
             mode=azmodels.StorageModes.Auto,
             overwrite=True,
@@ -355,8 +376,10 @@ def test_check_download_conditions(tmpdir):
         download_options=options.Download(
             check_file_md5=True,
             chunk_size_bytes=4194304,
+            chunk_size_mode=options.ChunkSizeMode.Static,
             delete_extraneous_destination=False,
             delete_only=False,
+            durability=filehandle.WriteDurability.NoSync,
             max_single_object_concurrency=8,
             mode=azmodels.StorageModes.Auto,
             overwrite=True,
@@ -393,12 +416,57 @@ def test_check_download_conditions(tmpdir):
     assert result == ops.DownloadAction.Skip
 
 
+def test_sync_state(tmpdir):
+    d = ops.Downloader(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
+    d._general_options.dry_run = False
+    d._general_options.sync_state = options.SyncState(
+        str(tmpdir.join('ss')), 0, 0)
+    d._spec.options.overwrite = True
+    d._spec.skip_on.md5_match = False
+    d._spec.skip_on.filesize_match = False
+    d._spec.skip_on.lmt_ge = False
+    d._initialize_sync_state()
+
+    ap = tmpdir.join('a')
+    ap.write('abc')
+    lpath = pathlib.Path(str(ap))
+    rfile = mock.MagicMock()
+    rfile.vectored_io = None
+    rfile.etag = 'e1'
+    rfile.lmt = None
+    rfile.md5 = None
+
+    assert not d._check_sync_state(lpath, rfile)
+    assert d._check_download_conditions(
+        lpath, rfile) == ops.DownloadAction.Download
+
+    d._update_sync_state(pathlib.Path(str(tmpdir.join('x'))), rfile)
+    d._update_sync_state(lpath, rfile)
+    assert d._check_sync_state(lpath, rfile)
+    assert d._check_download_conditions(
+        lpath, rfile) == ops.DownloadAction.Skip
+
+    # remote change
+    rfile.etag = 'e2'
+    assert not d._check_sync_state(lpath, rfile)
+    rfile.etag = 'e1'
+
+    # local change
+    ap.write('abcd')
+    assert not d._check_sync_state(lpath, rfile)
+
+    rfile.vectored_io = mock.MagicMock()
+    assert not d._check_sync_state(lpath, rfile)
+    d._sync_state.close()
+
+
 def test_pre_md5_skip_on_check():
     d = ops.Downloader(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
     d._md5_offload = mock.MagicMock()
 
     rfile = azmodels.StorageEntity('cont')
     rfile._encryption = mock.MagicMock()
+    rfile._encryption.is_chunked = False
     rfile._encryption.blobxfer_extensions = mock.MagicMock()
     rfile._encryption.blobxfer_extensions.pre_encrypted_content_md5 = 'abc'
     rfile._client = mock.MagicMock()
@@ -550,7 +618,7 @@ def test_check_for_crypto_done():
     d._crypto_offload.done_cv = multiprocessing.Condition()
     d._crypto_offload.pop_done_queue.side_effect = [
         None,
-        (lpath, offsets)
+        (lpath, offsets, None)
     ]
     d._all_remote_files_processed = False
     d._download_terminate = True
@@ -573,7 +641,7 @@ def test_check_for_crypto_done():
         d._crypto_offload.done_cv = multiprocessing.Condition()
         d._crypto_offload.pop_done_queue.side_effect = [
             None,
-            (lpath, offsets),
+            (lpath, offsets, None),
             None,
         ]
         patched_tc.side_effect = [False, False, False, True, True]
@@ -596,13 +664,33 @@ def test_check_for_crypto_done():
         d._crypto_offload.done_cv = multiprocessing.Condition()
         d._crypto_offload.pop_done_queue.side_effect = [
             None,
-            (lpath, offsets),
+            (lpath, offsets, None),
         ]
         patched_tc.side_effect = [False, False, True]
         d._complete_chunk_download = mock.MagicMock()
         d._check_for_crypto_done()
         assert dd.perform_chunked_integrity_check.call_count == 0
 
+    # check decrypt error on result
+    with mock.patch(
+            'blobxfer.operations.download.Downloader.termination_check',
+            new_callable=mock.PropertyMock) as patched_tc:
+        d = ops.Downloader(
+            mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
+        d._general_options.dry_run = False
+        dd = mock.MagicMock()
+        d._dd_map[lpath] = dd
+        d._crypto_offload = mock.MagicMock()
+        d._crypto_offload.done_cv = multiprocessing.Condition()
+        d._crypto_offload.pop_done_queue.side_effect = [
+            (lpath, offsets, 'failed authentication'),
+        ]
+        patched_tc.side_effect = [False, True]
+        d._check_for_crypto_done()
+        assert dd.perform_chunked_integrity_check.call_count == 0
+        assert len(d._exceptions) == 1
+        assert isinstance(d._exceptions[0], RuntimeError)
+
 
 def test_add_to_download_queue(tmpdir):
     path = tmpdir.join('a')
@@ -610,6 +698,7 @@ def test_add_to_download_queue(tmpdir):
     ase = azmodels.StorageEntity('cont')
     ase._size = 1
     ase._encryption = mock.MagicMock()
+    ase._encryption.is_chunked = False
     ase._encryption.symmetric_key = b'abc'
     d = ops.Downloader(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
     d._general_options.dry_run = False
@@ -620,6 +709,28 @@ def test_add_to_download_queue(tmpdir):
     assert str(path) in d._dd_map
 
 
+def test_initialize_concurrency_controller():
+    opts = mock.MagicMock()
+    opts.concurrency.mode = options.ConcurrencyMode.Static
+    d = ops.Downloader(opts, mock.MagicMock(), mock.MagicMock())
+    d._general_options.dry_run = False
+    d._initialize_concurrency_controller()
+    assert d._concurrency_controller is None
+
+    opts.concurrency.mode = options.ConcurrencyMode.Auto
+    opts.concurrency.transfer_threads = 1
+    opts.concurrency.max_transfer_threads = 3
+    d._worker_thread_transfer = mock.MagicMock()
+    d._initialize_concurrency_controller()
+    try:
+        assert d._concurrency_controller.limit == 1
+        d._initialize_transfer_threads()
+        assert len(d._transfer_threads) == 3
+    finally:
+        d._wait_for_transfer_threads(terminate=True)
+    assert not d._concurrency_controller.acquire()
+
+
 def test_initialize_and_terminate_threads():
     opts = mock.MagicMock()
     opts.concurrency.transfer_threads = 2
@@ -645,10 +756,20 @@ def test_initialize_and_terminate_threads():
         assert not thr.is_alive()
 
 
+def test_compute_inflight_bytes():
+    dd = mock.MagicMock()
+    dd.entity.is_encrypted = False
+    offsets = mock.MagicMock()
+    offsets.num_bytes = 16
+    assert ops.Downloader.compute_inflight_bytes(dd, offsets) == 16
+    dd.entity.is_encrypted = True
+    assert ops.Downloader.compute_inflight_bytes(dd, offsets) == 32
+
+
 def test_process_download_descriptor_vio(tmpdir):
     with mock.patch(
-            'blobxfer.models.download.Descriptor.all_operations_completed',
-            new_callable=mock.PropertyMock) as patched_aoc:
+            'blobxfer.models.download.Descriptor.claim_finalization',
+            return_value=True):
         d = ops.Downloader(
             mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
         d._general_options.dry_run = False
@@ -670,7 +791,6 @@ def test_process_download_descriptor_vio(tmpdir):
         dd = models.Descriptor(lp, ase, opts, mock.MagicMock(), None)
         dd.next_offsets = mock.MagicMock()
         dd.next_offsets.return_value = (None, None)
-        patched_aoc.return_value = True
         dd.finalize_file = mock.MagicMock()
         key = ops.Downloader.create_unique_transfer_operation_id(ase)
         d._transfer_set.add(key)
@@ -706,8 +826,10 @@ def test_worker_thread_transfer(
         d._disk_set.add(4)
 
         patched_tc.side_effect = [False, True]
+        d._disk_backpressure.terminate()
         d._worker_thread_transfer()
         assert d._process_download_descriptor.call_count == 0
+        assert d._transfer_queue.terminated
 
     d = ops.Downloader(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
     d._general_options.dry_run = False
@@ -727,9 +849,14 @@ def test_worker_thread_transfer(
             'blobxfer.operations.download.Downloader.termination_check',
             new_callable=mock.PropertyMock) as patched_tc:
         patched_tc.side_effect = [False, False, True]
+        d = ops.Downloader(
+            mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
+        d._general_options.dry_run = False
+        d._general_options.concurrency.disk_threads = 1
         ase = azmodels.StorageEntity('cont')
         ase._size = 16
         ase._encryption = mock.MagicMock()
+        ase._encryption.is_chunked = False
         ase._encryption.symmetric_key = b'abc'
         lp = pathlib.Path(str(tmpdir.join('exc')))
         opts = mock.MagicMock()
@@ -749,8 +876,7 @@ def test_worker_thread_transfer(
             new_callable=mock.PropertyMock) as patched_tc:
         with mock.patch(
                 'blobxfer.models.download.Descriptor.'
-                'all_operations_completed',
-                new_callable=mock.PropertyMock) as patched_aoc:
+                'claim_finalization') as patched_cf:
             d = ops.Downloader(
                 mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
             d._general_options.dry_run = False
@@ -767,6 +893,7 @@ def test_worker_thread_transfer(
             ase._vio = None
             key = ops.Downloader.create_unique_transfer_operation_id(ase)
             ase._encryption = mock.MagicMock()
+            ase._encryption.is_chunked = False
             ase._encryption.symmetric_key = b'abc'
             lp = pathlib.Path(str(tmpdir.join('a')))
             dd = models.Descriptor(lp, ase, opts, mock.MagicMock(), None)
@@ -775,8 +902,7 @@ def test_worker_thread_transfer(
             dd.finalize_integrity = mock.MagicMock()
             dd.finalize_file = mock.MagicMock()
             dd.perform_chunked_integrity_check = mock.MagicMock()
-            dd.all_operations_completed.side_effect = [False, True]
-            patched_aoc.side_effect = [False, True]
+            patched_cf.side_effect = [False, True]
             patched_tc.side_effect = [False, False, False, True]
             d._dd_map[str(lp)] = dd
             d._transfer_set.add(key)
@@ -819,11 +945,34 @@ def test_worker_thread_transfer(
         d._transfer_queue.get.side_effect = [dd]
         patched_tc.side_effect = [False, True]
         d._spec.options.max_single_object_concurrency = 0
+        d._memory_budget = workqueue.MemoryBudget(1024)
+        d._concurrency_controller = mock.MagicMock()
         d._worker_thread_transfer()
         assert len(d._disk_set) == 1
+        assert d._memory_budget.in_use == 16
+        assert d._concurrency_controller.acquire.call_count == 1
+        assert d._concurrency_controller.release.call_count == 1
         a, b, c = d._disk_queue.get()
+        puts = d._transfer_queue.put.call_count
         d._process_data(a, b, c)
         assert dd.perform_chunked_integrity_check.call_count == 1
+        assert d._memory_budget.in_use == 0
+        assert d._transfer_queue.put.call_count == puts
+
+        # test re-enqueue for finalization once the last chunk completes
+        dd._outstanding_ops = 0
+        dd._unchecked_chunks.clear()
+        d._disk_set.add(ops.Downloader.create_unique_disk_operation_id(a, b))
+        d._finalize_chunk(a, b)
+        assert d._transfer_queue.put.call_count == puts + 1
+        d._transfer_queue.put.assert_called_with(dd)
+
+        # test terminated while waiting for memory
+        d._memory_budget.terminate()
+        dd = models.Descriptor(lp, ase, opts, mock.MagicMock(), None)
+        d._process_download_descriptor(dd)
+        assert len(d._disk_set) == 0
+        assert d._disk_queue.qsize() == 0
 
     with mock.patch(
             'blobxfer.operations.download.Downloader.termination_check',
@@ -841,6 +990,7 @@ def test_worker_thread_transfer(
         ase._mode = azmodels.StorageModes.Auto
         ase._size = 32
         ase._encryption = mock.MagicMock()
+        ase._encryption.is_chunked = False
         ase._encryption.symmetric_key = b'abc'
         ase._encryption.content_encryption_iv = b'0' * 16
         ase._client = mock.MagicMock()
@@ -856,6 +1006,7 @@ def test_worker_thread_transfer(
         dd.perform_chunked_integrity_check = mock.MagicMock()
         d._crypto_offload = mock.MagicMock()
         d._crypto_offload.add_decrypt_chunk = mock.MagicMock()
+        d._crypto_offload.stage_data.return_value = None
         d._dd_map[str(lp)] = dd
         d._transfer_cc[dd.entity.path] = 0
         d._transfer_set.add(key)
@@ -868,6 +1019,16 @@ def test_worker_thread_transfer(
         d._process_data(a, b, c)
         assert d._crypto_offload.add_decrypt_chunk.call_count == 1
         assert dd.write_unchecked_hmac_data.call_count == 1
+        assert dd.write_unchecked_hmac_data.call_args[1]['persist']
+
+        # data staged in shared memory is not persisted
+        slot = offload.SharedMemorySlot(
+            length=32, name='shm', offset=0, slot=0)
+        d._crypto_offload.stage_data.return_value = slot
+        d._process_data(a, b, c)
+        assert d._crypto_offload.add_decrypt_chunk.call_count == 2
+        assert d._crypto_offload.add_decrypt_chunk.call_args[0][5] == slot
+        assert not dd.write_unchecked_hmac_data.call_args[1]['persist']
 
     with mock.patch(
             'blobxfer.operations.download.Downloader.termination_check',
@@ -886,6 +1047,7 @@ def test_worker_thread_transfer(
         ase._mode = azmodels.StorageModes.Auto
         ase._size = 32
         ase._encryption = mock.MagicMock()
+        ase._encryption.is_chunked = False
         ase._encryption.symmetric_key = b'abc'
         ase._encryption.content_encryption_iv = b'0' * 16
         ase._client = mock.MagicMock()
@@ -894,6 +1056,7 @@ def test_worker_thread_transfer(
         ase._vio = None
         key = ops.Downloader.create_unique_transfer_operation_id(ase)
         patched_gfr.return_value = b'0' * ase._size
+        patched_gbr.return_value = b'0' * ase._size
         lp = pathlib.Path(str(tmpdir.join('d')))
         dd = models.Descriptor(lp, ase, opts, mock.MagicMock(), None)
         dd.next_offsets()
@@ -913,6 +1076,10 @@ def test_worker_thread_transfer(
         d._process_data(a, b, c)
         assert patched_acdd.call_count == 1
         assert dd.write_unchecked_hmac_data.call_count == 1
+        assert not dd.write_unchecked_hmac_data.call_args[1]['persist']
+        encdata = dd.write_unchecked_hmac_data.call_args[0][1]
+        assert isinstance(encdata, memoryview)
+        assert encdata.obj is patched_gbr.return_value
         assert dd.perform_chunked_integrity_check.call_count == 1
 
 
@@ -985,6 +1152,7 @@ def test_cleanup_temporary_files(tmpdir):
     d = ops.Downloader(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
     d._general_options.dry_run = False
     d._general_options.resume_file = pathlib.Path('abc')
+    d._general_options.sync_state = None
     d._dd_map[0] = dd
     d._cleanup_temporary_files()
     assert dd.final_path.exists()
@@ -1000,6 +1168,7 @@ def test_cleanup_temporary_files(tmpdir):
     d = ops.Downloader(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
     d._general_options.dry_run = False
     d._general_options.resume_file = None
+    d._general_options.sync_state = None
     d._dd_map[0] = dd
     d._cleanup_temporary_files()
     assert not dd.final_path.exists()
@@ -1017,6 +1186,7 @@ def test_cleanup_temporary_files(tmpdir):
     d = ops.Downloader(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
     d._general_options.dry_run = False
     d._general_options.resume_file = None
+    d._general_options.sync_state = None
     d._dd_map[0] = dd
     d._cleanup_temporary_files()
     assert dd.final_path.exists()
@@ -1078,6 +1248,7 @@ def _create_downloader_for_start(td):
     d._general_options.concurrency.disk_threads = 1
     d._general_options.concurrency.transfer_threads = 1
     d._general_options.resume_file = pathlib.Path(str(td.join('rf')))
+    d._general_options.sync_state = None
     d._spec.sources = []
     d._spec.options = mock.MagicMock()
     d._spec.options.chunk_size_bytes = 1
@@ -1219,6 +1390,7 @@ def test_start_exception():
     d = ops.Downloader(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
     d._general_options.dry_run = False
     d._general_options.resume_file = None
+    d._general_options.sync_state = None
     d._run = mock.MagicMock(side_effect=RuntimeError('oops'))
     d._wait_for_disk_threads = mock.MagicMock()
     d._wait_for_transfer_threads = mock.MagicMock()
@@ -1244,6 +1416,7 @@ def test_start_keyboard_interrupt():
     d = ops.Downloader(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
     d._general_options.dry_run = False
     d._general_options.resume_file = None
+    d._general_options.sync_state = None
     d._run = mock.MagicMock(side_effect=KeyboardInterrupt)
     d._wait_for_disk_threads = mock.MagicMock()
     d._wait_for_transfer_threads = mock.MagicMock()
@@ -1254,3 +1427,22 @@ def test_start_keyboard_interrupt():
         d.start()
     assert d._wait_for_transfer_threads.call_count == 1
     assert d._cleanup_temporary_files.call_count == 1
+
+
+def test_initialize_chunk_sizer():
+    spec = mock.MagicMock()
+    spec.options.chunk_size_bytes = 0
+    spec.options.chunk_size_mode = options.ChunkSizeMode.Static
+    d = ops.Downloader(mock.MagicMock(), mock.MagicMock(), spec)
+    d._initialize_chunk_sizer()
+    assert d._chunk_sizer is None
+
+    spec.options.chunk_size_mode = options.ChunkSizeMode.Adaptive
+    spec.options.chunk_size_bytes = 1
+    d._initialize_chunk_sizer()
+    assert d._chunk_sizer is None
+
+    spec.options.chunk_size_bytes = 0
+    d._initialize_chunk_sizer()
+    assert d._chunk_sizer is not None
+    assert d._chunk_sizer.next_chunk_size() > 0
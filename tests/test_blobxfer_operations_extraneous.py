@@ -0,0 +1,157 @@
+# coding=utf-8
+"""Tests for operations extraneous"""
+
+# stdlib imports
+import unittest.mock as mock
+# non-stdlib imports
+import azure.common
+import pytest
+# module under test
+import blobxfer.operations.extraneous as ops
+
+
+def _create_id(client, container, name):
+    return ';'.join((client.primary_endpoint, container, name))
+
+
+def _create_sa():
+    sa = mock.MagicMock()
+    sa.name = 'name'
+    sa.endpoint = 'ep'
+    sa.file_client.primary_endpoint = 'ep'
+    sa.block_blob_client.primary_endpoint = 'ep'
+    return sa
+
+
+def _create_blob(name):
+    blob = mock.MagicMock()
+    blob.name = name
+    return blob
+
+
+def test_keep_manifest():
+    with pytest.raises(ValueError):
+        ops.KeepManifest(spill_threshold=0)
+
+    km = ops.KeepManifest()
+    km.add('a')
+    km.add('a')
+    assert 'a' in km
+    assert 'b' not in km
+    assert len(km) == 1
+    assert not km.spilled
+    km.close()
+    assert 'a' not in km
+
+
+def test_keep_manifest_spill():
+    km = ops.KeepManifest(spill_threshold=1)
+    km.add('a')
+    assert not km.spilled
+    km.add('b')
+    assert km.spilled
+    dbpath = km._ids.dbpath
+    assert dbpath.exists()
+    km.add('a')
+    assert 'a' in km
+    assert 'c' not in km
+    assert len(km) == 2
+
+    km.close()
+    assert not km.spilled
+    assert not dbpath.parent.exists()
+
+
+@mock.patch('blobxfer.operations.azure.blob.delete_blob')
+@mock.patch('blobxfer.operations.azure.blob.list_all_blobs')
+def test_extraneous_deleter_blobs(lab, db):
+    km = ops.KeepManifest()
+    km.add('ep;cont;vpath/keep')
+    sa = _create_sa()
+    lab.return_value = [
+        _create_blob('vpath/keep'),
+        _create_blob('vpath/remove'),
+        _create_blob('vpath2/other'),
+    ]
+
+    ed = ops.ExtraneousDeleter(km, _create_id, 2)
+    ed.start([
+        (sa, 'cont', 'vpath', False),
+        (sa, 'cont', 'vpath', False),
+    ])
+    ed.join()
+    assert lab.call_count == 1
+    assert lab.call_args[1]['prefix'] == 'vpath'
+    assert db.call_count == 1
+    assert db.call_args[0][2] == 'vpath/remove'
+    assert ed.deleted == 1
+
+    # test already deleted
+    db.reset_mock()
+    db.side_effect = azure.common.AzureMissingResourceHttpError('msg', 404)
+    ed = ops.ExtraneousDeleter(km, _create_id, 1, verbose=True)
+    ed.start([(sa, 'cont', 'vpath', False)])
+    ed.join()
+    assert db.call_count == 1
+    assert ed.deleted == 0
+
+    # test delete exception
+    db.side_effect = RuntimeError()
+    ed = ops.ExtraneousDeleter(km, _create_id, 1)
+    ed.start([(sa, 'cont', 'vpath', False)])
+    with pytest.raises(RuntimeError):
+        ed.join()
+
+    # test list exception
+    db.reset_mock()
+    lab.side_effect = azure.common.AzureMissingResourceHttpError('msg', 404)
+    ed = ops.ExtraneousDeleter(km, _create_id, 1)
+    ed.start([(sa, 'cont', 'vpath', False)])
+    with pytest.raises(azure.common.AzureMissingResourceHttpError):
+        ed.join()
+    assert db.call_count == 0
+
+
+@mock.patch('blobxfer.operations.azure.file.delete_file')
+@mock.patch('blobxfer.operations.azure.file.list_all_files')
+def test_extraneous_deleter_files(laf, df):
+    km = ops.KeepManifest()
+    sa = _create_sa()
+    laf.return_value = ['a', 'b']
+
+    # test dry run
+    ed = ops.ExtraneousDeleter(km, _create_id, 1, dry_run=True)
+    ed.start([(sa, 'share', '', True)])
+    ed.join()
+    assert laf.call_args[1]['prefix'] is None
+    assert df.call_count == 0
+    assert ed.deleted == 0
+
+    ed = ops.ExtraneousDeleter(km, _create_id, 1)
+    ed.start([(sa, 'share', None, True)])
+    ed.join()
+    assert df.call_count == 2
+    assert ed.deleted == 2
+
+    # test virtual path is not a directory
+    df.reset_mock()
+    laf.side_effect = azure.common.AzureMissingResourceHttpError('msg', 404)
+    ed = ops.ExtraneousDeleter(km, _create_id, 1)
+    ed.start([(sa, 'share', 'vpath', True)])
+    ed.join()
+    assert df.call_count == 0
+
+
+@mock.patch('blobxfer.operations.azure.blob.delete_blob')
+@mock.patch('blobxfer.operations.azure.blob.list_all_blobs')
+def test_extraneous_deleter_terminate(lab, db):
+    km = ops.KeepManifest()
+    sa = _create_sa()
+    lab.return_value = (_create_blob('name{}'.format(i)) for i in range(100))
+
+    ed = ops.ExtraneousDeleter(km, _create_id, 1)
+    ed.terminate()
+    ed.start([(sa, 'cont', '', False)])
+    ed.terminate()
+    assert db.call_count == 0
+    assert ed.deleted == 0
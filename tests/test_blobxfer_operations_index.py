@@ -0,0 +1,178 @@
+# coding=utf-8
+"""Tests for operations index"""
+
+# stdlib imports
+import datetime
+import unittest.mock as mock
+# non-stdlib imports
+import azure.common
+import azure.storage.blob.models
+import pytest
+# local imports
+import blobxfer.models.azure as azmodels
+# module under test
+import blobxfer.operations.index as ops
+
+
+def _create_blob(name, blob_type, size=1, metadata=None):
+    blob = azure.storage.blob.models.Blob(name=name, metadata=metadata)
+    blob.properties.blob_type = blob_type
+    blob.properties.content_length = size
+    blob.properties.last_modified = datetime.datetime(2020, 1, 1)
+    blob.properties.content_settings.content_md5 = 'md5'
+    blob.properties.content_settings.cache_control = 'cc'
+    blob.properties.content_settings.content_type = 'ct'
+    blob.properties.blob_tier = 'Hot'
+    return blob
+
+
+def test_remote_index_prefixes():
+    with pytest.raises(ValueError):
+        ops.RemoteIndex(spill_threshold=0)
+
+    sa = mock.MagicMock()
+    sa.name = 'sa'
+    ri = ops.RemoteIndex()
+    assert ri._find_prefix(sa, 'cont', False, 'a') is None
+
+    ri.add_prefix(sa, 'cont', 'a/')
+    ri.add_prefix(sa, 'cont', 'a/b')
+    assert ri._find_prefix(sa, 'cont', False, 'a') == 'a'
+    assert ri._find_prefix(sa, 'cont', False, 'a/c') == 'a'
+    assert ri._find_prefix(sa, 'cont', True, 'a/b/c') == 'a/b'
+    assert ri._find_prefix(sa, 'cont', False, 'ab') is None
+    assert ri._find_prefix(sa, 'cont2', False, 'a') is None
+
+    ri.add_prefix(sa, 'cont', None)
+    assert ri._find_prefix(sa, 'cont', False, 'ab') == ''
+
+
+@mock.patch('blobxfer.operations.azure.blob.get_blob_properties')
+@mock.patch('blobxfer.operations.azure.blob.list_blobs')
+def test_remote_index_blobs(patched_lb, patched_gbp):
+    sa = mock.MagicMock()
+    sa.name = 'sa'
+    patched_lb.return_value = iter([
+        _create_blob(
+            'a/b', azure.storage.blob.models._BlobTypes.BlockBlob,
+            metadata={'k': 'v'}),
+        _create_blob('a/c', azure.storage.blob.models._BlobTypes.PageBlob),
+        _create_blob('ab', azure.storage.blob.models._BlobTypes.BlockBlob),
+    ])
+    ri = ops.RemoteIndex()
+    ri.add_prefix(sa, 'cont', 'a')
+
+    blob = ri.get_properties(sa, 'cont', 'a/b', azmodels.StorageModes.Block)
+    assert blob.name == 'a/b'
+    assert blob.metadata == {'k': 'v'}
+    assert blob.properties.blob_type == \
+        azure.storage.blob.models._BlobTypes.BlockBlob
+    assert blob.properties.content_length == 1
+    assert blob.properties.last_modified == datetime.datetime(2020, 1, 1)
+    assert blob.properties.content_settings.content_md5 == 'md5'
+    assert blob.properties.content_settings.cache_control == 'cc'
+    assert blob.properties.content_settings.content_type == 'ct'
+    assert blob.properties.blob_tier == 'Hot'
+    assert patched_lb.call_count == 1
+    assert patched_lb.call_args[0][2] == 'a'
+    assert ri.num_entries == 2
+
+    # test missing entity and no additional listing
+    assert ri.get_properties(
+        sa, 'cont', 'a/d', azmodels.StorageModes.Auto) is None
+    assert ri.get_properties(
+        sa, 'cont', 'a/c', azmodels.StorageModes.Auto) is not None
+    assert patched_lb.call_count == 1
+
+    # test mode mismatch
+    with pytest.raises(RuntimeError):
+        ri.get_properties(sa, 'cont', 'a/c', azmodels.StorageModes.Block)
+
+    # test entity not covered by prefix
+    patched_gbp.return_value = None
+    assert ri.get_properties(
+        sa, 'cont', 'ab', azmodels.StorageModes.Block) is None
+    assert patched_gbp.call_count == 1
+    assert patched_lb.call_count == 1
+
+    # test missing container
+    patched_lb.side_effect = azure.common.AzureMissingResourceHttpError(
+        'msg', 404)
+    ri.add_prefix(sa, 'cont2', '')
+    assert ri.get_properties(
+        sa, 'cont2', 'a', azmodels.StorageModes.Block) is None
+    assert patched_lb.call_count == 2
+    ri.close()
+
+
+@mock.patch('blobxfer.operations.azure.file.get_file_properties')
+@mock.patch('blobxfer.operations.azure.file.list_all_files')
+def test_remote_index_files(patched_laf, patched_gfp):
+    sa = mock.MagicMock()
+    sa.name = 'sa'
+    patched_laf.return_value = iter(['a/b', 'a/c/d'])
+    patched_gfp.return_value = mock.MagicMock()
+    ri = ops.RemoteIndex()
+    ri.add_prefix(sa, 'share', 'a')
+
+    assert ri.get_properties(
+        sa, 'share', 'a/e', azmodels.StorageModes.File) is None
+    assert patched_gfp.call_count == 0
+    assert ri.get_properties(
+        sa, 'share', 'a/c/d', azmodels.StorageModes.File) is \
+        patched_gfp.return_value
+    assert patched_gfp.call_count == 1
+    assert patched_laf.call_count == 1
+    assert patched_laf.call_args[1]['prefix'] == 'a'
+
+    # test prefix is a single file
+    patched_laf.side_effect = azure.common.AzureMissingResourceHttpError(
+        'msg', 404)
+    ri.add_prefix(sa, 'share2', 'f')
+    assert ri.get_properties(
+        sa, 'share2', 'f', azmodels.StorageModes.File) is not None
+    assert patched_gfp.call_count == 3
+
+    # test prefix does not exist
+    patched_gfp.return_value = None
+    ri.add_prefix(sa, 'share3', 'g')
+    assert ri.get_properties(
+        sa, 'share3', 'g/h', azmodels.StorageModes.File) is None
+    assert patched_gfp.call_count == 4
+
+    # test entity not covered by prefix
+    assert ri.get_properties(
+        sa, 'share4', 'x', azmodels.StorageModes.File) is None
+    assert patched_gfp.call_count == 5
+    ri.close()
+
+
+@mock.patch('blobxfer.operations.azure.blob.list_blobs')
+def test_remote_index_spill(patched_lb):
+    sa = mock.MagicMock()
+    sa.name = 'sa'
+    blobs = [
+        _create_blob(
+            str(i), azure.storage.blob.models._BlobTypes.BlockBlob, size=i)
+        for i in range(10)
+    ]
+    patched_lb.return_value = iter(blobs)
+    ri = ops.RemoteIndex(spill_threshold=2)
+    ri.add_prefix(sa, 'cont', '')
+    with mock.patch('blobxfer.models.spill._SPILL_BATCH_SIZE', 3):
+        blob = ri.get_properties(
+            sa, 'cont', '9', azmodels.StorageModes.Block)
+    assert ri.spilled
+    assert ri.num_entries == 10
+    assert len(ri._entries._entries) == 0
+    assert blob.properties.content_length == 9
+    assert ri.get_properties(
+        sa, 'cont', '0', azmodels.StorageModes.Block) is not None
+    assert ri.get_properties(
+        sa, 'cont', '10', azmodels.StorageModes.Block) is None
+    spill_dir = ri._entries.dbpath.parent
+    assert spill_dir.exists()
+
+    ri.close()
+    assert not ri.spilled
+    assert not spill_dir.exists()
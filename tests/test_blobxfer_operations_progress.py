@@ -6,10 +6,12 @@ import unittest.mock as mock
 # non-stdlib imports
 # local imports
 import blobxfer.models.azure as azmodels
+import blobxfer.models.filehandle as filehandle
 import blobxfer.models.download as modelsdl
 import blobxfer.models.options as options
 import blobxfer.models.synccopy as modelssc
 import blobxfer.models.upload as modelsul
+import blobxfer.models.workqueue as workqueue
 import blobxfer.util as util
 # module under test
 import blobxfer.operations.progress as ops
@@ -19,13 +21,16 @@ def test_output_parameters():
     go = mock.MagicMock()
     go.quiet = False
     go.log_file = 'abc'
+    go.concurrency.max_memory_bytes = 1073741824
 
     spec = modelsdl.Specification(
         download_options=options.Download(
             check_file_md5=True,
             chunk_size_bytes=4194304,
+            chunk_size_mode=options.ChunkSizeMode.Static,
             delete_extraneous_destination=False,
             delete_only=False,
+            durability=filehandle.WriteDurability.NoSync,
             max_single_object_concurrency=8,
             mode=azmodels.StorageModes.Auto,
             overwrite=True,
@@ -55,13 +60,19 @@ def test_output_parameters():
         upload_options=options.Upload(
             access_tier='cool',
             chunk_size_bytes=4194304,
+            chunk_size_mode=options.ChunkSizeMode.Static,
+            delete_during_transfer=False,
             delete_extraneous_destination=False,
             delete_only=False,
+            delta=False,
+            encryption_mode=None,
             mode=azmodels.StorageModes.Auto,
             one_shot_bytes=0,
             overwrite=True,
             recursive=True,
+            remote_index=False,
             rename=False,
+            rsa_private_key=None,
             rsa_public_key=None,
             stdin_as_page_blob_size=0,
             store_file_properties=options.FileProperties(
@@ -88,13 +99,19 @@ def test_output_parameters():
         upload_options=options.Upload(
             access_tier='cool',
             chunk_size_bytes=4194304,
+            chunk_size_mode=options.ChunkSizeMode.Static,
+            delete_during_transfer=False,
             delete_extraneous_destination=False,
             delete_only=False,
+            delta=False,
+            encryption_mode=None,
             mode=azmodels.StorageModes.Auto,
             one_shot_bytes=0,
             overwrite=True,
             recursive=True,
+            remote_index=False,
             rename=False,
+            rsa_private_key=None,
             rsa_public_key=None,
             stdin_as_page_blob_size=0,
             store_file_properties=options.FileProperties(
@@ -120,14 +137,19 @@ def test_output_parameters():
     spec = modelssc.Specification(
         synccopy_options=options.SyncCopy(
             access_tier='archive',
+            async_copy=False,
+            delete_during_transfer=False,
             delete_extraneous_destination=False,
             delete_only=False,
+            delta=False,
             dest_mode=azmodels.StorageModes.Auto,
             mode=azmodels.StorageModes.Auto,
             overwrite=True,
             recursive=True,
+            remote_index=False,
             rename=False,
             server_side_copy=True,
+            stream_relay=False,
             strip_components=0,
         ),
         skip_on_options=options.SkipOn(
@@ -139,6 +161,13 @@ def test_output_parameters():
     ops.output_parameters(go, spec)
     assert util.is_not_empty(go.log_file)
 
+    go.concurrency.mode = options.ConcurrencyMode.Auto
+    go.concurrency.max_transfer_threads = 96
+    with mock.patch('blobxfer.operations.progress.logger') as patched_log:
+        ops.output_parameters(go, spec)
+        assert 'concurrency mode: auto (max xfer=96)' in \
+            patched_log.info.call_args[0][0]
+
 
 def test_update_progress_bar():
     go = mock.MagicMock()
@@ -159,4 +188,24 @@ def test_update_progress_bar():
         ops.update_progress_bar(
             go, 'synccopy', start, 1, 1, 1, 1)
 
+    budget = workqueue.MemoryBudget(1048576)
+    budget.acquire(524288)
+    with mock.patch('sys.stdout') as patched_stdout:
+        ops.update_progress_bar(
+            go, 'download', start, 2, 1, 2, 1, memory_budget=budget)
+        assert '0.5/1.0 MiB in-flight' in \
+            patched_stdout.write.call_args_list[1][0][0]
+
     assert util.is_not_empty(go.log_file)
+
+
+def test_output_memory_usage():
+    budget = workqueue.MemoryBudget(1048576)
+    budget.acquire(524288)
+    budget.release(524288)
+    with mock.patch('blobxfer.operations.progress.logger') as patched_log:
+        ops.output_memory_usage(budget)
+        assert 'peak in-flight memory: 0.500 MiB (limit: 1.000 MiB)' == \
+            patched_log.info.call_args[0][0]
+        ops.output_memory_usage(workqueue.MemoryBudget(0))
+        assert 'limit: unlimited' in patched_log.info.call_args[0][0]
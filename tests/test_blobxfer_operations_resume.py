@@ -2,6 +2,9 @@
 """Tests for operations resume"""
 
 # stdlib imports
+import sqlite3
+import stat
+import time
 import unittest.mock as mock
 import pathlib
 # non-stdlib imports
@@ -234,3 +237,207 @@ def test_synccopy_resume_manager(tmpdir):
     srm.delete()
     assert srm._data is None
     assert not tmpdb_dat.exists() and not tmpdb.exists()
+
+
+def _ase(name):
+    ase = mock.MagicMock()
+    ase._client.primary_endpoint = 'ep'
+    ase.path = name
+    ase._size = 16
+    return ase
+
+
+def _rows(tmpdb, table):
+    conn = sqlite3.connect(str(tmpdb))
+    try:
+        return conn.execute(
+            'SELECT * FROM {} ORDER BY key'.format(table)).fetchall()
+    finally:
+        conn.close()
+
+
+def test_bitmap_encoding():
+    for value in (0, 1, -1, 8, -128, 255, 1 << 50000, -(1 << 49999)):
+        assert ops._decode_bitmap(ops._encode_bitmap(value)) == value
+
+
+def test_resume_manager_group_commit(tmpdir):
+    tmpdb = pathlib.Path(str(tmpdir.join('tmp.db')))
+    urm = ops.UploadResumeManager(
+        tmpdb, checkpoint_interval=3600, checkpoint_records=2)
+    urm.add_or_update_record('a', _ase('a'), 2, 8, 1, False, 'abc')
+    assert _rows(tmpdb, 'upload') == []
+    assert urm.get_record(_ase('a')).completed_chunks == 1
+
+    # checkpoint once enough records are updated
+    urm.add_or_update_record('b', _ase('b'), 2, 8, -1, True, None)
+    rows = _rows(tmpdb, 'upload')
+    assert len(rows) == 2
+    assert rows[0] == (
+        'ep:a', 'a', 16, 2, 8, b'\x01', 0, 'abc', None, None, None, None,
+        None, None)
+    assert rows[1][6] == 1
+    # completed records are evicted from the cache but remain readable
+    assert 'ep:b' not in urm._records
+    assert urm.get_record(_ase('b')).completed
+    assert urm.get_record(_ase('b')).completed_chunks == -1
+
+    # checkpoint on close
+    urm.add_or_update_record('a', _ase('a'), 2, 8, 3, False, 'def')
+    urm.close()
+    assert _rows(tmpdb, 'upload')[0][5] == b'\x03'
+
+    # incomplete records are loaded on open
+    urm = ops.UploadResumeManager(tmpdb)
+    incomplete = urm.incomplete_records()
+    assert list(incomplete.keys()) == ['ep:a']
+    assert incomplete['ep:a'].md5hexdigest == 'def'
+    assert 'ep:a' in urm._records
+    urm.delete()
+    assert not tmpdb.exists()
+    assert not pathlib.Path(str(tmpdb) + '-wal').exists()
+
+
+def test_resume_manager_periodic_checkpoint(tmpdir):
+    tmpdb = pathlib.Path(str(tmpdir.join('tmp.db')))
+    drm = ops.DownloadResumeManager(tmpdb, checkpoint_interval=0.01)
+    drm.add_or_update_record('fp', _ase('a'), 2, 1, False, 'abc')
+    deadline = time.monotonic() + 5
+    while len(_rows(tmpdb, 'download')) == 0:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert _rows(tmpdb, 'download') == [
+        ('ep:a', 'fp', 16, 2, 1, None, 0, 'abc', None, None, None, None)]
+    drm.delete()
+
+    # checkpoint thread survives errors
+    drm = ops.DownloadResumeManager(tmpdb, checkpoint_interval=0.01)
+    with mock.patch.object(
+            drm, 'checkpoint', side_effect=[RuntimeError(), None, None]):
+        time.sleep(0.1)
+    assert drm._checkpoint_thread.is_alive()
+    drm.delete()
+
+
+def test_resume_manager_synccopy_persistence(tmpdir):
+    tmpdb = pathlib.Path(str(tmpdir.join('tmp.db')))
+    srm = ops.SyncCopyResumeManager(tmpdb)
+    srm.add_or_update_record(_ase('a'), ['b1', 'b2'], 4, 2, 8, 3, False)
+    srm.close()
+    srm = ops.SyncCopyResumeManager(tmpdb)
+    s = srm.get_record(_ase('a'))
+    assert s.src_block_list == ['b1', 'b2']
+    assert s.offset == 4
+    assert s.completed_chunks == 3
+    assert not s.completed
+    assert srm.get_record(_ase('z')) is None
+    srm.delete()
+
+
+def test_download_resume_manager_completed_chunks(tmpdir):
+    tmpdb = pathlib.Path(str(tmpdir.join('tmp.db')))
+    drm = ops.DownloadResumeManager(tmpdb)
+    drm.add_or_update_record(
+        'fp', _ase('a'), 2, 0, False, None, completed_chunks=2)
+    drm.add_or_update_record(
+        'fp', _ase('a'), 2, 1, False, 'abc', completed_chunks=6)
+    # stale integrity updates do not regress the record
+    drm.add_or_update_record(
+        'fp', _ase('a'), 2, 0, False, None, completed_chunks=7)
+    drm.close()
+    drm = ops.DownloadResumeManager(tmpdb)
+    d = drm.get_record(_ase('a'))
+    assert d.next_integrity_chunk == 1
+    assert d.completed_chunks == 6
+    assert d.md5hexdigest == 'abc'
+    drm.delete()
+
+    # resume files of another schema version are replaced
+    conn = sqlite3.connect(str(tmpdb))
+    conn.execute('PRAGMA user_version=1')
+    conn.close()
+    drm = ops.DownloadResumeManager(tmpdb)
+    assert drm._data.execute('PRAGMA user_version').fetchone()[0] == \
+        ops._SCHEMA_VERSION
+    drm.delete()
+
+
+def test_resume_manager_md5_state(tmpdir):
+    tmpdb = pathlib.Path(str(tmpdir.join('tmp.db')))
+    drm = ops.DownloadResumeManager(tmpdb)
+    drm.add_or_update_record(
+        'fp', _ase('a'), 2, 1, False, 'abc', md5_state=b'state1',
+        file_size=16, file_mtime_ns=1)
+    # chunk writes update the file stamp but keep the md5 state
+    drm.add_or_update_record(
+        'fp', _ase('a'), 2, 1, False, None, completed_chunks=3,
+        file_size=16, file_mtime_ns=2)
+    drm.close()
+    drm = ops.DownloadResumeManager(tmpdb)
+    d = drm.get_record(_ase('a'))
+    assert d.md5hexdigest == 'abc'
+    assert d.md5_state == b'state1'
+    assert d.file_size == 16
+    assert d.file_mtime_ns == 2
+    drm.delete()
+
+    urm = ops.UploadResumeManager(tmpdb)
+    urm.add_or_update_record(
+        'lp', _ase('a'), 2, 8, 1, False, 'abc', md5_state=b'state1',
+        file_size=16, file_mtime_ns=1)
+    urm.add_or_update_record(
+        'lp', _ase('a'), 2, 8, 3, False, 'def', md5_state=b'state2',
+        file_size=16, file_mtime_ns=1)
+    urm.close()
+    urm = ops.UploadResumeManager(tmpdb)
+    u = urm.get_record(_ase('a'))
+    assert u.md5hexdigest == 'def'
+    assert u.md5_state == b'state2'
+    assert u.file_size == 16
+    assert u.file_mtime_ns == 1
+    urm.delete()
+
+
+def test_resume_manager_encryption_state(tmpdir):
+    tmpdb = pathlib.Path(str(tmpdir.join('tmp.db')))
+    drm = ops.DownloadResumeManager(tmpdb)
+    # resume databases may hold keys so are only accessible by the owner
+    assert stat.S_IMODE(tmpdb.stat().st_mode) == 0o600
+    drm.add_or_update_record(
+        'fp', _ase('a'), 2, 1, False, None, hmac_state=b'hmac1',
+        file_size=16, file_mtime_ns=1)
+    drm.add_or_update_record(
+        'fp', _ase('a'), 2, 1, False, None, file_size=16, file_mtime_ns=2)
+    drm.close()
+    drm = ops.DownloadResumeManager(tmpdb)
+    d = drm.get_record(_ase('a'))
+    assert d.hmac_state == b'hmac1'
+    assert d.file_mtime_ns == 2
+    drm.delete()
+
+    urm = ops.UploadResumeManager(tmpdb)
+    urm.add_or_update_record(
+        'lp', _ase('a'), 2, 8, 1, False, None, encryption_keys='{}',
+        encryption_iv=b'iv1', hmac_state=b'hmac1')
+    # state is retained on completion for finalization
+    urm.add_or_update_record(
+        'lp', _ase('a'), 2, 8, -1, True, None, encryption_iv=b'iv2',
+        hmac_state=b'hmac2')
+    urm.close()
+    urm = ops.UploadResumeManager(tmpdb)
+    u = urm.get_record(_ase('a'))
+    assert u.completed
+    assert u.encryption_keys == '{}'
+    assert u.encryption_iv == b'iv2'
+    assert u.hmac_state == b'hmac2'
+    urm.delete()
+
+
+def test_resume_manager_incompatible_file(tmpdir):
+    tmpdb = pathlib.Path(str(tmpdir.join('tmp.db')))
+    tmpdb.write_bytes(b'\x00' * 4096)
+    drm = ops.DownloadResumeManager(tmpdb)
+    assert drm.get_record(_ase('a')) is None
+    drm.add_or_update_record('fp', _ase('a'), 2, 1, False, None)
+    drm.close()
+    assert len(_rows(tmpdb, 'download')) == 1
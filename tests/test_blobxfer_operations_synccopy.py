@@ -9,6 +9,7 @@ import pathlib
 import pytest
 # local imports
 import blobxfer.models.azure as azmodels
+import blobxfer.models.options as options
 import blobxfer.util as util
 # module under test
 import blobxfer.operations.synccopy as ops
@@ -99,6 +100,7 @@ def test_translate_src_mode_to_dst_mode():
 def test_delete_extraneous_files(db, lab, df, laf):
     s = ops.SyncCopy(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
     s._general_options.dry_run = False
+    s._general_options.concurrency.transfer_threads = 1
 
     # test no delete
     s._spec.options.delete_extraneous_destination = False
@@ -162,6 +164,20 @@ def test_delete_extraneous_files(db, lab, df, laf):
     assert lab.call_count == 2
     assert db.call_count == 1
 
+    # test deletion started during transfer is not restarted
+    s._start_extraneous_deletion()
+    s._start_extraneous_deletion()
+    s._delete_extraneous_files()
+    assert s._extraneous_deleter is None
+    assert lab.call_count == 3
+    assert db.call_count == 2
+
+    s._delete_exclude.add(ops.SyncCopy.create_deletion_id(
+        sa1.block_blob_client, 'cont', 'blobname'))
+    s._delete_extraneous_files()
+    assert lab.call_count == 4
+    assert db.call_count == 2
+
 
 @mock.patch('blobxfer.operations.azure.blob.block.get_committed_block_list')
 def test_add_to_transfer_queue(gcbl):
@@ -191,6 +207,47 @@ def test_add_to_transfer_queue(gcbl):
     assert s._transfer_queue.qsize() == 2
     assert s._synccopy_start_time is not None
 
+    # page blob to page blob only transfers populated page ranges
+    s._spec.options.server_side_copy = False
+    s._spec.options.stream_relay = False
+    src_ase.size = 4096
+    dst_ase.mode = azmodels.StorageModes.Page
+    dst_ase.replica_targets = [mock.MagicMock()]
+    with mock.patch(
+            'blobxfer.operations.azure.blob.page.get_page_ranges',
+            return_value=[mock.MagicMock(start=512, end=1023)]) as gpr:
+        s._add_to_transfer_queue(src_ase, dst_ase)
+        assert gpr.call_count == 1
+    assert s._transfer_queue.qsize() == 3
+    assert s._synccopy_bytes_sofar == (4096 - 512) * 2
+
+    # delta copies retrieve the committed blocks of existing destinations
+    s._spec.options.delta = True
+    src_ase.mode = azmodels.StorageModes.Block
+    src_ase.size = 6
+    dst_ase.mode = azmodels.StorageModes.Block
+    dst_ase.replica_targets = None
+    dst_ase.from_local = False
+    b1 = mock.MagicMock()
+    b1.id = '00000000-' + 'a' * 32
+    b1.size = 4
+    b2 = mock.MagicMock()
+    b2.id = '00000001-' + 'b' * 32
+    b2.size = 2
+    gcbl.return_value = [b1, b2]
+    with mock.patch(
+            'blobxfer.operations.azure.blob.block.'
+            'get_committed_block_digests',
+            return_value=[('a' * 32, 4), ('c' * 32, 2)]) as gcbd:
+        s._add_to_transfer_queue(src_ase, dst_ase)
+        assert gcbd.call_count == 1
+    assert s._transfer_queue.qsize() == 4
+    sd = list(s._transfer_queue.queue)[-1]
+    assert sd.is_delta
+    assert sd.delta_block_digests == ['a' * 32, 'b' * 32]
+    assert sd.is_delta_block_unchanged(0)
+    assert not sd.is_delta_block_unchanged(1)
+
 
 def test_initialize_transfer_threads():
     s = ops.SyncCopy(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
@@ -206,6 +263,243 @@ def test_initialize_transfer_threads():
             assert not thr.is_alive()
 
 
+def test_initialize_concurrency_controller():
+    s = ops.SyncCopy(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
+    s._general_options.dry_run = False
+    s._general_options.concurrency.mode = options.ConcurrencyMode.Auto
+    s._general_options.concurrency.transfer_threads = 1
+    s._general_options.concurrency.max_transfer_threads = 2
+
+    s._initialize_concurrency_controller()
+    try:
+        assert s._concurrency_controller.maximum == 2
+        s._initialize_transfer_threads()
+        assert len(s._transfer_threads) == 2
+    finally:
+        s._wait_for_transfer_threads(True)
+        for thr in s._transfer_threads:
+            assert not thr.is_alive()
+
+
+def test_async_copy_engine_process_job():
+    complete = mock.MagicMock()
+    engine = ops.AsyncCopyEngine(1, lambda: False, complete, None)
+
+    src_ase = mock.MagicMock()
+    src_ase.is_arbitrary_url = True
+    src_ase.path = 'https://host/cont/src'
+    dst_ase = mock.MagicMock()
+    dst_ase.from_local = False
+    dst_ase.path = 'cont/dst'
+
+    props = mock.MagicMock()
+    props.status = None
+    props.source = None
+    with mock.patch(
+            'blobxfer.operations.azure.blob.get_copy_properties',
+            return_value=props):
+        with mock.patch(
+                'blobxfer.operations.azure.blob.start_copy_blob',
+                return_value='cid') as scb:
+            # start new copy
+            job = ops._AsyncCopyJob(src_ase, dst_ase, 'tid')
+            engine._process_job(job)
+            assert scb.call_count == 1
+            assert job.copy_id == 'cid'
+            assert job in engine._active
+            assert len(engine._schedule) == 1
+
+            # adopt pending copy of the same source
+            props.status = 'pending'
+            props.source = 'https://host/cont/src?sig=old'
+            props.id = 'pid'
+            job2 = ops._AsyncCopyJob(src_ase, dst_ase, 'tid')
+            engine._process_job(job2)
+            assert scb.call_count == 1
+            assert job2.copy_id == 'pid'
+
+            # do not adopt pending copy of a different source
+            props.source = 'https://host/cont/other'
+            job3 = ops._AsyncCopyJob(src_ase, dst_ase, 'tid')
+            engine._process_job(job3)
+            assert scb.call_count == 2
+            assert job3.copy_id == 'cid'
+
+        # pending with backoff
+        props.id = 'cid'
+        props.status = 'pending'
+        engine._process_job(job)
+        assert job.interval == ops._ASYNC_COPY_POLL_INTERVAL_MIN * 2
+        job.interval = ops._ASYNC_COPY_POLL_INTERVAL_MAX
+        engine._process_job(job)
+        assert job.interval == ops._ASYNC_COPY_POLL_INTERVAL_MAX
+        assert complete.call_count == 0
+
+        # success
+        props.status = 'success'
+        engine._process_job(job)
+        complete.assert_called_once_with(src_ase, dst_ase, 'tid')
+        assert job not in engine._active
+
+        # failure
+        props.id = 'cid'
+        props.status = 'failed'
+        with pytest.raises(RuntimeError):
+            engine._process_job(job3)
+        assert job3 not in engine._active
+
+        # superseded
+        props.id = 'other'
+        with pytest.raises(RuntimeError):
+            engine._process_job(job2)
+        assert job2 not in engine._active
+
+
+def test_async_copy_engine_threads():
+    completed = []
+    errors = []
+    engine = ops.AsyncCopyEngine(
+        2, lambda: len(completed) + len(errors) == 2,
+        lambda src, dst, tid: completed.append(tid), errors.append)
+
+    src_ase = mock.MagicMock()
+    src_ase.is_arbitrary_url = True
+    src_ase.path = 'https://host/cont/src'
+    dst_ase = mock.MagicMock()
+    dst_ase.from_local = True
+
+    props = mock.MagicMock()
+    props.id = 'cid'
+    props.status = 'success'
+    with mock.patch(
+            'blobxfer.operations.azure.blob.get_copy_properties',
+            return_value=props):
+        with mock.patch(
+                'blobxfer.operations.azure.blob.start_copy_blob',
+                side_effect=['cid', RuntimeError('oops')]):
+            with mock.patch(
+                    'blobxfer.operations.synccopy.'
+                    '_ASYNC_COPY_POLL_INTERVAL_MIN', 0):
+                engine.add(src_ase, dst_ase, 'tid')
+                engine.add(src_ase, dst_ase, 'tid2')
+                engine.start()
+                engine.join()
+    assert completed == ['tid']
+    assert len(errors) == 1
+    assert len(engine._active) == 0
+
+    # terminated engine does not process jobs
+    engine = ops.AsyncCopyEngine(1, lambda: False, None, None)
+    engine.terminate()
+    engine.add(src_ase, dst_ase, 'tid')
+    assert engine._next_job() is None
+    engine.start()
+    engine.join()
+    assert len(engine._schedule) == 1
+
+
+def test_async_copy_engine_abort():
+    engine = ops.AsyncCopyEngine(1, lambda: False, None, None)
+    job = ops._AsyncCopyJob(mock.MagicMock(), mock.MagicMock(), 'tid')
+    job.copy_id = 'cid'
+    job2 = ops._AsyncCopyJob(mock.MagicMock(), mock.MagicMock(), 'tid2')
+    job2.copy_id = 'cid2'
+    engine._active.add(job)
+    engine._active.add(job2)
+
+    with mock.patch(
+            'blobxfer.operations.azure.blob.abort_copy_blob',
+            side_effect=[None, RuntimeError('oops')]) as acb:
+        engine.abort()
+        assert acb.call_count == 2
+    assert len(engine._active) == 0
+
+
+@mock.patch('blobxfer.operations.azure.blob.block.set_blob_access_tier')
+@mock.patch('blobxfer.operations.azure.blob.create_container')
+def test_async_copy(cc, sbat):
+    s = ops.SyncCopy(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
+    s._general_options.concurrency.transfer_threads = 1
+    s._general_options.resume_file = None
+
+    src_ase = mock.MagicMock()
+    src_ase._client.primary_endpoint = 'ep'
+    src_ase.path = 'srcasepath'
+    src_ase.mode = azmodels.StorageModes.Block
+    src_ase.size = 10
+    src_ase.snapshot = None
+    dst_ase = mock.MagicMock()
+    dst_ase._client.primary_endpoint = 'ep2'
+    dst_ase.path = 'dstasepath'
+    dst_ase.mode = azmodels.StorageModes.Block
+    dst_ase.access_tier = 'cool'
+    dst_ase.replica_targets = [mock.MagicMock()]
+    dst_ase.replica_targets[0].mode = azmodels.StorageModes.Block
+    dst_ase.replica_targets[0].access_tier = None
+
+    # disabled
+    s._spec.options.async_copy = False
+    s._initialize_async_copy()
+    assert s._async_copy is None
+    assert not s._is_async_copyable(src_ase, dst_ase)
+
+    s._spec.options.async_copy = True
+    with mock.patch('blobxfer.operations.synccopy.AsyncCopyEngine') as ace:
+        s._initialize_async_copy()
+        assert ace.return_value.start.call_count == 1
+    assert s._is_async_copyable(src_ase, dst_ase)
+    dst_ase.mode = azmodels.StorageModes.Page
+    assert not s._is_async_copyable(src_ase, dst_ase)
+    dst_ase.mode = azmodels.StorageModes.Block
+    src_ase.snapshot = 'snap'
+    assert not s._is_async_copyable(src_ase, dst_ase)
+    src_ase.snapshot = None
+
+    # copies are added for destination and replicas
+    tid = ops.SyncCopy.create_unique_transfer_operation_id(src_ase, dst_ase)
+    s._transfer_set.add(tid)
+    s._add_to_transfer_queue(src_ase, dst_ase)
+    assert s._async_copy.add.call_count == 2
+    assert cc.call_count == 2
+    assert s._async_copy_refs[tid] == 2
+    assert s._synccopy_start_time is not None
+
+    # transfer completes when all copies complete
+    s._complete_async_copy(src_ase, dst_ase, tid)
+    assert sbat.call_count == 1
+    assert tid in s._transfer_set
+    assert s._synccopy_sofar == 0
+    s._complete_async_copy(src_ase, dst_ase.replica_targets[0], tid)
+    assert sbat.call_count == 1
+    assert tid not in s._transfer_set
+    assert tid not in s._async_copy_refs
+    assert s._synccopy_sofar == 1
+    assert s._synccopy_bytes_sofar == 20
+
+    assert s._async_copy.terminate.call_count == 0
+
+    # the last completion signals termination
+    s._all_remote_files_processed = True
+    s._transfer_set.add(tid)
+    s._async_copy_refs[tid] = 1
+    s._complete_async_copy(src_ase, dst_ase.replica_targets[0], tid)
+    assert s._async_copy.terminate.call_count == 1
+
+    s._async_copy_error(RuntimeError('oops'))
+    assert len(s._exceptions) == 1
+    assert s._async_copy.terminate.call_count == 2
+
+    # pending copies are aborted on termination without resume file
+    s._wait_for_transfer_threads(True)
+    assert s._async_copy.terminate.call_count == 3
+    assert s._async_copy.join.call_count == 1
+    assert s._async_copy.abort.call_count == 1
+
+    s._general_options.resume_file = 'resume'
+    s._wait_for_transfer_threads(True)
+    assert s._async_copy.abort.call_count == 1
+
+
 def test_worker_thread_transfer():
     s = ops.SyncCopy(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
     s._general_options.dry_run = False
@@ -233,6 +527,7 @@ def test_put_data(pp, pfr, pbfu, pb, cb, ab):
     s = ops.SyncCopy(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
     s._general_options.dry_run = False
     s._spec.options.server_side_copy = False
+    s._spec.options.stream_relay = False
 
     offsets = mock.MagicMock()
     offsets.chunk_num = 0
@@ -277,6 +572,8 @@ def test_put_data(pp, pfr, pbfu, pb, cb, ab):
     assert pbfu.call_count == 1
 
     s._spec.options.server_side_copy = False
+
+    s._spec.options.stream_relay = False
     sd.is_server_side_copyable = False
     sd.is_one_shot_block_blob = True
 
@@ -313,12 +610,121 @@ def test_process_data():
     offsets.num_bytes = 1
     offsets.chunk_num = 0
     sd = mock.MagicMock()
+    sd.is_delta_block_unchanged.return_value = False
 
     s._process_data(sd, mock.MagicMock(), offsets, mock.MagicMock())
     assert s._put_data.call_count == 1
     assert s._synccopy_bytes_sofar == 1
     assert sd.complete_offset_upload.call_count == 1
 
+    # unchanged delta blocks are accounted for without a transfer
+    sd.is_delta_block_unchanged.return_value = True
+    s._process_data(sd, mock.MagicMock(), offsets, mock.MagicMock())
+    assert s._put_data.call_count == 1
+    assert s._synccopy_bytes_sofar == 2
+    assert sd.complete_offset_upload.call_count == 2
+
+
+def test_put_data_stream():
+    s = ops.SyncCopy(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
+    s._put_data = mock.MagicMock()
+    sd = mock.MagicMock()
+    sd.delta_block_digest.return_value = None
+    offsets = ops.blobxfer.models.synccopy.Offsets(
+        chunk_num=0, num_bytes=6, range_start=512, range_end=517)
+
+    ase = mock.MagicMock()
+    ase.mode = azmodels.StorageModes.Block
+    pipe = mock.MagicMock()
+    with mock.patch(
+            'blobxfer.operations.azure.blob.block.put_block') as pb:
+        s._put_data_stream(sd, ase, offsets, pipe)
+        assert pb.call_args[0][2] == pipe
+
+    ase.mode = azmodels.StorageModes.Page
+    pipe = ops.blobxfer.models.workqueue.RelayPipe(6, 4)
+    pipe.write(b'abcdef')
+    pipe.close()
+    with mock.patch('blobxfer.operations.synccopy._RELAY_PIPE_BYTES', 4):
+        s._put_data_stream(sd, ase, offsets, pipe)
+    assert s._put_data.call_count == 2
+    sub = s._put_data.call_args_list[0][0][2]
+    assert (sub.range_start, sub.range_end, sub.num_bytes) == (512, 515, 4)
+    assert s._put_data.call_args_list[0][0][3] == b'abcd'
+    sub = s._put_data.call_args_list[1][0][2]
+    assert (sub.range_start, sub.range_end, sub.num_bytes) == (516, 517, 2)
+    assert s._put_data.call_args_list[1][0][3] == b'ef'
+
+
+@mock.patch('blobxfer.operations.azure.get_source_range_stream')
+def test_relay_stream(gsrs):
+    s = ops.SyncCopy(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
+    s._spec.options.stream_relay = True
+
+    sd = mock.MagicMock()
+    sd.is_one_shot_block_blob = False
+    sd.dst_entity.mode = azmodels.StorageModes.Block
+    sd.dst_entity.replica_targets = [mock.MagicMock()]
+    sd.dst_entity.replica_targets[0].mode = azmodels.StorageModes.File
+    offsets = ops.blobxfer.models.synccopy.Offsets(
+        chunk_num=0, num_bytes=6, range_start=0, range_end=5)
+    gsrs.return_value.iter_content.return_value = [b'abc', b'def']
+
+    received = {}
+
+    def _put(sd, ase, offsets, pipe):
+        data = []
+        while True:
+            buf = pipe.read(2)
+            if len(buf) == 0:
+                break
+            data.append(buf)
+        received[ase.mode] = b''.join(data)
+
+    # not eligible
+    s._spec.options.stream_relay = False
+    assert not s._relay_stream(sd, offsets)
+    s._spec.options.stream_relay = True
+    sd.is_one_shot_block_blob = True
+    assert not s._relay_stream(sd, offsets)
+    sd.is_one_shot_block_blob = False
+    sd.dst_entity.replica_targets[0].mode = azmodels.StorageModes.Append
+    assert not s._relay_stream(sd, offsets)
+    sd.dst_entity.replica_targets[0].mode = azmodels.StorageModes.File
+    assert gsrs.call_count == 0
+
+    # tee to destination and replica
+    s._put_data_stream = mock.MagicMock(side_effect=_put)
+    assert s._relay_stream(sd, offsets)
+    assert received == {
+        azmodels.StorageModes.Block: b'abcdef',
+        azmodels.StorageModes.File: b'abcdef',
+    }
+    assert gsrs.return_value.close.call_count == 1
+    assert s._synccopy_bytes_sofar == 12
+    assert sd.complete_offset_upload.call_count == 2
+    assert s._memory_budget.in_use == 0
+
+    # short read
+    gsrs.return_value.iter_content.return_value = [b'abc']
+    assert not s._relay_stream(sd, offsets)
+    assert s._synccopy_bytes_sofar == 12
+
+    # long read
+    gsrs.return_value.iter_content.return_value = [b'abc', b'defg']
+    assert not s._relay_stream(sd, offsets)
+
+    # consumer failure
+    gsrs.return_value.iter_content.return_value = [b'abc', b'def']
+    s._put_data_stream = mock.MagicMock(side_effect=RuntimeError('oops'))
+    assert not s._relay_stream(sd, offsets)
+    assert sd.complete_offset_upload.call_count == 2
+    assert s._memory_budget.in_use == 0
+
+    # terminated
+    s._memory_budget.terminate()
+    assert not s._relay_stream(sd, offsets)
+
 
 @mock.patch('blobxfer.operations.azure.blob.create_container')
 @mock.patch('blobxfer.operations.azure.blob.append.create_blob')
@@ -330,6 +736,7 @@ def test_prepare_upload(page_cb, cf, capd, cs, append_cb, cc):
     s = ops.SyncCopy(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
     s._general_options.dry_run = False
     s._spec.options.server_side_copy = False
+    s._spec.options.stream_relay = False
 
     ase = mock.MagicMock()
     ase._client.primary_endpoint = 'ep'
@@ -365,6 +772,7 @@ def test_process_synccopy_descriptor(gbr, gfr):
     s = ops.SyncCopy(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
     s._general_options.dry_run = False
     s._spec.options.server_side_copy = False
+    s._spec.options.stream_relay = False
 
     src_ase = mock.MagicMock()
     src_ase._client.primary_endpoint = 'ep'
@@ -386,8 +794,10 @@ def test_process_synccopy_descriptor(gbr, gfr):
     sd.complete_offset_upload = mock.MagicMock()
     sd.next_offsets.return_value = (None, 1)
     sd.is_one_shot_block_blob = False
+    sd.claim_finalization.return_value = True
     sd.all_operations_completed = True
     sd.is_server_side_copyable = False
+    sd.is_delta_block_unchanged.return_value = False
 
     s._finalize_upload = mock.MagicMock()
     s._transfer_set.add(
@@ -395,6 +805,7 @@ def test_process_synccopy_descriptor(gbr, gfr):
 
     # test resume and completed
     s._process_synccopy_descriptor(sd)
+    assert s._memory_budget.peak == 0
     assert s._synccopy_bytes_sofar == 1
     assert s._finalize_upload.call_count == 1
     assert len(s._transfer_set) == 0
@@ -404,15 +815,18 @@ def test_process_synccopy_descriptor(gbr, gfr):
     s = ops.SyncCopy(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
     s._general_options.dry_run = False
     s._spec.options.server_side_copy = False
+    s._spec.options.stream_relay = False
+    sd.claim_finalization.return_value = False
     sd.all_operations_completed = False
     sd.next_offsets.return_value = (None, None)
     s._process_synccopy_descriptor(sd)
-    assert s._transfer_queue.qsize() == 1
+    assert s._transfer_queue.qsize() == 0
 
     # test normal block blob
     s = ops.SyncCopy(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
     s._general_options.dry_run = False
     s._spec.options.server_side_copy = False
+    s._spec.options.stream_relay = False
     s._prepare_upload = mock.MagicMock()
     s._process_data = mock.MagicMock()
     offsets = mock.MagicMock()
@@ -428,11 +842,32 @@ def test_process_synccopy_descriptor(gbr, gfr):
     assert gbr.call_count == 1
     assert s._transfer_queue.qsize() == 1
     assert len(s._transfer_set) == 0
+    assert s._process_data.call_count == 2
+    assert s._memory_budget.peak == 1
+    assert s._memory_budget.in_use == 0
+
+    # test streamed relay
+    s = ops.SyncCopy(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
+    s._general_options.dry_run = False
+    s._spec.options.server_side_copy = False
+    s._prepare_upload = mock.MagicMock()
+    s._process_data = mock.MagicMock()
+    s._relay_stream = mock.MagicMock(return_value=True)
+    s._concurrency_controller = mock.MagicMock()
+    s._process_synccopy_descriptor(sd)
+    assert s._relay_stream.call_count == 1
+    assert gbr.call_count == 1
+    assert s._process_data.call_count == 0
+    assert s._memory_budget.peak == 0
+    assert s._concurrency_controller.acquire.call_count == 1
+    assert s._concurrency_controller.release.call_count == 1
+    assert s._concurrency_controller.record.call_count == 1
 
     # test normal append blob
     s = ops.SyncCopy(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
     s._general_options.dry_run = False
     s._spec.options.server_side_copy = False
+    s._spec.options.stream_relay = False
     s._prepare_upload = mock.MagicMock()
     s._process_data = mock.MagicMock()
     offsets = mock.MagicMock()
@@ -452,6 +887,7 @@ def test_process_synccopy_descriptor(gbr, gfr):
     s = ops.SyncCopy(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
     s._general_options.dry_run = False
     s._spec.options.server_side_copy = False
+    s._spec.options.stream_relay = False
     s._prepare_upload = mock.MagicMock()
     s._process_data = mock.MagicMock()
     offsets = mock.MagicMock()
@@ -511,12 +947,35 @@ def test_process_synccopy_descriptor(gbr, gfr):
     assert s._transfer_queue.qsize() == 1
     assert len(s._transfer_set) == 0
 
+    # test memory is released on failure and not acquired on termination
+    offsets.range_start = 0
+    s._process_data.side_effect = RuntimeError()
+    with pytest.raises(RuntimeError):
+        s._process_synccopy_descriptor(sd)
+    assert gbr.call_count == 3
+    assert s._memory_budget.in_use == 0
+    s._memory_budget.terminate()
+    s._process_synccopy_descriptor(sd)
+    assert gbr.call_count == 3
+
+    # unchanged delta blocks are not retrieved
+    s = ops.SyncCopy(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
+    s._general_options.dry_run = False
+    s._prepare_upload = mock.MagicMock()
+    s._process_data = mock.MagicMock()
+    sd.is_delta_block_unchanged.return_value = True
+    s._process_synccopy_descriptor(sd)
+    assert gbr.call_count == 3
+    assert s._process_data.call_count == 2
+    assert s._process_data.call_args[0][3] is None
+
 
 @mock.patch('blobxfer.operations.azure.blob.block.put_block_list')
 def test_finalize_block_blob(pbl):
     s = ops.SyncCopy(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
     s._general_options.dry_run = False
     s._spec.options.server_side_copy = False
+    s._spec.options.stream_relay = False
 
     ase = mock.MagicMock()
     ase._client.primary_endpoint = 'ep'
@@ -529,9 +988,20 @@ def test_finalize_block_blob(pbl):
     sd = mock.MagicMock()
     sd.dst_entity = ase
     sd.last_block_num = 1
+    sd.is_delta = False
+    sd.delta_block_digests = None
 
     s._finalize_block_blob(sd, mock.MagicMock(), mock.MagicMock())
     assert pbl.call_count == 2
+    assert pbl.call_args_list[0][1]['digests'] is None
+
+    sd.is_delta = True
+    sd.delta_block_digests = ['a', 'b']
+    sd.delta_unchanged = (1, 10)
+    ase.replica_targets = None
+    s._finalize_block_blob(sd, mock.MagicMock(), mock.MagicMock())
+    assert pbl.call_count == 3
+    assert pbl.call_args[1]['digests'] == ['a', 'b']
 
 
 @mock.patch('blobxfer.operations.azure.blob.set_blob_properties')
@@ -539,6 +1009,7 @@ def test_set_blob_properties(sbp):
     s = ops.SyncCopy(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
     s._general_options.dry_run = False
     s._spec.options.server_side_copy = False
+    s._spec.options.stream_relay = False
 
     ase = mock.MagicMock()
     ase._client.primary_endpoint = 'ep'
@@ -560,6 +1031,7 @@ def test_set_blob_metadata(sbm):
     s = ops.SyncCopy(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
     s._general_options.dry_run = False
     s._spec.options.server_side_copy = False
+    s._spec.options.stream_relay = False
 
     ase = mock.MagicMock()
     ase._client.primary_endpoint = 'ep'
@@ -580,6 +1052,7 @@ def test_finalize_nonblock_blob():
     s = ops.SyncCopy(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
     s._general_options.dry_run = False
     s._spec.options.server_side_copy = False
+    s._spec.options.stream_relay = False
 
     s._set_blob_properties = mock.MagicMock()
     s._set_blob_metadata = mock.MagicMock()
@@ -595,6 +1068,7 @@ def test_finalize_azure_file(sfmeta, sfp):
     s = ops.SyncCopy(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
     s._general_options.dry_run = False
     s._spec.options.server_side_copy = False
+    s._spec.options.stream_relay = False
 
     ase = mock.MagicMock()
     ase._client.primary_endpoint = 'ep'
@@ -615,6 +1089,7 @@ def test_finalize_upload():
     s = ops.SyncCopy(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
     s._general_options.dry_run = False
     s._spec.options.server_side_copy = False
+    s._spec.options.stream_relay = False
 
     ase = mock.MagicMock()
     ase._client.primary_endpoint = 'ep'
@@ -655,6 +1130,7 @@ def test_check_copy_conditions(gmfm):
     s = ops.SyncCopy(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
     s._general_options.dry_run = False
     s._spec.options.server_side_copy = False
+    s._spec.options.stream_relay = False
     s._spec.options.strip_components = 0
 
     src_ase = mock.MagicMock()
@@ -728,6 +1204,7 @@ def test_check_for_existing_remote(gbp, gfp):
     s = ops.SyncCopy(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
     s._general_options.dry_run = False
     s._spec.options.server_side_copy = False
+    s._spec.options.stream_relay = False
     s._spec.options.strip_components = 0
 
     sa = mock.MagicMock()
@@ -767,11 +1244,38 @@ def test_check_for_existing_remote(gbp, gfp):
         assert s._check_for_existing_remote(
             sa, 'cont', 'name', src_mode) is not None
 
+    # check remote index
+    s._remote_index = mock.MagicMock()
+    s._remote_index.get_properties.return_value = None
+    gbp.reset_mock()
+    assert s._check_for_existing_remote(sa, 'cont', 'name', src_mode) is None
+    s._remote_index.get_properties.assert_called_once_with(
+        sa, 'cont', 'name', src_mode)
+    assert gbp.call_count == 0
+
+
+def test_initialize_remote_index():
+    s = ops.SyncCopy(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
+    s._spec.options.remote_index = False
+    s._initialize_remote_index()
+    assert s._remote_index is None
+
+    sa = mock.MagicMock()
+    sa.name = 'sa'
+    s._spec.options.remote_index = True
+    s._get_destination_paths = mock.MagicMock()
+    s._get_destination_paths.return_value = [(sa, 'cont', '', 'cont')]
+    s._initialize_remote_index()
+    assert s._remote_index is not None
+    assert s._remote_index._find_prefix(sa, 'cont', True, 'a') == ''
+    s._remote_index.close()
+
 
 def test_get_destination_paths():
     s = ops.SyncCopy(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
     s._general_options.dry_run = False
     s._spec.options.server_side_copy = False
+    s._spec.options.stream_relay = False
     s._spec.options.strip_components = 0
 
     paths = mock.MagicMock()
@@ -788,6 +1292,7 @@ def test_generate_destination_for_source():
     s = ops.SyncCopy(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
     s._general_options.dry_run = False
     s._spec.options.server_side_copy = False
+    s._spec.options.stream_relay = False
     s._spec.options.strip_components = 0
     s._spec.options.dest_mode = azmodels.StorageModes.Block
     s._spec.options.rename = False
@@ -881,6 +1386,7 @@ def test_bind_sources_to_destination():
     s = ops.SyncCopy(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
     s._general_options.dry_run = False
     s._spec.options.server_side_copy = False
+    s._spec.options.stream_relay = False
     s._spec.options.strip_components = 0
     s._spec.options.delete_extraneous_destination = True
 
@@ -946,11 +1452,13 @@ def test_run(srm, gbr, gfr):
     s = ops.SyncCopy(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
     s._general_options.dry_run = False
     s._spec.options.server_side_copy = False
+    s._spec.options.stream_relay = False
     s._spec.options.strip_components = 0
     s._general_options.concurrency.transfer_threads = 1
     s._general_options.resume_file = 'resume'
     s._spec.options.chunk_size_bytes = 0
     s._spec.options.delete_only = False
+    s._spec.options.async_copy = False
 
     src_ase = mock.MagicMock()
     src_ase._client.primary_endpoint = 'ep'
@@ -1021,11 +1529,76 @@ def test_run(srm, gbr, gfr):
         s._synccopy_terminate = True
 
 
+@mock.patch('blobxfer.operations.synccopy._ASYNC_COPY_POLL_INTERVAL_MIN', 0)
+@mock.patch('blobxfer.operations.azure.blob.get_copy_properties')
+@mock.patch('blobxfer.operations.azure.blob.start_copy_blob')
+@mock.patch('blobxfer.operations.azure.blob.create_container')
+@mock.patch('blobxfer.operations.azure.blob.block.get_source_url')
+def test_run_async_copy_only(gsu, cc, scb, gcp):
+    def _create():
+        s = ops.SyncCopy(
+            mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
+        s._general_options.dry_run = False
+        s._general_options.concurrency.mode = options.ConcurrencyMode.Static
+        s._general_options.concurrency.transfer_threads = 2
+        s._general_options.resume_file = None
+        s._spec.options.delete_only = False
+        s._spec.options.delete_extraneous_destination = False
+        s._spec.options.delete_during_transfer = False
+        s._spec.options.async_copy = True
+        s._initialize_remote_index = mock.MagicMock()
+        src_ase = mock.MagicMock()
+        src_ase._client.primary_endpoint = 'ep'
+        src_ase.path = 'srcasepath'
+        src_ase.mode = azmodels.StorageModes.Block
+        src_ase.size = 10
+        src_ase.snapshot = None
+        dst_ase = mock.MagicMock()
+        dst_ase._client.primary_endpoint = 'ep2'
+        dst_ase.path = 'dstasepath'
+        dst_ase.mode = azmodels.StorageModes.Block
+        dst_ase.access_tier = None
+        dst_ase.from_local = True
+        dst_ase.replica_targets = None
+        s._bind_sources_to_destination = mock.MagicMock(
+            return_value=[(src_ase, dst_ase)])
+        return s
+
+    gsu.return_value = 'https://ep/cont/srcasepath'
+    scb.return_value = 'copyid'
+    pending = mock.MagicMock()
+    pending.id = 'copyid'
+    pending.status = 'pending'
+    success = mock.MagicMock()
+    success.id = 'copyid'
+    success.status = 'success'
+    failed = mock.MagicMock()
+    failed.id = 'copyid'
+    failed.status = 'failed'
+
+    # transfer threads are woken when the last copy completes
+    gcp.side_effect = [pending, success]
+    s = _create()
+    s._run()
+    assert scb.call_count == 1
+    assert s._synccopy_sofar == 1
+    assert s._synccopy_bytes_sofar == 10
+    assert all(not thr.is_alive() for thr in s._transfer_threads)
+
+    # transfer threads are woken on copy error
+    gcp.side_effect = [pending, failed]
+    s = _create()
+    with pytest.raises(RuntimeError):
+        s._run()
+    assert all(not thr.is_alive() for thr in s._transfer_threads)
+
+
 def test_start():
     s = ops.SyncCopy(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
     s._general_options.dry_run = False
     s._spec.options.delete_only = False
     s._spec.options.server_side_copy = False
+    s._spec.options.stream_relay = False
     s._spec.options.strip_components = 0
     s._wait_for_transfer_threads = mock.MagicMock()
     s._resume = mock.MagicMock()
@@ -0,0 +1,94 @@
+# coding=utf-8
+"""Tests for operations sync state"""
+
+# stdlib imports
+import datetime
+import os
+import pathlib
+import unittest.mock as mock
+# non-stdlib imports
+import pytest
+# local imports
+import blobxfer.models.options as options
+# module under test
+import blobxfer.operations.syncstate as ops
+
+
+def test_generate_keys():
+    assert ops.SyncStateManager.generate_remote_key(
+        'ep', 'cont', 'a/b') == 'ep:cont/a/b'
+    assert ops.SyncStateManager.generate_local_key(
+        pathlib.Path('a')) == 'local:a'
+
+
+def test_local_and_remote_matches():
+    stat = mock.MagicMock()
+    stat.st_size = 1
+    stat.st_mtime_ns = 2
+    stat.st_ino = 3
+    lmt = datetime.datetime.now(tz=datetime.timezone.utc)
+    record = ops.SyncStateRecord(
+        local_size=1, local_mtime_ns=2, local_inode=3, remote_etag='e',
+        remote_lmt=lmt, remote_md5=None, validated=0)
+
+    assert ops.SyncStateManager.local_matches(record, stat)
+    stat.st_mtime_ns = 4
+    assert not ops.SyncStateManager.local_matches(record, stat)
+
+    assert ops.SyncStateManager.remote_matches(record, 'e', None)
+    assert not ops.SyncStateManager.remote_matches(record, 'f', lmt)
+    assert ops.SyncStateManager.remote_matches(record, None, lmt)
+    assert not ops.SyncStateManager.remote_matches(record, None, None)
+
+
+def test_sync_state_manager(tmpdir):
+    ssopts = options.SyncState(str(tmpdir.join('ss.db')), None, None)
+    ssm = ops.SyncStateManager(ssopts)
+    assert ssm.get_record('key') is None
+
+    tmpdir.join('a').write('abc')
+    stat = os.stat(str(tmpdir.join('a')))
+    ssm.add_or_update_record('key', stat, 'etag', None, 'md5')
+    record = ssm.get_record('key')
+    assert record.local_size == 3
+    assert record.remote_etag == 'etag'
+    assert record.remote_md5 == 'md5'
+    assert not ssm.requires_revalidation(record)
+    ssm.close()
+    assert ssm._data is None
+    ssm.close()
+    ssm.add_or_update_record('key2', stat, 'etag', None, 'md5')
+
+    # records persist across instances
+    ssm = ops.SyncStateManager(ssopts)
+    record = ssm.get_record('key')
+    assert record.remote_etag == 'etag'
+    ssm.mark_unchanged('key', record._replace(validated=0), validated=True)
+    assert ssm.get_record('key').validated > 0
+    assert ssm._unchanged == 1
+    ssm.close()
+
+
+def test_sync_state_manager_revalidation(tmpdir):
+    record = ops.SyncStateRecord(
+        local_size=1, local_mtime_ns=2, local_inode=3, remote_etag='e',
+        remote_lmt=None, remote_md5=None, validated=100)
+
+    ssm = ops.SyncStateManager(options.SyncState(
+        str(tmpdir.join('ss.db')), 10, 0))
+    with mock.patch('time.time', return_value=105):
+        assert not ssm.requires_revalidation(record)
+    with mock.patch('time.time', return_value=110):
+        assert ssm.requires_revalidation(record)
+    ssm.close()
+
+    ssm = ops.SyncStateManager(options.SyncState(
+        str(tmpdir.join('ss.db')), 0, 0.5))
+    with mock.patch('random.random', return_value=0.25):
+        assert ssm.requires_revalidation(record)
+    with mock.patch('random.random', return_value=0.75):
+        assert not ssm.requires_revalidation(record)
+    ssm.close()
+
+    with pytest.raises(ValueError):
+        options.SyncState(str(tmpdir.join('ss.db')), 0, 2)
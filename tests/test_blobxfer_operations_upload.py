@@ -10,9 +10,14 @@ import azure.storage.blob
 import pytest
 # local imports
 import blobxfer.models.azure as azmodels
+import blobxfer.models.buffer as buffer
+import blobxfer.models.options as options
 import blobxfer.models.upload as models
+import blobxfer.operations.concurrency as concurrency
+import blobxfer.retry as retry
 import blobxfer.util as util
 # module under test
+import blobxfer.operations.crypto as crypto
 import blobxfer.operations.upload as ops
 
 
@@ -177,6 +182,39 @@ def test_add_to_upload_queue():
     assert u._upload_start_time is not None
 
 
+@mock.patch('blobxfer.operations.azure.blob.block.get_committed_block_digests')
+def test_add_to_upload_queue_delta(gcbd, tmpdir):
+    tmpdir.join('a').write('z' * 32)
+    u = ops.Uploader(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
+    u._general_options.dry_run = False
+    u._spec.options.chunk_size_bytes = 8
+    u._spec.options.one_shot_bytes = 0
+    u._spec.options.rsa_public_key = None
+    u._spec.options.delta = True
+    gcbd.return_value = [(None, 8)]
+
+    src = models.LocalPath(pathlib.Path(str(tmpdir)), pathlib.Path('a'))
+    ase = azmodels.StorageEntity('cont')
+    ase._mode = azmodels.StorageModes.Block
+    ase._name = 'name'
+    ase._size = 32
+    ase._encryption = None
+    ase._from_local = True
+    ase._client = mock.MagicMock()
+    ase._client.primary_endpoint = 'ep'
+    id = ops.Uploader.create_unique_id(src, ase)
+
+    # no committed blocks are retrieved for new remote entities
+    u._add_to_upload_queue(src, ase, id)
+    assert gcbd.call_count == 0
+    assert u._upload_queue.get().is_delta
+
+    ase._from_local = False
+    u._add_to_upload_queue(src, ase, id)
+    assert gcbd.call_count == 1
+    assert u._upload_queue.get().is_delta
+
+
 def test_initialize_disk_threads():
     u = ops.Uploader(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
     u._general_options.dry_run = False
@@ -227,10 +265,28 @@ def test_worker_thread_transfer():
         assert u._process_transfer.call_count == 2
         assert len(u._exceptions) == 1
 
+    # idle workers do not hold admission so the limit does not grow
+    # while the queue is empty
+    u = ops.Uploader(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
+    u._general_options.dry_run = False
+    u._concurrency_controller = concurrency.AdaptiveConcurrencyController(
+        1, 4, 'upload', throttle_counter=retry.ThrottleCounter())
+    u._concurrency_controller.record(1, 0.01)
+    u._transfer_queue.terminate()
+    with mock.patch(
+            'blobxfer.operations.upload.Uploader.termination_check',
+            new_callable=mock.PropertyMock) as patched_tc:
+        patched_tc.side_effect = [False, False, True]
+        u._worker_thread_transfer()
+    decision = u._concurrency_controller.evaluate()
+    assert decision.reason == 'underutilized'
+    assert decision.limit == 1
+
 
 def test_process_transfer():
     u = ops.Uploader(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
     u._general_options.dry_run = False
+    u._concurrency_controller = mock.MagicMock()
     u._put_data = mock.MagicMock()
     u._update_progress_bar = mock.MagicMock()
 
@@ -250,31 +306,83 @@ def test_process_transfer():
     lp.use_stdin = True
 
     ud = mock.MagicMock()
-    ud.entity.mode = azmodels.StorageModes.Append
+    ud.entity = ase
+    ase.mode = azmodels.StorageModes.Append
     ud.complete_offset_upload = mock.MagicMock()
     ud.local_path = lp
+    ud.is_delta_block_unchanged.return_value = False
 
     id = ops.Uploader.create_unique_transfer_id(lp, ase, offsets)
     u._transfer_set.add(id)
+    u._memory_budget = mock.MagicMock()
+    u._memory_refs[id] = [1, 1]
 
     u._process_transfer(ud, ase, offsets, mock.MagicMock())
     assert u._upload_bytes_total == 1
     assert u._upload_bytes_sofar == 1
     assert len(u._transfer_set) == 0
+    assert len(u._memory_refs) == 0
+    u._memory_budget.release.assert_called_once_with(1)
+    assert u._concurrency_controller.record.call_args[0][0] == 1
+    assert u._concurrency_controller.acquire.call_count == 1
+    assert u._concurrency_controller.release.call_count == 1
     assert ud.complete_offset_upload.call_count == 1
     assert u._upload_queue.qsize() == 1
     assert u._update_progress_bar.call_count == 1
 
+    # memory is held until the last replica is transferred
     lp.use_stdin = False
     u._transfer_set.add(id)
+    u._memory_refs[id] = [2, 1]
     u._process_transfer(ud, ase, offsets, mock.MagicMock())
     assert u._upload_bytes_total == 11
     assert u._upload_bytes_sofar == 2
     assert len(u._transfer_set) == 0
+    assert u._memory_refs[id] == [1, 1]
+    assert u._memory_budget.release.call_count == 1
     assert ud.complete_offset_upload.call_count == 2
     assert u._upload_queue.qsize() == 2
     assert u._update_progress_bar.call_count == 2
 
+    # pooled buffer is returned after the last replica is transferred
+    data = u._buffer_pool.acquire(1)
+    u._transfer_set.add(id)
+    u._process_transfer(ud, ase, offsets, data)
+    assert len(u._memory_refs) == 0
+    assert u._buffer_pool.retained_bytes == len(data.obj)
+
+    # unchanged delta blocks are accounted for without a transfer
+    ud.is_delta_block_unchanged.return_value = True
+    u._put_data.reset_mock()
+    u._transfer_set.add(id)
+    u._memory_refs[id] = [1, 0]
+    u._process_transfer(ud, ase, offsets, mock.MagicMock())
+    assert u._put_data.call_count == 0
+    assert u._upload_bytes_sofar == 4
+    assert ud.complete_offset_upload.call_count == 4
+
+    # descriptor is re-enqueued only once all chunks complete if not append
+    ase.mode = azmodels.StorageModes.Block
+    ud.all_operations_completed = False
+    qsize = u._upload_queue.qsize()
+    u._transfer_set.add(id)
+    u._memory_refs[id] = [1, 0]
+    u._process_transfer(ud, ase, offsets, mock.MagicMock())
+    assert u._upload_queue.qsize() == qsize
+
+    ud.all_operations_completed = True
+    u._transfer_set.add(id)
+    u._memory_refs[id] = [1, 0]
+    u._process_transfer(ud, ase, offsets, mock.MagicMock())
+    assert u._upload_queue.qsize() == qsize + 1
+
+    # no transfer once the concurrency controller is terminated
+    ud.is_delta_block_unchanged.return_value = False
+    u._put_data.reset_mock()
+    u._concurrency_controller.acquire.return_value = False
+    u._process_transfer(ud, ase, offsets, mock.MagicMock())
+    assert u._put_data.call_count == 0
+
 
 @mock.patch('blobxfer.operations.azure.blob.append.append_block')
 @mock.patch('blobxfer.operations.azure.blob.block.create_blob')
@@ -341,15 +449,22 @@ def test_put_data(pp, pfr, pb, cb, ab):
     u._put_data(ud, ase, offsets, b'1')
     assert pp.call_count == 1
 
+    # test pooled buffers are zero padded in place
+    pool = buffer.BufferPool()
+    data = pool.acquire(1)
+    data[0] = ord('1')
+    u._put_data(ud, ase, offsets, data)
+    assert pp.call_count == 2
+    assert isinstance(pp.call_args[0][3], bytes)
+    assert pp.call_args[0][3] == b'1' + b'\0' * 511
+    assert bytes(data.obj[:512]) == b'1' + b'\0' * 511
+
 
-@mock.patch('time.sleep', return_value=None)
-def test_worker_thread_upload(ts):
+def test_worker_thread_upload():
     u = ops.Uploader(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
     u._general_options.dry_run = False
     u._general_options.concurrency.transfer_threads = 1
 
-    u._transfer_set = mock.MagicMock()
-    u._transfer_set.__len__.side_effect = [5, 0, 0, 0]
     u._upload_queue.put(mock.MagicMock)
     u._upload_queue.put(mock.MagicMock)
     u._process_upload_descriptor = mock.MagicMock()
@@ -358,10 +473,30 @@ def test_worker_thread_upload(ts):
     with mock.patch(
             'blobxfer.operations.upload.Uploader.termination_check',
             new_callable=mock.PropertyMock) as patched_tc:
-        patched_tc.side_effect = [False, False, False, False, True]
+        patched_tc.side_effect = [False, False, True]
         u._worker_thread_upload()
         assert u._process_upload_descriptor.call_count == 2
         assert len(u._exceptions) == 1
+        assert u._upload_queue.terminated
+        assert u._transfer_queue.terminated
+
+    # test transfer set > max set length
+    u = ops.Uploader(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
+    u._general_options.dry_run = False
+    u._general_options.concurrency.transfer_threads = 1
+    for i in range(0, 5):
+        u._transfer_set.add(i)
+    u._upload_queue.put(mock.MagicMock)
+    u._process_upload_descriptor = mock.MagicMock()
+
+    with mock.patch(
+            'blobxfer.operations.upload.Uploader.termination_check',
+            new_callable=mock.PropertyMock) as patched_tc:
+        patched_tc.side_effect = [False, True]
+        u._transfer_backpressure.terminate()
+        u._worker_thread_upload()
+        assert u._process_upload_descriptor.call_count == 0
+        assert u._upload_queue.qsize() == 1
 
 
 @mock.patch('blobxfer.operations.azure.blob.create_container')
@@ -423,7 +558,8 @@ def test_process_upload_descriptor():
     ud.complete_offset_upload = mock.MagicMock()
     ud.local_path = lp
     ud.next_offsets.return_value = (None, 1)
-    ud.all_operations_completed = True
+    ud.claim_finalization.return_value = True
+    ud.is_encrypted_in_regions = False
     ud.unique_id = 'uid'
 
     u._finalize_upload = mock.MagicMock()
@@ -442,10 +578,11 @@ def test_process_upload_descriptor():
     # test nothing
     u = ops.Uploader(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
     u._general_options.dry_run = False
+    ud.claim_finalization.return_value = False
     ud.all_operations_completed = False
     ud.next_offsets.return_value = (None, None)
     u._process_upload_descriptor(ud)
-    assert u._upload_queue.qsize() == 1
+    assert u._upload_queue.qsize() == 0
 
     # test encrypted
     u = ops.Uploader(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
@@ -471,9 +608,12 @@ def test_process_upload_descriptor():
         u._process_upload_descriptor(ud)
         assert u._upload_queue.qsize() == 1
         assert u._prepare_upload.call_count == 2
-        assert ud.hmac_data.call_count == 2
+        assert ud.hmac_data.call_count == 1
+        assert ud.complete_encrypted_chunk.call_count == 1
         assert u._transfer_queue.qsize() == 2
         assert len(u._transfer_set) == 2
+        assert u._memory_budget.in_use == 2
+        assert list(u._memory_refs.values()) == [[2, 2]]
 
     # test stdin
     ase.is_encrypted = False
@@ -491,6 +631,103 @@ def test_process_upload_descriptor():
     assert u._upload_queue.qsize() == 1
     assert u._transfer_queue.qsize() == 0
     assert len(u._transfer_set) == 0
+    assert u._memory_budget.in_use == 0
+    assert u._memory_budget.peak == 1
+
+    # test terminated while waiting for memory
+    u = ops.Uploader(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
+    u._memory_budget.terminate()
+    u._process_upload_descriptor(ud)
+    assert ud.read_data.call_count == 2
+    assert u._upload_queue.qsize() == 0
+
+    # test encrypted with pooled buffer padded in place
+    u = ops.Uploader(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
+    u._general_options.dry_run = False
+    u._prepare_upload = mock.MagicMock()
+    lp.use_stdin = False
+    ase.is_encrypted = True
+    ase.replica_targets = None
+    ase.encryption_metadata.symmetric_key = b'k' * 32
+    offsets.pad = True
+    ud.current_iv = b'i' * 16
+    data = u._buffer_pool.acquire(1 + 16)[:1]
+    data[0] = ord('a')
+    ud.read_data.return_value = (data, None)
+    u._process_upload_descriptor(ud)
+    _, _, _, encdata = u._transfer_queue.get()
+    assert isinstance(encdata, bytes)
+    assert encdata == crypto.aes_cbc_encrypt_data(
+        b'k' * 32, b'i' * 16, b'a', True)
+    ud.complete_encrypted_chunk.assert_called_with(0, encdata)
+    assert u._buffer_pool.retained_bytes == len(data.obj)
+
+    # test encrypted in regions
+    u = ops.Uploader(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
+    u._general_options.dry_run = False
+    u._prepare_upload = mock.MagicMock()
+    ud.is_encrypted_in_regions = True
+    ud.hmac_data.reset_mock()
+    offsets.chunk_num = 3
+    data = u._buffer_pool.acquire(1)[:1]
+    data[0] = ord('a')
+    ud.read_data.return_value = (data, None)
+    u._process_upload_descriptor(ud)
+    assert u._upload_queue.qsize() == 1
+    assert ud.hmac_data.call_count == 0
+    _, _, _, encdata = u._transfer_queue.get()
+    assert len(encdata) == 1 + 28
+    assert crypto.aes_gcm_decrypt_regions(b'k' * 32, 3, 1, encdata) == b'a'
+    ud.add_region_tag.assert_called_once_with(3, encdata)
+    assert u._buffer_pool.retained_bytes == len(data.obj)
+
+    # test encrypted in regions with crypto offload
+    u = ops.Uploader(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
+    u._general_options.dry_run = False
+    u._prepare_upload = mock.MagicMock()
+    u._crypto_offload = mock.MagicMock()
+    ud.must_compute_md5 = False
+    ud.read_data.reset_mock()
+    ud.compute_read_range.return_value = (96, 1)
+    u._process_upload_descriptor(ud)
+    assert u._upload_queue.qsize() == 1
+    assert u._transfer_queue.qsize() == 0
+    assert len(u._transfer_set) == 1
+    assert ud.read_data.call_count == 0
+    u._crypto_offload.add_encrypt_chunk.assert_called_once_with(
+        'uid', 'lpabspath', 96, offsets, 1, b'k' * 32)
+
+
+def test_process_encrypted_chunk():
+    u = ops.Uploader(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
+    ud = mock.MagicMock()
+    ud.entity._client.primary_endpoint = 'ep'
+    ud.entity.path = 'asepath'
+    ud.entity.replica_targets = None
+    ud.entity.is_encrypted = True
+    ud.local_path.absolute_path = 'lpabspath'
+    u._ud_map['uid'] = ud
+    offsets = mock.MagicMock()
+    offsets.chunk_num = 0
+    offsets.num_bytes = 29
+
+    u._crypto_offload = mock.MagicMock()
+    u._crypto_offload.retrieve_data.return_value = b'\1' * 29
+
+    with pytest.raises(RuntimeError):
+        u._process_encrypted_chunk('uid', offsets, None, 'error')
+    assert u._crypto_offload.retrieve_data.call_count == 0
+
+    # slot is released even on error
+    with pytest.raises(RuntimeError):
+        u._process_encrypted_chunk('uid', offsets, 'slot', 'error')
+    u._crypto_offload.retrieve_data.assert_called_once_with('slot')
+
+    u._process_encrypted_chunk('uid', offsets, 'slot', None)
+    ud.add_region_tag.assert_called_once_with(0, b'\1' * 29)
+    assert u._transfer_queue.get() == (ud, ud.entity, offsets, b'\1' * 29)
+    assert len(u._transfer_set) == 1
+    assert list(u._memory_refs.values()) == [[1, 58]]
 
 
 @mock.patch('blobxfer.operations.azure.blob.block.put_block_list')
@@ -518,15 +755,26 @@ def test_finalize_block_blob(pbl):
     ud.unique_id = 'uid'
     ud.must_compute_md5 = True
     ud.md5.digest.return_value = b'md5'
+    ud.is_delta = False
 
     u._finalize_block_blob(ud, mock.MagicMock())
     assert pbl.call_count == 2
+    assert pbl.call_args_list[0][1]['digests'] is None
+    ase.update_from_response.assert_called_once_with(
+        pbl.return_value, util.base64_encode_as_string(b'md5'))
 
     ud.must_compute_md5 = False
     ase.replica_targets = []
     u._finalize_block_blob(ud, mock.MagicMock())
     assert pbl.call_count == 3
 
+    ud.is_delta = True
+    ud.delta_block_digests = ['a', 'b']
+    ud.delta_unchanged = (1, 10)
+    u._finalize_block_blob(ud, mock.MagicMock())
+    assert pbl.call_count == 4
+    assert pbl.call_args[1]['digests'] == ['a', 'b']
+
 
 @mock.patch('blobxfer.operations.azure.blob.set_blob_properties')
 def test_set_blob_properties(sbp):
@@ -648,16 +896,29 @@ def test_finalize_nonblock_blob():
     u._set_blob_metadata = mock.MagicMock()
     u._resize_blob = mock.MagicMock()
 
-    u._finalize_nonblock_blob(ud, {'a': 0})
+    ud.md5.digest.return_value = b'md5'
+
+    assert u._finalize_nonblock_blob(ud, {'a': 0})
     assert u._set_blob_properties.call_count == 1
     assert u._set_blob_metadata.call_count == 1
     assert u._resize_blob.call_count == 0
+    ase.update_from_response.assert_called_once_with(
+        u._set_blob_metadata.return_value,
+        util.base64_encode_as_string(b'md5'))
 
     # resize required
     ud.requires_resize.return_value = (True, 512)
-    u._finalize_nonblock_blob(ud, {'a': 0})
+    assert u._finalize_nonblock_blob(ud, {'a': 0})
     assert u._resize_blob.call_count == 1
 
+    # no finalize requests
+    ase.update_from_response.reset_mock()
+    ud.requires_resize.return_value = (False, None)
+    ud.requires_non_encrypted_md5_put = False
+    ase.cache_control = None
+    assert not u._finalize_nonblock_blob(ud, None)
+    assert ase.update_from_response.call_count == 0
+
 
 @mock.patch('blobxfer.operations.azure.file.set_file_properties')
 @mock.patch('blobxfer.operations.azure.file.set_file_metadata')
@@ -723,23 +984,32 @@ def test_finalize_upload():
     ud.unique_id = 'uid'
     ud.requires_put_block_list = True
 
+    u._fd_cache = mock.MagicMock()
     u._finalize_block_blob = mock.MagicMock()
-    u._finalize_upload(ud)
+    assert u._finalize_upload(ud)
     assert u._finalize_block_blob.call_count == 1
+    u._fd_cache.close.assert_called_once_with('lpabspath')
 
     ud.requires_put_block_list = False
     ud.remote_is_page_blob = True
     u._finalize_nonblock_blob = mock.MagicMock()
-    u._finalize_upload(ud)
+    u._finalize_nonblock_blob.return_value = False
+    assert not u._finalize_upload(ud)
     assert u._finalize_nonblock_blob.call_count == 1
 
     ud.remote_is_page_blob = False
     ud.remote_is_append_blob = False
     ud.remote_is_file = True
+    ud.is_one_shot_block_blob = False
     u._finalize_azure_file = mock.MagicMock()
-    u._finalize_upload(ud)
+    assert not u._finalize_upload(ud)
     assert u._finalize_azure_file.call_count == 1
 
+    # one shot block blob
+    ud.remote_is_file = False
+    ud.is_one_shot_block_blob = True
+    assert u._finalize_upload(ud)
+
 
 def test_get_destination_paths():
     u = ops.Uploader(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
@@ -761,6 +1031,7 @@ def test_get_destination_paths():
 def test_delete_extraneous_files(db, lab, df, laf):
     u = ops.Uploader(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
     u._general_options.dry_run = False
+    u._general_options.concurrency.transfer_threads = 1
 
     # test no delete
     u._spec.options.delete_extraneous_destination = False
@@ -844,6 +1115,20 @@ def test_delete_extraneous_files(db, lab, df, laf):
     assert lab.call_count == 3
     assert db.call_count == 1
 
+    # test deletion started during transfer is not restarted
+    u._start_extraneous_deletion()
+    u._start_extraneous_deletion()
+    u._delete_extraneous_files()
+    assert u._extraneous_deleter is None
+    assert lab.call_count == 4
+    assert db.call_count == 2
+
+    u._delete_exclude.add(ops.Uploader.create_destination_id(
+        sa1.block_blob_client, 'cont', 'blobname'))
+    u._delete_extraneous_files()
+    assert lab.call_count == 5
+    assert db.call_count == 2
+
 
 @mock.patch('blobxfer.models.metadata.get_md5_from_metadata')
 def test_check_upload_conditions(gmfm):
@@ -923,6 +1208,7 @@ def test_check_for_existing_remote(gbp, gfp):
     u = ops.Uploader(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
     u._general_options.dry_run = False
     u._spec.options.overwrite = True
+    u._spec.options.delta = False
 
     sa = mock.MagicMock()
     sa.name = 'name'
@@ -938,6 +1224,13 @@ def test_check_for_existing_remote(gbp, gfp):
     u._spec.skip_on.lmt_ge = False
     u._spec.skip_on.md5_match = False
     assert u._check_for_existing_remote(sa, 'cont', 'name') is None
+    assert gfp.call_count == 0
+
+    # delta uploads require the existing remote
+    u._spec.options.delta = True
+    assert u._check_for_existing_remote(sa, 'cont', 'name') is None
+    assert gfp.call_count == 1
+    u._spec.options.delta = False
 
     u._spec.options.overwrite = False
 
@@ -992,6 +1285,33 @@ def test_check_for_existing_remote(gbp, gfp):
         assert ase is not None
         assert ase.access_tier == 'Hot'
 
+    # check remote index
+    u._remote_index = mock.MagicMock()
+    u._remote_index.get_properties.return_value = None
+    gbp.reset_mock()
+    assert u._check_for_existing_remote(sa, 'cont', 'name') is None
+    u._remote_index.get_properties.assert_called_once_with(
+        sa, 'cont', 'name', azmodels.StorageModes.Block)
+    assert gbp.call_count == 0
+
+
+def test_initialize_remote_index():
+    u = ops.Uploader(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
+    u._spec.options.remote_index = False
+    u._initialize_remote_index()
+    assert u._remote_index is None
+
+    sa = mock.MagicMock()
+    sa.name = 'sa'
+    u._spec.options.remote_index = True
+    u._get_destination_paths = mock.MagicMock()
+    u._get_destination_paths.return_value = [
+        (sa, 'cont', 'a/b', 'cont/a/b')]
+    u._initialize_remote_index()
+    assert u._remote_index is not None
+    assert u._remote_index._find_prefix(sa, 'cont', False, 'a/b/c') == 'a/b'
+    u._remote_index.close()
+
 
 def test_generate_destination_for_source():
     u = ops.Uploader(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
@@ -1052,6 +1372,82 @@ def test_generate_destination_for_source():
     assert u._check_for_existing_remote.call_count == 2
 
 
+@mock.patch('blobxfer.operations.azure.blob.get_blob_properties')
+def test_sync_state(gbp, tmpdir):
+    u = ops.Uploader(mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
+    u._general_options.dry_run = False
+    u._general_options.sync_state = options.SyncState(
+        str(tmpdir.join('ss')), 0, 0)
+    u._spec.options.mode = azmodels.StorageModes.Block
+    u._spec.options.vectored_io.distribution_mode = \
+        models.VectoredIoDistributionMode.Disabled
+    u._spec.options.overwrite = True
+    u._spec.options.rename = False
+    u._spec.options.strip_components = 0
+    u._initialize_sync_state()
+
+    tmpdir.join('a').write('abc')
+    lp = models.LocalPath(pathlib.Path(str(tmpdir)), pathlib.Path('a'))
+    sa = mock.MagicMock()
+    sa.block_blob_client.primary_endpoint = 'ep'
+    sa.can_read_object = True
+    u._get_destination_paths = mock.MagicMock()
+    u._get_destination_paths.return_value = [
+        (sa, 'cont', pathlib.Path('dir'), 'dpath'),
+    ]
+
+    assert not u._check_sync_state(lp, sa, 'cont', 'dir/a')
+
+    ase = azmodels.StorageEntity('cont')
+    ase.populate_from_local(
+        sa, 'cont', 'dir/a', azmodels.StorageModes.Block, None, None)
+    gbp.return_value = None
+    u._update_sync_state(lp, ase)
+    assert u._sync_state.get_record('ep:cont/dir/a') is None
+
+    blob = azure.storage.blob.models.Blob(name='dir/a')
+    blob.properties.etag = 'e1'
+    gbp.return_value = blob
+    u._update_sync_state(lp, ase)
+    assert u._sync_state.get_record('ep:cont/dir/a').remote_etag == 'e1'
+
+    # unchanged entities are skipped without contacting the remote
+    u._check_for_existing_remote = mock.MagicMock()
+    _, dase = next(u._generate_destination_for_source(lp))
+    assert u._check_for_existing_remote.call_count == 0
+    assert dase.size == 3
+    assert u._check_upload_conditions(lp, dase) == ops.UploadAction.Skip
+    assert len(u._sync_state_unchanged) == 0
+
+    # revalidation
+    u._sync_state._revalidate_sample = 1
+    u._get_remote_properties = mock.MagicMock()
+    u._get_remote_properties.return_value = blob
+    assert u._check_sync_state(lp, sa, 'cont', 'dir/a')
+    blob.properties.etag = 'e2'
+    assert not u._check_sync_state(lp, sa, 'cont', 'dir/a')
+    sa.can_read_object = False
+    assert not u._check_sync_state(lp, sa, 'cont', 'dir/a')
+    u._sync_state._revalidate_sample = 0
+
+    # properties from a finalize response do not contact the remote
+    props = azure.storage.blob.models.ResourceProperties()
+    props.etag = 'e0'
+    ase.update_from_response(props, None)
+    u._update_sync_state(lp, ase, refresh=False)
+    assert gbp.call_count == 2
+    assert u._sync_state.get_record('ep:cont/dir/a').remote_etag == 'e0'
+
+    # local change
+    tmpdir.join('a').write('abcd')
+    lp = models.LocalPath(pathlib.Path(str(tmpdir)), pathlib.Path('a'))
+    assert not u._check_sync_state(lp, sa, 'cont', 'dir/a')
+
+    u._general_options.dry_run = True
+    assert not u._check_sync_state(lp, sa, 'cont', 'dir/a')
+    u._sync_state.close()
+
+
 def test_vectorize_and_bind():
     ase = mock.MagicMock()
     ase.client.primary_endpoint = 'ep'
@@ -1227,6 +1623,7 @@ def test_run(lfmo, urm, tmpdir):
     u._general_options.concurrency.md5_processes = 1
     u._general_options.concurrency.crypto_processes = 1
     u._general_options.resume_file = 'resume'
+    u._general_options.sync_state = None
     u._spec.options.overwrite = False
     u._spec.options.store_file_properties.md5 = True
     u._spec.skip_on.md5_match = True
@@ -1331,6 +1728,7 @@ def test_run(lfmo, urm, tmpdir):
     u._general_options.concurrency.md5_processes = 1
     u._general_options.concurrency.crypto_processes = 0
     u._general_options.resume_file = 'resume'
+    u._general_options.sync_state = None
     u._spec.options.store_file_properties.md5 = True
     u._spec.skip_on.md5_match = True
     u._spec.options.rsa_public_key = None
@@ -1365,6 +1763,7 @@ def test_run(lfmo, urm, tmpdir):
     u._general_options.concurrency.md5_processes = 1
     u._general_options.concurrency.crypto_processes = 0
     u._general_options.resume_file = 'resume'
+    u._general_options.sync_state = None
     u._spec.options.overwrite = False
     u._spec.options.store_file_properties.md5 = True
     u._spec.skip_on.md5_match = True
@@ -1406,6 +1805,7 @@ def test_run(lfmo, urm, tmpdir):
     u._general_options.concurrency.md5_processes = 1
     u._general_options.concurrency.crypto_processes = 0
     u._general_options.resume_file = 'resume'
+    u._general_options.sync_state = None
     u._spec.options.overwrite = False
     u._spec.options.store_file_properties.md5 = True
     u._spec.skip_on.md5_match = True
@@ -1441,6 +1841,7 @@ def test_run(lfmo, urm, tmpdir):
     u._general_options.concurrency.md5_processes = 1
     u._general_options.concurrency.crypto_processes = 0
     u._general_options.resume_file = 'resume'
+    u._general_options.sync_state = None
     u._spec.options.store_file_properties.md5 = True
     u._spec.skip_on.md5_match = True
     u._spec.options.rsa_public_key = None
@@ -1518,3 +1919,22 @@ def test_start():
     assert u._md5_offload.finalize_processes.call_count == 3
     assert u._crypto_offload.finalize_processes.call_count == 3
     assert u._resume.close.call_count == 3
+
+
+def test_initialize_chunk_sizer():
+    spec = mock.MagicMock()
+    spec.options.chunk_size_bytes = 0
+    spec.options.chunk_size_mode = options.ChunkSizeMode.Static
+    u = ops.Uploader(mock.MagicMock(), mock.MagicMock(), spec)
+    u._initialize_chunk_sizer()
+    assert u._chunk_sizer is None
+
+    spec.options.chunk_size_mode = options.ChunkSizeMode.Adaptive
+    spec.options.chunk_size_bytes = 1
+    u._initialize_chunk_sizer()
+    assert u._chunk_sizer is None
+
+    spec.options.chunk_size_bytes = 0
+    u._initialize_chunk_sizer()
+    assert u._chunk_sizer is not None
+    assert u._chunk_sizer.next_chunk_size() > 0
@@ -2,6 +2,11 @@
 """Tests for retry"""
 
 # stdlib imports
+import base64
+import email.utils
+import http.server
+import threading
+import time
 import unittest.mock as mock
 import ssl
 # non-stdlib imports
@@ -9,6 +14,9 @@ import azure.storage.common.models
 import pytest
 import requests
 import urllib3
+# local imports
+import blobxfer.models.options as options
+import blobxfer.operations.azure as azops
 # module under test
 import blobxfer.retry as retry
 
@@ -124,6 +132,29 @@ def test_should_retry():
     context.response.status = 501
     assert not er._should_retry(context)
 
+    # throttling responses are counted
+    total = retry.throttle_counter.total
+    counts = retry.throttle_counter.counts()
+    context.response.status = 429
+    assert er._should_retry(context)
+    context.response.status = 503
+    assert er._should_retry(context)
+    assert retry.throttle_counter.total == total + 2
+    assert retry.throttle_counter.counts()[429] == counts[429] + 1
+    assert retry.throttle_counter.counts()[503] == counts[503] + 1
+
+
+def test_throttle_counter():
+    a = retry.ThrottleCounter()
+    a.increment(None)
+    a.increment(500)
+    assert a.total == 0
+    a.increment(429)
+    a.increment(429)
+    a.increment(503)
+    assert a.total == 3
+    assert a.counts() == {429: 2, 503: 1}
+
 
 def test_exponentialretrywithmaxwait():
     with pytest.raises(ValueError):
@@ -139,8 +170,9 @@ def test_exponentialretrywithmaxwait():
             initial_backoff=2, max_backoff=1)
 
     er = retry.ExponentialRetryWithMaxWait()
-    context = mock.MagicMock()
+    context = azure.storage.common.models.RetryContext()
     context.count = 0
+    context.response = mock.MagicMock()
     context.response.status = 500
     bo = er.retry(context)
     assert context.count == 1
@@ -161,3 +193,163 @@ def test_exponentialretrywithmaxwait():
     bo = er.retry(context)
     assert context.count == 5
     assert bo == 0.1
+
+
+def test_exponentialretrywithmaxwait_per_request_state():
+    throttle = mock.MagicMock()
+    er = retry.ExponentialRetryWithMaxWait(throttle=throttle)
+    ctx1 = azure.storage.common.models.RetryContext()
+    ctx1.response = mock.MagicMock()
+    ctx1.response.status = 500
+    ctx2 = azure.storage.common.models.RetryContext()
+    ctx2.response = mock.MagicMock()
+    ctx2.response.status = 500
+
+    # interleaved requests back off independently
+    assert er.retry(ctx1) == 0.1
+    assert er.retry(ctx1) == 0.2
+    assert er.retry(ctx2) == 0.1
+    assert er.retry(ctx1) == 0.4
+    assert er.retry(ctx2) == 0.2
+    assert throttle.throttled.call_count == 0
+
+    # throttling responses honor retry after and notify the account
+    ctx3 = azure.storage.common.models.RetryContext()
+    ctx3.response = mock.MagicMock()
+    ctx3.response.status = 503
+    ctx3.response.headers = {'x-ms-retry-after-ms': '2500'}
+    assert er.retry(ctx3) == 2.5
+    throttle.throttled.assert_called_once_with(2.5)
+
+    # exponential backoff is used if larger than retry after
+    ctx3.response.status = 429
+    ctx3.response.headers = {'retry-after': '0'}
+    assert er.retry(ctx3) == 0.2
+    assert throttle.throttled.call_args[0][0] == 0
+
+    ctx3.response.headers = {}
+    assert er.retry(ctx3) == 0.4
+    assert throttle.throttled.call_args[0][0] is None
+
+
+def test_get_retry_after():
+    assert retry._get_retry_after(None) is None
+    response = mock.MagicMock()
+    response.headers = None
+    assert retry._get_retry_after(response) is None
+    response.headers = {}
+    assert retry._get_retry_after(response) is None
+    response.headers = {'x-ms-retry-after-ms': '150'}
+    assert retry._get_retry_after(response) == 0.15
+    response.headers = {'x-ms-retry-after-ms': 'x', 'retry-after': '3'}
+    assert retry._get_retry_after(response) == 3
+    response.headers = {'retry-after': '-3'}
+    assert retry._get_retry_after(response) == 0
+    response.headers = {'retry-after': '100000'}
+    assert retry._get_retry_after(response) == retry._MAX_RETRY_AFTER_SECONDS
+    response.headers = {
+        'retry-after': email.utils.formatdate(time.time() + 30, usegmt=True)
+    }
+    assert 25 < retry._get_retry_after(response) <= 30
+    response.headers = {'retry-after': 'garbage'}
+    assert retry._get_retry_after(response) is None
+
+
+def test_account_throttle():
+    now = [100.0]
+    sleeps = []
+
+    def _sleep(secs):
+        sleeps.append(secs)
+        now[0] += secs
+
+    a = retry.AccountThrottle('sa', clock=lambda: now[0], sleep=_sleep)
+    assert a.rate is None
+
+    # unlimited until throttled
+    for _ in range(20):
+        a.acquire()
+        now[0] += 0.1
+    assert len(sleeps) == 0
+
+    # throttling engages a limit below demand and pauses the account
+    a.throttled(retry_after=0.5)
+    assert a.rate == pytest.approx(5)
+    a.acquire()
+    assert sleeps == [0.5]
+    # bucket is drained, next request waits for a token
+    a.acquire()
+    assert sleeps[-1] == pytest.approx(0.2)
+
+    # throttles within the decrease interval do not compound
+    a.throttled()
+    assert a.rate == pytest.approx(5)
+    now[0] += retry._THROTTLE_DECREASE_INTERVAL_SECONDS
+    a.throttled()
+    assert a.rate == pytest.approx(2.5)
+    for _ in range(10):
+        a.throttled()
+        now[0] += retry._THROTTLE_DECREASE_INTERVAL_SECONDS
+    assert a.rate == retry._THROTTLE_MIN_RATE
+
+    # rate recovers additively and is lifted once throttling subsides
+    now[0] += retry._THROTTLE_RECOVERY_SECONDS
+    a.acquire()
+    assert a.rate is None
+    nsleeps = len(sleeps)
+    a.acquire()
+    assert len(sleeps) == nsleeps
+
+
+class _ThrottlingHandler(http.server.BaseHTTPRequestHandler):
+    """Local stand-in for a storage endpoint which throttles the first
+    requests"""
+    throttle_count = 2
+    requests = 0
+
+    def do_HEAD(self):
+        _ThrottlingHandler.requests += 1
+        if _ThrottlingHandler.requests <= _ThrottlingHandler.throttle_count:
+            self.send_response(503)
+            self.send_header('x-ms-retry-after-ms', '200')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.send_header('x-ms-blob-type', 'BlockBlob')
+        self.send_header('Last-Modified', 'Mon, 01 Jan 2024 00:00:00 GMT')
+        self.send_header('ETag', '"0x1"')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def test_throttling_against_local_server():
+    server = http.server.ThreadingHTTPServer(
+        ('127.0.0.1', 0), _ThrottlingHandler)
+    thr = threading.Thread(target=server.serve_forever)
+    thr.start()
+    try:
+        sa = azops.StorageAccount(
+            'sa', base64.b64encode(b'k' * 32).decode('ascii'),
+            'core.windows.net', 1,
+            options.Timeout(connect=1, read=5, max_retries=3), None)
+        client = sa.block_blob_client
+        client.protocol = 'http'
+        client.primary_endpoint = '127.0.0.1:{}'.format(server.server_port)
+        throttled = retry.throttle_counter.counts()[503]
+        start = time.monotonic()
+        props = client.get_blob_properties('container', 'blob')
+        elapsed = time.monotonic() - start
+        assert props.properties.blob_type == 'BlockBlob'
+        assert _ThrottlingHandler.requests == 3
+        assert retry.throttle_counter.counts()[503] == throttled + 2
+        # retry after was honored and the account is rate limited
+        assert elapsed >= 0.4
+        assert sa.throttle.rate is not None
+    finally:
+        server.shutdown()
+        server.server_close()
+        thr.join()
@@ -3,7 +3,11 @@
 
 # stdlib imports
 import datetime
+import hashlib
+import hmac
+import threading
 import time
+import unittest.mock as mock
 # non-stdlib imports
 import dateutil.tz
 import pytest
@@ -100,6 +104,94 @@ def test_scantree(tmpdir):
     assert 'world.txt' in found
     assert len(found) == 2
 
+    found = set()
+    for de in blobxfer.util.scantree(
+            str(tmpdir), prune=lambda x: x.name == 'def'):
+        found.add(de.name)
+    assert 'hello.txt' in found
+    assert 'world.txt' not in found
+
+
+def test_scantree_parallel(tmpdir):
+    expected = set()
+    for i in range(3):
+        dpath = tmpdir.mkdir('d{}'.format(i))
+        for j in range(3):
+            spath = dpath.mkdir('s{}'.format(j))
+            spath.join('f{}'.format(j)).write('x')
+            expected.add(str(spath.join('f{}'.format(j))))
+        dpath.join('g').write('y')
+        expected.add(str(dpath.join('g')))
+
+    found = set()
+    for de in blobxfer.util.scantree(str(tmpdir), num_threads=4):
+        assert de.stat().st_size == 1
+        found.add(de.path)
+    assert found == expected
+
+    # frontier full forces inline descent
+    with mock.patch('blobxfer.util._SCAN_MAX_FRONTIER', 0):
+        with mock.patch('blobxfer.util._SCAN_BATCH_SIZE', 1):
+            found = set(
+                de.path for de in blobxfer.util.scantree(
+                    str(tmpdir), num_threads=2))
+    assert found == expected
+
+    found = set(
+        de.path for de in blobxfer.util.scantree(
+            str(tmpdir), prune=lambda x: x.name == 's1', num_threads=2))
+    assert len(found) == len(expected) - 3
+    assert str(tmpdir.join('d0').join('s1').join('f1')) not in found
+
+    # early close of generator
+    gen = blobxfer.util.scantree(str(tmpdir), num_threads=2)
+    next(gen)
+    gen.close()
+
+    with mock.patch('os.scandir', side_effect=OSError('error')):
+        with pytest.raises(OSError):
+            list(blobxfer.util.scantree(str(tmpdir), num_threads=2))
+
+
+def test_parallel_tree_scanner_put_blocks_until_stopped(tmpdir):
+    scanner = blobxfer.util._ParallelTreeScanner(str(tmpdir), None, 2)
+    with mock.patch('blobxfer.util._SCAN_MAX_PENDING_BATCHES', 1):
+        scanner._put('a')
+        thr = threading.Thread(target=scanner._put, args=('b',))
+        thr.start()
+        thr.join(0.2)
+        assert thr.is_alive()
+        assert list(scanner._results) == ['a']
+
+        # consuming an item admits the blocked producer
+        assert scanner._get() == 'a'
+        thr.join(5)
+        assert not thr.is_alive()
+        assert list(scanner._results) == ['b']
+
+        # stopping wakes a blocked producer without enqueuing
+        thr = threading.Thread(target=scanner._put, args=('c',))
+        thr.start()
+        thr.join(0.2)
+        assert thr.is_alive()
+        with scanner._cv:
+            scanner._stop = True
+            scanner._cv.notify_all()
+        thr.join(5)
+        assert not thr.is_alive()
+        assert list(scanner._results) == ['b']
+
+
+def test_parallel_tree_scanner_frontier_wakes_all(tmpdir):
+    tmpdir.mkdir('d')
+    tmpdir.join('f').write('x')
+    scanner = blobxfer.util._ParallelTreeScanner(str(tmpdir), None, 2)
+    scanner._cv = mock.MagicMock()
+    scanner._scan(str(tmpdir))
+    assert list(scanner._frontier) == [str(tmpdir), str(tmpdir.join('d'))]
+    assert scanner._cv.notify.call_count == 0
+    assert scanner._cv.notify_all.call_count == 2
+
 
 def test_get_mime_type():
     a = 'b.txt'
@@ -122,6 +214,75 @@ def test_new_md5_hasher():
     assert blobxfer.util.new_md5_hasher() is not None
 
 
+def test_new_resumable_md5_hasher():
+    data = b'0123456789' * 20
+    if not blobxfer.util.resumable_hasher_supported():
+        md5 = blobxfer.util.new_resumable_md5_hasher()
+        assert blobxfer.util.export_hasher_state(md5) is None
+        with pytest.raises(RuntimeError):
+            blobxfer.util.new_resumable_md5_hasher(b'')
+        return
+    md5 = blobxfer.util.new_resumable_md5_hasher()
+    md5.update(data[:70])
+    state = blobxfer.util.export_hasher_state(md5)
+    assert md5.hexdigest() == hashlib.md5(data[:70]).hexdigest()
+    # digest does not finalize the hasher
+    md5.update(bytearray(data[70:]))
+    assert md5.digest() == hashlib.md5(data).digest()
+
+    restored = blobxfer.util.new_resumable_md5_hasher(state)
+    restored.update(memoryview(data)[70:])
+    assert restored.hexdigest() == hashlib.md5(data).hexdigest()
+    assert restored.copy().hexdigest() == restored.hexdigest()
+
+    with pytest.raises(ValueError):
+        blobxfer.util.new_resumable_md5_hasher(b'bad')
+    assert blobxfer.util.export_hasher_state(hashlib.md5()) is None
+
+    with mock.patch('blobxfer.util._LIBCRYPTO', None):
+        assert not blobxfer.util.resumable_hasher_supported()
+        md5 = blobxfer.util.new_resumable_md5_hasher()
+        assert blobxfer.util.export_hasher_state(md5) is None
+        with pytest.raises(RuntimeError):
+            blobxfer.util.new_resumable_md5_hasher(state)
+
+    with mock.patch('ctypes.util.find_library', return_value=None):
+        assert blobxfer.util._load_libcrypto() is None
+
+
+def test_new_resumable_hmac_sha256_hasher():
+    data = b'0123456789' * 20
+    for key in (b'k' * 32, b'k' * 100):
+        expected = hmac.new(key, data, digestmod=hashlib.sha256).digest()
+        if not blobxfer.util.resumable_hasher_supported():
+            mac = blobxfer.util.new_resumable_hmac_sha256_hasher(key)
+            assert not blobxfer.util.is_resumable_hasher(mac)
+            with pytest.raises(RuntimeError):
+                blobxfer.util.new_resumable_hmac_sha256_hasher(key, b'')
+            continue
+        mac = blobxfer.util.new_resumable_hmac_sha256_hasher(key)
+        assert blobxfer.util.is_resumable_hasher(mac)
+        mac.update(data[:70])
+        state = blobxfer.util.export_hasher_state(mac)
+        assert mac.copy().digest() == hmac.new(
+            key, data[:70], digestmod=hashlib.sha256).digest()
+        mac.update(data[70:])
+        assert mac.digest() == expected
+
+        restored = blobxfer.util.new_resumable_hmac_sha256_hasher(
+            key, state)
+        restored.update(memoryview(data)[70:])
+        assert restored.hexdigest() == expected.hex()
+
+    assert not blobxfer.util.is_resumable_hasher(
+        hmac.new(b'k', digestmod=hashlib.sha256))
+    with mock.patch('blobxfer.util._LIBCRYPTO', None):
+        mac = blobxfer.util.new_resumable_hmac_sha256_hasher(b'k')
+        assert blobxfer.util.export_hasher_state(mac) is None
+        with pytest.raises(RuntimeError):
+            blobxfer.util.new_resumable_hmac_sha256_hasher(b'k', b'state')
+
+
 def test_page_align_content_length():
     assert 0 == blobxfer.util.page_align_content_length(0)
     assert 512 == blobxfer.util.page_align_content_length(1)
@@ -133,6 +294,20 @@ def test_page_align_content_length():
     assert 1536 == blobxfer.util.page_align_content_length(1025)
 
 
+def test_parse_byte_size():
+    assert blobxfer.util.parse_byte_size(None) == 0
+    assert blobxfer.util.parse_byte_size(1024) == 1024
+    assert blobxfer.util.parse_byte_size('1024') == 1024
+    assert blobxfer.util.parse_byte_size('4k') == 4096
+    assert blobxfer.util.parse_byte_size('1.5 MiB') == 1572864
+    assert blobxfer.util.parse_byte_size('2GB') == 2147483648
+    assert blobxfer.util.parse_byte_size('1tib') == 1099511627776
+    with pytest.raises(ValueError):
+        blobxfer.util.parse_byte_size('2 gigs')
+    with pytest.raises(ValueError):
+        blobxfer.util.parse_byte_size('-1')
+
+
 def test_normalize_azure_path():
     a = '\\cont\\r1\\r2\\r3\\'
     b = blobxfer.util.normalize_azure_path(a)